@@ -0,0 +1,182 @@
+"""
+Measures the coefficients of the augmentation cost model (see app/internal/cost_model.py).
+
+Every augmentation is run on random images of a few sizes with arguments that cover each of its regimes.
+The CPU time of a case is the best of --repeats runs... its peak memory is what it allocates on top of the image.
+A line is fitted through the CPU times of every regime:
+
+    cpu seconds = seconds_per_unit x work + overhead_seconds
+
+and bytes_per_unit is the largest peak memory per unit of memory at the largest size.
+
+Run it on the machines that serve the API (with the same AUGMENTATION_THREADS) and commit the result.
+
+Example:
+    python -m app.commands.calibrate_cost_model
+    python -m app.commands.calibrate_cost_model --sizes 128 256 512 --output /tmp/calibration.json
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import asdict
+from datetime import UTC, datetime
+from pathlib import Path
+
+import numpy
+
+from app.config import settings
+from app.internal.cost_model import CALIBRATION_PATH, Calibration, get_work
+from app.repository.image_processing import PROCESSING_MAP, STOCHASTIC_PROCESSING
+
+DEFAULT_SIZES = (64, 128, 256)
+DEFAULT_REPEATS = 3
+
+# the arguments every augmentation is measured with... at least 2 per regime so a line can be fitted
+CALIBRATION_CASES: dict[str, list[dict]] = {
+    'brighten': [{'amount': 50}],
+    'channel_swap': [{'a': 'r', 'b': 'b'}],
+    'cutout': [{'amount': 10}, {'amount': 50}],
+    'darken': [{'amount': 50}],
+    'edge_filter': [{'image_type': 'edge_map'}, {'image_type': 'edge_enhanced'}],
+    'flip': [{'axis': 'x'}, {'axis': 'y'}],
+    # direct below a sigma of 4... the FFT from there
+    'gaussian_blur': [{'amount': 100}, {'amount': 300}, {'amount': 500}, {'amount': 2000}],
+    'invert': [{}],
+    # direct below a size of 16... the running max/min from there
+    'max_filter': [{'size': 3}, {'size': 9}, {'size': 16}, {'size': 64}],
+    'min_filter': [{'size': 3}, {'size': 9}, {'size': 16}, {'size': 64}],
+    'mute_channel': [{'channel': 'g'}],
+    'pepper_noise': [{'amount': 10}, {'amount': 90}],
+    # size^2 work per pixel... small sizes keep the calibration quick
+    'percentile_filter': [{'percentile': 50, 'size': 3}, {'percentile': 50, 'size': 7}, {'percentile': 50, 'size': 11}],
+    'rainbow_noise': [{'amount': 10}, {'amount': 90}],
+    'rotate': [{'angle': 30}, {'angle': 45}],
+    'salt_and_pepper_noise': [{'amount': 10}, {'amount': 90}],
+    'salt_noise': [{'amount': 10}, {'amount': 90}],
+    'shift': [{'direction': 'up', 'distance': 10}, {'direction': 'left', 'distance': 10}],
+    'tint': [{'channel': 'r', 'amount': 50}],
+    'uniform_blur': [{'size': 3}, {'size': 64}],
+    'zoom': [{'amount': 10}, {'amount': 50}, {'amount': 100}],
+}
+
+
+def measure(processing: str, arguments: dict, image_data: numpy.ndarray, repeats: int) -> tuple[float, int]:
+    """
+    Runs an augmentation `repeats` times.
+
+    Returns:
+        tuple[float, int]: The least CPU seconds of a run and the most bytes it allocated at once.
+    """
+    processing_function = PROCESSING_MAP[processing]
+
+    def run() -> None:
+        # some augmentations work in place
+        image_copy = image_data.copy()
+        kwargs = dict(arguments)
+        if processing in STOCHASTIC_PROCESSING:
+            kwargs['rng'] = numpy.random.default_rng()
+        processing_function(image_copy, **kwargs)
+
+    best_seconds = float("inf")
+    for _ in range(repeats):
+        # CPU time of the whole process... counts the filter threads too
+        started = time.process_time()
+        run()
+        best_seconds = min(best_seconds, time.process_time() - started)
+    # tracing slows down every allocation... so memory is measured in a run of its own
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the copy of the input is not counted... the model adds the decoded image itself
+    return best_seconds, max(peak - baseline - image_data.nbytes, 0)
+
+
+def fit_line(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """
+    Least squares fit of y = slope x + intercept. Neither is ever negative.
+
+    Args:
+        points (list[tuple[float, float]]): the (x, y) pairs.
+    Returns:
+        tuple[float, float]: The slope and the intercept.
+    """
+    x = numpy.array([point[0] for point in points], dtype=numpy.float64)
+    y = numpy.array([point[1] for point in points], dtype=numpy.float64)
+    if len(points) > 1 and numpy.ptp(x) > 0:
+        slope, intercept = numpy.polyfit(x, y, deg=1)
+        if slope >= 0 and intercept >= 0:
+            return float(slope), float(intercept)
+    # too few points or a negative coefficient... fit a line through the origin instead
+    slope = float(numpy.dot(x, y) / numpy.dot(x, x)) if numpy.dot(x, x) > 0 else 0.0
+    return max(slope, 0.0), 0.0
+
+
+def calibrate(sizes: tuple[int, ...], repeats: int) -> dict[str, Calibration]:
+    """
+    Measures every augmentation in CALIBRATION_CASES at every size.
+
+    Returns:
+        dict[str, Calibration]: The coefficients of every regime.
+    """
+    rng = numpy.random.default_rng(seed=0)
+    timings: dict[str, list[tuple[float, float]]] = defaultdict(list)
+    bytes_per_unit: dict[str, float] = defaultdict(float)
+    for size in sizes:
+        image_data = rng.integers(low=0, high=256, size=(size, size, 3), dtype=numpy.uint8)
+        for processing, cases in CALIBRATION_CASES.items():
+            for arguments in cases:
+                work = get_work(processing, arguments, size * size)
+                seconds, peak_bytes = measure(processing, arguments, image_data, repeats)
+                timings[work.regime].append((work.work, seconds))
+                if size == max(sizes):
+                    # fixed allocations are smallest next to the largest image
+                    bytes_per_unit[work.regime] = max(bytes_per_unit[work.regime], peak_bytes / work.memory)
+                print(f"{processing} {arguments} {size}x{size}: {seconds * 1000:.2f}ms {peak_bytes} bytes")
+    calibration = {}
+    for regime, points in sorted(timings.items()):
+        seconds_per_unit, overhead_seconds = fit_line(points)
+        calibration[regime] = Calibration(
+            seconds_per_unit=seconds_per_unit,
+            overhead_seconds=overhead_seconds,
+            bytes_per_unit=bytes_per_unit[regime],
+        )
+    return calibration
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help=f"width (and height) of the images in pixels (default: {' '.join(map(str, DEFAULT_SIZES))})",
+    )
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="runs of every case (default: 3)")
+    parser.add_argument("--output", type=Path, default=CALIBRATION_PATH, help="where to write the coefficients")
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> dict[str, Calibration]:
+    calibration = calibrate(tuple(arguments.sizes), repeats=arguments.repeats)
+    data = {
+        "calibrated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "augmentation_threads": settings.AUGMENTATION_THREADS,
+        "sizes": list(arguments.sizes),
+        "regimes": {regime: asdict(coefficients) for regime, coefficients in calibration.items()},
+    }
+    arguments.output.write_text(json.dumps(data, indent=2) + "\n")
+    print(f"wrote {len(calibration)} regimes to {arguments.output}")
+    return calibration
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,166 @@
+"""
+Moves stored images into the shard layout set by STORAGE_SHARD_LEVELS.
+
+Unprocessed images are stored at `{user_id}/ab/cd/{storage_filename}` and the directories of
+processed images at `{user_id}/ab/cd/{unprocessed_image_id}/`. Images stored before sharding
+(or with another number of levels) are moved into place.
+
+It is safe to run while the service is running:
+- every image file or image directory is moved with a single rename... it is never copied or half moved.
+- the service looks for an image in the configured layout first and then in every other layout.
+- a write never makes an image or user directory... a write into an image directory that is moved
+  while it is written is made again at the new location (see app/repository/directory_manager.py).
+- images already in place are skipped... so it can be stopped and run again at any time.
+
+Only local volumes are resharded. An object store has no directories to fill up... its keys stay where they are.
+
+Example:
+    python -m app.commands.reshard --dry-run
+    python -m app.commands.reshard --levels 2
+"""
+import argparse
+import contextlib
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from app.config import settings
+from app.internal.content_addressing import BLOB_DIRECTORY
+from app.internal.sharding import MAX_SHARD_LEVELS, is_shard_directory
+from app.repository.directory_manager import VOLUME_PATHS, get_sharded_path
+from app.schemas.logging import LogEntry
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReshardReport:
+    """
+    What happened to the images of a volume.
+    """
+    moved: int = 0
+    already_in_place: int = 0
+    # an image with the same name is already at the new location... it is left for a person to look at
+    conflicts: int = 0
+
+
+def _iter_stored_entries(user_dir_path: Path, depth: int = 0):
+    """
+    Yields every image file or image directory in a user directory, in any shard layout.
+    """
+    for entry in user_dir_path.iterdir():
+        # temporary files are still being written
+        if entry.name.startswith("."):
+            continue
+        if depth < MAX_SHARD_LEVELS and entry.is_dir() and is_shard_directory(entry.name):
+            yield from _iter_stored_entries(entry, depth + 1)
+        else:
+            yield entry
+
+
+def _remove_empty_shard_directories(user_dir_path: Path, levels: int, depth: int = 0) -> None:
+    # only directories deeper than the layout are removed... the rest are still used for new images
+    for entry in user_dir_path.iterdir():
+        if depth < MAX_SHARD_LEVELS and entry.is_dir() and is_shard_directory(entry.name):
+            _remove_empty_shard_directories(entry, levels, depth + 1)
+            if depth >= levels:
+                # not empty
+                with contextlib.suppress(OSError):
+                    entry.rmdir()
+
+
+def reshard_user_directory(
+        user_dir_path: Path,
+        levels: int,
+        dry_run: bool = False,
+) -> ReshardReport:
+    """
+    Moves the images of a user into the shard layout with `levels` levels.
+
+    Args:
+        user_dir_path (Path): the directory of a user in an image volume.
+        levels (int): the number of shard directories.
+        dry_run (bool): only count what would be moved.
+    Returns:
+        ReshardReport: What happened to the images.
+    """
+    report = ReshardReport()
+    # the entries are listed first... so nothing that was just moved is seen again
+    for entry in list(_iter_stored_entries(user_dir_path)):
+        target = get_sharded_path(user_dir_path, entry.name, levels)
+        if entry == target:
+            report.already_in_place += 1
+            continue
+        if target.exists():
+            report.conflicts += 1
+            log_data = LogEntry(
+                date_time=datetime.now(),
+                event="reshard",
+                details=f"Did not move {entry}. {target} already exists.",
+            )
+            logger.warning(log_data.model_dump_json())
+            continue
+        report.moved += 1
+        if dry_run:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # a rename within a volume is atomic... readers see the image at one location or the other
+        os.rename(entry, target)
+    if not dry_run:
+        _remove_empty_shard_directories(user_dir_path, levels)
+    return report
+
+
+def reshard_volume(
+        volume_path: Path,
+        levels: int,
+        dry_run: bool = False,
+) -> ReshardReport:
+    """
+    Moves the images of every user in a volume into the shard layout with `levels` levels.
+    """
+    report = ReshardReport()
+    for user_dir_path in sorted(volume_path.iterdir()):
+        # content addressed blobs have their own layout... tombstones are being removed
+        if (not user_dir_path.is_dir() or user_dir_path.name == BLOB_DIRECTORY
+                or user_dir_path.name.startswith(".")):
+            continue
+        user_report = reshard_user_directory(user_dir_path, levels=levels, dry_run=dry_run)
+        report.moved += user_report.moved
+        report.already_in_place += user_report.already_in_place
+        report.conflicts += user_report.conflicts
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--levels",
+        type=int,
+        choices=range(MAX_SHARD_LEVELS + 1),
+        default=settings.STORAGE_SHARD_LEVELS,
+        help="number of shard directories (default: STORAGE_SHARD_LEVELS)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only count the images that would be moved")
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> dict[str, ReshardReport]:
+    if settings.STORAGE_BACKEND != "local":
+        raise SystemExit(f"reshard only works with local volumes... STORAGE_BACKEND is {settings.STORAGE_BACKEND}")
+    reports = {}
+    for volume_name, volume_path in VOLUME_PATHS.items():
+        report = reshard_volume(volume_path, levels=arguments.levels, dry_run=arguments.dry_run)
+        reports[volume_name] = report
+        print(
+            f"{volume_name}: moved {report.moved}, already in place {report.already_in_place}, "
+            f"conflicts {report.conflicts}{' (dry run)' if arguments.dry_run else ''}"
+        )
+    return reports
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -0,0 +1,346 @@
+"""
+Finds where the image volumes and the database have drifted apart... and optionally repairs it.
+
+Files are written before their database entries, and a crash in between leaves a file nothing points at.
+A file lost from a volume leaves an entry that points at nothing... the API then has nothing to return for it.
+
+The scan reports:
+- orphaned files: files (and image directories) with no database entry
+- missing files: database entries with no file
+- empty directories: shard directories with nothing in them
+
+With --repair orphaned files are moved to the tombstones (the reaper removes them),
+entries with missing files are deleted and empty shard directories are removed.
+
+The volumes are walked with os.scandir and the database is read `--batch-size` rows at a time...
+the scan takes time in proportion to the number of files and its memory grows with the largest user,
+never with the size of the volume.
+
+Files younger than --min-age are never orphans... they may belong to an upload that is not committed yet.
+
+Only local volumes can be scanned (STORAGE_BACKEND=local).
+
+Example:
+    python -m app.commands.scan_volumes
+    python -m app.commands.scan_volumes --repair
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import time
+import uuid
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.database import get_async_session
+from app.internal.content_addressing import BLOB_DIRECTORY
+from app.internal.sharding import MAX_SHARD_LEVELS, get_shard_key, is_shard_directory
+from app.repository import (
+    delete_ProcessedImage_entries,
+    delete_UnprocessedImage_entries,
+    read_existing_ImageBlob_hashes,
+    read_existing_User_ids,
+    read_UnprocessedImage_ids_by_content_hash,
+    stream_ProcessedImage_files,
+    stream_referenced_ImageBlob_hashes,
+    stream_UnprocessedImage_files,
+    stream_User_ids,
+)
+from app.repository.directory_manager import VOLUME_PATHS, get_unprocessed_blob_location
+from app.schemas.logging import LogEntry
+from app.storage import make_tombstone
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+# an hour is far longer than any upload takes to commit
+DEFAULT_MIN_AGE_SECONDS = 3600.0
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class ScanReport:
+    """
+    What the scan found (and repaired) in the image volumes.
+    """
+    files: int = 0
+    orphaned: int = 0
+    missing: int = 0
+    empty_directories: int = 0
+    repaired: int = 0
+
+
+@dataclass
+class VolumeScanner:
+    """
+    Compares the image volumes with the database.
+    """
+    db_session: AsyncSession
+    repair: bool = False
+    min_age: float = DEFAULT_MIN_AGE_SECONDS
+    batch_size: int = DEFAULT_BATCH_SIZE
+    report: ScanReport = field(default_factory=ScanReport)
+
+    def _log(self, details: str) -> None:
+        log_data = LogEntry(
+            date_time=datetime.now(),
+            event="scan_volumes",
+            details=details,
+        )
+        logger.warning(log_data.model_dump_json())
+
+    def _is_old_enough(self, entry: os.DirEntry) -> bool:
+        try:
+            modified_at = entry.stat(follow_symlinks=False).st_mtime
+        except FileNotFoundError:
+            # removed while we looked
+            return False
+        return time.time() - modified_at >= self.min_age
+
+    def _iter_stored_entries(self, dir_path: Path, depth: int = 0) -> Iterator[os.DirEntry]:
+        """
+        Yields every file or image directory in a sharded directory... in any shard layout.
+        """
+        try:
+            entries = os.scandir(dir_path)
+        except FileNotFoundError:
+            return
+        with entries:
+            is_empty = True
+            for entry in entries:
+                is_empty = False
+                if depth < MAX_SHARD_LEVELS and entry.is_dir(follow_symlinks=False) and is_shard_directory(entry.name):
+                    yield from self._iter_stored_entries(Path(entry.path), depth + 1)
+                else:
+                    yield entry
+        # an empty user (or blob) directory is fine... only empty shard directories are reported
+        if is_empty and depth > 0:
+            self.report.empty_directories += 1
+            if self.repair:
+                try:
+                    dir_path.rmdir()
+                    self.report.repaired += 1
+                except OSError:
+                    # a new file was written to it
+                    pass
+
+    def _found_orphan(self, entry: os.DirEntry, volume_path: Path) -> None:
+        if not self._is_old_enough(entry):
+            return
+        self.report.orphaned += 1
+        self._log(f"{entry.path} has no database entry.")
+        if self.repair and make_tombstone(Path(entry.path), volume_path) is not None:
+            self.report.repaired += 1
+
+    def _found_missing(self, count: int, details: str) -> None:
+        self.report.missing += count
+        self._log(details)
+        if self.repair:
+            self.report.repaired += count
+
+    async def scan_user(self, user_id: uuid.UUID) -> None:
+        """
+        Compares the images of a user with their files.
+        """
+        # the unprocessed images stored under the user directory... by the key of their storage filename
+        expected_unprocessed_files = {}
+        image_ids = set()
+        async for rows in stream_UnprocessedImage_files(
+                user_id=user_id, batch_size=self.batch_size, db_session=self.db_session):
+            for row in rows:
+                image_ids.add(str(row.id))
+                # images stored as blobs are compared in scan_blobs
+                if row.content_hash is None:
+                    expected_unprocessed_files[get_shard_key(row.storage_filename)] = row.id
+        expected_processed_files = {}
+        async for rows in stream_ProcessedImage_files(
+                user_id=user_id, batch_size=self.batch_size, db_session=self.db_session):
+            for row in rows:
+                expected_processed_files[(str(row.unprocessed_image_id), get_shard_key(row.storage_filename))] = row.id
+        # --- unprocessed images ---
+        volume_path = VOLUME_PATHS["unprocessed_image_data"]
+        found_unprocessed_files = set()
+        for entry in self._iter_stored_entries(volume_path / str(user_id)):
+            self.report.files += 1
+            # an image and its previews share a key
+            key = get_shard_key(entry.name)
+            if key in expected_unprocessed_files:
+                found_unprocessed_files.add(key)
+            else:
+                self._found_orphan(entry, volume_path)
+        missing_unprocessed_ids = [
+            image_id for key, image_id in expected_unprocessed_files.items() if key not in found_unprocessed_files
+        ]
+        if missing_unprocessed_ids:
+            self._found_missing(
+                len(missing_unprocessed_ids),
+                f"The files of unprocessed images {sorted(map(str, missing_unprocessed_ids))} are missing.",
+            )
+            if self.repair:
+                await delete_UnprocessedImage_entries(image_ids=missing_unprocessed_ids, db_session=self.db_session)
+                # their processed images were deleted with them... their directories are now orphans
+                image_ids.difference_update(map(str, missing_unprocessed_ids))
+                expected_processed_files = {
+                    key: image_id for key, image_id in expected_processed_files.items() if key[0] in image_ids
+                }
+        # --- processed images ---
+        volume_path = VOLUME_PATHS["processed_image_data"]
+        found_processed_files = set()
+        for image_dir_entry in self._iter_stored_entries(volume_path / str(user_id)):
+            if image_dir_entry.name not in image_ids or not image_dir_entry.is_dir(follow_symlinks=False):
+                self._found_orphan(image_dir_entry, volume_path)
+                continue
+            with os.scandir(image_dir_entry.path) as entries:
+                for entry in entries:
+                    self.report.files += 1
+                    key = (image_dir_entry.name, get_shard_key(entry.name))
+                    if key in expected_processed_files:
+                        found_processed_files.add(key)
+                    else:
+                        self._found_orphan(entry, volume_path)
+        missing_processed_ids = [
+            image_id for key, image_id in expected_processed_files.items() if key not in found_processed_files
+        ]
+        if missing_processed_ids:
+            self._found_missing(
+                len(missing_processed_ids),
+                f"The files of processed images {sorted(map(str, missing_processed_ids))} are missing.",
+            )
+            if self.repair:
+                await delete_ProcessedImage_entries(image_ids=missing_processed_ids, db_session=self.db_session)
+
+    async def scan_users(self) -> None:
+        """
+        Compares the images of every user with their files.
+        """
+        async for user_ids in stream_User_ids(batch_size=self.batch_size, db_session=self.db_session):
+            for user_id in user_ids:
+                await self.scan_user(user_id)
+
+    async def scan_user_directories(self) -> None:
+        """
+        Finds the directories of users that no longer exist.
+        """
+        for volume_path in VOLUME_PATHS.values():
+            try:
+                entries = os.scandir(volume_path)
+            except FileNotFoundError:
+                continue
+            with entries:
+                # blobs have their own scan... tombstones and temporary files are not user directories
+                user_dir_entries = (
+                    entry for entry in entries
+                    if entry.name != BLOB_DIRECTORY and not entry.name.startswith(".")
+                )
+                for batch in itertools.batched(user_dir_entries, self.batch_size):
+                    user_ids = {}
+                    for entry in batch:
+                        try:
+                            user_ids[uuid.UUID(entry.name)] = entry
+                        except ValueError:
+                            self._found_orphan(entry, volume_path)
+                    existing_user_ids = await read_existing_User_ids(
+                        user_ids=list(user_ids), db_session=self.db_session)
+                    for user_id, entry in user_ids.items():
+                        if user_id not in existing_user_ids:
+                            self._found_orphan(entry, volume_path)
+
+    async def scan_blobs(self) -> None:
+        """
+        Compares the ImageBlob entries with the blob files.
+        """
+        volume_path = VOLUME_PATHS["unprocessed_image_data"]
+        for batch in itertools.batched(self._iter_stored_entries(volume_path / BLOB_DIRECTORY), self.batch_size):
+            self.report.files += len(batch)
+            existing_hashes = await read_existing_ImageBlob_hashes(
+                content_hashes=list({get_shard_key(entry.name) for entry in batch}),
+                db_session=self.db_session,
+            )
+            for entry in batch:
+                if get_shard_key(entry.name) not in existing_hashes:
+                    self._found_orphan(entry, volume_path)
+        async for content_hashes in stream_referenced_ImageBlob_hashes(
+                batch_size=self.batch_size, db_session=self.db_session):
+            for content_hash in content_hashes:
+                if get_unprocessed_blob_location(content_hash).exists():
+                    continue
+                self._found_missing(1, f"The blob {content_hash} is missing.")
+                if self.repair:
+                    # the blob is reclaimed once nothing references it
+                    image_ids = await read_UnprocessedImage_ids_by_content_hash(
+                        content_hash=content_hash, db_session=self.db_session)
+                    await delete_UnprocessedImage_entries(image_ids=image_ids, db_session=self.db_session)
+
+    async def scan(self) -> ScanReport:
+        """
+        Runs every scan.
+        """
+        await self.scan_user_directories()
+        await self.scan_users()
+        await self.scan_blobs()
+        return self.report
+
+
+async def scan_volumes(
+        repair: bool = False,
+        min_age: float = DEFAULT_MIN_AGE_SECONDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+) -> ScanReport:
+    """
+    Compares the image volumes with the database.
+
+    Args:
+        repair (bool): repair what was found.
+        min_age (float): files younger than this (in seconds) are never orphans.
+        batch_size (int): the number of rows read from the database at a time.
+    Returns:
+        ScanReport: What was found (and repaired).
+    """
+    async for db_session in get_async_session():
+        scanner = VolumeScanner(db_session=db_session, repair=repair, min_age=min_age, batch_size=batch_size)
+        return await scanner.scan()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true", help="repair what is found")
+    parser.add_argument(
+        "--min-age",
+        type=float,
+        default=DEFAULT_MIN_AGE_SECONDS,
+        help=f"seconds before a file with no database entry is an orphan (default: {DEFAULT_MIN_AGE_SECONDS:g})",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"rows read from the database at a time (default: {DEFAULT_BATCH_SIZE})",
+    )
+    return parser
+
+
+def main(arguments: argparse.Namespace) -> ScanReport:
+    if settings.STORAGE_BACKEND != "local":
+        raise SystemExit(f"scan_volumes only works with local volumes... STORAGE_BACKEND is {settings.STORAGE_BACKEND}")
+    report = asyncio.run(scan_volumes(
+        repair=arguments.repair,
+        min_age=arguments.min_age,
+        batch_size=arguments.batch_size,
+    ))
+    print(
+        f"files {report.files}, orphaned {report.orphaned}, missing {report.missing}, "
+        f"empty directories {report.empty_directories}"
+        f"{f', repaired {report.repaired}' if arguments.repair else ''}"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
@@ -1,4 +1,6 @@
+import uuid
 from pathlib import Path
+from typing import Literal
 
 from pydantic import PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -12,6 +14,90 @@ class Settings(BaseSettings):
     UNPROCESSED_IMAGE_PATH: Path = Path("/image-augmentation-service/data/images/unprocessed")
     # where are processed images stored?
     PROCESSED_IMAGE_PATH: Path = Path("/image-augmentation-service/data/images/processed")
+    # where are the image files kept? (local or s3)
+    # ... local: the two paths above, which every API node must share. s3: an S3 compatible object store.
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    # which bucket holds the image files? (s3 only)
+    # ... credentials come from the usual AWS environment variables or instance role
+    S3_BUCKET: str | None = None
+    # which endpoint? leave empty for AWS... set it for MinIO or another S3 compatible store
+    S3_ENDPOINT_URL: str | None = None
+    S3_REGION: str | None = None
+    # what goes in front of every object key? lets several deployments share a bucket
+    S3_KEY_PREFIX: str = ""
+    # files larger than this (in bytes) are uploaded and downloaded in parts
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+    # how many parts of one file are sent at the same time?
+    S3_TRANSFER_CONCURRENCY: int = 4
+    # how long (in seconds) does a download link work? downloads are redirected to the object store
+    S3_PRESIGNED_URL_EXPIRES_SECONDS: int = 300
+    # who sends the bytes of an image download? (proxy, signed_url, x_accel_redirect or x_sendfile)
+    # ... proxy: this service. signed_url: whatever serves DOWNLOAD_URL_BASE, after a redirect to a signed link.
+    # ... x_accel_redirect: nginx in front of this service. x_sendfile: Apache or lighttpd in front of this service.
+    # ... an object store (STORAGE_BACKEND=s3) always redirects to its own presigned links.
+    DOWNLOAD_MODE: Literal["proxy", "signed_url", "x_accel_redirect", "x_sendfile"] = "proxy"
+    # which key signs the download links? (signed_url only) every node must use the same one
+    DOWNLOAD_URL_SECRET: str | None = None
+    # where are signed links served? a CDN or file server in front of /files-api... or this service itself
+    DOWNLOAD_URL_BASE: str = "/files-api"
+    # how long (in seconds) does a signed link work?
+    DOWNLOAD_URL_EXPIRES_SECONDS: int = 300
+    # which internal nginx location serves the volumes? (x_accel_redirect only)
+    # ... a file is at `{X_ACCEL_REDIRECT_PREFIX}/{volume name}/{path in the volume}`
+    X_ACCEL_REDIRECT_PREFIX: str = "/protected-files"
+    # how many levels of shard directories are under every user directory? (0 to 2)
+    # ... 0 keeps every image of a user in a single directory.
+    # ... images stored with another layout are still found. `python -m app.commands.reshard` moves them.
+    STORAGE_SHARD_LEVELS: int = 2
+    # how many threads can read or write the image volumes at the same time?
+    # ... filesystem calls never run on the event loop. These threads are not shared with the rest of the app.
+    STORAGE_IO_THREADS: int = 16
+    # are image files flushed to disk before they are renamed into place?
+    # ... off: a power cut can lose the last few seconds of writes. on: every write waits for the disk.
+    STORAGE_FSYNC: bool = False
+    # how often (in seconds) are the files of deleted images removed?
+    REAPER_INTERVAL_SECONDS: float = 30.0
+    # how many files are removed at a time? the reaper gives the storage threads back between batches
+    REAPER_BATCH_SIZE: int = 1000
+    # how many threads can filter the channels or tiles of a single image at the same time?
+    AUGMENTATION_THREADS: int = 1
+    # how many augmentations can a worker run at the same time? the rest wait in the job scheduler
+    # ... each one runs in a thread of its own. AUGMENTATION_THREADS more can filter the channels of each image.
+    AUGMENTATION_WORKERS: int = 2
+    # how many augmentations of a single user can run at the same time? the rest of theirs wait
+    AUGMENTATION_MAX_RUNNING_PER_USER: int = 1
+    # how many augmentations of a single user can wait? past it their requests get 429
+    AUGMENTATION_MAX_QUEUED_PER_USER: int = 100
+    # how much of the workers does a user get compared to the others? (user id -> weight, default 1)
+    # ... a JSON object, e.g. {"5f0c...": 4} gives that user 4 turns for every turn of a user with weight 1
+    AUGMENTATION_USER_WEIGHTS: dict[uuid.UUID, float] = {}
+    # how much augmentation work can wait or run on a worker at the same time? (in estimated CPU seconds and bytes)
+    # ... every augmentation is priced by the cost model (see app/internal/cost_model.py).
+    # ... past either budget requests get 503 with Retry-After instead of piling up... latency and memory stay bounded.
+    AUGMENTATION_CPU_SECONDS_BUDGET: float = 30.0
+    AUGMENTATION_MEMORY_BUDGET_BYTES: int = 2 * 1024 * 1024 * 1024
+    # how much of each budget can a single user hold? (0 to 1) past it their requests get 429
+    AUGMENTATION_USER_BUDGET_SHARE: float = 0.5
+    # what size (in pixels) is an image assumed to be? only images uploaded before sizes were recorded
+    AUGMENTATION_UNKNOWN_IMAGE_PIXELS: int = 16_000_000
+    # how long (in seconds) is a rejected client told to wait?
+    AUGMENTATION_RETRY_AFTER_SECONDS: int = 2
+    # how long (in seconds) can an augmentation take? from the request to the stored image, waiting included
+    # ... past it the job stops at its next safe point and is recorded as cancelled (504).
+    # ... a request can ask for a shorter or longer timeout... but never more than the max.
+    AUGMENTATION_DEFAULT_TIMEOUT_SECONDS: float = 300.0
+    AUGMENTATION_MAX_TIMEOUT_SECONDS: float = 3600.0
+    # how long (in seconds) can `GET /image-api/job/{job_id}?wait=` hold a request before answering?
+    JOB_LONG_POLL_MAX_SECONDS: float = 60.0
+    # how often (in seconds) does `GET /image-api/job/{job_id}/events` send a comment to keep the stream open?
+    # ... proxies close a connection that is quiet for too long.
+    JOB_EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    # how often (in seconds) does a waiting client read its job while the LISTEN connection is down?
+    # ... only then... while it is up the client sleeps until its job moves.
+    JOB_STATUS_FALLBACK_POLL_SECONDS: float = 1.0
+    # how long (in seconds) to wait before connecting again after the LISTEN connection is lost?
+    JOB_LISTENER_RECONNECT_SECONDS: float = 1.0
     # use a single field for the database connection string
     DATABASE_URL: PostgresDsn
     # This tells Pydantic to be case-insensitive when matching environment variables
@@ -19,4 +105,10 @@ class Settings(BaseSettings):
         case_sensitive=False
     )
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+# Define a mapping from volume names to the in-container paths for easy lookup
+VOLUME_PATHS = {
+    "unprocessed_image_data": settings.UNPROCESSED_IMAGE_PATH,
+    "processed_image_data": settings.PROCESSED_IMAGE_PATH,
+}
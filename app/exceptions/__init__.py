@@ -1,4 +1,5 @@
-from .common import PermissionDenied
+from .admission import AugmentationRejected, ServiceOverloaded, TooManyAugmentations
+from .common import InvalidCursor, InvalidDownloadLink, PermissionDenied
 from .directory_manager import (
     ImageDirectoryNotFound,
     UserDirectoryAlreadyExists,
@@ -7,4 +8,33 @@ from .directory_manager import (
     ImageAlreadyExists
 )
 from .image import ImageNotFound
+from .job import (
+    JobAlreadyExists,
+    JobAlreadyFinished,
+    JobCancelled,
+    JobDeadlineExceeded,
+    JobNotFound,
+)
 from .user import UserAlreadyExists, UserNotFound
+
+__all__ = [
+    "AugmentationRejected",
+    "ServiceOverloaded",
+    "TooManyAugmentations",
+    "InvalidCursor",
+    "InvalidDownloadLink",
+    "PermissionDenied",
+    "ImageDirectoryNotFound",
+    "UserDirectoryAlreadyExists",
+    "ImageDirectoryAlreadyExists",
+    "UserDirectoryNotFound",
+    "ImageAlreadyExists",
+    "ImageNotFound",
+    "JobAlreadyExists",
+    "JobAlreadyFinished",
+    "JobCancelled",
+    "JobDeadlineExceeded",
+    "JobNotFound",
+    "UserAlreadyExists",
+    "UserNotFound",
+]
@@ -0,0 +1,27 @@
+# --- Custom Exceptions ---
+
+class AugmentationRejected(Exception):
+    """
+    Raised when an augmentation is turned away to keep the service responsive.
+    The client should try again after `retry_after` seconds.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ServiceOverloaded(AugmentationRejected):
+    """
+    Raised when the augmentations already running use up the budget of the worker.
+    """
+
+    pass
+
+
+class TooManyAugmentations(AugmentationRejected):
+    """
+    Raised when the augmentations a user already has running use up their share of the budget.
+    """
+
+    pass
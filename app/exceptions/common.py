@@ -5,4 +5,18 @@ class PermissionDenied(Exception):
     Raised when a user is not authorized to perform an action.
     """
 
-    pass
\ No newline at end of file
+    pass
+
+class InvalidCursor(Exception):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+
+    pass
+
+class InvalidDownloadLink(Exception):
+    """
+    Raised when a signed download link was not made by this service or has expired.
+    """
+
+    pass
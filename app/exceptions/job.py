@@ -0,0 +1,41 @@
+# --- Custom Exceptions ---
+
+class JobNotFound(Exception):
+    """
+    Raised when a processing job is not found in the database.
+    """
+
+    pass
+
+
+class JobAlreadyExists(Exception):
+    """
+    Raised when a processing job is created with the ID of another job.
+    """
+
+    pass
+
+
+class JobAlreadyFinished(Exception):
+    """
+    Raised when a processing job that already succeeded or failed is cancelled.
+    """
+
+    pass
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a processing job at the first safe point after it is cancelled.
+    The work it had done is thrown away.
+    """
+
+    pass
+
+
+class JobDeadlineExceeded(JobCancelled):
+    """
+    Raised inside a processing job at the first safe point after its deadline.
+    """
+
+    pass
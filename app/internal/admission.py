@@ -0,0 +1,140 @@
+"""
+This module contains the admission controller that sheds augmentation load before it piles up.
+
+An augmentation decodes the whole image and makes several copies of it... its memory and time grow
+with the number of pixels and with the processing. Every augmentation is priced by the cost model before it starts
+(see app/internal/cost_model.py): its CPU seconds and its peak memory.
+
+A worker runs augmentations until their CPU seconds add up to AUGMENTATION_CPU_SECONDS_BUDGET
+or their memory to AUGMENTATION_MEMORY_BUDGET_BYTES. Past either a request is rejected straight away
+(503 with Retry-After)... instead of waiting and making every request slower.
+A user can hold at most AUGMENTATION_USER_BUDGET_SHARE of each budget (429 with Retry-After)...
+so a single client cannot crowd out the rest.
+
+An augmentation that costs more than the whole budget still runs... but only when nothing else is running.
+The budget belongs to a worker process. Every worker has its own.
+"""
+import contextlib
+import threading
+import uuid
+from collections.abc import Iterator
+
+from anyio.lowlevel import RunVar
+
+from app.config import settings
+from app.exceptions import ServiceOverloaded, TooManyAugmentations
+from app.internal.cost_model import CostEstimate
+from app.internal.metrics import (
+    AUGMENTATION_CPU_SECONDS_IN_USE,
+    AUGMENTATION_MEMORY_BYTES_IN_USE,
+    AUGMENTATIONS_ADMITTED,
+    AUGMENTATIONS_REJECTED_OVERLOADED,
+    AUGMENTATIONS_REJECTED_USER_SHARE,
+)
+
+
+class AdmissionController:
+    """
+    Keeps the cost of the augmentations running at the same time within a budget.
+
+    Args:
+        budget (CostEstimate): the largest total CPU seconds and memory of the augmentations running at the same time.
+        user_budget_share (float): the part of the budget (0 to 1) a single user can hold.
+        retry_after (int): how long (in seconds) a rejected client is told to wait.
+    """
+
+    def __init__(self, budget: CostEstimate, user_budget_share: float = 1.0, retry_after: int = 1):
+        self.budget = budget
+        self.user_budget = CostEstimate(
+            cpu_seconds=budget.cpu_seconds * user_budget_share,
+            peak_memory_bytes=int(budget.peak_memory_bytes * user_budget_share),
+        )
+        self.retry_after = retry_after
+        self.in_use = CostEstimate()
+        self._user_in_use: dict[uuid.UUID, CostEstimate] = {}
+        # how many augmentations of every user are running... a free augmentation still counts
+        self._running: dict[uuid.UUID, int] = {}
+        # costs are released from whichever thread or task finishes the augmentation
+        self._lock = threading.Lock()
+
+    def _acquire(self, cost: CostEstimate, user_id: uuid.UUID) -> None:
+        with self._lock:
+            user_in_use = self._user_in_use.get(user_id, CostEstimate())
+            # nothing running means nothing to wait for... so an expensive request is never refused forever
+            if user_id in self._running and _exceeds(user_in_use + cost, self.user_budget):
+                AUGMENTATIONS_REJECTED_USER_SHARE.inc()
+                raise TooManyAugmentations(
+                    "You have too many augmentations running. Try again later.",
+                    retry_after=self.retry_after,
+                )
+            if self._running and _exceeds(self.in_use + cost, self.budget):
+                AUGMENTATIONS_REJECTED_OVERLOADED.inc()
+                raise ServiceOverloaded(
+                    "The service is busy. Try again later.",
+                    retry_after=self.retry_after,
+                )
+            self.in_use += cost
+            self._user_in_use[user_id] = user_in_use + cost
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            AUGMENTATIONS_ADMITTED.inc()
+            self._report()
+
+    def _release(self, cost: CostEstimate, user_id: uuid.UUID) -> None:
+        with self._lock:
+            self.in_use -= cost
+            user_in_use = self._user_in_use.pop(user_id) - cost
+            running = self._running.pop(user_id) - 1
+            # users with nothing running are forgotten... the dicts never grow with the number of users
+            if running > 0:
+                self._user_in_use[user_id] = user_in_use
+                self._running[user_id] = running
+            elif not self._running:
+                # nothing is running... drop the rounding errors of the float sums
+                self.in_use = CostEstimate()
+            self._report()
+
+    def _report(self) -> None:
+        AUGMENTATION_CPU_SECONDS_IN_USE.set(self.in_use.cpu_seconds)
+        AUGMENTATION_MEMORY_BYTES_IN_USE.set(self.in_use.peak_memory_bytes)
+
+    @contextlib.contextmanager
+    def admit(self, cost: CostEstimate, user_id: uuid.UUID) -> Iterator[None]:
+        """
+        Runs the block if the budget has room for `cost`... and gives it back when the block ends.
+
+        Raises:
+            TooManyAugmentations: the user has used up their share of the budget.
+            ServiceOverloaded: the budget is used up.
+        """
+        self._acquire(cost, user_id)
+        try:
+            yield
+        finally:
+            self._release(cost, user_id)
+
+
+def _exceeds(cost: CostEstimate, budget: CostEstimate) -> bool:
+    return cost.cpu_seconds > budget.cpu_seconds or cost.peak_memory_bytes > budget.peak_memory_bytes
+
+
+# one controller per worker... RunVar keeps one per event loop
+_admission_controller: RunVar[AdmissionController] = RunVar("admission_controller")
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    The admission controller of this worker.
+    """
+    try:
+        return _admission_controller.get()
+    except LookupError:
+        controller = AdmissionController(
+            budget=CostEstimate(
+                cpu_seconds=settings.AUGMENTATION_CPU_SECONDS_BUDGET,
+                peak_memory_bytes=settings.AUGMENTATION_MEMORY_BUDGET_BYTES,
+            ),
+            user_budget_share=settings.AUGMENTATION_USER_BUDGET_SHARE,
+            retry_after=settings.AUGMENTATION_RETRY_AFTER_SECONDS,
+        )
+        _admission_controller.set(controller)
+        return controller
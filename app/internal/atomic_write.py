@@ -0,0 +1,91 @@
+"""
+This module contains helpers for writing files so a reader never sees half of one.
+
+A file is written under a temporary name in the same directory and renamed into place with os.replace.
+A rename within a directory is atomic... readers see the old file (or none) until the new one is complete.
+A crash mid write leaves a `.{name}.{uuid}.tmp` file behind, never a truncated image under the real name.
+
+With STORAGE_FSYNC the file is flushed to disk before the rename and its directory after it...
+so a power cut cannot lose an image the database already points at.
+Writes made inside `fsync_batch()` share a single flush of each directory.
+"""
+import contextlib
+import os
+import uuid
+from collections.abc import Iterator
+from contextvars import ContextVar
+from pathlib import Path
+
+from app.config import settings
+
+# the directories waiting to be flushed at the end of the current fsync_batch... None outside of one
+_pending_directories: ContextVar[set[Path] | None] = ContextVar("pending_directories", default=None)
+
+
+def get_temporary_path(path: Path) -> Path:
+    """
+    A unique temporary name for a file in the same directory as `path`.
+    It starts with a dot... so it is never mistaken for a stored image.
+    """
+    return path.with_name(f".{path.name}.{uuid.uuid4()}.tmp")
+
+
+def fsync_path(path: Path) -> None:
+    """
+    Flush a file or directory to disk.
+    """
+    file_descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
+
+@contextlib.contextmanager
+def atomic_write(path: Path) -> Iterator[Path]:
+    """
+    Write a file under a temporary name and rename it into place.
+
+    Example:
+        with atomic_write(image_path) as temporary_path:
+            image.save(fp=temporary_path, format="PNG")
+
+    Args:
+        path (Path): where the file ends up.
+    Yields:
+        Path: The temporary path to write to. It is removed if the block raises.
+    """
+    temporary_path = get_temporary_path(path)
+    try:
+        yield temporary_path
+        if settings.STORAGE_FSYNC:
+            fsync_path(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+    if settings.STORAGE_FSYNC:
+        pending_directories = _pending_directories.get()
+        if pending_directories is None:
+            fsync_path(path.parent)
+        else:
+            pending_directories.add(path.parent)
+
+
+@contextlib.contextmanager
+def fsync_batch() -> Iterator[None]:
+    """
+    Flush the directories of every atomic_write in the block once... at the end of the block.
+    Writing several files to the same directory then costs one directory flush instead of one each.
+    """
+    if _pending_directories.get() is not None:
+        # already in a batch... the outer batch flushes them
+        yield
+        return
+    pending_directories: set[Path] = set()
+    token = _pending_directories.set(pending_directories)
+    try:
+        yield
+    finally:
+        _pending_directories.reset(token)
+        for directory_path in pending_directories:
+            fsync_path(directory_path)
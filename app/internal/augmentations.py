@@ -5,6 +5,14 @@ import random
 import numpy
 import scipy.ndimage
 
+from app.internal import filters
+from app.internal.cancellation import check_cancelled
+from app.internal.parallel import map_channels
+from app.internal.tiling import (
+    apply_neighbourhood_operation,
+    halo_for_sigma,
+    halo_for_size,
+)
 from app.schemas.logging import LogEntry
 
 # set up logging
@@ -20,6 +28,9 @@ CHANNEL_MAP = {
     'a': 3
 }
 
+# the contribution of each channel to the brightness of a pixel
+GRAYSCALE_WEIGHTS = numpy.array([0.2989, 0.5870, 0.1140], dtype=numpy.float32)
+
 def split_channels(image_data: numpy.ndarray) -> dict:
     r_channel = image_data[:, :, 0]
     g_channel = image_data[:, :, 1]
@@ -35,6 +46,46 @@ def merge_channels(r_channel: numpy.ndarray, g_channel: numpy.ndarray, b_channel
     merged_array = numpy.stack((r_channel, g_channel, b_channel), axis=-1)
     return merged_array
 
+
+def noise_mask(
+        shape: tuple[int, ...],
+        amount: int,
+        rng: numpy.random.Generator | None = None,
+        num_kinds: int = 1,
+) -> numpy.ndarray:
+    """
+    Picks a percentage of the pixels in an image for the noise augmentations.
+
+    Pixels are picked without replacement, so exactly `amount` percent of them are picked.
+    When there is more than one kind of noise the picked pixels are shared between the kinds as equally as possible.
+
+    Args:
+        shape (tuple): the shape of the image. Only the height and width are used.
+        amount (int): the percentage of pixels to pick, between 0 and 100.
+        rng (numpy.random.Generator): the source of randomness. Defaults to a new generator.
+        num_kinds (int): the number of different kinds of noise.
+    Returns:
+        numpy.array: A uint8 array with the height and width of the image.
+            0 marks a pixel that was not picked. 1 to `num_kinds` marks the kind of noise for a picked pixel.
+            With a single kind of noise the mask can be used as a boolean mask with `.view(numpy.bool_)`.
+    """
+    if rng is None:
+        rng = numpy.random.default_rng()
+    height, width = shape[:2]
+    total_pixels = height * width
+    num_pixels = int(amount / 100 * total_pixels)
+    # 1 byte per pixel... the coordinates are never stored as integers
+    mask = numpy.zeros(total_pixels, dtype=numpy.uint8)
+    # label the first `num_pixels` pixels... then shuffle the labels
+    start = 0
+    for kind in range(1, num_kinds + 1):
+        stop = num_pixels * kind // num_kinds
+        mask[start:stop] = kind
+        start = stop
+    # a shuffle moves every label to a different pixel so no pixel is picked twice
+    rng.shuffle(mask)
+    return mask.reshape(height, width)
+
 # --- --- ---
 
 def brighten(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
@@ -49,6 +100,8 @@ def brighten(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
     """
     value = (amount/100) * 255
     for i, row in enumerate(image_data):
+        # a safe point every row... a cancelled job stops here (see app/internal/cancellation.py)
+        check_cancelled()
         for j, pixel in enumerate(row):
             for k, channel in enumerate(pixel):
                 image_data[i][j][k] = min(int(channel + value), 255)
@@ -74,6 +127,8 @@ def channel_swap(image_data: numpy.ndarray, a: str, b: str) -> numpy.ndarray:
     # Get number of channels
     num_channels = output_image.shape[2]
     for i, row in enumerate(output_image):
+        # a safe point every row
+        check_cancelled()
         for j, pixel in enumerate(row):
             pixel[CHANNEL_MAP[a]], pixel[CHANNEL_MAP[b]] = pixel[CHANNEL_MAP[b]], pixel[CHANNEL_MAP[a]]
     # return the modified array
@@ -113,6 +168,8 @@ def cutout(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
     # Generate a set of random colors pixels.
     # apply the random colours to the selected coordinates
     for i in range(start_x, end_x):
+        # a safe point every row
+        check_cancelled()
         for j in range(start_y, end_y):
             output_image[i][j] = numpy.random.randint(low=0, high=max_val + 1, size=(1, num_channels), dtype=bit_depth)
     # return the modified array
@@ -131,6 +188,8 @@ def darken(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
     """
     value = (amount/100) * 255
     for i, row in enumerate(image_data):
+        # a safe point every row
+        check_cancelled()
         for j, pixel in enumerate(row):
             for k, channel in enumerate(pixel):
                 image_data[i][j][k] = max(int(channel - value), 0)
@@ -138,31 +197,59 @@ def darken(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
 
 
 def edge_filter(image_data: numpy.ndarray, image_type: str) -> numpy.ndarray:
-    # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.percentile_filter.html#scipy.ndimage.percentile_filter
-    # convert to grayscale
-    g_image_data = numpy.dot(image_data[...,:3], [0.2989, 0.5870, 0.1140])
-    g_image_data = g_image_data.astype('int32')
-    sobel_h = scipy.ndimage.sobel(g_image_data, axis=0)
-    sobel_v = scipy.ndimage.sobel(g_image_data, axis=1)
-    magnitude = numpy.sqrt(sobel_h**2 + sobel_v**2)
-    # normalize the magnitude
-    max_mag = numpy.max(magnitude)
-    if max_mag == 0:
-        magnitude_norm_2D = numpy.zeros(magnitude.shape, dtype=image_data.dtype)
-    else:
-        magnitude_norm_2D = (magnitude * (255.0 / numpy.max(magnitude))).astype(image_data.dtype)
+    """
+    Finds the edges in an image with a sobel filter.
+
+    Args:
+        image_data (numpy.array): the image data to process.
+        image_type (str): 'edge_map' returns only the edges. 'edge_enhanced' adds the edges to the original image.
+    Returns:
+        numpy.array: The newly processed image.
+    """
+    # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.sobel.html#scipy.ndimage.sobel
+    # every intermediate is a single float32 channel... the image is never copied as float64 or as 3 float channels.
+    magnitude = apply_neighbourhood_operation(image_data, _edge_magnitude, halo=1)
+    # normalize the magnitude to the range 0 to 255 in place
+    max_mag = magnitude.max()
+    if max_mag > 0:
+        numpy.divide(magnitude, max_mag, out=magnitude)
+        numpy.multiply(magnitude, 255, out=magnitude)
+    magnitude_norm_2D = magnitude.astype(image_data.dtype)
+    del magnitude
+    result = numpy.empty((*image_data.shape[:2], 3), dtype=image_data.dtype)
     if image_type == 'edge_map':
-        result = numpy.stack([magnitude_norm_2D] * 3, axis=-1)
+        # write the same edge map to every channel
+        result[...] = magnitude_norm_2D[..., numpy.newaxis]
     else:
-        # enhance the edges
-        enhance_weight = 0.5
-        edge_map_3D = numpy.stack([magnitude_norm_2D] * 3, axis=-1).astype('float32')
-        original_3D = image_data[..., :3].astype('float32')
-        blended = original_3D + ( edge_map_3D * enhance_weight )
-        result = numpy.clip(blended, 0, 255).astype(image_data.dtype)
+        # enhance the edges by adding half of the edge map
+        # ... min(original, 255 - edge) + edge never overflows so the whole blend stays in 8 bits
+        edge_2D = numpy.floor_divide(magnitude_norm_2D, 2, out=magnitude_norm_2D)
+        headroom_2D = 255 - edge_2D
+        numpy.minimum(image_data[..., :3], headroom_2D[..., numpy.newaxis], out=result)
+        result += edge_2D[..., numpy.newaxis]
     return result
 
 
+def _edge_magnitude(image_data: numpy.ndarray) -> numpy.ndarray:
+    """
+    Computes the magnitude of the sobel gradient of the grayscale image.
+    Uses 2 float32 buffers the size of a single channel.
+    """
+    grayscale = numpy.empty(image_data.shape[:2], dtype=numpy.float32)
+    magnitude = numpy.empty_like(grayscale)
+    # convert to grayscale one channel at a time
+    # ... `magnitude` is used as scratch space until the gradient is computed.
+    numpy.multiply(image_data[..., 0], GRAYSCALE_WEIGHTS[0], out=grayscale, dtype=numpy.float32)
+    for channel in (1, 2):
+        numpy.multiply(image_data[..., channel], GRAYSCALE_WEIGHTS[channel], out=magnitude, dtype=numpy.float32)
+        grayscale += magnitude
+    # the horizontal gradient goes into `magnitude`
+    scipy.ndimage.sobel(grayscale, axis=0, output=magnitude)
+    # the vertical gradient overwrites the grayscale image in place
+    scipy.ndimage.sobel(grayscale, axis=1, output=grayscale)
+    return numpy.hypot(magnitude, grayscale, out=magnitude)
+
+
 def flip(image_data: numpy.ndarray, axis: str) -> numpy.ndarray:
     """
     Flips image along the specified axis.
@@ -182,20 +269,22 @@ def flip(image_data: numpy.ndarray, axis: str) -> numpy.ndarray:
 def gaussian_blur(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.gaussian_filter.html#scipy.ndimage.gaussian_filter
     sigma = amount / 100
-    channel_dict = split_channels(image_data)
-    result_b = scipy.ndimage.gaussian_filter(channel_dict['b_channel'], sigma=sigma).astype(image_data.dtype)
-    result_r = scipy.ndimage.gaussian_filter(channel_dict['r_channel'], sigma=sigma).astype(image_data.dtype)
-    result_g = scipy.ndimage.gaussian_filter(channel_dict['g_channel'], sigma=sigma).astype(image_data.dtype)
-    result = merge_channels(
-        r_channel=result_r,
-        g_channel=result_g,
-        b_channel=result_b,
+
+    def blur(channel: numpy.ndarray, output: numpy.ndarray) -> None:
+        filters.gaussian_filter(channel, sigma=sigma, output=output)
+
+    result = apply_neighbourhood_operation(
+        image_data,
+        lambda tile: map_channels(blur, tile),
+        halo=halo_for_sigma(sigma),
     )
     return result
 
 
 def invert(image_data: numpy.ndarray) -> numpy.ndarray:
     for i, row in enumerate(image_data):
+        # a safe point every row
+        check_cancelled()
         for j, pixel in enumerate(row):
             for k, channel in enumerate(pixel):
                 image_data[i][j][k] = max(255 - channel, 0)
@@ -204,87 +293,86 @@ def invert(image_data: numpy.ndarray) -> numpy.ndarray:
 
 def max_filter(image_data: numpy.ndarray, size: int) -> numpy.ndarray:
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.maximum_filter.html#scipy.ndimage.maximum_filter
-    channel_dict = split_channels(image_data)
-    result_r = scipy.ndimage.maximum_filter(channel_dict['r_channel'], size=size).astype(image_data.dtype)
-    result_g = scipy.ndimage.maximum_filter(channel_dict['g_channel'], size=size).astype(image_data.dtype)
-    result_b = scipy.ndimage.maximum_filter(channel_dict['b_channel'], size=size).astype(image_data.dtype)
-    result = merge_channels(
-        r_channel=result_r,
-        g_channel=result_g,
-        b_channel=result_b,
+
+    def filter_channel(channel: numpy.ndarray, output: numpy.ndarray) -> None:
+        filters.maximum_filter(channel, size=size, output=output)
+
+    result = apply_neighbourhood_operation(
+        image_data,
+        lambda tile: map_channels(filter_channel, tile),
+        halo=halo_for_size(size),
     )
     return result
 
 
 def min_filter(image_data: numpy.ndarray, size: int) -> numpy.ndarray:
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.minimum_filter.html#scipy.ndimage.minimum_filter
-    channel_dict = split_channels(image_data)
-    result_b = scipy.ndimage.minimum_filter(channel_dict['b_channel'], size=size).astype(image_data.dtype)
-    result_r = scipy.ndimage.minimum_filter(channel_dict['r_channel'], size=size).astype(image_data.dtype)
-    result_g = scipy.ndimage.minimum_filter(channel_dict['g_channel'], size=size).astype(image_data.dtype)
-    result = merge_channels(
-        r_channel=result_r,
-        g_channel=result_g,
-        b_channel=result_b,
+
+    def filter_channel(channel: numpy.ndarray, output: numpy.ndarray) -> None:
+        filters.minimum_filter(channel, size=size, output=output)
+
+    result = apply_neighbourhood_operation(
+        image_data,
+        lambda tile: map_channels(filter_channel, tile),
+        halo=halo_for_size(size),
     )
     return result
 
 
 def mute_channel(image_data: numpy.ndarray, channel: str) -> numpy.ndarray:
     for i, row in enumerate(image_data):
+        # a safe point every row
+        check_cancelled()
         for j, pixel in enumerate(row):
             image_data[i][j][CHANNEL_MAP[channel]] = 0
     return image_data
 
 
-def pepper_noise(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
+def pepper_noise(
+        image_data: numpy.ndarray,
+        amount: int,
+        rng: numpy.random.Generator | None = None,
+) -> numpy.ndarray:
     """
     Applies random noise to a percentage of pixels in the image.
-    Takes n randomly selected pixels and overwrites the pixel as white.
+    Takes n randomly selected pixels and overwrites the pixel as black.
 
     Args:
         image_data (numpy.array): the image data to process.
         amount (int): The percentage of pixels to replace with noise, as a float between 0 and 100 (e.g., 10 for 10%).
+        rng (numpy.random.Generator): the source of randomness. Defaults to a new generator.
     Returns:
         numpy.array: The newly processed image.
     """
-    value = amount / 100
     output_image = image_data.copy()
-    # Get dimensions of image
-    width, height = output_image.shape[:2]
-    # Get number of channels
-    num_channels = output_image.shape[2]
-    # Get the bit depth of the image
-    bit_depth = output_image.dtype
-    max_val = numpy.iinfo(bit_depth).max
-    # Calculate the number of pixels to change
-    num_pixels = int(value * height * width)
-    # Generate a random set of coordinates
-    rows = numpy.random.randint(low=0, high=height, size=num_pixels)
-    columns = numpy.random.randint(low=0, high=width, size=num_pixels)
-    # Generate a set of random colors pixels.
-    random_black = numpy.random.randint(low=0, high=1, size=(num_pixels, num_channels), dtype=bit_depth)
-    # apply the random colours to the selected coordinates
-    output_image[rows, columns] = random_black
-    # return the modified array
+    mask = noise_mask(output_image.shape, amount=amount, rng=rng)
+    # broadcast a single black pixel to every selected coordinate
+    # ... a `where` mask never builds the arrays of coordinates that boolean indexing does.
+    numpy.copyto(output_image, 0, where=mask.view(numpy.bool_)[..., numpy.newaxis])
     return output_image
 
 
 def percentile_filter(image_data: numpy.ndarray, percentile: int, size: int) -> numpy.ndarray:
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.percentile_filter.html#scipy.ndimage.percentile_filter
-    channel_dict = split_channels(image_data)
-    result_r = scipy.ndimage.percentile_filter(channel_dict['r_channel'], percentile=percentile, size=size).astype(image_data.dtype)
-    result_g = scipy.ndimage.percentile_filter(channel_dict['g_channel'], percentile=percentile, size=size).astype(image_data.dtype)
-    result_b = scipy.ndimage.percentile_filter(channel_dict['b_channel'], percentile=percentile, size=size).astype(image_data.dtype)
-    result = merge_channels(
-        r_channel=result_r,
-        g_channel=result_g,
-        b_channel=result_b,
+
+    def filter_channel(channel: numpy.ndarray, output: numpy.ndarray) -> None:
+        scipy.ndimage.percentile_filter(channel, percentile=percentile, size=size, output=output)
+
+    # size^2 work for every pixel... a large size takes minutes, so it can be cancelled between blocks of rows
+    result = apply_neighbourhood_operation(
+        image_data,
+        lambda tile: map_channels(filter_channel, tile),
+        halo=halo_for_size(size),
+        cancellable=True,
     )
     return result
 
 
-def rainbow_noise(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
+def rainbow_noise(
+        image_data: numpy.ndarray,
+        amount: int,
+        rng: numpy.random.Generator | None = None,
+) -> numpy.ndarray:
     """
     Applies random noise to a percentage of pixels in the image.
     Takes n randomly selected pixels and overwrites the pixel value.
@@ -292,27 +380,27 @@ def rainbow_noise(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
     Args:
         image_data (numpy.array): the image data to process.
         amount (int): The percentage of pixels to replace with noise, as a float between 0 and 100 (e.g., 10 for 10%).
+        rng (numpy.random.Generator): the source of randomness. Defaults to a new generator.
     Returns:
         numpy.array: The newly processed image.
     """
-    value = amount / 100
+    if rng is None:
+        rng = numpy.random.default_rng()
     output_image = image_data.copy()
-    # Get dimensions of image
-    width, height = output_image.shape[:2]
-    # Get number of channels
-    num_channels = output_image.shape[2]
     # Get the bit depth of the image
     bit_depth = output_image.dtype
     max_val = numpy.iinfo(bit_depth).max
-    # Calculate the number of pixels to change
-    num_pixels = int(value * height * width)
-    # Generate a random set of coordinates
-    rows = numpy.random.randint(low=0, high=height, size=num_pixels)
-    columns = numpy.random.randint(low=0, high=width, size=num_pixels)
-    # Generate a set of random colors pixels.
-    random_colours = numpy.random.randint(low=0, high=max_val + 1, size=(num_pixels, num_channels), dtype=bit_depth)
+    selected = noise_mask(output_image.shape, amount=amount, rng=rng).view(numpy.bool_)
+    # Generate a random colour for every picked pixel only... in the bit depth of the image.
+    random_colours = rng.integers(
+        low=0,
+        high=max_val,
+        size=(numpy.count_nonzero(selected), *output_image.shape[2:]),
+        dtype=bit_depth,
+        endpoint=True,
+    )
     # apply the random colours to the selected coordinates
-    output_image[rows, columns] = random_colours
+    output_image[selected] = random_colours
     # return the modified array
     return output_image
 
@@ -343,7 +431,11 @@ def rotate(image_data: numpy.ndarray, angle: int) -> numpy.ndarray:
     return scipy.ndimage.rotate(input=image_data, angle=angle, reshape=False)
 
 
-def salt_noise(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
+def salt_noise(
+        image_data: numpy.ndarray,
+        amount: int,
+        rng: numpy.random.Generator | None = None,
+) -> numpy.ndarray:
     """
     Applies random noise to a percentage of pixels in the image.
     Takes n randomly selected pixels and overwrites the pixel as white.
@@ -351,28 +443,39 @@ def salt_noise(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
     Args:
         image_data (numpy.array): the image data to process.
         amount (int): The percentage of pixels to replace with noise, as a float between 0 and 100 (e.g., 10 for 10%).
+        rng (numpy.random.Generator): the source of randomness. Defaults to a new generator.
     Returns:
         numpy.array: The newly processed image.
     """
-    value = amount / 100
     output_image = image_data.copy()
-    # Get dimensions of image
-    width, height = output_image.shape[:2]
-    # Get number of channels
-    num_channels = output_image.shape[2]
-    # Get the bit depth of the image
-    bit_depth = output_image.dtype
-    max_val = numpy.iinfo(bit_depth).max
-    # Calculate the number of pixels to change
-    num_pixels = int(value * height * width)
-    # Generate a random set of coordinates
-    rows = numpy.random.randint(low=0, high=height, size=num_pixels)
-    columns = numpy.random.randint(low=0, high=width, size=num_pixels)
-    # Generate a set of random colors pixels.
-    random_white = numpy.random.randint(low=max_val, high=max_val + 1, size=(num_pixels, num_channels), dtype=bit_depth)
-    # apply the random colours to the selected coordinates
-    output_image[rows, columns] = random_white
-    # return the modified array
+    max_val = numpy.iinfo(output_image.dtype).max
+    mask = noise_mask(output_image.shape, amount=amount, rng=rng)
+    # broadcast a single white pixel to every selected coordinate
+    numpy.copyto(output_image, max_val, where=mask.view(numpy.bool_)[..., numpy.newaxis])
+    return output_image
+
+
+def salt_and_pepper_noise(
+        image_data: numpy.ndarray,
+        amount: int,
+        rng: numpy.random.Generator | None = None,
+) -> numpy.ndarray:
+    """
+    Applies random noise to a percentage of pixels in the image.
+    Takes n randomly selected pixels and overwrites half of them as white and the other half as black.
+
+    Args:
+        image_data (numpy.array): the image data to process.
+        amount (int): The percentage of pixels to replace with noise, as a float between 0 and 100 (e.g., 10 for 10%).
+        rng (numpy.random.Generator): the source of randomness. Defaults to a new generator.
+    Returns:
+        numpy.array: The newly processed image.
+    """
+    output_image = image_data.copy()
+    max_val = numpy.iinfo(output_image.dtype).max
+    mask = noise_mask(output_image.shape, amount=amount, rng=rng, num_kinds=2)
+    numpy.copyto(output_image, max_val, where=(mask == 1)[..., numpy.newaxis])
+    numpy.copyto(output_image, 0, where=(mask == 2)[..., numpy.newaxis])
     return output_image
 
 
@@ -420,6 +523,8 @@ def shift(image_data: numpy.ndarray, direction: str, distance: int) -> numpy.nda
 def tint(image_data: numpy.ndarray, channel: str, amount: int) -> numpy.ndarray:
     value = amount / 100
     for i, row in enumerate(image_data):
+        # a safe point every row
+        check_cancelled()
         for j, pixel in enumerate(row):
             for k, c in enumerate(pixel):
                 channel_to_change = CHANNEL_MAP[channel]
@@ -432,14 +537,14 @@ def tint(image_data: numpy.ndarray, channel: str, amount: int) -> numpy.ndarray:
 
 def uniform_blur(image_data: numpy.ndarray, size: int) -> numpy.ndarray:
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.uniform_filter.html#scipy.ndimage.uniform_filter
-    channel_dict = split_channels(image_data)
-    result_r = scipy.ndimage.uniform_filter(channel_dict['r_channel'], size=size).astype(image_data.dtype)
-    result_g = scipy.ndimage.uniform_filter(channel_dict['g_channel'], size=size).astype(image_data.dtype)
-    result_b = scipy.ndimage.uniform_filter(channel_dict['b_channel'], size=size).astype(image_data.dtype)
-    result = merge_channels(
-        r_channel=result_r,
-        g_channel=result_g,
-        b_channel=result_b,
+
+    def filter_channel(channel: numpy.ndarray, output: numpy.ndarray) -> None:
+        filters.uniform_filter(channel, size=size, output=output)
+
+    result = apply_neighbourhood_operation(
+        image_data,
+        lambda tile: map_channels(filter_channel, tile),
+        halo=halo_for_size(size),
     )
     return result
 
@@ -0,0 +1,53 @@
+"""
+This module contains a helper for running blocking filesystem calls without blocking the event loop.
+
+`open()`, `Path.exists()`, `mkdir` and `Image.save` all block the thread they run on.
+On a network backed volume a single call can take tens of milliseconds... on the event loop that
+stalls every request the worker is serving. These calls are run in worker threads instead.
+
+The threads are limited by their own CapacityLimiter (STORAGE_IO_THREADS) rather than the default
+limiter shared with the rest of the app. A slow volume can only tie up these threads...
+it can never starve the threads used to stream responses or run sync endpoints.
+"""
+import functools
+from collections.abc import Callable
+
+import anyio
+import anyio.to_thread
+from anyio.lowlevel import RunVar
+
+from app.config import settings
+
+# a limiter belongs to an event loop... RunVar keeps one per loop
+_storage_io_limiter: RunVar[anyio.CapacityLimiter] = RunVar("storage_io_limiter")
+
+
+def get_storage_io_limiter() -> anyio.CapacityLimiter:
+    """
+    The limiter shared by every filesystem call of this event loop.
+    """
+    try:
+        return _storage_io_limiter.get()
+    except LookupError:
+        limiter = anyio.CapacityLimiter(settings.STORAGE_IO_THREADS)
+        _storage_io_limiter.set(limiter)
+        return limiter
+
+
+async def run_blocking_io[**P, T](function: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """
+    Runs a blocking filesystem call in a worker thread.
+
+    At most STORAGE_IO_THREADS calls run at the same time... the rest wait without blocking the event loop.
+
+    Args:
+        function (Callable): the blocking function.
+        *args: the positional arguments of the function.
+        **kwargs: the keyword arguments of the function.
+    Returns:
+        The return value of the function. Exceptions raised by the function are raised here.
+    """
+    return await anyio.to_thread.run_sync(
+        functools.partial(function, *args, **kwargs),
+        limiter=get_storage_io_limiter(),
+    )
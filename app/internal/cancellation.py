@@ -0,0 +1,183 @@
+"""
+This module contains the cancellation tokens that stop an augmentation part way through.
+
+A thread cannot be killed from the outside... so an augmentation stops itself. Every job has a token.
+The token is cancelled by `POST /image-api/job/{job_id}/cancel` or runs out at the deadline of the request,
+and the augmentation checks it at safe points:
+- before every channel or tile handed to `parallel_map` (see app/internal/parallel.py)
+- before every row of the pure Python loops (see app/internal/augmentations.py)
+- before every block of rows of the slow rank filters (see app/internal/tiling.py)
+- between reading, processing and writing the image (see app/services/image.py)
+
+The first safe point after a cancel raises JobCancelled (or JobDeadlineExceeded). The exception unwinds the
+worker thread... its arrays are freed and the worker and the admitted cost are given back straight away.
+A single scipy call is never interrupted, so a safe point is at most one channel of one block away.
+
+The token of the running job is kept in a context variable. anyio copies it into the worker thread of the job
+and `parallel_map` copies it into the threads that filter the channels and tiles.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+
+from app.exceptions import JobCancelled, JobDeadlineExceeded
+
+
+class CancellationToken:
+    """
+    Tells a job it should stop.
+
+    It is cancelled from the event loop and checked from any thread.
+
+    Args:
+        deadline (float): when (in time.monotonic() seconds) the job runs out of time. Defaults to never.
+    """
+
+    def __init__(self, deadline: float | None = None):
+        self.deadline = deadline
+        self._cancelled = threading.Event()
+        self._reason = ""
+        self._callbacks: list[Callable[[], object]] = []
+
+    @classmethod
+    def with_timeout(cls, timeout: float | None) -> "CancellationToken":
+        """
+        A token that runs out `timeout` seconds from now.
+        """
+        return cls(deadline=None if timeout is None else time.monotonic() + timeout)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or self.deadline_exceeded
+
+    @property
+    def deadline_exceeded(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self) -> float | None:
+        """
+        The seconds left before the deadline... None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def cancel(self, reason: str = "The job was cancelled.") -> None:
+        """
+        Stops the job at its next safe point. Cancelling twice does nothing.
+        """
+        if self._cancelled.is_set():
+            return
+        self._reason = reason
+        self._cancelled.set()
+        for callback in self._callbacks:
+            callback()
+        self._callbacks.clear()
+
+    def on_cancel(self, callback: Callable[[], object]) -> Callable[[], None]:
+        """
+        Calls `callback` when the token is cancelled... it wakes a job that is waiting for a worker.
+
+        Returns:
+            Callable: Removes the callback again.
+        """
+        if self._cancelled.is_set():
+            callback()
+            return lambda: None
+        self._callbacks.append(callback)
+
+        def remove() -> None:
+            with contextlib.suppress(ValueError):
+                self._callbacks.remove(callback)
+        return remove
+
+    def raise_if_cancelled(self) -> None:
+        """
+        A safe point.
+
+        Raises:
+            JobCancelled: the token was cancelled.
+            JobDeadlineExceeded: the deadline has passed.
+        """
+        if self._cancelled.is_set():
+            raise JobCancelled(self._reason)
+        if self.deadline_exceeded:
+            raise JobDeadlineExceeded("The job did not finish before its deadline.")
+
+
+# the token of the job running in this context... None outside a job
+_current_token: contextvars.ContextVar[CancellationToken | None] = contextvars.ContextVar(
+    "cancellation_token", default=None,
+)
+
+
+def get_cancellation_token() -> CancellationToken | None:
+    """
+    The token of the job running in this context.
+    """
+    return _current_token.get()
+
+
+@contextlib.contextmanager
+def use_cancellation_token(token: CancellationToken | None) -> Iterator[None]:
+    """
+    Makes `token` the token of everything run in this context... including worker threads started from it.
+    """
+    reset_token = _current_token.set(token)
+    try:
+        yield
+    finally:
+        _current_token.reset(reset_token)
+
+
+def check_cancelled() -> None:
+    """
+    A safe point for the job running in this context. Does nothing outside a job.
+
+    Raises:
+        JobCancelled: the job was cancelled.
+        JobDeadlineExceeded: the deadline of the job has passed.
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+# the jobs of this process that are waiting or running... only used from the event loop
+_jobs: dict[uuid.UUID, CancellationToken] = {}
+
+
+@contextlib.contextmanager
+def track_job(job_id: uuid.UUID, token: CancellationToken) -> Iterator[None]:
+    """
+    Lets `cancel_job` find the token of a job while it waits or runs.
+    """
+    _jobs[job_id] = token
+    try:
+        yield
+    finally:
+        _jobs.pop(job_id, None)
+
+
+def tracked_job_ids() -> list[uuid.UUID]:
+    """
+    The jobs of this process that are waiting or running.
+    """
+    return list(_jobs)
+
+
+def cancel_job(job_id: uuid.UUID) -> bool:
+    """
+    Cancels a job of this process.
+
+    Returns:
+        bool: True if the job was waiting or running in this process.
+    """
+    token = _jobs.get(job_id)
+    if token is None:
+        return False
+    token.cancel()
+    return True
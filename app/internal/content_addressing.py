@@ -0,0 +1,41 @@
+"""
+This module contains functions for storing unprocessed images by the hash of their content.
+
+The same source image is often uploaded again and again.
+Every upload is hashed before it is decoded... if a file with that hash is already stored
+the upload only needs a new database entry pointing at it. Nothing is decoded or written.
+
+Blobs are spread over 2 levels of directories named after the start of the hash:
+`blobs/ab/cd/abcd....png` ...so no directory ever holds more than a few thousand files.
+"""
+import hashlib
+from pathlib import PurePath
+
+# the directory (inside the unprocessed image volume) that holds every blob
+BLOB_DIRECTORY = "blobs"
+# BLAKE2b is faster than SHA-256 in hashlib... 32 bytes is plenty to never collide
+HASH_DIGEST_SIZE = 32
+
+
+def hash_image_content(content: bytes) -> str:
+    """
+    Hashes the raw bytes of an uploaded file.
+
+    Args:
+        content (bytes): the raw bytes of the uploaded file.
+    Returns:
+        str: The hash as 64 hex characters.
+    """
+    return hashlib.blake2b(content, digest_size=HASH_DIGEST_SIZE).hexdigest()
+
+
+def get_blob_relative_path(content_hash: str) -> PurePath:
+    """
+    The location of a blob inside the unprocessed image volume.
+
+    Args:
+        content_hash (str): the hash made by hash_image_content.
+    Returns:
+        PurePath: `blobs/{hash[0:2]}/{hash[2:4]}/{hash}.png`
+    """
+    return PurePath(BLOB_DIRECTORY, content_hash[0:2], content_hash[2:4], f"{content_hash}.png")
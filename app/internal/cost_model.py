@@ -0,0 +1,210 @@
+"""
+This module contains the cost model that predicts how expensive an augmentation is before it runs.
+
+Augmentations differ by orders of magnitude: `flip` returns a view while `percentile_filter` at size 128
+sorts 16384 values for every pixel. Pricing them all by their pixels turns away cheap requests and lets
+expensive ones through. The model prices each augmentation from the size of the image and its arguments:
+
+    cpu seconds = seconds_per_unit x work + overhead_seconds
+    peak memory = decoded image + bytes_per_unit x memory
+
+`work` and `memory` come from the complexity of the algorithm (see _WORK below)... for example
+`percentile_filter` does pixels x size^2 work and `zoom` needs memory for pixels x zoom^2.
+An algorithm that switches implementation with its arguments (`gaussian_blur` uses an FFT from a sigma of 4,
+`max_filter` the van Herk/Gil-Werman running max from a size of 16) has a regime for each.
+
+The coefficients of every regime are measured by `python -m app.commands.calibrate_cost_model`
+and stored in cost_model_calibration.json. Calibrate again on the machines that serve the API
+after an augmentation changes or the hardware does.
+"""
+import functools
+import json
+import math
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.internal.filters import GAUSSIAN_FFT_MIN_SIGMA, VAN_HERK_GIL_WERMAN_MIN_SIZE
+
+# where the calibrated coefficients are kept
+CALIBRATION_PATH = Path(__file__).with_name("cost_model_calibration.json")
+# every image is decoded to 8 bit RGB
+BYTES_PER_PIXEL = 3
+
+
+@dataclass(frozen=True)
+class CostEstimate:
+    """
+    The predicted cost of an augmentation.
+    """
+    cpu_seconds: float = 0.0
+    peak_memory_bytes: int = 0
+
+    def __add__(self, other: "CostEstimate") -> "CostEstimate":
+        return CostEstimate(
+            cpu_seconds=self.cpu_seconds + other.cpu_seconds,
+            peak_memory_bytes=self.peak_memory_bytes + other.peak_memory_bytes,
+        )
+
+    def __sub__(self, other: "CostEstimate") -> "CostEstimate":
+        return CostEstimate(
+            cpu_seconds=self.cpu_seconds - other.cpu_seconds,
+            peak_memory_bytes=self.peak_memory_bytes - other.peak_memory_bytes,
+        )
+
+
+@dataclass(frozen=True)
+class Work:
+    """
+    How much an augmentation does, in the units of its regime.
+    """
+    # the calibrated coefficients used... `{processing}` or `{processing}:{regime}`
+    regime: str
+    work: float
+    memory: float
+
+
+@dataclass(frozen=True)
+class Calibration:
+    """
+    The measured coefficients of a regime.
+    """
+    seconds_per_unit: float
+    overhead_seconds: float
+    bytes_per_unit: float
+
+
+# used for a regime missing from the calibration... as slow as the pure Python loops
+UNCALIBRATED = Calibration(seconds_per_unit=1e-6, overhead_seconds=0.0, bytes_per_unit=4.0)
+
+
+def _pixels(processing: str) -> Callable[[int, dict], Work]:
+    # the work and memory grow with the pixels and nothing else
+    def work(pixels: int, arguments: dict) -> Work:
+        return Work(processing, pixels, pixels * BYTES_PER_PIXEL)
+    return work
+
+
+def _cutout(pixels: int, arguments: dict) -> Work:
+    # the cutout is filled pixel by pixel... its area is `amount` percent of the image
+    return Work("cutout", pixels * arguments["amount"] / 100, pixels * BYTES_PER_PIXEL)
+
+
+def _gaussian_blur(pixels: int, arguments: dict) -> Work:
+    sigma = arguments["amount"] / 100
+    if sigma < GAUSSIAN_FFT_MIN_SIGMA:
+        # 2 separable passes with a window of 4 sigma either side
+        window = 2 * math.ceil(4 * sigma) + 1
+        return Work("gaussian_blur:direct", pixels * window, pixels * BYTES_PER_PIXEL)
+    # the FFT costs the same for every sigma
+    return Work("gaussian_blur:fft", pixels * math.log2(max(pixels, 2)), pixels * BYTES_PER_PIXEL)
+
+
+def _extreme_filter(processing: str) -> Callable[[int, dict], Work]:
+    def work(pixels: int, arguments: dict) -> Work:
+        size = arguments["size"]
+        if size < VAN_HERK_GIL_WERMAN_MIN_SIZE:
+            # 2 separable passes comparing `size` values
+            return Work(f"{processing}:direct", pixels * size, pixels * BYTES_PER_PIXEL)
+        # the running max/min costs the same for every size
+        return Work(f"{processing}:van_herk", pixels, pixels * BYTES_PER_PIXEL)
+    return work
+
+
+def _percentile_filter(pixels: int, arguments: dict) -> Work:
+    # every pixel selects from the size x size values around it
+    return Work("percentile_filter", pixels * arguments["size"] ** 2, pixels * BYTES_PER_PIXEL)
+
+
+def _zoom(pixels: int, arguments: dict) -> Work:
+    # every channel is interpolated at the zoomed size before it is cropped
+    zoomed_pixels = pixels * (1 + arguments["amount"] / 100) ** 2
+    return Work("zoom", zoomed_pixels, zoomed_pixels * BYTES_PER_PIXEL)
+
+
+# the work of every augmentation in PROCESSING_MAP
+_WORK: dict[str, Callable[[int, dict], Work]] = {
+    'brighten': _pixels('brighten'),
+    'channel_swap': _pixels('channel_swap'),
+    'cutout': _cutout,
+    'darken': _pixels('darken'),
+    'edge_filter': _pixels('edge_filter'),
+    'flip': _pixels('flip'),
+    'gaussian_blur': _gaussian_blur,
+    'invert': _pixels('invert'),
+    'max_filter': _extreme_filter('max_filter'),
+    'min_filter': _extreme_filter('min_filter'),
+    'mute_channel': _pixels('mute_channel'),
+    'pepper_noise': _pixels('pepper_noise'),
+    'percentile_filter': _percentile_filter,
+    'rainbow_noise': _pixels('rainbow_noise'),
+    'rotate': _pixels('rotate'),
+    'salt_and_pepper_noise': _pixels('salt_and_pepper_noise'),
+    'salt_noise': _pixels('salt_noise'),
+    'shift': _pixels('shift'),
+    'tint': _pixels('tint'),
+    'uniform_blur': _pixels('uniform_blur'),
+    'zoom': _zoom,
+}
+PROCESSING_NAMES = frozenset(_WORK)
+
+
+def get_work(processing: str, arguments: dict, pixels: int) -> Work:
+    """
+    How much an augmentation does.
+
+    Args:
+        processing (str): the name of the augmentation. (example: rotate)
+        arguments (dict): the arguments of the augmentation.
+        pixels (int): the width x height of the image.
+    Returns:
+        Work: The work and memory in the units of its regime.
+    """
+    return _WORK[processing](pixels, arguments)
+
+
+def load_calibration(path: Path = CALIBRATION_PATH) -> dict[str, Calibration]:
+    """
+    Reads the coefficients written by `python -m app.commands.calibrate_cost_model`.
+    """
+    with path.open(mode="r") as f:
+        data = json.load(f)
+    return {regime: Calibration(**coefficients) for regime, coefficients in data["regimes"].items()}
+
+
+@functools.cache
+def get_calibration() -> dict[str, Calibration]:
+    """
+    The coefficients in use... read once per process.
+    """
+    return load_calibration()
+
+
+def estimate_cost(
+        processing: str,
+        arguments: dict,
+        width: int,
+        height: int,
+        calibration: dict[str, Calibration] | None = None,
+) -> CostEstimate:
+    """
+    Predicts the CPU time and peak memory of an augmentation.
+
+    Args:
+        processing (str): the name of the augmentation. (example: rotate)
+        arguments (dict): the arguments of the augmentation.
+        width (int): the width of the image in pixels.
+        height (int): the height of the image in pixels.
+        calibration (dict[str, Calibration]): the coefficients to use. Defaults to the calibrated ones.
+    Returns:
+        CostEstimate: The predicted CPU seconds and peak bytes... including the decoded image.
+    """
+    if calibration is None:
+        calibration = get_calibration()
+    pixels = width * height
+    work = get_work(processing, arguments, pixels)
+    coefficients = calibration.get(work.regime, UNCALIBRATED)
+    return CostEstimate(
+        cpu_seconds=coefficients.seconds_per_unit * work.work + coefficients.overhead_seconds,
+        peak_memory_bytes=int(pixels * BYTES_PER_PIXEL + coefficients.bytes_per_unit * work.memory),
+    )
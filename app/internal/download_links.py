@@ -0,0 +1,115 @@
+"""
+This module contains functions for handing a download to something other than this service.
+
+Sending the bytes of an image ties up a worker and a connection for the whole download.
+With DOWNLOAD_MODE the service only checks who is asking... and something else sends the file:
+- signed_url: the client is redirected to a short lived link signed with HMAC-SHA256.
+  The link is served by `/files-api/files/` without a user... so a CDN or caching proxy in front of it
+  (or a separate pool of nodes) can serve it.
+- x_accel_redirect: nginx in front of the service sends the file from an internal location.
+- x_sendfile: Apache (mod_xsendfile) or lighttpd in front of the service sends the file.
+
+A file is named by its key: `{volume name}/{path in the volume}`, exactly like an object store key.
+"""
+import base64
+import hashlib
+import hmac
+import time
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote, urlencode
+
+from app.exceptions import InvalidDownloadLink
+
+
+def get_file_key(path: Path, volume_paths: dict[str, Path]) -> str:
+    """
+    The key of a stored file: `{volume name}/{path in the volume}`.
+
+    Raises:
+        ValueError: if the path is not in a volume.
+    """
+    for volume_name, volume_path in volume_paths.items():
+        if path.is_relative_to(volume_path):
+            return f"{volume_name}/{path.relative_to(volume_path).as_posix()}"
+    raise ValueError(f"{path} is not in a volume")
+
+
+def get_file_path(file_key: str, volume_paths: dict[str, Path]) -> Path:
+    """
+    The location of the file with a key made by get_file_key.
+
+    Raises:
+        ValueError: if the key does not name a file in a volume.
+    """
+    volume_name, _, relative_path = file_key.partition("/")
+    parts = PurePosixPath(relative_path).parts
+    if volume_name not in volume_paths or not parts or ".." in parts or parts[0] == "/":
+        raise ValueError(f"{file_key!r} is not a file in a volume")
+    return volume_paths[volume_name].joinpath(*parts)
+
+
+def _sign(file_key: str, filename: str, expires: int, secret: str) -> str:
+    message = f"{file_key}\n{filename}\n{expires}".encode()
+    digest = hmac.new(secret.encode(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def make_signed_url(
+        file_key: str,
+        filename: str,
+        base_url: str,
+        secret: str,
+        expires_seconds: int,
+) -> str:
+    """
+    Makes a link to a stored file that works for `expires_seconds`.
+
+    Args:
+        file_key (str): the key of the file.
+        filename (str): the name the client saves the file as.
+        base_url (str): where the files are served. (example: https://cdn.example.com/files-api)
+        secret (str): the key the link is signed with.
+        expires_seconds (int): how long the link works.
+    Returns:
+        str: The link.
+    """
+    # links expire on whole minutes... so links made in the same minute are the same and a cache can share them
+    expires = (int(time.time()) + expires_seconds) // 60 * 60 + 60
+    query = urlencode({
+        "filename": filename,
+        "expires": expires,
+        "signature": _sign(file_key, filename, expires, secret),
+    })
+    return f"{base_url.rstrip('/')}/files/{quote(file_key)}?{query}"
+
+
+def verify_signed_url(
+        file_key: str,
+        filename: str,
+        expires: int,
+        signature: str,
+        secret: str,
+) -> None:
+    """
+    Checks a link made by make_signed_url.
+
+    Raises:
+        InvalidDownloadLink: if the link was not made with the secret or has expired.
+    """
+    try:
+        # compared as bytes... compare_digest refuses str with non-ASCII characters
+        signature_bytes = signature.encode()
+    except UnicodeEncodeError as e:
+        raise InvalidDownloadLink(f"The link to {file_key} is not valid") from e
+    # compare_digest takes the same time however much of the signature is right
+    if not hmac.compare_digest(signature_bytes, _sign(file_key, filename, expires, secret).encode()):
+        raise InvalidDownloadLink(f"The link to {file_key} is not valid")
+    if expires < time.time():
+        raise InvalidDownloadLink(f"The link to {file_key} has expired")
+
+
+def make_internal_redirect_uri(file_key: str, prefix: str) -> str:
+    """
+    The URI of a file in the internal location nginx serves the volumes from.
+    """
+    return f"{prefix.rstrip('/')}/{quote(file_key)}"
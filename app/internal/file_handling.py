@@ -5,13 +5,9 @@ from pathlib import Path
 import numpy
 from PIL import Image, UnidentifiedImageError
 
-from ..config import settings
+from ..config import VOLUME_PATHS
+from ..storage import get_storage_backend
 
-# Define the mapping from volume names to the in-container paths
-VOLUME_PATHS = {
-    "unprocessed_image_data": settings.UNPROCESSED_IMAGE_PATH,
-    "processed_image_data": settings.PROCESSED_IMAGE_PATH,
-}
 
 class InvalidImageFileError(ValueError):
     """
@@ -45,6 +41,25 @@ def translate_file_to_numpy_array(content: bytes) -> numpy.ndarray:
         raise InvalidImageFileError(f"failed to open or convert image {e}")
 
 
+def read_image_size(content: bytes) -> tuple[int, int]:
+    """
+        Reads the width and height of an image file without decoding it.
+
+        Args:
+            content (bytes): The raw byte content of an image file. (example: JPEG, PNG)
+        Returns:
+            tuple[int, int]: The width and height in pixels.
+        Raises:
+            InvalidImageFileError: The image file format is not supported.
+    """
+    try:
+        # Pillow only reads the header until the pixels are asked for
+        with Image.open(io.BytesIO(content)) as img:
+            return img.size
+    except UnidentifiedImageError as e:
+        raise InvalidImageFileError(f"failed to open image {e}") from e
+
+
 def write_numpy_array_to_image_file(data: numpy.ndarray, file_name: str, destination_volume: str) -> str:
     """
         Saves a NumPy array as a PNG image file.
@@ -63,14 +78,15 @@ def write_numpy_array_to_image_file(data: numpy.ndarray, file_name: str, destina
     base_path = VOLUME_PATHS.get(destination_volume)
     if not base_path:
         raise ValueError(f"Invalid destination volume: {destination_volume}")
-    # ensure the destination directory exists
-    base_path.mkdir(parents=True, exist_ok=True)
     # define the full path for the output file, including the directory.
     file_path = base_path / Path(file_name).with_suffix(suffix= ".png")
     # convert the numpy array to a Pillow Image object.
     img_data = Image.fromarray(data)
     # save the image object to the save location in PNG format
-    img_data.save(fp= file_path, format='PNG')
+    storage = get_storage_backend()
+    storage.make_directory(file_path.parent, exist_ok=True)
+    with storage.open_write(file_path) as image_file:
+        img_data.save(fp= image_file, format='PNG')
     # return the path where the image was saved
     return str(file_path)
 
@@ -0,0 +1,182 @@
+"""
+This module contains fast single channel filters used by the augmentations.
+
+A square window filter is separable: filtering the rows and then the columns gives the same result as
+filtering the whole window at once. Each 1D pass costs O(1) per pixel, no matter how wide the window is.
+A gaussian filter with a large sigma is applied with an FFT so its cost does not grow with the kernel radius.
+"""
+import numpy
+import scipy.fft
+import scipy.ndimage
+
+# windows at least this wide use the van Herk/Gil-Werman running max/min
+# ... narrower windows use scipy's own 1D filters which are faster for small sizes.
+VAN_HERK_GIL_WERMAN_MIN_SIZE = 16
+# gaussian kernels with at least this sigma are applied with an FFT
+# ... the cost of scipy's direct convolution grows with the kernel radius but the FFT cost does not.
+GAUSSIAN_FFT_MIN_SIGMA = 4.0
+
+
+def _van_herk_gil_werman_1d(
+        data: numpy.ndarray,
+        size: int,
+        axis: int,
+        function: numpy.ufunc,
+) -> numpy.ndarray:
+    """
+    Computes a running max (or min) along one axis with the van Herk/Gil-Werman algorithm.
+
+    The data is cut into blocks of `size` pixels.
+    Every window of `size` pixels spans at most 2 neighbouring blocks,
+    so its extreme value is the extreme of a suffix of one block and a prefix of the next.
+    Prefixes and suffixes are found with 2 cumulative passes... about 3 comparisons per pixel.
+
+    Args:
+        data (numpy.array): the data to filter.
+        size (int): the width of the window.
+        axis (int): the axis to filter along.
+        function (numpy.ufunc): numpy.maximum or numpy.minimum.
+    Returns:
+        numpy.array: The filtered data. It matches scipy's 1D filter with mode='reflect'.
+    """
+    data = numpy.moveaxis(data, axis, -1)
+    length = data.shape[-1]
+    # scipy centres a window of `size` pixels on `size // 2`
+    before = size // 2
+    after = size - 1 - before
+    padded_length = length + size - 1
+    num_blocks = -(-padded_length // size)
+    # fill the end of the last block with a value that never wins
+    if function is numpy.maximum:
+        fill_value = numpy.iinfo(data.dtype).min if data.dtype.kind in "ui" else -numpy.inf
+    else:
+        fill_value = numpy.iinfo(data.dtype).max if data.dtype.kind in "ui" else numpy.inf
+    blocks = numpy.full((*data.shape[:-1], num_blocks * size), fill_value, dtype=data.dtype)
+    # numpy's 'symmetric' padding is scipy's 'reflect' mode
+    blocks[..., :padded_length] = numpy.pad(
+        data,
+        [(0, 0)] * (data.ndim - 1) + [(before, after)],
+        mode="symmetric",
+    )
+    block_view = blocks.reshape(*data.shape[:-1], num_blocks, size)
+    # the extreme value from the start of each block up to each pixel
+    prefix = function.accumulate(block_view, axis=-1).reshape(blocks.shape)
+    # the extreme value from each pixel up to the end of its block
+    suffix = function.accumulate(block_view[..., ::-1], axis=-1)[..., ::-1].reshape(blocks.shape)
+    # the window starting at pixel i ends at pixel i + size - 1
+    result = function(suffix[..., :length], prefix[..., size - 1:size - 1 + length])
+    return numpy.moveaxis(result, -1, axis)
+
+
+def _running_extreme_1d(
+        data: numpy.ndarray,
+        size: int,
+        axis: int,
+        function: numpy.ufunc,
+        output: numpy.ndarray,
+) -> None:
+    """
+    Writes a running max (or min) along one axis to `output`.
+    """
+    if size >= VAN_HERK_GIL_WERMAN_MIN_SIZE:
+        output[...] = _van_herk_gil_werman_1d(data, size=size, axis=axis, function=function)
+    elif function is numpy.maximum:
+        scipy.ndimage.maximum_filter1d(data, size=size, axis=axis, output=output)
+    else:
+        scipy.ndimage.minimum_filter1d(data, size=size, axis=axis, output=output)
+
+
+def _separable_extreme_filter(
+        channel: numpy.ndarray,
+        size: int,
+        function: numpy.ufunc,
+        output: numpy.ndarray | None,
+) -> numpy.ndarray:
+    if output is None:
+        output = numpy.empty_like(channel)
+    # filter along the columns into a scratch array... then along the rows into the output
+    columns_filtered = numpy.empty_like(channel)
+    _running_extreme_1d(channel, size=size, axis=0, function=function, output=columns_filtered)
+    _running_extreme_1d(columns_filtered, size=size, axis=1, function=function, output=output)
+    return output
+
+
+def maximum_filter(channel: numpy.ndarray, size: int, output: numpy.ndarray | None = None) -> numpy.ndarray:
+    """
+    A square window maximum filter computed as 2 separable 1D passes.
+    Matches scipy.ndimage.maximum_filter(channel, size=size).
+    """
+    return _separable_extreme_filter(channel, size=size, function=numpy.maximum, output=output)
+
+
+def minimum_filter(channel: numpy.ndarray, size: int, output: numpy.ndarray | None = None) -> numpy.ndarray:
+    """
+    A square window minimum filter computed as 2 separable 1D passes.
+    Matches scipy.ndimage.minimum_filter(channel, size=size).
+    """
+    return _separable_extreme_filter(channel, size=size, function=numpy.minimum, output=output)
+
+
+def uniform_filter(channel: numpy.ndarray, size: int, output: numpy.ndarray | None = None) -> numpy.ndarray:
+    """
+    A square window mean filter computed as 2 separable 1D running sums.
+    Matches scipy.ndimage.uniform_filter(channel, size=size).
+    """
+    if output is None:
+        output = numpy.empty_like(channel)
+    scipy.ndimage.uniform_filter1d(channel, size=size, axis=0, output=output)
+    # the second pass reads each line into a buffer first so it can run in place
+    scipy.ndimage.uniform_filter1d(output, size=size, axis=1, output=output)
+    return output
+
+
+def _fft_gaussian_filter(
+        channel: numpy.ndarray,
+        sigma: float,
+        output: numpy.ndarray,
+        truncate: float = 4.0,
+) -> None:
+    """
+    Applies a gaussian filter by multiplying the spectrum of the channel with the spectrum of the kernel.
+
+    The channel is padded by the kernel radius with reflected pixels first.
+    This matches the boundary of scipy's mode='reflect' and keeps the circular FFT from wrapping the edges together.
+    """
+    radius = int(truncate * float(sigma) + 0.5)
+    height, width = channel.shape
+    padded = numpy.pad(channel.astype(numpy.float32), radius, mode="symmetric")
+    # FFTs are fastest when the length has only small prime factors
+    fft_height = scipy.fft.next_fast_len(padded.shape[0], real=True)
+    fft_width = scipy.fft.next_fast_len(padded.shape[1], real=True)
+    spectrum = scipy.fft.rfft2(padded, s=(fft_height, fft_width))
+    del padded
+    # the fourier transform of a gaussian is a gaussian... and it is separable
+    frequency_y = scipy.fft.fftfreq(fft_height).astype(numpy.float32)
+    frequency_x = scipy.fft.rfftfreq(fft_width).astype(numpy.float32)
+    spectrum *= numpy.exp(-2 * (numpy.pi * sigma * frequency_y) ** 2)[:, numpy.newaxis]
+    spectrum *= numpy.exp(-2 * (numpy.pi * sigma * frequency_x) ** 2)[numpy.newaxis, :]
+    blurred = scipy.fft.irfft2(spectrum, s=(fft_height, fft_width))[radius:radius + height, radius:radius + width]
+    if numpy.issubdtype(output.dtype, numpy.integer):
+        limits = numpy.iinfo(output.dtype)
+        numpy.clip(blurred, limits.min, limits.max, out=blurred)
+    output[...] = blurred
+
+
+def gaussian_filter(
+        channel: numpy.ndarray,
+        sigma: float,
+        output: numpy.ndarray | None = None,
+) -> numpy.ndarray:
+    """
+    A gaussian filter which picks the fastest method for the size of the kernel.
+
+    Small sigmas use scipy.ndimage.gaussian_filter.
+    Large sigmas use an FFT. It differs from scipy by at most 1 level for 8-bit images.
+    """
+    if output is None:
+        output = numpy.empty_like(channel)
+    if sigma < GAUSSIAN_FFT_MIN_SIGMA:
+        scipy.ndimage.gaussian_filter(channel, sigma=sigma, output=output)
+    else:
+        _fft_gaussian_filter(channel, sigma=sigma, output=output)
+    return output
@@ -0,0 +1,101 @@
+"""
+This module contains functions for the HTTP cache validators sent with image downloads.
+
+A stored image is never changed after it is written... a new augmentation is always a new file.
+So the storage filename identifies the exact bytes of an image and can be used as a strong ETag
+without reading or hashing the file. Clients can cache an image forever and a revalidation
+can be answered from the database entry alone.
+"""
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import PurePath
+
+# images never change so caches never need to ask again
+# ... `immutable` stops browsers revalidating on reload.
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+# a redirect points at a link that expires... so it is never cached like the image itself
+REDIRECT_CACHE_CONTROL = "no-store"
+# every user sees only their own images... so a shared cache must keep a copy per user
+VARY = "X-External-User-ID"
+
+
+def make_etag(storage_filename: str, size: int | None = None) -> str:
+    """
+    Makes a strong ETag for a stored image.
+
+    Args:
+        storage_filename (str): the unique storage filename of the image.
+        size (int): the size of the rendition, if a rendition is served instead of the image.
+    Returns:
+        str: The quoted ETag.
+    """
+    tag = PurePath(storage_filename).stem
+    if size is not None:
+        tag = f"{tag}-{int(size)}"
+    return f'"{tag}"'
+
+
+def format_last_modified(created_at: datetime) -> str:
+    """
+    Formats a timestamp as an HTTP date.
+    """
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=UTC)
+    return format_datetime(created_at.astimezone(UTC), usegmt=True)
+
+
+def make_caching_headers(etag: str, created_at: datetime) -> dict[str, str]:
+    """
+    The cache headers for an image download.
+    FileResponse only sets its own ETag and Last-Modified when these are missing.
+    """
+    return {
+        "ETag": etag,
+        "Last-Modified": format_last_modified(created_at),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Vary": VARY,
+    }
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison... W/"x" matches "x"
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def is_not_modified(
+        etag: str,
+        created_at: datetime,
+        if_none_match: str | None = None,
+        if_modified_since: str | None = None,
+) -> bool:
+    """
+    Can a conditional GET be answered with 304 Not Modified?
+
+    If-Modified-Since is ignored when If-None-Match is sent.
+
+    Args:
+        etag (str): the ETag of the image.
+        created_at (datetime): when the image was written.
+        if_none_match (str): the If-None-Match request header.
+        if_modified_since (str): the If-Modified-Since request header.
+    Returns:
+        bool: True if the client already has the image.
+    """
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            # an invalid date is ignored
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=UTC)
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=UTC)
+        # HTTP dates only have whole seconds
+        return created_at.replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,213 @@
+"""
+This module contains the Postgres LISTEN/NOTIFY fan-out that tells waiting clients a job has moved.
+
+Every change of `ProcessingJob.job_status` sends a NOTIFY on JOB_STATUS_CHANNEL in the same transaction
+(see app/repository/image.py)... Postgres only delivers it once the change is committed, and from any worker.
+
+Every worker holds a single LISTEN connection, whatever the number of waiting clients. A client waiting for
+a job (`GET /image-api/job/{job_id}?wait=` or `/events`) subscribes to it and sleeps until a notification
+for that job arrives. Nothing polls the database while a job runs.
+
+A notification sent while the connection is down is lost. After reconnecting, every subscriber is woken
+to read its job again. While it is down, subscribers read their job every JOB_STATUS_FALLBACK_POLL_SECONDS.
+
+A CANCELLED notification also stops the job if it waits or runs in this worker (see app/internal/cancellation.py).
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import math
+import uuid
+from collections.abc import Awaitable, Callable, Iterator
+from datetime import datetime
+
+import anyio
+import psycopg
+from anyio.lowlevel import RunVar
+
+from app.config import settings
+from app.internal.cancellation import cancel_job
+from app.internal.metrics import (
+    JOB_STATUS_LISTENER_CONNECTED,
+    JOB_STATUS_NOTIFICATIONS,
+    JOB_STATUS_SUBSCRIBERS,
+)
+from app.schemas.logging import LogEntry
+from app.schemas.transactions_db import JobStatus
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+# the channel every change of a job status is sent on
+JOB_STATUS_CHANNEL = "processing_job_status"
+
+
+def encode_job_status(job_id: uuid.UUID, job_status: JobStatus) -> str:
+    """
+    The payload of a notification.
+    """
+    return json.dumps({"job_id": str(job_id), "job_status": job_status.value})
+
+
+def decode_job_status(payload: str) -> tuple[uuid.UUID, JobStatus]:
+    """
+    Reads the payload of a notification.
+
+    Raises:
+        ValueError: the payload was not made by encode_job_status.
+    """
+    try:
+        data = json.loads(payload)
+        return uuid.UUID(data["job_id"]), JobStatus(data["job_status"])
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Not a job status notification: {payload!r}") from e
+
+
+def get_conninfo(database_url: str) -> str:
+    """
+    The libpq connection string of a SQLAlchemy database URL.
+    """
+    return database_url.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+class JobSubscription:
+    """
+    Wakes a waiting client when its job moves.
+    """
+
+    def __init__(self, job_id: uuid.UUID):
+        self.job_id = job_id
+        self._moved = anyio.Event()
+
+    def wake(self) -> None:
+        self._moved.set()
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits for the job to move... at most `timeout` seconds.
+
+        Returns:
+            bool: True if the job (may have) moved since the last wait.
+        """
+        with anyio.move_on_after(math.inf if timeout is None else timeout):
+            await self._moved.wait()
+        if not self._moved.is_set():
+            return False
+        self._moved = anyio.Event()
+        return True
+
+
+class JobStatusListener:
+    """
+    Holds the LISTEN connection of a worker and hands every notification to the subscribers of its job.
+
+    It belongs to an event loop and is only used from it... so it needs no lock.
+
+    Args:
+        conninfo (str): the libpq connection string of the database.
+        reconnect_seconds (float): how long to wait before connecting again after the connection is lost.
+    """
+
+    def __init__(self, conninfo: str, reconnect_seconds: float = 1.0):
+        self.conninfo = conninfo
+        self.reconnect_seconds = reconnect_seconds
+        self.connected = False
+        self._subscriptions: dict[uuid.UUID, set[JobSubscription]] = {}
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    @contextlib.contextmanager
+    def subscribe(self, job_id: uuid.UUID) -> Iterator[JobSubscription]:
+        """
+        Wakes the subscription every time the job moves... until the block ends.
+        Subscribe before reading the job: a move between the read and the wait is then never missed.
+        """
+        subscription = JobSubscription(job_id)
+        self._subscriptions.setdefault(job_id, set()).add(subscription)
+        JOB_STATUS_SUBSCRIBERS.set(self.subscribers)
+        try:
+            yield subscription
+        finally:
+            subscriptions = self._subscriptions[job_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[job_id]
+            JOB_STATUS_SUBSCRIBERS.set(self.subscribers)
+
+    def dispatch(self, payload: str) -> None:
+        """
+        Hands a notification to the subscribers of its job.
+        """
+        JOB_STATUS_NOTIFICATIONS.inc()
+        try:
+            job_id, job_status = decode_job_status(payload)
+        except ValueError as e:
+            log_data = LogEntry(date_time=datetime.now(), event="job_status_listener", details=str(e))
+            logger.warning(log_data.model_dump_json())
+            return
+        if job_status == JobStatus.CANCELLED:
+            # cancelled through another worker... stop it if it waits or runs here
+            cancel_job(job_id)
+        for subscription in self._subscriptions.get(job_id, ()):
+            subscription.wake()
+
+    def wake_all(self) -> None:
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.wake()
+
+    def _set_connected(self, connected: bool) -> None:
+        self.connected = connected
+        JOB_STATUS_LISTENER_CONNECTED.set(int(connected))
+
+    async def run(self, on_connect: Callable[[], Awaitable[object]] | None = None) -> None:
+        """
+        Listens until cancelled... connecting again whenever the connection is lost.
+
+        Args:
+            on_connect (Callable): called after every (re)connect, to catch up on what was missed.
+        """
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True) as connection:
+                    await connection.execute(f"LISTEN {JOB_STATUS_CHANNEL}")
+                    self._set_connected(True)
+                    # notifications sent while disconnected are lost... every subscriber reads its job again
+                    self.wake_all()
+                    if on_connect is not None:
+                        await on_connect()
+                    async for notify in connection.notifies():
+                        self.dispatch(notify.payload)
+            except Exception as e:
+                # the listener must never stop... subscribers fall back to polling until it is back
+                log_data = LogEntry(
+                    date_time=datetime.now(),
+                    event="job_status_listener",
+                    details=f"Lost the notification connection: {e!r}",
+                )
+                logger.error(log_data.model_dump_json())
+            finally:
+                self._set_connected(False)
+            await asyncio.sleep(self.reconnect_seconds)
+
+
+# one listener per worker... RunVar keeps one per event loop
+_job_status_listener: RunVar[JobStatusListener] = RunVar("job_status_listener")
+
+
+def get_job_status_listener() -> JobStatusListener:
+    """
+    The job status listener of this worker.
+    """
+    try:
+        return _job_status_listener.get()
+    except LookupError:
+        listener = JobStatusListener(
+            conninfo=get_conninfo(str(settings.DATABASE_URL)),
+            reconnect_seconds=settings.JOB_LISTENER_RECONNECT_SECONDS,
+        )
+        _job_status_listener.set(listener)
+        return listener
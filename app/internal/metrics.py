@@ -0,0 +1,157 @@
+"""
+This module contains in-process metrics in the Prometheus text format.
+
+Metrics are counted per worker process. Scrape every worker (or add them up) for totals.
+`GET /healthcheck-api/metrics` returns every metric registered here.
+"""
+import threading
+from dataclasses import dataclass, field
+
+# every metric, in the order it was registered
+_REGISTRY: list["Metric"] = []
+# metrics are changed from the event loop and from worker threads
+_LOCK = threading.Lock()
+
+
+@dataclass
+class Metric:
+    """
+    A named number with help text.
+    """
+    name: str
+    description: str
+    metric_type: str
+    value: float = field(default=0, init=False)
+
+    def render(self) -> str:
+        value = int(self.value) if float(self.value).is_integer() else self.value
+        return (
+            f"# HELP {self.name} {self.description}\n"
+            f"# TYPE {self.name} {self.metric_type}\n"
+            f"{self.name} {value}\n"
+        )
+
+
+class Counter(Metric):
+    """
+    A number that only goes up.
+    """
+    def __init__(self, name: str, description: str):
+        super().__init__(name=name, description=description, metric_type="counter")
+
+    def inc(self, amount: float = 1) -> None:
+        if amount < 0:
+            raise ValueError("a counter can only go up")
+        with _LOCK:
+            self.value += amount
+
+
+class Gauge(Metric):
+    """
+    A number that goes up and down.
+    """
+    def __init__(self, name: str, description: str):
+        super().__init__(name=name, description=description, metric_type="gauge")
+
+    def set(self, value: float) -> None:
+        with _LOCK:
+            self.value = value
+
+
+def register(metric: Metric) -> Metric:
+    """
+    Adds a metric to the ones returned by render_metrics.
+    """
+    _REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text format.
+    """
+    with _LOCK:
+        return "".join(metric.render() for metric in _REGISTRY)
+
+
+# --- storage reclamation ---
+RECLAIMED_BYTES = register(Counter(
+    "storage_reclaimed_bytes_total",
+    "Bytes of deleted images removed from the image volumes.",
+))
+RECLAIMED_FILES = register(Counter(
+    "storage_reclaimed_files_total",
+    "Files of deleted images removed from the image volumes.",
+))
+PENDING_TOMBSTONES = register(Gauge(
+    "storage_tombstones_pending",
+    "Deleted directories waiting to be removed from the image volumes.",
+))
+
+# --- augmentation admission ---
+AUGMENTATIONS_ADMITTED = register(Counter(
+    "augmentation_admitted_total",
+    "Augmentations admitted by the admission controller.",
+))
+AUGMENTATIONS_REJECTED_OVERLOADED = register(Counter(
+    "augmentation_rejected_overloaded_total",
+    "Augmentations rejected with 503 because the worker budget was used up.",
+))
+AUGMENTATIONS_REJECTED_USER_SHARE = register(Counter(
+    "augmentation_rejected_user_share_total",
+    "Augmentations rejected with 429 because the user had used up their share of the budget.",
+))
+AUGMENTATION_CPU_SECONDS_IN_USE = register(Gauge(
+    "augmentation_cpu_seconds_in_use",
+    "Estimated CPU seconds of the augmentations running now.",
+))
+AUGMENTATION_MEMORY_BYTES_IN_USE = register(Gauge(
+    "augmentation_memory_bytes_in_use",
+    "Estimated peak memory of the augmentations running now.",
+))
+
+# --- augmentation scheduling ---
+AUGMENTATIONS_QUEUED = register(Gauge(
+    "augmentation_queued",
+    "Augmentations waiting for a worker.",
+))
+AUGMENTATIONS_RUNNING = register(Gauge(
+    "augmentation_running",
+    "Augmentations running on a worker.",
+))
+AUGMENTATIONS_STARTED = register(Counter(
+    "augmentation_started_total",
+    "Augmentations given a worker by the job scheduler.",
+))
+AUGMENTATION_QUEUE_WAIT_SECONDS = register(Counter(
+    "augmentation_queue_wait_seconds_total",
+    "Seconds augmentations waited for a worker. Divide by augmentation_started_total for the mean wait.",
+))
+AUGMENTATIONS_REJECTED_QUEUE_FULL = register(Counter(
+    "augmentation_rejected_queue_full_total",
+    "Augmentations rejected with 429 because the user already had too many waiting.",
+))
+
+# --- augmentation cancellation ---
+AUGMENTATIONS_CANCELLED = register(Counter(
+    "augmentation_cancelled_total",
+    "Augmentations stopped because they were cancelled.",
+))
+AUGMENTATIONS_DEADLINE_EXCEEDED = register(Counter(
+    "augmentation_deadline_exceeded_total",
+    "Augmentations stopped because they did not finish before their deadline.",
+))
+
+# --- job status notifications ---
+JOB_STATUS_NOTIFICATIONS = register(Counter(
+    "job_status_notifications_total",
+    "Job status notifications received from Postgres.",
+))
+JOB_STATUS_SUBSCRIBERS = register(Gauge(
+    "job_status_subscribers",
+    "Clients waiting for a job to move.",
+))
+JOB_STATUS_LISTENER_CONNECTED = register(Gauge(
+    "job_status_listener_connected",
+    "1 while the LISTEN connection for job status notifications is up.",
+))
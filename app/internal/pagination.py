@@ -0,0 +1,53 @@
+"""
+This module contains functions for the cursors used to page through a list of images.
+
+Pages are read with keyset pagination: a page is "the next `limit` rows after (created_at, id)".
+The database seeks straight to that key in an index... so a page costs the same no matter how deep it is.
+An OFFSET would read and throw away every row before the page.
+
+The cursor is the (created_at, id) of the last row of a page, encoded so clients can treat it as opaque.
+"""
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from app.exceptions import InvalidCursor
+
+# the largest page a client can ask for
+MAX_PAGE_SIZE = 100
+DEFAULT_PAGE_SIZE = 20
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    """
+    Makes the cursor that points just after a row.
+
+    Args:
+        created_at (datetime): the created_at of the last row of a page.
+        row_id (uuid.UUID): the id of the last row of a page.
+    Returns:
+        str: A URL safe cursor.
+    """
+    key = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Reads a cursor made by encode_cursor.
+
+    Args:
+        cursor (str): the cursor sent by the client.
+    Returns:
+        tuple[datetime, uuid.UUID]: The (created_at, id) of the row the cursor points after.
+    Raises:
+        InvalidCursor: if the cursor was not made by encode_cursor.
+    """
+    try:
+        # the padding was stripped to keep the cursor short
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = key.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"Cursor {cursor!r} is not valid") from e
@@ -0,0 +1,132 @@
+"""
+This module contains a shared thread pool for running image filters in parallel.
+
+scipy.ndimage filters release the GIL while they run.
+So filtering the R, G and B channels (or the tiles of a large image) on separate threads
+gives a real wall-clock speedup on a multi-core machine.
+Each task writes to its own region of a preallocated output, so the result does not depend on the order tasks finish in.
+Every task is a safe point of the job that started it (see app/internal/cancellation.py).
+"""
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from ..config import settings
+from .cancellation import get_cancellation_token, use_cancellation_token
+
+# the pool is created the first time it is needed
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# marks the threads that belong to the pool
+_worker_state = threading.local()
+
+
+def _mark_worker_thread() -> None:
+    _worker_state.is_worker = True
+
+
+def is_worker_thread() -> bool:
+    """
+    Is the current thread one of the threads in the shared pool?
+    """
+    return getattr(_worker_state, "is_worker", False)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Get the thread pool shared by every filter in the process.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.AUGMENTATION_THREADS,
+                thread_name_prefix="augmentation",
+                initializer=_mark_worker_thread,
+            )
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """
+    Stop the shared thread pool.
+    A new pool is created if a filter needs it again.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _run_on_pool(function: Callable[[object], None], items: list) -> None:
+    futures = [get_executor().submit(function, item) for item in items]
+    try:
+        for future in futures:
+            # raises any exception from a task
+            future.result()
+    finally:
+        # once a task raised the rest are not needed... the tasks that have not started are dropped
+        # ... the running ones finish on their own (a cancelled job stops at its next safe point)
+        for future in futures:
+            future.cancel()
+
+
+def parallel_map(function: Callable[[object], None], items: Iterable) -> None:
+    """
+    Calls a function once for every item.
+    The calls run on the shared thread pool when more than one thread is configured.
+
+    Tasks never submit more tasks to the pool.
+    When this is called from a pool thread the calls run one after another on that thread.
+    This stops nested work (example: channels inside a tile) from waiting on a full pool forever.
+
+    Raises:
+        JobCancelled: the job was cancelled before an item... the items after it are skipped.
+    """
+    items = list(items)
+    token = get_cancellation_token()
+    if settings.AUGMENTATION_THREADS <= 1 or len(items) <= 1 or is_worker_thread():
+        for item in items:
+            if token is not None:
+                token.raise_if_cancelled()
+            function(item)
+        return
+    if token is None:
+        _run_on_pool(function, items)
+        return
+
+    def run_item(item: object) -> None:
+        # pool threads do not inherit context variables... the token is handed over
+        # ... so nested safe points (example: rows inside a tile) see it too.
+        token.raise_if_cancelled()
+        with use_cancellation_token(token):
+            function(item)
+
+    _run_on_pool(run_item, items)
+
+
+def map_channels(
+        function: Callable[[numpy.ndarray, numpy.ndarray], object],
+        image_data: numpy.ndarray,
+        num_channels: int = 3,
+) -> numpy.ndarray:
+    """
+    Applies a single channel filter to every colour channel of an image.
+
+    Args:
+        function (Callable): the filter. It takes a channel and the output array to write the filtered channel to.
+        image_data (numpy.array): the image data to process.
+        num_channels (int): the number of channels to filter.
+    Returns:
+        numpy.array: The newly processed image.
+    """
+    output = numpy.empty((*image_data.shape[:2], num_channels), dtype=image_data.dtype)
+
+    def filter_channel(channel: int) -> None:
+        function(image_data[..., channel], output[..., channel])
+
+    parallel_map(filter_channel, range(num_channels))
+    return output
@@ -0,0 +1,98 @@
+"""
+This module contains functions for making small previews (renditions) of stored images.
+
+A rendition is a downscaled WebP copy of an image.
+It is stored next to the original with the size in its name: `{storage_filename stem}.{size}.webp`
+Clients showing a grid of images can download a rendition instead of the full resolution PNG.
+"""
+import logging
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image
+
+from app.internal.atomic_write import fsync_batch
+from app.schemas.image import RenditionSize
+from app.schemas.logging import LogEntry
+from app.storage import get_storage_backend
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+# the longest side of each rendition in pixels
+RENDITION_SIZES: tuple[int, ...] = tuple(size.value for size in RenditionSize)
+RENDITION_MEDIA_TYPE = "image/webp"
+# lossy WebP at this quality is a fraction of the size of the PNG... and good enough for a preview
+RENDITION_QUALITY = 80
+
+
+def get_rendition_location(image_path: Path, size: int) -> Path:
+    """
+    The location of a rendition of an image.
+
+    Args:
+        image_path (Path): the location of the original image.
+        size (int): the longest side of the rendition in pixels.
+    Returns:
+        Path: The location of the rendition, in the same directory as the original.
+    """
+    return image_path.with_name(f"{image_path.stem}.{size}.webp")
+
+
+def make_rendition(image: Image.Image, size: int) -> Image.Image:
+    """
+    Downscales an image so its longest side is at most `size` pixels.
+    The aspect ratio is kept. Images are never made larger.
+    """
+    rendition = image.copy()
+    # reducing_gap shrinks the image by a whole factor first... which is much faster for large images
+    rendition.thumbnail((size, size), resample=Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if rendition.mode not in ("RGB", "RGBA"):
+        rendition = rendition.convert("RGB")
+    return rendition
+
+
+def write_rendition(rendition: Image.Image, rendition_path: Path) -> Path:
+    """
+    Saves a rendition as WebP.
+    The storage backend only shows the file once it is complete... so a half written rendition is never served.
+    """
+    with get_storage_backend().open_write(rendition_path) as rendition_file:
+        rendition.save(fp=rendition_file, format="WEBP", quality=RENDITION_QUALITY)
+    return rendition_path
+
+
+def generate_renditions(image_path: Path, sizes: Iterable[int] = RENDITION_SIZES) -> list[Path]:
+    """
+    Makes and stores renditions of an image.
+    This is slow (it decodes the whole image) so it should run in a background task or a thread.
+
+    Args:
+        image_path (Path): the location of the original image.
+        sizes (Iterable[int]): the longest side of each rendition in pixels.
+    Returns:
+        list[Path]: The location of every rendition that was written.
+    """
+    rendition_paths = []
+    # every rendition is in the same directory... it is flushed once for all of them
+    with (
+        get_storage_backend().open_read(image_path) as image_file,
+        Image.open(image_file) as image,
+        fsync_batch(),
+    ):
+        image.load()
+        source = image
+        # the largest rendition is made first... each smaller rendition is made from the one before it
+        for size in sorted(sizes, reverse=True):
+            source = make_rendition(source, size)
+            rendition_paths.append(
+                write_rendition(source, get_rendition_location(image_path, size))
+            )
+    log_data = LogEntry(
+        date_time=datetime.now(),
+        event="generate_renditions",
+        details=f"Wrote {len(rendition_paths)} renditions of {image_path.name}.",
+    )
+    logger.info(log_data.model_dump_json())
+    return rendition_paths
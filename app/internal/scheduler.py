@@ -0,0 +1,273 @@
+"""
+This module contains the job scheduler that decides which augmentation runs next on a worker.
+
+A worker runs AUGMENTATION_WORKERS augmentations at the same time, each in a thread of its own.
+Without a scheduler they would start in the order they arrive... one user sending a thousand
+`percentile_filter` jobs would make everyone else wait behind all of them.
+
+Waiting jobs are ordered by:
+1. priority class: a waiting HIGH job starts before any NORMAL job, and NORMAL before LOW.
+2. weighted fair queuing between the users of a class. Every job gets a virtual finish time:
+
+       start  = max(virtual time of the class, finish of the last job of the user in the class)
+       finish = start + estimated CPU seconds / weight of the user
+
+   and the job with the earliest finish starts first. A user sending many (or expensive) jobs pushes
+   their own finish times back, so other users get their turns in proportion to their weights
+   (AUGMENTATION_USER_WEIGHTS). The virtual time of a class is the start of its last job that started.
+3. the order they arrived in.
+
+A user runs at most AUGMENTATION_MAX_RUNNING_PER_USER jobs at the same time. Their other jobs are skipped
+until one finishes... a free worker is given to the next user instead of waiting.
+A user can have at most AUGMENTATION_MAX_QUEUED_PER_USER jobs waiting (429 with Retry-After).
+A job that is cancelled or runs out of time while it waits gives up its place straight away.
+
+The scheduler belongs to an event loop and is only used from it... so it needs no lock.
+"""
+import contextlib
+import functools
+import itertools
+import math
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from typing import ParamSpec, TypeVar
+
+import anyio
+import anyio.to_thread
+from anyio.lowlevel import RunVar
+
+from app.config import settings
+from app.exceptions import TooManyAugmentations
+from app.internal.cancellation import CancellationToken
+from app.internal.metrics import (
+    AUGMENTATION_QUEUE_WAIT_SECONDS,
+    AUGMENTATIONS_QUEUED,
+    AUGMENTATIONS_REJECTED_QUEUE_FULL,
+    AUGMENTATIONS_RUNNING,
+    AUGMENTATIONS_STARTED,
+)
+from app.schemas.transactions_db import JobPriority
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# the classes in the order they are served
+PRIORITY_ORDER = (JobPriority.HIGH, JobPriority.NORMAL, JobPriority.LOW)
+
+
+@dataclass
+class _Job:
+    user_id: uuid.UUID
+    priority: JobPriority
+    # the virtual start and finish times... see the module docstring
+    start: float
+    finish: float
+    sequence: int
+    queued_at: float
+    started: anyio.Event = field(default_factory=anyio.Event)
+
+
+class JobScheduler:
+    """
+    Gives the workers of an event loop to waiting jobs by priority class and weighted fair queuing.
+
+    Args:
+        workers (int): how many jobs run at the same time.
+        max_running_per_user (int): how many jobs of a single user run at the same time.
+        max_queued_per_user (int): how many jobs of a single user can wait.
+        user_weights (dict[uuid.UUID, float]): the share of every user compared to the others. Defaults to 1.
+        retry_after (int): how long (in seconds) a rejected client is told to wait.
+    """
+
+    def __init__(
+            self,
+            workers: int,
+            max_running_per_user: int = 1,
+            max_queued_per_user: int = 100,
+            user_weights: dict[uuid.UUID, float] | None = None,
+            retry_after: int = 1,
+    ):
+        self.workers = workers
+        self.max_running_per_user = max_running_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.user_weights = user_weights or {}
+        self.retry_after = retry_after
+        # the CPU work of a running job is done in these threads... not the default threads of the app
+        self.limiter = anyio.CapacityLimiter(workers)
+        self.running = 0
+        # the waiting jobs of every user in every class... each in the order it arrived
+        self._queues: dict[JobPriority, dict[uuid.UUID, deque[_Job]]] = {
+            priority: {} for priority in PRIORITY_ORDER
+        }
+        self._virtual_time: dict[JobPriority, float] = {priority: 0.0 for priority in PRIORITY_ORDER}
+        self._last_finish: dict[tuple[JobPriority, uuid.UUID], float] = {}
+        self._queued: dict[uuid.UUID, int] = {}
+        self._running: dict[uuid.UUID, int] = {}
+        self._sequence = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def _enqueue(self, user_id: uuid.UUID, cost: float, priority: JobPriority) -> _Job:
+        if self._queued.get(user_id, 0) >= self.max_queued_per_user:
+            AUGMENTATIONS_REJECTED_QUEUE_FULL.inc()
+            raise TooManyAugmentations(
+                "You have too many augmentations waiting. Try again later.",
+                retry_after=self.retry_after,
+            )
+        start = max(self._virtual_time[priority], self._last_finish.get((priority, user_id), 0.0))
+        finish = start + cost / self.user_weights.get(user_id, 1.0)
+        self._last_finish[(priority, user_id)] = finish
+        job = _Job(
+            user_id=user_id,
+            priority=priority,
+            start=start,
+            finish=finish,
+            sequence=next(self._sequence),
+            queued_at=time.monotonic(),
+        )
+        self._queues[priority].setdefault(user_id, deque()).append(job)
+        self._queued[user_id] = self._queued.get(user_id, 0) + 1
+        return job
+
+    def _next_job(self) -> _Job | None:
+        for priority in PRIORITY_ORDER:
+            heads = [
+                queue[0] for user_id, queue in self._queues[priority].items()
+                if self._running.get(user_id, 0) < self.max_running_per_user
+            ]
+            if heads:
+                return min(heads, key=lambda job: (job.finish, job.sequence))
+        return None
+
+    def _dequeue(self, job: _Job) -> None:
+        queue = self._queues[job.priority][job.user_id]
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.priority][job.user_id]
+        self._queued[job.user_id] -= 1
+        if self._queued[job.user_id] == 0:
+            del self._queued[job.user_id]
+
+    def _dispatch(self) -> None:
+        # start waiting jobs until the workers are busy or every waiting user is at their cap
+        while self.running < self.workers:
+            job = self._next_job()
+            if job is None:
+                break
+            self._dequeue(job)
+            self._virtual_time[job.priority] = max(self._virtual_time[job.priority], job.start)
+            self.running += 1
+            self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+            AUGMENTATIONS_STARTED.inc()
+            AUGMENTATION_QUEUE_WAIT_SECONDS.inc(time.monotonic() - job.queued_at)
+            job.started.set()
+        self._report()
+
+    def _forget_idle_user(self, user_id: uuid.UUID) -> None:
+        # a user with nothing waiting or running starts again from the virtual time when they come back
+        # ... the dicts never grow with the number of users
+        if user_id not in self._queued and user_id not in self._running:
+            for priority in PRIORITY_ORDER:
+                self._last_finish.pop((priority, user_id), None)
+
+    def _finish(self, job: _Job) -> None:
+        self.running -= 1
+        self._running[job.user_id] -= 1
+        if self._running[job.user_id] == 0:
+            del self._running[job.user_id]
+        self._forget_idle_user(job.user_id)
+        self._dispatch()
+
+    def _report(self) -> None:
+        AUGMENTATIONS_QUEUED.set(self.queued)
+        AUGMENTATIONS_RUNNING.set(self.running)
+
+    @contextlib.asynccontextmanager
+    async def schedule(
+            self,
+            user_id: uuid.UUID,
+            cost: float,
+            priority: JobPriority = JobPriority.NORMAL,
+            token: CancellationToken | None = None,
+    ) -> AsyncIterator[None]:
+        """
+        Waits for a worker... and gives it to the next job when the block ends.
+
+        Args:
+            user_id (uuid.UUID): the user the job belongs to.
+            cost (float): the estimated CPU seconds of the job.
+            priority (JobPriority): the priority class of the job.
+            token (CancellationToken): stops the wait when the job is cancelled or reaches its deadline.
+        Raises:
+            TooManyAugmentations: the user already has too many jobs waiting.
+            JobCancelled: the job was cancelled before it got a worker.
+            JobDeadlineExceeded: the deadline of the job passed before it got a worker.
+        """
+        job = self._enqueue(user_id, cost, priority)
+        try:
+            self._dispatch()
+            await self._wait(job, token)
+        except BaseException:
+            # cancelled while waiting... the job never runs
+            if job.started.is_set():
+                self._finish(job)
+            else:
+                self._dequeue(job)
+                self._forget_idle_user(user_id)
+                self._report()
+            raise
+        try:
+            yield
+        finally:
+            self._finish(job)
+
+    async def _wait(self, job: _Job, token: CancellationToken | None) -> None:
+        if token is None:
+            await job.started.wait()
+            return
+        while not job.started.is_set():
+            token.raise_if_cancelled()
+            remaining = token.remaining()
+            # woken by the worker, a cancel or the deadline... whichever comes first
+            with anyio.move_on_after(math.inf if remaining is None else remaining) as scope:
+                remove_callback = token.on_cancel(scope.cancel)
+                try:
+                    await job.started.wait()
+                finally:
+                    remove_callback()
+
+    async def run_sync(self, function: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        """
+        Runs the CPU work of a job in a worker thread... the event loop keeps serving other requests.
+        """
+        return await anyio.to_thread.run_sync(
+            functools.partial(function, *args, **kwargs),
+            limiter=self.limiter,
+        )
+
+
+# one scheduler per worker... RunVar keeps one per event loop
+_job_scheduler: RunVar[JobScheduler] = RunVar("job_scheduler")
+
+
+def get_job_scheduler() -> JobScheduler:
+    """
+    The job scheduler of this worker.
+    """
+    try:
+        return _job_scheduler.get()
+    except LookupError:
+        scheduler = JobScheduler(
+            workers=settings.AUGMENTATION_WORKERS,
+            max_running_per_user=settings.AUGMENTATION_MAX_RUNNING_PER_USER,
+            max_queued_per_user=settings.AUGMENTATION_MAX_QUEUED_PER_USER,
+            user_weights=settings.AUGMENTATION_USER_WEIGHTS,
+            retry_after=settings.AUGMENTATION_RETRY_AFTER_SECONDS,
+        )
+        _job_scheduler.set(scheduler)
+        return scheduler
@@ -0,0 +1,50 @@
+"""
+This module contains functions for spreading the files of a user over shard directories.
+
+ext4 and overlayfs get slow when a single directory holds hundreds of thousands of entries.
+Instead of `{user_id}/{name}` a file is stored at `{user_id}/ab/cd/{name}`,
+where `ab` and `cd` come from a hash of the name. With 2 levels there are 65536 shard directories per user.
+
+Every file with the same key (the name up to the first dot) is in the same shard...
+so an image and its previews (`{key}.png`, `{key}.128.webp`) stay together.
+"""
+import hashlib
+import string
+from pathlib import PurePath
+
+# each level is named by one byte of the hash... 256 directories per level
+MAX_SHARD_LEVELS = 2
+
+
+def get_shard_key(name: str) -> str:
+    """
+    The part of a file or directory name that picks its shard.
+    """
+    return name.split(".", 1)[0]
+
+
+def get_shard_directories(name: str, levels: int) -> PurePath:
+    """
+    The shard directories of a file or directory.
+
+    Args:
+        name (str): the name of the file or directory.
+        levels (int): the number of shard directories. 0 keeps the flat layout.
+    Returns:
+        PurePath: The relative path of the shard, for example `ab/cd`. Empty if levels is 0.
+    Raises:
+        ValueError: if levels is not between 0 and MAX_SHARD_LEVELS.
+    """
+    if not 0 <= levels <= MAX_SHARD_LEVELS:
+        raise ValueError(f"levels must be between 0 and {MAX_SHARD_LEVELS}, got {levels}")
+    # hash the key... so names that are not random (or share a prefix) are still spread evenly
+    digest = hashlib.blake2b(get_shard_key(name).encode(), digest_size=MAX_SHARD_LEVELS).hexdigest()
+    return PurePath(*(digest[2 * level:2 * level + 2] for level in range(levels)))
+
+
+def is_shard_directory(name: str) -> bool:
+    """
+    Is this the name of a shard directory (2 hex characters)?
+    Image directories are named after a uuid... so they never look like a shard.
+    """
+    return len(name) == 2 and all(character in string.hexdigits.lower() for character in name)
@@ -0,0 +1,103 @@
+"""
+This module contains functions for streaming a tar archive without building it in memory or on disk.
+
+A tar archive is a sequence of members. Each member is a 512 byte header followed by its content,
+padded with zeros to a multiple of 512 bytes. The archive ends with 2 blocks of zeros.
+So the archive can be produced one member (and one chunk of a member) at a time.
+"""
+import contextlib
+import io
+import logging
+import tarfile
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from app.schemas.logging import LogEntry
+from app.storage import get_storage_backend
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+# the size of every tar block
+BLOCK_SIZE = tarfile.BLOCKSIZE
+# how much of a file is read at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class TarMember:
+    """
+    A file to add to a streamed tar archive.
+    Exactly one of `path` or `content` is set.
+    """
+    name: str
+    modified_at: datetime
+    path: Path | None = None
+    content: bytes | None = None
+
+
+def _member_header(name: str, size: int, modified_at: datetime) -> bytes:
+    tarinfo = tarfile.TarInfo(name=name)
+    tarinfo.size = size
+    tarinfo.mtime = int(modified_at.timestamp())
+    tarinfo.mode = 0o644
+    # PAX headers allow long names and large files
+    return tarinfo.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _padding(size: int) -> bytes:
+    remainder = size % BLOCK_SIZE
+    return b"\0" * (BLOCK_SIZE - remainder) if remainder else b""
+
+
+def _iter_file_member(member: TarMember) -> Iterator[bytes]:
+    with contextlib.ExitStack() as stack:
+        try:
+            image_file = stack.enter_context(get_storage_backend().open_read(member.path))
+        except FileNotFoundError:
+            # the header has not been sent yet... so the member can be left out of the archive
+            log_data = LogEntry(
+                date_time=datetime.now(),
+                event="tar_stream",
+                details=f"Skipped {member.name}. {member.path} does not exist.",
+            )
+            logger.warning(log_data.model_dump_json())
+            return
+        # the size comes from the open file... so it matches the bytes that are read
+        size = image_file.seek(0, io.SEEK_END)
+        image_file.seek(0)
+        yield _member_header(member.name, size, member.modified_at)
+        remaining = size
+        while remaining > 0:
+            chunk = image_file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                # the file was truncated while it was being read... keep the archive valid
+                chunk = b"\0" * min(CHUNK_SIZE, remaining)
+            remaining -= len(chunk)
+            yield chunk
+        yield _padding(size)
+
+
+def iter_tar(members: Iterable[TarMember]) -> Iterator[bytes]:
+    """
+    Yields a tar archive chunk by chunk.
+
+    Only one file is open at a time and at most CHUNK_SIZE bytes of it are held in memory.
+    Files that no longer exist are left out.
+
+    Args:
+        members (Iterable[TarMember]): the files to put in the archive, in order.
+    Returns:
+        Iterator[bytes]: The bytes of the archive.
+    """
+    for member in members:
+        if member.path is not None:
+            yield from _iter_file_member(member)
+        else:
+            yield _member_header(member.name, len(member.content), member.modified_at)
+            yield member.content
+            yield _padding(len(member.content))
+    # the end of archive marker
+    yield b"\0" * (2 * BLOCK_SIZE)
@@ -0,0 +1,180 @@
+"""
+This module contains functions for running neighbourhood operations on an image one tile at a time.
+
+A neighbourhood operation (example: a blur or a rank filter) computes each output pixel from a window of input pixels.
+Each tile is read with a `halo` of extra pixels around it so the pixels at the edge of the tile see the same
+neighbours they would see in the full image. The result for each tile is written into a single preallocated output.
+
+A slow operation on a smaller image can be run a block of rows at a time instead... so a cancelled job stops
+at the next block (see app/internal/cancellation.py) rather than after the whole image.
+"""
+from collections.abc import Callable, Iterator
+
+import numpy
+
+from app.internal.cancellation import get_cancellation_token
+from app.internal.parallel import parallel_map
+
+# the height and width of a tile in pixels
+TILE_SIZE = 1024
+# images with more pixels than this are processed tile by tile
+TILING_THRESHOLD_PIXELS = 4096 * 4096
+# the fewest rows in a block of a cancellable operation... more for a large halo
+# ... every block reads 2 x halo extra rows, so blocks of at least 8 x halo rows recompute at most 25% more.
+CANCELLATION_BLOCK_ROWS = 256
+
+
+def halo_for_size(size: int) -> int:
+    """
+    The halo needed by a filter with a square window.
+
+    Args:
+        size (int): the width of the filter window in pixels.
+    Returns:
+        int: The number of pixels needed on each side of a tile.
+    """
+    # scipy centres a window of `size` pixels on `size // 2`
+    # ... so the window never reaches further than that from the centre.
+    return size // 2
+
+
+def halo_for_sigma(sigma: float, truncate: float = 4.0) -> int:
+    """
+    The halo needed by a gaussian filter.
+
+    Args:
+        sigma (float): the standard deviation of the gaussian kernel.
+        truncate (float): the number of standard deviations where the kernel is cut off.
+    Returns:
+        int: The number of pixels needed on each side of a tile.
+    """
+    # this is the kernel radius used by scipy.ndimage.gaussian_filter
+    return int(truncate * float(sigma) + 0.5)
+
+
+def iter_tiles(
+        shape: tuple[int, ...],
+        tile_size: int = TILE_SIZE,
+        tile_width: int | None = None,
+) -> Iterator[tuple[slice, slice]]:
+    """
+    Yields the row and column slices of every tile covering an image.
+    Tiles are `tile_size` pixels high and `tile_width` (defaults to `tile_size`) pixels wide.
+    """
+    height, width = shape[:2]
+    if tile_width is None:
+        tile_width = tile_size
+    for row_start in range(0, height, tile_size):
+        for column_start in range(0, width, tile_width):
+            yield (
+                slice(row_start, min(row_start + tile_size, height)),
+                slice(column_start, min(column_start + tile_width, width)),
+            )
+
+
+def process_in_tiles(
+        image_data: numpy.ndarray,
+        function: Callable[[numpy.ndarray], numpy.ndarray],
+        halo: int,
+        tile_size: int = TILE_SIZE,
+        output: numpy.ndarray | None = None,
+        parallel: bool = False,
+        tile_width: int | None = None,
+) -> numpy.ndarray:
+    """
+    Applies a neighbourhood operation to an image one tile at a time.
+
+    Args:
+        image_data (numpy.array): the image data to process.
+        function (Callable): the operation. It takes a tile (including its halo) and returns an array with the same height and width.
+        halo (int): the number of extra pixels read on each side of a tile.
+        tile_size (int): the height and width of a tile in pixels.
+        output (numpy.array): where to write the result. Defaults to a new array shaped by the result of the first tile.
+        parallel (bool): process the tiles on the shared thread pool.
+        tile_width (int): the width of a tile in pixels, if it is not `tile_size`.
+    Returns:
+        numpy.array: The newly processed image.
+    """
+    if halo < 0:
+        raise ValueError(f"halo must not be negative. Got {halo}.")
+    if tile_size < 1:
+        raise ValueError(f"tile_size must be a positive integer. Got {tile_size}.")
+    if tile_width is not None and tile_width < 1:
+        raise ValueError(f"tile_width must be a positive integer. Got {tile_width}.")
+    height, width = image_data.shape[:2]
+    if output is not None and output.shape[:2] != (height, width):
+        raise ValueError("output must have the same height and width as image_data.")
+
+    def process_tile(tile: tuple[slice, slice]) -> None:
+        nonlocal output
+        rows, columns = tile
+        # read the tile with its halo... but never beyond the edge of the image
+        # ... the image boundary is then handled by the operation exactly as it would be without tiling.
+        row_start = max(rows.start - halo, 0)
+        column_start = max(columns.start - halo, 0)
+        padded_tile = image_data[
+            row_start:min(rows.stop + halo, height),
+            column_start:min(columns.stop + halo, width),
+        ]
+        result = function(padded_tile)
+        if output is None:
+            # the operation decides the dtype and number of channels of the output
+            output = numpy.empty((height, width, *result.shape[2:]), dtype=result.dtype)
+        # keep the centre of the result and throw the halo away
+        output[rows, columns] = result[
+            rows.start - row_start:rows.stop - row_start,
+            columns.start - column_start:columns.stop - column_start,
+        ]
+
+    tiles = list(iter_tiles(image_data.shape, tile_size, tile_width))
+    # the first tile is processed on its own so the output exists before any threads start
+    process_tile(tiles[0])
+    if parallel:
+        # tiles write to separate regions of the output so the order they finish in does not matter
+        parallel_map(process_tile, tiles[1:])
+    else:
+        for tile in tiles[1:]:
+            process_tile(tile)
+    return output
+
+
+def apply_neighbourhood_operation(
+        image_data: numpy.ndarray,
+        function: Callable[[numpy.ndarray], numpy.ndarray],
+        halo: int,
+        cancellable: bool = False,
+) -> numpy.ndarray:
+    """
+    Applies a neighbourhood operation to a whole image.
+    Large images are processed tile by tile so the intermediate arrays stay small.
+    The tiles are spread across the shared thread pool.
+
+    Args:
+        image_data (numpy.array): the image data to process.
+        function (Callable): the operation. It takes an image and returns an array with the same height and width.
+        halo (int): the number of extra pixels the operation needs on each side of a tile.
+        cancellable (bool): inside a job, process a smaller image in blocks of rows... a cancelled job stops
+            at the next block. Only worth the recomputed halos for operations that are slow for every pixel.
+    Returns:
+        numpy.array: The newly processed image.
+    """
+    height, width = image_data.shape[:2]
+    if height * width <= TILING_THRESHOLD_PIXELS:
+        block_rows = max(CANCELLATION_BLOCK_ROWS, 8 * halo)
+        if cancellable and height > block_rows and get_cancellation_token() is not None:
+            return process_in_tiles(
+                image_data=image_data,
+                function=function,
+                halo=halo,
+                tile_size=block_rows,
+                tile_width=width,
+                parallel=True,
+            )
+        return function(image_data)
+    return process_in_tiles(
+        image_data=image_data,
+        function=function,
+        halo=halo,
+        tile_size=TILE_SIZE,
+        parallel=True,
+    )
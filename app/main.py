@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import json
 import logging.config
 from contextlib import asynccontextmanager
@@ -6,14 +8,29 @@ from pathlib import Path
 from fastapi import FastAPI
 
 from app.db.database import create_db_and_tables
-from app.routers import health, image, user
+from app.internal.parallel import shutdown_executor
+from app.routers import files, health, image, user
+from app.services.image import cancel_submitted_jobs
+from app.services.job import run_job_status_listener
+from app.services.reaper import run_reaper
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("creating database and tables...")
     create_db_and_tables()
+    # remove the files of deleted images in the background
+    reaper_task = asyncio.create_task(run_reaper())
+    # wake the clients waiting for a job... and stop the jobs cancelled through another worker
+    listener_task = asyncio.create_task(run_job_status_listener())
     yield
+    # jobs submitted with `/augment/{id}/async` are recorded as cancelled instead of left running
+    await cancel_submitted_jobs()
+    for task in (reaper_task, listener_task):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    shutdown_executor()
     print('application shutdown.')
 
 def set_up_logging():
@@ -29,4 +46,5 @@ logger = logging.getLogger(__name__)
 app.include_router(image.router, prefix="/image-api")
 app.include_router(health.router, prefix="/healthcheck-api")
 app.include_router(user.router, prefix="/users-api")
+app.include_router(files.router, prefix="/files-api")
 
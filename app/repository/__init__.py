@@ -1,23 +1,90 @@
 from .user import (
     create_user,
-    get_user_by_external_id
+    get_user_by_external_id,
+    stream_User_ids,
+    read_existing_User_ids,
 )
 from .image  import (
     write_unprocessed_image_to_disc,
     read_unprocessed_image_from_disc,
     write_processed_image_to_disc,
+    reference_ImageBlob_entry,
+    release_ImageBlob_references,
+    reclaim_orphaned_ImageBlob_entries,
     create_UnprocessedImage_entry,
     create_ProcessedImage_entry,
     read_UnprocessedImage_entry,
-    read_ProcessedImage_entry
+    read_ProcessedImage_entry,
+    create_ProcessingJob_entry,
+    read_ProcessingJob_entry,
+    read_cancelled_ProcessingJob_ids,
+    update_ProcessingJob_entry,
+    complete_ProcessingJob_entry,
+    count_ProcessedImage_entries,
+    read_ProcessedImage_entries_with_requests,
+    read_UnprocessedImage_entries,
+    read_ProcessedImage_entries,
+    stream_UnprocessedImage_files,
+    stream_ProcessedImage_files,
+    stream_referenced_ImageBlob_hashes,
+    read_existing_ImageBlob_hashes,
+    read_UnprocessedImage_ids_by_content_hash,
+    delete_UnprocessedImage_entries,
+    delete_ProcessedImage_entries,
 )
-from .image_processing import process_image
+from .image_processing import estimate_processing_cost, process_image
 from .directory_manager import (
-    does_unprocessed_image_file_exist,
     get_unprocessed_image_location,
-    does_processed_image_file_exist,
     get_processed_image_location,
     create_unprocessed_user_directory,
     create_processed_user_directory,
     create_processed_image_directory,
+    delete_unprocessed_user_directory,
+    delete_processed_user_directory,
+    delete_processed_image_directory,
+    reap_tombstones,
 )
+
+__all__ = [
+    "create_user",
+    "get_user_by_external_id",
+    "stream_User_ids",
+    "read_existing_User_ids",
+    "write_unprocessed_image_to_disc",
+    "read_unprocessed_image_from_disc",
+    "write_processed_image_to_disc",
+    "reference_ImageBlob_entry",
+    "release_ImageBlob_references",
+    "reclaim_orphaned_ImageBlob_entries",
+    "create_UnprocessedImage_entry",
+    "create_ProcessedImage_entry",
+    "read_UnprocessedImage_entry",
+    "read_ProcessedImage_entry",
+    "create_ProcessingJob_entry",
+    "read_ProcessingJob_entry",
+    "read_cancelled_ProcessingJob_ids",
+    "update_ProcessingJob_entry",
+    "complete_ProcessingJob_entry",
+    "count_ProcessedImage_entries",
+    "read_ProcessedImage_entries_with_requests",
+    "read_UnprocessedImage_entries",
+    "read_ProcessedImage_entries",
+    "stream_UnprocessedImage_files",
+    "stream_ProcessedImage_files",
+    "stream_referenced_ImageBlob_hashes",
+    "read_existing_ImageBlob_hashes",
+    "read_UnprocessedImage_ids_by_content_hash",
+    "delete_UnprocessedImage_entries",
+    "delete_ProcessedImage_entries",
+    "estimate_processing_cost",
+    "process_image",
+    "get_unprocessed_image_location",
+    "get_processed_image_location",
+    "create_unprocessed_user_directory",
+    "create_processed_user_directory",
+    "create_processed_image_directory",
+    "delete_unprocessed_user_directory",
+    "delete_processed_user_directory",
+    "delete_processed_image_directory",
+    "reap_tombstones",
+]
@@ -1,55 +1,144 @@
 """
 This module contains a number of functions for creating, reading and deleting directories.
+
+Every file is read and written through the storage backend (see app/storage)...
+so the same functions work with local volumes and an object store.
+Every storage call runs in a storage I/O thread (see app/internal/blocking_io.py)...
+so a slow volume never blocks the event loop.
 """
+import contextlib
+import os
 import uuid
+from dataclasses import dataclass
 from pathlib import Path
 
 import numpy
 from PIL import Image
 
-from app.config import settings
+from app.config import VOLUME_PATHS, settings
 from app.exceptions import (
-    ImageAlreadyExists,
     ImageDirectoryAlreadyExists,
     UserDirectoryAlreadyExists,
 )
+from app.internal.blocking_io import run_blocking_io
+from app.internal.content_addressing import get_blob_relative_path
 from app.internal.file_handling import translate_file_to_numpy_array
+from app.internal.sharding import MAX_SHARD_LEVELS, get_shard_directories
+from app.storage import TOMBSTONE_DIRECTORY, get_storage_backend
+
+
+@dataclass
+class ReapResult:
+    """
+    What a call to reap_tombstones removed.
+    """
+    files: int = 0
+    bytes: int = 0
+    # tombstones that still have files in them
+    pending: int = 0
+
+
+def get_sharded_path(
+        user_dir_path: Path,
+        name: str,
+        levels: int | None = None,
+) -> Path:
+    """
+    The location of a file or directory inside a user directory.
+    It is under `levels` shard directories... STORAGE_SHARD_LEVELS if levels is not given.
+    """
+    if levels is None:
+        levels = settings.STORAGE_SHARD_LEVELS
+    return user_dir_path / get_shard_directories(name, levels) / name
 
-# Define a mapping from volume names to the in-container paths for easy lookup
-VOLUME_PATHS = {
-    "unprocessed_image_data": settings.UNPROCESSED_IMAGE_PATH,
-    "processed_image_data": settings.PROCESSED_IMAGE_PATH,
-}
+def _resolve_sharded_path(
+        user_dir_path: Path,
+        name: str,
+) -> Path:
+    # new files are stored with the configured layout...
+    # ... files stored before the layout changed are found until they are resharded
+    storage = get_storage_backend()
+    sharded_path = get_sharded_path(user_dir_path, name)
+    # every check is a round trip to an object store... and its keys are never in another layout
+    if not storage.has_other_layouts:
+        return sharded_path
+    if storage.exists(sharded_path):
+        return sharded_path
+    for levels in range(MAX_SHARD_LEVELS + 1):
+        other_path = get_sharded_path(user_dir_path, name, levels)
+        if other_path != sharded_path and storage.exists(other_path):
+            return other_path
+    # a reshard may have moved the file while we looked... it is now where it should be
+    return sharded_path
 
-async def does_unprocessed_image_file_exist(
+def _make_shard_directories(
+        user_dir_path: Path,
+        path: Path,
+) -> None:
+    # only the shard directories are made... a user directory that was just deleted is never made again
+    # ... the write then fails with FileNotFoundError instead of leaving an orphan behind
+    storage = get_storage_backend()
+    for shard_dir_path in reversed(path.parents):
+        if shard_dir_path.is_relative_to(user_dir_path) and shard_dir_path != user_dir_path:
+            storage.make_directory(shard_dir_path, exist_ok=True, parents=False)
+
+def _unprocessed_image_path(
         user_id: uuid.UUID,
-        unprocessed_image_storage_filename: str,
-) -> bool:
-    filepath = VOLUME_PATHS["unprocessed_image_data"] / str(user_id) / unprocessed_image_storage_filename
-    return filepath.exists()
+        storage_filename: str,
+        content_hash: str | None,
+) -> Path:
+    # images uploaded before deduplication have no hash... they are under the user directory
+    if content_hash is None:
+        return _resolve_sharded_path(VOLUME_PATHS["unprocessed_image_data"] / str(user_id), storage_filename)
+    return get_unprocessed_blob_location(content_hash)
+
+def _processed_image_directory_path(
+        user_id: uuid.UUID,
+        unprocessed_image_id: uuid.UUID,
+) -> Path:
+    return _resolve_sharded_path(VOLUME_PATHS["processed_image_data"] / str(user_id), str(unprocessed_image_id))
+
+def get_unprocessed_blob_location(
+        content_hash: str,
+) -> Path:
+    """
+    The location of the file holding every unprocessed image uploaded with these bytes.
+    """
+    return VOLUME_PATHS["unprocessed_image_data"] / get_blob_relative_path(content_hash)
 
 async def get_unprocessed_image_location(
         user_id: uuid.UUID,
         unprocessed_image_storage_filename: str,
+        content_hash: str | None = None,
 ) -> Path:
-    filepath = VOLUME_PATHS["unprocessed_image_data"] / str(user_id) / unprocessed_image_storage_filename
+    # finding the layout an image is stored in checks the storage
+    filepath = await run_blocking_io(_unprocessed_image_path, user_id, unprocessed_image_storage_filename, content_hash)
     return filepath
 
-async def does_processed_image_file_exist(
-        user_id: uuid.UUID,
-        unprocessed_image_id: uuid.UUID,
-        processed_image_storage_filename: str,
+async def does_unprocessed_blob_exist(
+        content_hash: str,
 ) -> bool:
-    filepath = VOLUME_PATHS["processed_image_data"] / str(user_id) / str(unprocessed_image_id) / processed_image_storage_filename
-    return filepath.exists()
+    filepath = get_unprocessed_blob_location(content_hash)
+    return await run_blocking_io(get_storage_backend().exists, filepath)
 
 async def get_processed_image_location(
         user_id: uuid.UUID,
         unprocessed_image_id: uuid.UUID,
         processed_image_storage_filename: str,
 ) -> Path:
-    filepath = VOLUME_PATHS["processed_image_data"] / str(user_id) / str(unprocessed_image_id) / processed_image_storage_filename
-    return filepath
+    # finding the layout an image is stored in checks the storage
+    image_dir_path = await run_blocking_io(_processed_image_directory_path, user_id, unprocessed_image_id)
+    return image_dir_path / processed_image_storage_filename
+
+def _make_user_directory(user_dir_path: Path) -> Path:
+    # check if subdirectory exists
+    try:
+        get_storage_backend().make_directory(user_dir_path, exist_ok=False)
+        return user_dir_path
+    except FileExistsError:
+        raise UserDirectoryAlreadyExists(
+            f"{user_dir_path} already exists."
+        )
 
 async def create_unprocessed_user_directory(
         user_id: uuid.UUID,
@@ -59,26 +148,43 @@ async def create_unprocessed_user_directory(
     """
     # create the path object
     user_dir_path = VOLUME_PATHS["unprocessed_image_data"] / str(user_id)
-    # check if subdirectory exists
-    try:
-        user_dir_path.mkdir(parents=False, exist_ok=False)
-        return user_dir_path
-    except FileExistsError:
-        raise UserDirectoryAlreadyExists(
-            f"{user_dir_path} already exists."
-        )
+    return await run_blocking_io(_make_user_directory, user_dir_path)
 
 
 async def delete_unprocessed_user_directory(
         user_id: uuid.UUID,
-) -> None:
+) -> Path | None:
     """
     Delete the entire subdirectory of unprocessed images for a particular user.
+    The directory is moved to a tombstone straight away... its files are removed by reap_tombstones.
+    Returns the tombstone, or None if the directory does not exist.
     """
-    # TODO: check if subdirectory exists
-    # /image-augmentation-service/data/images/unprocessed/{user_id}/
-    # TODO: delete subdirectory and all internal contents
-    return None
+    user_dir_path = VOLUME_PATHS["unprocessed_image_data"] / str(user_id)
+    return await run_blocking_io(get_storage_backend().delete, user_dir_path)
+
+def _save_png(image_data: numpy.ndarray, image_filepath: Path) -> Path:
+    # convert the numpy array to a Pillow Image object.
+    image = Image.fromarray(
+        obj=image_data,
+    )
+    # a crash while encoding never leaves a truncated PNG under the real name (see StorageBackend.open_write)
+    with get_storage_backend().open_write(image_filepath) as image_file:
+        # save the image object to the save location in PNG format
+        image.save(
+            fp= image_file,
+            format='PNG'
+        )
+    return image_filepath
+
+def _write_unprocessed_image(
+        image_data: numpy.ndarray,
+        user_id: uuid.UUID,
+        storage_filename: str,
+) -> Path:
+    user_dir_path = VOLUME_PATHS["unprocessed_image_data"] / str(user_id)
+    image_filepath = get_sharded_path(user_dir_path, storage_filename)
+    _make_shard_directories(user_dir_path, image_filepath)
+    return _save_png(image_data, image_filepath)
 
 async def write_unprocessed_image(
         image_data: numpy.ndarray,
@@ -88,42 +194,55 @@ async def write_unprocessed_image(
     """
     Write an unprocessed image file to the filesystem.
     """
-    # check if the file exists
-    image_filepath = VOLUME_PATHS["unprocessed_image_data"] / str(user_id) / storage_filename
-    try:
-        # convert the numpy array to a Pillow Image object.
-        image = Image.fromarray(
-            obj=image_data,
-        )
-        # save the image object to the save location in PNG format
-        image.save(
-            fp= str(image_filepath),
-            format='PNG'
-        )
-        return image_filepath
-    except FileExistsError:
-        raise ImageAlreadyExists(
-            f"{image_filepath} already exists."
-        )
+    return await run_blocking_io(_write_unprocessed_image, image_data, user_id, storage_filename)
 
 
-async def read_unprocessed_image(
+def _write_unprocessed_blob(
+        image_data: numpy.ndarray,
+        content_hash: str,
+) -> Path:
+    image_filepath = get_unprocessed_blob_location(content_hash)
+    get_storage_backend().make_directory(image_filepath.parent, exist_ok=True)
+    return _save_png(image_data, image_filepath)
+
+async def write_unprocessed_blob(
+        image_data: numpy.ndarray,
+        content_hash: str,
+) -> Path:
+    """
+    Write the file of a content addressed unprocessed image to the filesystem.
+
+    Two uploads of the same bytes can write the same blob at the same time.
+    Each writes its own temporary file and renames it into place... the last rename wins with the same bytes.
+    """
+    return await run_blocking_io(_write_unprocessed_blob, image_data, content_hash)
+
+
+def _read_unprocessed_image(
         user_id: uuid.UUID,
         storage_filename: str,
+        content_hash: str | None,
 ) -> numpy.ndarray:
-    """
-    Write an unprocessed image file to the filesystem.
-    """
     # check if the file exists
-    image_filepath = VOLUME_PATHS["unprocessed_image_data"] / str(user_id) / storage_filename
+    image_filepath = _unprocessed_image_path(user_id, storage_filename, content_hash)
     # TODO: file not found
     # read image file as bytes
-    with open(file=image_filepath, mode='rb') as image_content:
+    with get_storage_backend().open_read(image_filepath) as image_content:
         # Wrap raw byte content to an in-memory binary stream.
         # This allows Pillow to use it like a file without persisting to disk.
         image_data = translate_file_to_numpy_array(image_content.read())
         return image_data
 
+async def read_unprocessed_image(
+        user_id: uuid.UUID,
+        storage_filename: str,
+        content_hash: str | None = None,
+) -> numpy.ndarray:
+    """
+    Read an unprocessed image file from the filesystem.
+    """
+    return await run_blocking_io(_read_unprocessed_image, user_id, storage_filename, content_hash)
+
 
 async def create_processed_user_directory(
         user_id: uuid.UUID,
@@ -133,46 +252,61 @@ async def create_processed_user_directory(
     """
     # create the path object
     user_dir_path = VOLUME_PATHS["processed_image_data"] / str(user_id)
-    # check if subdirectory exists
-    try:
-        user_dir_path.mkdir(parents=False, exist_ok=False)
-        return user_dir_path
-    except FileExistsError:
-        raise UserDirectoryAlreadyExists(
-            f"{user_dir_path} already exists."
-        )
+    return await run_blocking_io(_make_user_directory, user_dir_path)
 
 
 async def delete_processed_user_directory(
         user_id: uuid.UUID,
-) -> None:
+) -> Path | None:
     """
     Delete the entire subdirectory of processed images for a particular user.
+    The directory is moved to a tombstone straight away... its files are removed by reap_tombstones.
+    Returns the tombstone, or None if the directory does not exist.
     """
-    # TODO: check if subdirectory exists
-    # /image-augmentation-service/data/images/processed/{user_id}/
-    # TODO: delete subdirectory and all internal contents
-    return None
+    user_dir_path = VOLUME_PATHS["processed_image_data"] / str(user_id)
+    return await run_blocking_io(get_storage_backend().delete, user_dir_path)
 
 
+def _make_processed_image_directory(user_dir_path: Path, image_dir_path: Path) -> Path:
+    # the shard directories are shared by many images... only the image directory must be new
+    _make_shard_directories(user_dir_path, image_dir_path)
+    # check if subdirectory exists
+    try:
+        get_storage_backend().make_directory(image_dir_path, exist_ok=False, parents=False)
+        return image_dir_path
+    except FileExistsError:
+        raise ImageDirectoryAlreadyExists(
+            f"{image_dir_path} already exists."
+        )
+
 async def create_processed_image_directory(
         user_id: uuid.UUID,
         image_id: uuid.UUID,
-) -> None:
+) -> Path:
     """
     Create a processed image directory.
     """
-    user_dir_path = VOLUME_PATHS["processed_image_data"] / str(user_id) / str(image_id)
-    # check if subdirectory exists
-    try:
-        user_dir_path.mkdir(parents=False, exist_ok=False)
-        return user_dir_path
-    except FileExistsError:
-        raise ImageDirectoryAlreadyExists(
-            f"{user_dir_path} already exists."
-        )
+    user_dir_path = VOLUME_PATHS["processed_image_data"] / str(user_id)
+    image_dir_path = get_sharded_path(user_dir_path, str(image_id))
+    return await run_blocking_io(_make_processed_image_directory, user_dir_path, image_dir_path)
 
 
+def _write_processed_image(
+        image_data: numpy.ndarray,
+        user_id: uuid.UUID,
+        unprocessed_image_id: uuid.UUID,
+        storage_filename: str,
+) -> Path:
+    image_filepath = _processed_image_directory_path(user_id, unprocessed_image_id) / storage_filename
+    try:
+        return _save_png(image_data, image_filepath)
+    except FileNotFoundError:
+        # a reshard moved the image directory while the image was written... it is written again at its new location
+        # ... a deleted image directory is not found again and the write fails
+        moved_filepath = _processed_image_directory_path(user_id, unprocessed_image_id) / storage_filename
+        if moved_filepath == image_filepath:
+            raise
+        return _save_png(image_data, moved_filepath)
 
 async def write_processed_image(
         image_data: numpy.ndarray,
@@ -181,33 +315,94 @@ async def write_processed_image(
         storage_filename: str,
 ) -> Path:
     """
-    Write an unprocessed image file to the filesystem.
+    Write a processed image file to the filesystem.
     """
-    image_filepath = VOLUME_PATHS["processed_image_data"] / str(user_id) / str(unprocessed_image_id) / storage_filename
-    try:
-        # convert the numpy array to a Pillow Image object.
-        image = Image.fromarray(
-            obj=image_data,
-        )
-        # save the image object to the save location in PNG format
-        image.save(
-            fp= str(image_filepath),
-            format='PNG'
-        )
-        return image_filepath
-    except FileExistsError:
-        raise ImageAlreadyExists(
-            f"{image_filepath} already exists."
-        )
+    return await run_blocking_io(_write_processed_image, image_data, user_id, unprocessed_image_id, storage_filename)
 
 async def delete_processed_image_directory(
         user_id: uuid.UUID,
         image_id: uuid.UUID,
-) -> None:
+) -> Path | None:
     """
     Delete a processed image directory.
+    The directory is moved to a tombstone straight away... its files are removed by reap_tombstones.
+    Returns the tombstone, or None if the directory does not exist.
+    """
+    def _delete() -> Path | None:
+        image_dir_path = _processed_image_directory_path(user_id, image_id)
+        return get_storage_backend().delete(image_dir_path)
+    return await run_blocking_io(_delete)
+
+
+async def delete_unprocessed_blob(
+        content_hash: str,
+) -> list[Path]:
+    """
+    Delete the file (and previews) of a content addressed unprocessed image.
+    Only call this once nothing references the blob.
+    The files are moved to tombstones straight away... they are removed by reap_tombstones.
+    """
+    def _delete() -> list[Path]:
+        storage = get_storage_backend()
+        blob_path = get_unprocessed_blob_location(content_hash)
+        # the blob and its previews: {hash}.png, {hash}.128.webp, ...
+        return [
+            storage.delete(path)
+            for path in storage.list_files(blob_path.parent)
+            if path.name.startswith(f"{content_hash}.")
+        ]
+    return await run_blocking_io(_delete)
+
+
+def _reap_file(file_path: Path, result: ReapResult) -> None:
+    # every worker runs the reaper... another one may have removed the file first
+    # ... only the files this process removed are counted
+    with contextlib.suppress(FileNotFoundError):
+        size = file_path.lstat().st_size
+        file_path.unlink()
+        result.bytes += size
+        result.files += 1
+
+def _reap_tombstones(batch_size: int) -> ReapResult:
+    result = ReapResult()
+    for volume_path in VOLUME_PATHS.values():
+        tombstones_path = volume_path / TOMBSTONE_DIRECTORY
+        if not tombstones_path.exists():
+            continue
+        for tombstone_path in sorted(tombstones_path.iterdir()):
+            if result.files >= batch_size:
+                result.pending += 1
+                continue
+            if tombstone_path.is_file() or tombstone_path.is_symlink():
+                _reap_file(tombstone_path, result)
+                continue
+            # files first (deepest first)... then the directories they were in
+            for dir_path, dir_names, file_names in os.walk(tombstone_path, topdown=False):
+                for file_name in file_names:
+                    if result.files >= batch_size:
+                        break
+                    _reap_file(Path(dir_path) / file_name, result)
+                for dir_name in dir_names:
+                    # not empty if the batch ran out
+                    with contextlib.suppress(OSError):
+                        (Path(dir_path) / dir_name).rmdir()
+            try:
+                tombstone_path.rmdir()
+            except FileNotFoundError:
+                # another worker removed it
+                pass
+            except OSError:
+                result.pending += 1
+    return result
+
+
+async def reap_tombstones(
+        batch_size: int,
+) -> ReapResult:
+    """
+    Remove the files of deleted directories.
+    At most `batch_size` files are removed... so a very large deletion never holds a storage I/O thread for long.
+    Call it again while ReapResult.pending is not 0.
+    An object store deletes files straight away... it has no tombstones.
     """
-    # TODO: check if subdirectory exists
-    # /image-augmentation-service/data/images/processed/{user_id}/{image_id}
-    # TODO: delete subdirectory
-    return None
\ No newline at end of file
+    return await run_blocking_io(_reap_tombstones, batch_size)
\ No newline at end of file
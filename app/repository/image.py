@@ -1,43 +1,65 @@
 import uuid
+from collections.abc import Collection
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
 
 import numpy
 import sqlalchemy
 from fastapi import Depends
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from app.db.database import get_async_session
-from app.exceptions import ImageNotFound
+from app.exceptions import ImageNotFound, JobAlreadyExists, JobNotFound
 from app.internal.file_handling import translate_file_to_numpy_array
+from app.internal.job_notifications import JOB_STATUS_CHANNEL, encode_job_status
 from app.repository.directory_manager import (
+    delete_unprocessed_blob,
+    does_unprocessed_blob_exist,
+    get_unprocessed_blob_location,
     read_unprocessed_image,
     write_processed_image,
-    write_unprocessed_image,
+    write_unprocessed_blob,
+)
+from app.schemas.transactions_db import (
+    ImageBlob,
+    JobPriority,
+    JobStatus,
+    ProcessedImage,
+    ProcessingJob,
+    UnprocessedImage,
 )
-from app.schemas.transactions_db import ProcessedImage, UnprocessedImage
 
 
 async def write_unprocessed_image_to_disc(
     image_content: bytes,
-    user_id: uuid.UUID,
-    storage_filename=str,
-) -> None:
+    content_hash: str,
+) -> tuple[Path, bool]:
     """
-    Store an unprocessed image in the block storage.
+    Store an unprocessed image in the block storage under the hash of its content.
+    If the same bytes were uploaded before the stored file is reused... and the upload is never decoded.
+    Returns where the image is stored and whether it was written by this call.
     """
-    # convert the raw image bytes into a numpy array
-    image_data = translate_file_to_numpy_array(image_content)
+    file_location = get_unprocessed_blob_location(content_hash)
+    if await does_unprocessed_blob_exist(content_hash):
+        return file_location, False
+    # convert the raw image bytes into a numpy array... decoding a large image would stall the event loop
+    image_data = await run_in_threadpool(translate_file_to_numpy_array, image_content)
     # save the image
-    file_location = await write_unprocessed_image(
+    file_location = await write_unprocessed_blob(
         image_data=image_data,
-        user_id=user_id,
-        storage_filename=storage_filename,
+        content_hash=content_hash,
     )
     # tell the caller where the image was stored
-    return file_location
+    return file_location, True
 
 async def read_unprocessed_image_from_disc(
         user_id: uuid.UUID,
         storage_filename: str,
+        content_hash: str | None = None,
 ) -> numpy.ndarray:
     """
     Read an unprocessed image from the block storage.
@@ -45,6 +67,7 @@ async def read_unprocessed_image_from_disc(
     image_data = await read_unprocessed_image(
         user_id=user_id,
         storage_filename=storage_filename,
+        content_hash=content_hash,
     )
     return image_data
 
@@ -68,10 +91,88 @@ async def write_processed_image_to_disc(
     # tell the caller where the image was stored
     return file_location
 
+async def reference_ImageBlob_entry(
+    content_hash: str,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> int:
+    """
+    Create an ImageBlob entry... or add a reference to it if it already exists.
+    The change is committed with the UnprocessedImage entry that holds the reference.
+    The row stays locked until then... so the blob cannot be reclaimed while it is being stored.
+    Return the number of references to the blob.
+    """
+    # a single statement... so concurrent uploads of the same bytes never lose a reference
+    query = insert(ImageBlob).values(
+        content_hash=content_hash,
+        reference_count=1,
+        # a core insert does not run the default_factory of the model
+        created_at=datetime.now(UTC),
+    ).on_conflict_do_update(
+        index_elements=[ImageBlob.content_hash],
+        set_={"reference_count": ImageBlob.reference_count + 1},
+    ).returning(ImageBlob.reference_count)
+    result = await db_session.execute(query)
+    return result.scalar_one()
+
+
+async def release_ImageBlob_references(
+    user_id: uuid.UUID,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> None:
+    """
+    Remove the references the UnprocessedImage entries of a user hold on their ImageBlob entries.
+    Call this in the same transaction that deletes the entries... it is committed with them.
+    Blobs left with no references are removed by reclaim_orphaned_ImageBlob_entries.
+    """
+    references = sqlalchemy.select(
+        UnprocessedImage.content_hash,
+        sqlalchemy.func.count().label("reference_count"),
+    ).where(
+        UnprocessedImage.user_id == user_id,
+        UnprocessedImage.content_hash.is_not(None),
+    ).group_by(
+        UnprocessedImage.content_hash
+    ).subquery()
+    query = sqlalchemy.update(ImageBlob).where(
+        ImageBlob.content_hash == references.c.content_hash
+    ).values(
+        reference_count=ImageBlob.reference_count - references.c.reference_count
+    )
+    await db_session.execute(query)
+
+
+async def reclaim_orphaned_ImageBlob_entries(
+    limit: int,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> list[str]:
+    """
+    Delete up to `limit` ImageBlob entries that nothing references... and move their files to tombstones.
+    Return the hashes of the deleted blobs.
+    """
+    # the rows stay locked until the files are gone...
+    # ... an upload of the same bytes waits and then stores the file again
+    query = sqlalchemy.select(ImageBlob.content_hash).where(
+        ImageBlob.reference_count <= 0
+    ).limit(limit).with_for_update(skip_locked=True)
+    result = await db_session.execute(query)
+    content_hashes = list(result.scalars().all())
+    for content_hash in content_hashes:
+        await delete_unprocessed_blob(content_hash)
+    if content_hashes:
+        await db_session.execute(
+            sqlalchemy.delete(ImageBlob).where(ImageBlob.content_hash.in_(content_hashes))
+        )
+    await db_session.commit()
+    return content_hashes
+
+
 async def create_UnprocessedImage_entry(
     original_filename: str,
     storage_filename: str,
     user_id: uuid.UUID,
+    content_hash: str | None = None,
+    width: int | None = None,
+    height: int | None = None,
     db_session: AsyncSession = Depends(get_async_session)
 ) -> UnprocessedImage:
     """
@@ -83,6 +184,9 @@ async def create_UnprocessedImage_entry(
         original_filename=original_filename,
         storage_filename=storage_filename,
         user_id=user_id,
+        content_hash=content_hash,
+        width=width,
+        height=height,
     )
     # attempt to write it to the Transactions Database
     db_session.add(new_entry)
@@ -167,4 +271,450 @@ async def read_ProcessedImage_entry(
             f'Image with id {image_id} not found',
         )
     # return the entry
-    return entry
\ No newline at end of file
+    return entry
+
+
+async def create_ProcessingJob_entry(
+    unprocessed_image_id: uuid.UUID,
+    processed_image_id: uuid.UUID | None,
+    upload_request_body: dict[str, Any],
+    job_status: JobStatus,
+    requested_at: datetime,
+    started_at: datetime | None = None,
+    completed_at: datetime | None = None,
+    priority: JobPriority = JobPriority.NORMAL,
+    job_id: uuid.UUID | None = None,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> ProcessingJob:
+    """
+    Create a ProcessingJob entry.
+    Records the request that made (or failed to make) a processed image.
+    The client can choose the id... so it can cancel the job before the response arrives.
+    Raises JobAlreadyExists if another job has that id.
+    """
+    new_entry = ProcessingJob(
+        unprocessed_image_id=unprocessed_image_id,
+        processed_image_id=processed_image_id,
+        upload_request_body=upload_request_body,
+        job_status=job_status,
+        priority=priority,
+        requested_at=requested_at,
+        started_at=started_at,
+        completed_at=completed_at,
+    )
+    if job_id is not None:
+        new_entry.id = job_id
+    # attempt to write it to the Transactions Database
+    db_session.add(new_entry)
+    try:
+        await db_session.flush()
+    except IntegrityError as e:
+        await db_session.rollback()
+        raise JobAlreadyExists(f'Job with id {job_id} already exists') from e
+    await db_session.refresh(new_entry)
+    await db_session.commit()
+    # return the entry
+    return new_entry
+
+
+async def read_ProcessingJob_entry(
+    job_id: uuid.UUID,
+    user_id: uuid.UUID,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> ProcessingJob:
+    """
+    Find a ProcessingJob entry of a user.
+    Return the ProcessingJob entry if it exists.
+    """
+    # make the query
+    query = sqlalchemy.select(ProcessingJob).join(
+        UnprocessedImage,
+    ).where(
+        ProcessingJob.id == job_id,
+        UnprocessedImage.user_id == user_id
+    ).execution_options(
+        # a job changes status... so never return a stale copy from the session
+        populate_existing=True,
+    )
+    # execute the query
+    result = await db_session.execute(query)
+    # evaluate if entry exists
+    entry = result.scalar_one_or_none()
+    if entry is None:
+        raise JobNotFound(
+            f'Job with id {job_id} not found',
+        )
+    # return the entry
+    return entry
+
+
+async def read_cancelled_ProcessingJob_ids(
+    job_ids: Collection[uuid.UUID],
+    db_session: AsyncSession = Depends(get_async_session)
+) -> set[uuid.UUID]:
+    """
+    Find which of the given jobs have been cancelled.
+    """
+    query = sqlalchemy.select(ProcessingJob.id).where(
+        ProcessingJob.id.in_(job_ids),
+        ProcessingJob.job_status == JobStatus.CANCELLED,
+    )
+    result = await db_session.execute(query)
+    return set(result.scalars().all())
+
+
+async def _notify_job_status(job_id: uuid.UUID, job_status: JobStatus, db_session: AsyncSession) -> None:
+    # sent with the transaction... Postgres only delivers it if the move is committed
+    await db_session.execute(sqlalchemy.select(
+        sqlalchemy.func.pg_notify(JOB_STATUS_CHANNEL, encode_job_status(job_id, job_status))
+    ))
+
+
+async def update_ProcessingJob_entry(
+    job_id: uuid.UUID,
+    job_status: JobStatus,
+    processed_image_id: uuid.UUID | None = None,
+    started_at: datetime | None = None,
+    completed_at: datetime | None = None,
+    from_statuses: Collection[JobStatus] | None = None,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> bool:
+    """
+    Move a ProcessingJob entry to a new status.
+    Only the fields that are given are changed... a job keeps its started_at when it completes.
+    With from_statuses the job only moves if it is in one of them... a job cancelled by another
+    request is never moved back.
+    A job that moved notifies the clients waiting for it (see app/internal/job_notifications.py).
+    Return True if the job moved.
+    """
+    values: dict[str, Any] = {"job_status": job_status}
+    if processed_image_id is not None:
+        values["processed_image_id"] = processed_image_id
+    if started_at is not None:
+        values["started_at"] = started_at
+    if completed_at is not None:
+        values["completed_at"] = completed_at
+    query = sqlalchemy.update(ProcessingJob).where(
+        ProcessingJob.id == job_id
+    ).values(**values)
+    if from_statuses is not None:
+        query = query.where(ProcessingJob.job_status.in_(from_statuses))
+    result = await db_session.execute(query)
+    moved = result.rowcount > 0
+    if moved:
+        await _notify_job_status(job_id, job_status, db_session)
+    await db_session.commit()
+    return moved
+
+
+async def complete_ProcessingJob_entry(
+    job_id: uuid.UUID,
+    unprocessed_image_id: uuid.UUID,
+    storage_filename: str,
+    completed_at: datetime,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> ProcessedImage | None:
+    """
+    Create the ProcessedImage entry a job made and mark the job as succeeded... in a single transaction.
+    Return None (and create nothing) if the job is no longer processing... it was cancelled.
+    """
+    new_entry = ProcessedImage(
+        unprocessed_image_id=unprocessed_image_id,
+        storage_filename=storage_filename,
+    )
+    db_session.add(new_entry)
+    # the job refers to the image... so the image is written first
+    await db_session.flush()
+    query = sqlalchemy.update(ProcessingJob).where(
+        ProcessingJob.id == job_id,
+        ProcessingJob.job_status == JobStatus.PROCESSING,
+    ).values(
+        job_status=JobStatus.SUCCEEDED,
+        processed_image_id=new_entry.id,
+        completed_at=completed_at,
+    )
+    result = await db_session.execute(query)
+    if result.rowcount == 0:
+        await db_session.rollback()
+        return None
+    await _notify_job_status(job_id, JobStatus.SUCCEEDED, db_session)
+    await db_session.refresh(new_entry)
+    await db_session.commit()
+    return new_entry
+
+
+def _ProcessedImage_export_filter(
+    query: sqlalchemy.Select,
+    user_id: uuid.UUID,
+    unprocessed_image_id: uuid.UUID | None,
+) -> sqlalchemy.Select:
+    query = query.join(
+        UnprocessedImage,
+        ProcessedImage.unprocessed_image_id == UnprocessedImage.id,
+    ).where(
+        UnprocessedImage.user_id == user_id
+    )
+    if unprocessed_image_id is not None:
+        query = query.where(ProcessedImage.unprocessed_image_id == unprocessed_image_id)
+    return query
+
+
+async def count_ProcessedImage_entries(
+    user_id: uuid.UUID,
+    unprocessed_image_id: uuid.UUID | None = None,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> int:
+    """
+    Count the ProcessedImage entries of a user.
+    Only count the entries made from one UnprocessedImage if unprocessed_image_id is given.
+    """
+    query = _ProcessedImage_export_filter(
+        sqlalchemy.select(sqlalchemy.func.count(ProcessedImage.id)),
+        user_id=user_id,
+        unprocessed_image_id=unprocessed_image_id,
+    )
+    result = await db_session.execute(query)
+    return result.scalar_one()
+
+
+async def read_ProcessedImage_entries_with_requests(
+    user_id: uuid.UUID,
+    unprocessed_image_id: uuid.UUID | None = None,
+    offset: int = 0,
+    limit: int | None = None,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> list[tuple[ProcessedImage, dict[str, Any] | None]]:
+    """
+    Find the ProcessedImage entries of a user... oldest first.
+    Each entry comes with the request body of the ProcessingJob that made it.
+    The request body is None for images made before jobs were recorded.
+    """
+    query = _ProcessedImage_export_filter(
+        sqlalchemy.select(ProcessedImage, ProcessingJob.upload_request_body),
+        user_id=user_id,
+        unprocessed_image_id=unprocessed_image_id,
+    ).outerjoin(
+        ProcessingJob,
+        ProcessingJob.processed_image_id == ProcessedImage.id,
+    ).order_by(
+        ProcessedImage.created_at,
+        ProcessedImage.id,
+    ).offset(offset).limit(limit)
+    # execute the query
+    result = await db_session.execute(query)
+    return [tuple(row) for row in result.all()]
+
+
+def _is_after_key(
+    created_at_column: sqlalchemy.ColumnElement,
+    id_column: sqlalchemy.ColumnElement,
+    after: tuple[datetime, uuid.UUID],
+) -> sqlalchemy.ColumnElement[bool]:
+    # the key is bound with the column types... an untyped datetime would be cast to a timestamp without time zone
+    return sqlalchemy.tuple_(created_at_column, id_column) > sqlalchemy.tuple_(
+        *after,
+        types=[created_at_column.type, id_column.type],
+    )
+
+
+async def read_UnprocessedImage_entries(
+    user_id: uuid.UUID,
+    limit: int,
+    after: tuple[datetime, uuid.UUID] | None = None,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> list[UnprocessedImage]:
+    """
+    Find a page of the UnprocessedImage entries of a user... oldest first.
+    Only return the entries after the (created_at, id) key if `after` is given.
+    """
+    query = sqlalchemy.select(UnprocessedImage).where(
+        UnprocessedImage.user_id == user_id
+    )
+    if after is not None:
+        # a row comparison... so the database seeks to the key in the (user_id, created_at, id) index
+        query = query.where(
+            _is_after_key(UnprocessedImage.created_at, UnprocessedImage.id, after)
+        )
+    query = query.order_by(
+        UnprocessedImage.created_at,
+        UnprocessedImage.id,
+    ).limit(limit)
+    # execute the query
+    result = await db_session.execute(query)
+    return list(result.scalars().all())
+
+
+async def read_ProcessedImage_entries(
+    unprocessed_image_id: uuid.UUID,
+    user_id: uuid.UUID,
+    limit: int,
+    after: tuple[datetime, uuid.UUID] | None = None,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> list[ProcessedImage]:
+    """
+    Find a page of the ProcessedImage entries made from an UnprocessedImage... oldest first.
+    Only return the entries after the (created_at, id) key if `after` is given.
+    """
+    query = sqlalchemy.select(ProcessedImage).join(
+        UnprocessedImage,
+    ).where(
+        ProcessedImage.unprocessed_image_id == unprocessed_image_id,
+        UnprocessedImage.user_id == user_id
+    )
+    if after is not None:
+        # a row comparison... so the database seeks to the key in the (unprocessed_image_id, created_at, id) index
+        query = query.where(
+            _is_after_key(ProcessedImage.created_at, ProcessedImage.id, after)
+        )
+    query = query.order_by(
+        ProcessedImage.created_at,
+        ProcessedImage.id,
+    ).limit(limit)
+    # execute the query
+    result = await db_session.execute(query)
+    return list(result.scalars().all())
+
+
+async def _iter_key_batches(
+    query: sqlalchemy.Select,
+    key_column: sqlalchemy.ColumnElement,
+    batch_size: int,
+    db_session: AsyncSession,
+):
+    # keyset batches rather than a server side cursor... a cursor would be closed by the commits in between
+    after = None
+    while True:
+        batch_query = query.order_by(key_column).limit(batch_size)
+        if after is not None:
+            batch_query = batch_query.where(key_column > after)
+        rows = (await db_session.execute(batch_query)).all()
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        # the key is the first column of every row
+        after = rows[-1][0]
+
+
+async def stream_UnprocessedImage_files(
+    user_id: uuid.UUID,
+    batch_size: int,
+    db_session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Yield the (id, storage_filename, content_hash) of every UnprocessedImage entry of a user... `batch_size` rows at a time.
+    """
+    query = sqlalchemy.select(
+        UnprocessedImage.id,
+        UnprocessedImage.storage_filename,
+        UnprocessedImage.content_hash,
+    ).where(
+        UnprocessedImage.user_id == user_id
+    )
+    async for rows in _iter_key_batches(query, UnprocessedImage.id, batch_size, db_session):
+        yield rows
+
+
+async def stream_ProcessedImage_files(
+    user_id: uuid.UUID,
+    batch_size: int,
+    db_session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Yield the (id, unprocessed_image_id, storage_filename) of every ProcessedImage entry of a user...
+    `batch_size` rows at a time.
+    """
+    query = sqlalchemy.select(
+        ProcessedImage.id,
+        ProcessedImage.unprocessed_image_id,
+        ProcessedImage.storage_filename,
+    ).join(
+        UnprocessedImage,
+    ).where(
+        UnprocessedImage.user_id == user_id
+    )
+    async for rows in _iter_key_batches(query, ProcessedImage.id, batch_size, db_session):
+        yield rows
+
+
+async def stream_referenced_ImageBlob_hashes(
+    batch_size: int,
+    db_session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Yield the hash of every ImageBlob entry that is still referenced... `batch_size` hashes at a time.
+    """
+    query = sqlalchemy.select(ImageBlob.content_hash).where(
+        ImageBlob.reference_count > 0
+    )
+    async for rows in _iter_key_batches(query, ImageBlob.content_hash, batch_size, db_session):
+        yield [row.content_hash for row in rows]
+
+
+async def read_existing_ImageBlob_hashes(
+    content_hashes: list[str],
+    db_session: AsyncSession = Depends(get_async_session)
+) -> set[str]:
+    """
+    Find which of the hashes have an ImageBlob entry.
+    """
+    query = sqlalchemy.select(ImageBlob.content_hash).where(
+        ImageBlob.content_hash.in_(content_hashes)
+    )
+    result = await db_session.execute(query)
+    return set(result.scalars().all())
+
+
+async def read_UnprocessedImage_ids_by_content_hash(
+    content_hash: str,
+    db_session: AsyncSession = Depends(get_async_session)
+) -> list[uuid.UUID]:
+    """
+    Find the ids of the UnprocessedImage entries stored in a blob.
+    """
+    query = sqlalchemy.select(UnprocessedImage.id).where(
+        UnprocessedImage.content_hash == content_hash
+    )
+    result = await db_session.execute(query)
+    return list(result.scalars().all())
+
+
+async def delete_UnprocessedImage_entries(
+    image_ids: list[uuid.UUID],
+    db_session: AsyncSession = Depends(get_async_session)
+) -> None:
+    """
+    Delete UnprocessedImage entries with their ProcessedImage and ProcessingJob entries.
+    Their references on their ImageBlob entries are removed in the same transaction.
+    """
+    result = await db_session.execute(
+        sqlalchemy.select(UnprocessedImage).where(UnprocessedImage.id.in_(image_ids))
+    )
+    for entry in result.scalars().all():
+        if entry.content_hash is not None:
+            await db_session.execute(
+                sqlalchemy.update(ImageBlob).where(
+                    ImageBlob.content_hash == entry.content_hash
+                ).values(
+                    reference_count=ImageBlob.reference_count - 1
+                )
+            )
+        # the processed images and jobs are deleted by the cascade
+        await db_session.delete(entry)
+    await db_session.commit()
+
+
+async def delete_ProcessedImage_entries(
+    image_ids: list[uuid.UUID],
+    db_session: AsyncSession = Depends(get_async_session)
+) -> None:
+    """
+    Delete ProcessedImage entries. The jobs that made them are kept.
+    """
+    result = await db_session.execute(
+        sqlalchemy.select(ProcessedImage).where(ProcessedImage.id.in_(image_ids))
+    )
+    for entry in result.scalars().all():
+        # the job of the image no longer points at it
+        await db_session.delete(entry)
+    await db_session.commit()
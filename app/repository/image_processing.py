@@ -1,5 +1,8 @@
+import math
+
 import numpy
 
+from app.config import settings
 from app.internal.augmentations import (
     brighten,
     channel_swap,
@@ -16,12 +19,15 @@ from app.internal.augmentations import (
     percentile_filter,
     rainbow_noise,
     rotate,
+    salt_and_pepper_noise,
     salt_noise,
     shift,
     tint,
     uniform_blur,
     zoom,
 )
+from app.internal.cost_model import CostEstimate, estimate_cost
+from app.internal.scheduler import get_job_scheduler
 from app.schemas.image import AugmentationRequestBody
 
 # map a string in the input parameter to an augmentation function
@@ -41,15 +47,21 @@ PROCESSING_MAP = {
     'percentile_filter': percentile_filter,
     'rainbow_noise': rainbow_noise,
     'rotate': rotate,
+    'salt_and_pepper_noise': salt_and_pepper_noise,
     'salt_noise': salt_noise,
     'shift': shift,
     'tint': tint,
     'uniform_blur': uniform_blur,
     'zoom': zoom,
 }
+# augmentations that take a random number generator
+STOCHASTIC_PROCESSING = {
+    'pepper_noise',
+    'rainbow_noise',
+    'salt_and_pepper_noise',
+    'salt_noise',
+}
 # TODO: add more functions
-# flip
-# salt_and_pepper_noise
 # blur
 
 async def process_image(
@@ -64,7 +76,30 @@ async def process_image(
     # get the arguments model
     # convert the arguments model to a dictionary but exclude processing field
     kwargs = arguments_model.model_dump(exclude={'processing'})
-    # apply the parameters in this request
-    new_image = processing_function(image_data, **kwargs)
+    if processing_function_name in STOCHASTIC_PROCESSING:
+        # every request gets its own generator... so concurrent requests never share random state
+        kwargs['rng'] = numpy.random.default_rng()
+    # apply the parameters in this request... in a worker thread so the event loop is never blocked
+    new_image = await get_job_scheduler().run_sync(processing_function, image_data, **kwargs)
     # return the new image
     return new_image
+
+
+def estimate_processing_cost(
+        processing_parameters: AugmentationRequestBody,
+        width: int | None,
+        height: int | None,
+) -> CostEstimate:
+    """
+    The CPU seconds and peak memory of an augmentation... without decoding the image.
+    Images of unknown size are assumed to be square with AUGMENTATION_UNKNOWN_IMAGE_PIXELS.
+    """
+    if width is None or height is None:
+        width = height = math.isqrt(settings.AUGMENTATION_UNKNOWN_IMAGE_PIXELS)
+    arguments_model = processing_parameters.arguments
+    return estimate_cost(
+        processing=arguments_model.processing,
+        arguments=arguments_model.model_dump(exclude={'processing'}),
+        width=width,
+        height=height,
+    )
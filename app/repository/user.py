@@ -1,3 +1,5 @@
+import uuid
+
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
@@ -39,3 +41,36 @@ async def get_user_by_external_id(
     # --- return relevant information to user ---
     return user_record
 
+async def stream_User_ids(
+    batch_size: int,
+    db_session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Yields the id of every user... `batch_size` ids at a time, in order.
+    """
+    after = None
+    while True:
+        query = select(User.id).order_by(User.id).limit(batch_size)
+        if after is not None:
+            query = query.where(User.id > after)
+        result = await db_session.execute(query)
+        user_ids = list(result.scalars().all())
+        if user_ids:
+            yield user_ids
+        if len(user_ids) < batch_size:
+            return
+        after = user_ids[-1]
+
+async def read_existing_User_ids(
+    user_ids: list[uuid.UUID],
+    db_session: AsyncSession = Depends(get_async_session)
+) -> set[uuid.UUID]:
+    """
+    Finds which of the ids belong to a user.
+    """
+    result = await db_session.execute(
+        select(User.id).where(
+            User.id.in_(user_ids)
+        )
+    )
+    return set(result.scalars().all())
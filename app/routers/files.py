@@ -0,0 +1,55 @@
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import FileResponse
+
+import app.exceptions as exc
+from app.services.image import get_signed_file_service
+
+router = APIRouter()
+
+@router.api_route(
+    path="/files/{file_key:path}",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+    status_code=status.HTTP_200_OK
+)
+async def get_signed_file_endpoint(
+        file_key: str,
+        filename: Annotated[str, Query()],
+        expires: Annotated[int, Query()],
+        signature: Annotated[str, Query()],
+):
+    """
+    Download an image from a signed link.
+
+    You never build this link yourself. With `DOWNLOAD_MODE=signed_url` the image download endpoints
+    redirect you here (`307 Temporary Redirect`). The link works for a few minutes without `X-External-User-ID`.
+
+    ## Parameters
+    ### filename / expires / signature
+
+    Part of the link. A link that was changed or has expired gets `403 Forbidden`.
+
+    ### Range / If-Range
+
+    Optional. Download part of the image (`206 Partial Content`).
+
+    """
+    try:
+        return await get_signed_file_service(
+            file_key=file_key,
+            filename=filename,
+            expires=expires,
+            signature=signature,
+        )
+    except exc.InvalidDownloadLink as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e)
+        ) from e
+    except exc.ImageNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
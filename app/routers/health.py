@@ -2,7 +2,9 @@ import logging
 from datetime import datetime
 
 from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
 
+from app.internal.metrics import render_metrics
 from app.schemas.health import HealthCheckResponse
 from app.schemas.logging import LogEntry
 
@@ -19,4 +21,16 @@ def get_health_endpoint():
         details="Health check"
     )
     logger.info(log_data.model_dump_json())
-    return HealthCheckResponse(status="OK")
\ No newline at end of file
+    return HealthCheckResponse(status="OK")
+
+@router.get(path="/metrics",
+         response_class=PlainTextResponse,
+         status_code=status.HTTP_200_OK)
+def get_metrics_endpoint():
+    """
+    The metrics of this worker in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        content=render_metrics(),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -1,27 +1,57 @@
 import uuid
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import app.exceptions as exc
+from app.config import settings
 from app.db.database import get_async_session
 from app.dependency.async_dependency import (
     get_current_active_user,
 )
+from app.internal.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.schemas.image import (
     AugmentationRequestBody,
+    ExportFormat,
+    RenditionSize,
     ResponseAugmentImage,
+    ResponseEstimateAugmentation,
+    ResponseListProcessedImages,
+    ResponseListUnprocessedImages,
     ResponseUploadImage,
 )
+from app.schemas.job import ResponseProcessingJob
+from app.schemas.transactions_db import JobPriority
 from app.schemas.transactions_db.user import User
 from app.services.image import (
     augment_image_service,
+    estimate_augmentation_service,
+    export_processed_images_service,
     get_processed_image_by_id_service,
     get_unprocessed_image_by_id_service,
+    list_processed_images_service,
+    list_unprocessed_images_service,
+    submit_augmentation_service,
     upload_image_service,
 )
+from app.services.job import (
+    cancel_job_service,
+    job_events_service,
+    wait_for_job_service,
+)
 
 router = APIRouter()
 
@@ -37,6 +67,7 @@ async def upload_image_endpoint(
                 description="The image file to upload"
             )
         ],
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_active_user),
         db_session: AsyncSession = Depends(get_async_session),
 ) -> ResponseUploadImage:
@@ -69,6 +100,7 @@ async def upload_image_endpoint(
             image_file=image,
             user_id=current_user.id,
             db_session=db_session,
+            background_tasks=background_tasks,
         )
     except exc.UserNotFound as e:
         raise HTTPException(
@@ -85,6 +117,10 @@ async def upload_image_endpoint(
 async def augment_image_endpoint(
         unprocessed_image_id: uuid.UUID,
         processing_request: AugmentationRequestBody,
+        background_tasks: BackgroundTasks,
+        priority: JobPriority = JobPriority.NORMAL,
+        timeout: Annotated[float | None, Query(gt=0)] = None,
+        job_id: uuid.UUID | None = None,
         current_user: User = Depends(get_current_active_user),
         db_session: AsyncSession = Depends(get_async_session),
 ) -> ResponseAugmentImage:
@@ -131,22 +167,363 @@ async def augment_image_endpoint(
     }
     ```
 
+    ### priority
+
+    `high`, `normal` (default) or `low`.
+
+    Augmentations wait for a free worker. A waiting `high` augmentation always starts before a `normal` one,
+    and `normal` before `low`... use `low` for bulk jobs that nobody is waiting on.
+    Within a priority users take turns, so a user with many augmentations waiting never holds up the others.
+
+    ### timeout
+
+    Optional. How many seconds you are willing to wait, from now until the image is stored.
+    An augmentation that is not finished by then is stopped and recorded as `cancelled`.
+    Set it to the timeout of your HTTP client... so an augmentation nobody is waiting for does not keep running.
+
+    Default: 300. At most 3600.
+
+    ### job_id
+
+    Optional. A new UUID of your choosing for the processing job.
+    Send it to cancel the augmentation while you wait for this response:
+
+    > `/image-api/job/{job_id}/cancel`
+
+    ## Responses
+    ### 429 Too Many Requests / 503 Service Unavailable
+
+    Augmenting large images is expensive. When you (429) or everyone together (503) already have too much waiting
+    or running, the request is turned away straight away. Wait for the number of seconds in `Retry-After` and try again.
+
+    ### 409 Conflict
+
+    The augmentation was cancelled... or another job already has your `job_id`.
+
+    ### 504 Gateway Timeout
+
+    The augmentation did not finish within `timeout` seconds. It was stopped and nothing was stored.
+
     """
-    return await augment_image_service(
-        unprocessed_image_id=unprocessed_image_id,
-        processing_request=processing_request,
-        user_id=current_user.id,
-        db_session=db_session,
-    )
+    try:
+        return await augment_image_service(
+            unprocessed_image_id=unprocessed_image_id,
+            processing_request=processing_request,
+            user_id=current_user.id,
+            db_session=db_session,
+            background_tasks=background_tasks,
+            priority=priority,
+            timeout_seconds=timeout,
+            job_id=job_id,
+        )
+    except exc.TooManyAugmentations as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+    except exc.ServiceOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+    except exc.JobDeadlineExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        ) from e
+    except (exc.JobCancelled, exc.JobAlreadyExists) as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        ) from e
+
+
+@router.post(
+    path="/augment/{unprocessed_image_id}/async",
+    response_model=ResponseProcessingJob,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def submit_augmentation_endpoint(
+        unprocessed_image_id: uuid.UUID,
+        processing_request: AugmentationRequestBody,
+        response: Response,
+        priority: JobPriority = JobPriority.NORMAL,
+        timeout: Annotated[float | None, Query(gt=0)] = None,
+        job_id: uuid.UUID | None = None,
+        current_user: User = Depends(get_current_active_user),
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseProcessingJob:
+    """
+    Create an augmented version of an unprocessed image... without waiting for it.
+
+    The augmentation runs in the background. The response is the `pending` job, and `Location` is where to wait for it:
+
+    > `/image-api/job/{job_id}?wait=30` answers as soon as the job has finished.
+
+    > `/image-api/job/{job_id}/events` streams every change of the job as server-sent events.
+
+    Neither polls... you are told the moment the job finishes.
+
+    ## Parameters
+
+    The same as `/image-api/augment/{unprocessed_image_id}`.
+    `timeout` counts from now until the image is stored, even though you do not wait for it.
+
+    ## Responses
+    ### 429 Too Many Requests / 503 Service Unavailable
+
+    Too much is already waiting or running. Wait for the number of seconds in `Retry-After` and try again.
+
+    ### 409 Conflict
+
+    Another job already has your `job_id`.
+
+    """
+    try:
+        job = await submit_augmentation_service(
+            unprocessed_image_id=unprocessed_image_id,
+            processing_request=processing_request,
+            user_id=current_user.id,
+            db_session=db_session,
+            priority=priority,
+            timeout_seconds=timeout,
+            job_id=job_id,
+        )
+    except exc.TooManyAugmentations as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+    except exc.ServiceOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        ) from e
+    except exc.JobAlreadyExists as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        ) from e
+    response.headers["Location"] = f"/image-api/job/{job.job_id}"
+    return job
+
+
+@router.get(
+    path="/job/{job_id}",
+    response_model=ResponseProcessingJob,
+    status_code=status.HTTP_200_OK
+)
+async def get_job_endpoint(
+        job_id: uuid.UUID,
+        wait: Annotated[float, Query(ge=0, le=settings.JOB_LONG_POLL_MAX_SECONDS)] = 0.0,
+        current_user: User = Depends(get_current_active_user),
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseProcessingJob:
+    """
+    Get an augmentation job... or wait for it to finish.
+
+    ## Parameters
+    ### job_id
+
+    The `job_id` returned by (or sent with):
+
+    > `/image-api/augment/{unprocessed_image_id}/async`
+
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    ### wait
+
+    Optional. How many seconds to hold the request while the job is `pending` or `processing`.
+    The response is sent the moment the job finishes... or after `wait` seconds with the job as it is then.
+    Send the request again to keep waiting.
+
+    Default: 0 (answer straight away). At most 60.
+
+    """
+    try:
+        return await wait_for_job_service(
+            job_id=job_id,
+            user_id=current_user.id,
+            wait=wait,
+            db_session=db_session,
+        )
+    except exc.JobNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
 
 
 @router.get(
+    path="/job/{job_id}/events",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK
+)
+async def job_events_endpoint(
+        job_id: uuid.UUID,
+        current_user: User = Depends(get_current_active_user),
+        db_session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Follow an augmentation job as server-sent events (`text/event-stream`)... for `EventSource` in a browser.
+
+    A `status` event is sent straight away and again every time the job changes.
+    Its data is the job, as returned by `/image-api/job/{job_id}`.
+    The stream ends once the job is `succeeded`, `failed` or `cancelled`.
+
+    Example:
+
+    ```
+    event: status
+    data: {"job_id": "...", "job_status": "processing", ...}
+
+    ```
+
+    A comment (`: heartbeat`) is sent while nothing changes... so proxies keep the stream open.
+
+    ## Parameters
+    ### job_id
+
+    The `job_id` returned by (or sent with):
+
+    > `/image-api/augment/{unprocessed_image_id}/async`
+
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    """
+    try:
+        return await job_events_service(
+            job_id=job_id,
+            user_id=current_user.id,
+            db_session=db_session,
+        )
+    except exc.JobNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
+
+
+@router.post(
+    path="/job/{job_id}/cancel",
+    response_model=ResponseProcessingJob,
+    status_code=status.HTTP_200_OK
+)
+async def cancel_job_endpoint(
+        job_id: uuid.UUID,
+        current_user: User = Depends(get_current_active_user),
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseProcessingJob:
+    """
+    Cancel an augmentation that is waiting for a worker or running.
+
+    A waiting augmentation never starts. A running one stops within moments... whatever it had done is thrown away.
+    Either way the job is recorded as `cancelled` and the augment request gets `409 Conflict`.
+    Cancelling a cancelled job again does nothing.
+
+    ## Parameters
+    ### job_id
+
+    The `job_id` you sent with:
+
+    > `/image-api/augment/{unprocessed_image_id}`
+
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    ## Responses
+    ### 409 Conflict
+
+    The augmentation already finished... it was too late to cancel it.
+
+    """
+    try:
+        return await cancel_job_service(
+            job_id=job_id,
+            user_id=current_user.id,
+            db_session=db_session,
+        )
+    except exc.JobNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
+    except exc.JobAlreadyFinished as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        ) from e
+
+
+@router.post(
+    path="/augment/{unprocessed_image_id}/estimate",
+    response_model=ResponseEstimateAugmentation,
+    status_code=status.HTTP_200_OK
+)
+async def estimate_augmentation_endpoint(
+        unprocessed_image_id: uuid.UUID,
+        processing_request: AugmentationRequestBody,
+        current_user: User = Depends(get_current_active_user),
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseEstimateAugmentation:
+    """
+    Estimate how much CPU time and memory an augmentation would take... without running it.
+
+    Augmentations differ by orders of magnitude. A `flip` takes almost nothing.
+    A `percentile_filter` with a large `size` can take minutes on a large image.
+    The estimate is the one used to decide whether an augmentation is admitted.
+
+    ## Parameters
+    ### unprocessed_image_id
+
+    The ID of the unprocessed image you uploaded earlier.
+
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    ### Request body
+
+    The same JSON object you would send to:
+
+    > `/image-api/augment/{unprocessed_image_id}`
+
+    """
+    try:
+        return await estimate_augmentation_service(
+            unprocessed_image_id=unprocessed_image_id,
+            processing_request=processing_request,
+            user_id=current_user.id,
+            db_session=db_session,
+        )
+    except exc.ImageNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
+
+
+@router.api_route(
     path="/unprocessed-image/{unprocessed_image_id}/",
+    # HEAD gives the size of the image so a client can plan its range requests
+    methods=["GET", "HEAD"],
     response_class=FileResponse,
     status_code=status.HTTP_200_OK
 )
 async def get_unprocessed_image_by_id_endpoint(
         unprocessed_image_id: uuid.UUID,
+        size: RenditionSize | None = None,
+        if_none_match: Annotated[str | None, Header()] = None,
+        if_modified_since: Annotated[str | None, Header()] = None,
         db_session: AsyncSession = Depends(get_async_session),
         current_user: User = Depends(get_current_active_user)
 ):
@@ -176,22 +553,62 @@ async def get_unprocessed_image_by_id_endpoint(
 
     > `my-cool-username`
 
+    ### size
+
+    Optional. Download a WebP preview instead of the full image.
+    The value is the longest side of the preview in pixels.
+
+    Allowed values: `128`, `512`
+
+    Example:
+
+    > `?size=128`
+
+    ### If-None-Match / If-Modified-Since
+
+    Optional. Images never change once they are stored.
+    Send the `ETag` or `Last-Modified` value from an earlier download to get `304 Not Modified` instead of the image.
+
+    ### Range / If-Range
+
+    Optional. Download part of the image (`206 Partial Content`).
+    Use this to resume an interrupted download or to fetch a large image in parallel pieces.
+    Send the `ETag` as `If-Range` to make sure the pieces all come from the same image.
+
+    Example:
+
+    > `Range: bytes=0-1048575`
+
     """
     # call the service
-    return await get_unprocessed_image_by_id_service(
-        unprocessed_image_id=unprocessed_image_id,
-        user_id=current_user.id,
-        db_session=db_session,
-    )
+    try:
+        return await get_unprocessed_image_by_id_service(
+            unprocessed_image_id=unprocessed_image_id,
+            user_id=current_user.id,
+            db_session=db_session,
+            size=size,
+            if_none_match=if_none_match,
+            if_modified_since=if_modified_since,
+        )
+    except exc.ImageNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
 
 
-@router.get(
+@router.api_route(
     path="/processed-image/{processed_image_id}/",
+    # HEAD gives the size of the image so a client can plan its range requests
+    methods=["GET", "HEAD"],
     response_class=FileResponse,
     status_code=status.HTTP_200_OK
 )
 async def get_processed_image_by_id_endpoint(
         processed_image_id: uuid.UUID,
+        size: RenditionSize | None = None,
+        if_none_match: Annotated[str | None, Header()] = None,
+        if_modified_since: Annotated[str | None, Header()] = None,
         db_session: AsyncSession = Depends(get_async_session),
         current_user: User = Depends(get_current_active_user)
 ):
@@ -221,10 +638,308 @@ async def get_processed_image_by_id_endpoint(
 
     > `my-cool-username`
 
+    ### size
+
+    Optional. Download a WebP preview instead of the full image.
+    The value is the longest side of the preview in pixels.
+
+    Allowed values: `128`, `512`
+
+    Example:
+
+    > `?size=128`
+
+    ### If-None-Match / If-Modified-Since
+
+    Optional. Images never change once they are stored.
+    Send the `ETag` or `Last-Modified` value from an earlier download to get `304 Not Modified` instead of the image.
+
+    ### Range / If-Range
+
+    Optional. Download part of the image (`206 Partial Content`).
+    Use this to resume an interrupted download or to fetch a large image in parallel pieces.
+    Send the `ETag` as `If-Range` to make sure the pieces all come from the same image.
+
+    Example:
+
+    > `Range: bytes=0-1048575`
+
     """
     # call the service
-    return await get_processed_image_by_id_service(
-        processed_image_id=processed_image_id,
+    try:
+        return await get_processed_image_by_id_service(
+            processed_image_id=processed_image_id,
+            user_id=current_user.id,
+            db_session=db_session,
+            size=size,
+            if_none_match=if_none_match,
+            if_modified_since=if_modified_since,
+        )
+    except exc.ImageNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
+
+
+@router.get(
+    path="/export/",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK
+)
+async def export_processed_images_endpoint(
+        archive_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.TAR,
+        shard: Annotated[int, Query(ge=0)] = 0,
+        shard_size: Annotated[int | None, Query(ge=1)] = None,
+        db_session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user)
+):
+    """
+    Download every processed image you have created as a single tar archive.
+
+    The archive is streamed... it starts downloading straight away no matter how many images there are.
+
+    ## Parameters
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    This should be the same value that was used in:
+
+    > `/users-api/sign-up`
+
+    Example:
+
+    > `my-cool-username`
+
+    ### format
+
+    Optional. The layout of the archive.
+
+    `tar` (default): one directory per unprocessed image containing its processed images.
+
+    `webdataset`: a flat [WebDataset](https://github.com/webdataset/webdataset) shard.
+    Every processed image is stored as `{processed_image_id}.png`
+    next to `{processed_image_id}.json` containing the request body that made it.
+
+    ### shard_size / shard
+
+    Optional. Split the images (oldest first) into shards of `shard_size` images and download shard number `shard`.
+    The `X-Shard-Count` response header tells you how many shards there are.
+
+    Example:
+
+    > `?format=webdataset&shard_size=1000&shard=0`
+
+    """
+    return await export_processed_images_service(
         user_id=current_user.id,
         db_session=db_session,
+        archive_format=archive_format,
+        shard=shard,
+        shard_size=shard_size,
     )
+
+
+@router.get(
+    path="/export/{unprocessed_image_id}/",
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK
+)
+async def export_processed_images_of_unprocessed_image_endpoint(
+        unprocessed_image_id: uuid.UUID,
+        archive_format: Annotated[ExportFormat, Query(alias="format")] = ExportFormat.TAR,
+        shard: Annotated[int, Query(ge=0)] = 0,
+        shard_size: Annotated[int | None, Query(ge=1)] = None,
+        db_session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user)
+):
+    """
+    Download every processed image made from one unprocessed image as a single tar archive.
+
+    The archive is streamed... it starts downloading straight away no matter how many images there are.
+
+    ## Parameters
+    ### unprocessed_image_id
+
+    The ID of the unprocessed image you uploaded earlier.
+
+    It was returned to you in the response at:
+
+    > `/image-api/upload`
+
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    This should be the same value that was used in:
+
+    > `/users-api/sign-up`
+
+    Example:
+
+    > `my-cool-username`
+
+    ### format
+
+    Optional. The layout of the archive.
+
+    `tar` (default): one directory per unprocessed image containing its processed images.
+
+    `webdataset`: a flat [WebDataset](https://github.com/webdataset/webdataset) shard.
+    Every processed image is stored as `{processed_image_id}.png`
+    next to `{processed_image_id}.json` containing the request body that made it.
+
+    ### shard_size / shard
+
+    Optional. Split the images (oldest first) into shards of `shard_size` images and download shard number `shard`.
+    The `X-Shard-Count` response header tells you how many shards there are.
+
+    Example:
+
+    > `?format=webdataset&shard_size=1000&shard=0`
+
+    """
+    try:
+        return await export_processed_images_service(
+            user_id=current_user.id,
+            db_session=db_session,
+            unprocessed_image_id=unprocessed_image_id,
+            archive_format=archive_format,
+            shard=shard,
+            shard_size=shard_size,
+        )
+    except exc.ImageNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
+
+
+@router.get(
+    path="/unprocessed-image/",
+    response_model=ResponseListUnprocessedImages,
+    status_code=status.HTTP_200_OK
+)
+async def list_unprocessed_images_endpoint(
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+        db_session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user)
+) -> ResponseListUnprocessedImages:
+    """
+    List the images you have uploaded... oldest first.
+
+    ## Parameters
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    This should be the same value that was used in:
+
+    > `/users-api/sign-up`
+
+    Example:
+
+    > `my-cool-username`
+
+    ### limit
+
+    Optional. The number of images in a page. At most 100.
+
+    Default: 20
+
+    ### cursor
+
+    Optional. Leave this out to get the first page.
+    To get the next page send the `next_cursor` from the previous page.
+
+    Example:
+
+    > `?cursor=MjAyNS0wMS0wMVQwMDowMDowMCswMDowMHw...`
+
+    """
+    try:
+        return await list_unprocessed_images_service(
+            user_id=current_user.id,
+            limit=limit,
+            cursor=cursor,
+            db_session=db_session,
+        )
+    except exc.InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
+
+
+@router.get(
+    path="/unprocessed-image/{unprocessed_image_id}/processed-image/",
+    response_model=ResponseListProcessedImages,
+    status_code=status.HTTP_200_OK
+)
+async def list_processed_images_endpoint(
+        unprocessed_image_id: uuid.UUID,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+        db_session: AsyncSession = Depends(get_async_session),
+        current_user: User = Depends(get_current_active_user)
+) -> ResponseListProcessedImages:
+    """
+    List the processed images made from one of your unprocessed images... oldest first.
+
+    ## Parameters
+    ### unprocessed_image_id
+
+    The ID of the unprocessed image you uploaded earlier.
+
+    It was returned to you in the response at:
+
+    > `/image-api/upload`
+
+    ### X-External-User-ID
+
+    Your external user ID.
+
+    This should be the same value that was used in:
+
+    > `/users-api/sign-up`
+
+    Example:
+
+    > `my-cool-username`
+
+    ### limit
+
+    Optional. The number of images in a page. At most 100.
+
+    Default: 20
+
+    ### cursor
+
+    Optional. Leave this out to get the first page.
+    To get the next page send the `next_cursor` from the previous page.
+
+    Example:
+
+    > `?cursor=MjAyNS0wMS0wMVQwMDowMDowMCswMDowMHw...`
+
+    """
+    try:
+        return await list_processed_images_service(
+            unprocessed_image_id=unprocessed_image_id,
+            user_id=current_user.id,
+            limit=limit,
+            cursor=cursor,
+            db_session=db_session,
+        )
+    except exc.ImageNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        ) from e
+    except exc.InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        ) from e
@@ -1,4 +1,6 @@
+import enum
 import uuid
+from datetime import datetime
 from typing import Annotated, Literal
 
 from pydantic import BaseModel, Field
@@ -67,8 +69,15 @@ class EdgeFilterArguments(BaseModel):
     image_type: Literal["edge_map"] | Literal["edge_enhanced"]
 
 class GaussianBlurArguments(BaseModel):
+    """
+        A data model for specifying a 'gaussian_blur' operation.
+
+        Attributes:
+            processing (Literal["gaussian_blur"]): The type of operation. This field is fixed.
+            amount (int): The sigma of the gaussian kernel in hundredths of a pixel. 100 is a sigma of 1 pixel. 5000 is a sigma of 50 pixels.
+    """
     processing: Literal["gaussian_blur"]
-    amount: Annotated[int, Field(ge=0), Field(le=200)]
+    amount: Annotated[int, Field(ge=0), Field(le=5000)]
 
 class InvertArguments(BaseModel):
     processing: Literal["invert"]
@@ -135,6 +144,21 @@ class RotateArguments(BaseModel):
     # enforce integer range
     angle: Annotated[int, Field(strict=True, gt=0, lt=360)]
 
+class SaltAndPepperNoiseArguments(BaseModel):
+    """
+        A data model for specifying a 'salt_and_pepper_noise' operation.
+
+        This model is used to define the parameters for making a noisey image.
+
+        Attributes:
+            processing (Literal["salt_and_pepper_noise"]): The type of operation. This field is fixed.
+            amount (int): The percentage of pixels to overwrite. Half are overwritten as white and half as black.
+    """
+    # enforce specific value for processing field
+    processing: Literal["salt_and_pepper_noise"]
+    # enforce positive integer... 0 is no change
+    amount: Annotated[int, Field(strict=True, ge=0, le=100)]
+
 class SaltNoiseArguments(BaseModel):
     """
         A data model for specifying a 'salt_noise' operation.
@@ -224,6 +248,7 @@ class AugmentationRequestBody(BaseModel):
             PercentileFilterArguments |
             RainbowNoiseArguments |
             RotateArguments |
+            SaltAndPepperNoiseArguments |
             SaltNoiseArguments |
             ShiftArguments |
             TintArguments |
@@ -237,6 +262,25 @@ class AugmentationRequestBody(BaseModel):
         )
     ]
 
+class RenditionSize(enum.IntEnum):
+    """
+        The sizes of the previews that can be downloaded instead of a full image.
+
+        The value is the longest side of the preview in pixels.
+    """
+    SMALL = 128
+    LARGE = 512
+
+class ExportFormat(str, enum.Enum):
+    """
+        The layouts of an archive of processed images.
+
+        TAR: one directory per unprocessed image containing its processed images.
+        WEBDATASET: a flat WebDataset shard. Each processed image has a .png and a .json sidecar with the same key.
+    """
+    TAR = "tar"
+    WEBDATASET = "webdataset"
+
 # --- Service Layer Responses ---
 
 class ResponseUploadImage(BaseModel):
@@ -269,6 +313,12 @@ class ResponseAugmentImage(BaseModel):
     /image-api/augment/{unprocessed_image_id}/
     ```
     """
+    job_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the processing job that made the image."
+        )
+    ]
     unprocessed_image_id: Annotated[
         uuid.UUID,
         Field(
@@ -296,3 +346,149 @@ class ResponseAugmentImage(BaseModel):
             description="The way the image was requested to be augmented."
         )
     ]
+
+class ResponseEstimateAugmentation(BaseModel):
+    """
+    This is the response body for:
+    ```
+    /image-api/augment/{unprocessed_image_id}/estimate
+    ```
+    """
+    unprocessed_image_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the unprocessed image."
+        )
+    ]
+    width: Annotated[
+        int | None,
+        Field(
+            description="The width of the unprocessed image in pixels."
+                        "\nNull if the size was not recorded... the estimate assumes a large image."
+        )
+    ]
+    height: Annotated[
+        int | None,
+        Field(
+            description="The height of the unprocessed image in pixels."
+        )
+    ]
+    estimated_cpu_seconds: Annotated[
+        float,
+        Field(
+            description="The CPU time the augmentation is expected to take, in seconds."
+        )
+    ]
+    estimated_peak_memory_bytes: Annotated[
+        int,
+        Field(
+            description="The most memory the augmentation is expected to use at once, in bytes."
+        )
+    ]
+    request_body: Annotated[
+        AugmentationRequestBody,
+        Field(
+            description="The augmentation that was estimated."
+        )
+    ]
+
+class UnprocessedImageSummary(BaseModel):
+    """
+    One unprocessed image in a page of:
+    ```
+    /image-api/unprocessed-image/
+    ```
+    """
+    unprocessed_image_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the unprocessed image."
+        )
+    ]
+    unprocessed_image_filename: Annotated[
+        str,
+        Field(
+            description="The filename of the unprocessed image, as it was uploaded."
+        )
+    ]
+    created_at: Annotated[
+        datetime,
+        Field(
+            description="When the image was uploaded."
+        )
+    ]
+
+class ResponseListUnprocessedImages(BaseModel):
+    """
+    This is the response body for:
+    ```
+    /image-api/unprocessed-image/
+    ```
+    """
+    images: Annotated[
+        list[UnprocessedImageSummary],
+        Field(
+            description="A page of your unprocessed images, oldest first."
+        )
+    ]
+    next_cursor: Annotated[
+        str | None,
+        Field(
+            description="Send this as `cursor` to get the next page."
+                        "\nThis is null on the last page."
+        )
+    ]
+
+class ProcessedImageSummary(BaseModel):
+    """
+    One processed image in a page of:
+    ```
+    /image-api/unprocessed-image/{unprocessed_image_id}/processed-image/
+    ```
+    """
+    processed_image_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the processed image."
+        )
+    ]
+    processed_image_filename: Annotated[
+        str,
+        Field(
+            description="The filename of the processed image."
+        )
+    ]
+    created_at: Annotated[
+        datetime,
+        Field(
+            description="When the image was made."
+        )
+    ]
+
+class ResponseListProcessedImages(BaseModel):
+    """
+    This is the response body for:
+    ```
+    /image-api/unprocessed-image/{unprocessed_image_id}/processed-image/
+    ```
+    """
+    unprocessed_image_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the unprocessed image."
+                        "\nThis is the parent image of every image in this page."
+        )
+    ]
+    images: Annotated[
+        list[ProcessedImageSummary],
+        Field(
+            description="A page of the processed images made from this image, oldest first."
+        )
+    ]
+    next_cursor: Annotated[
+        str | None,
+        Field(
+            description="Send this as `cursor` to get the next page."
+                        "\nThis is null on the last page."
+        )
+    ]
@@ -0,0 +1,69 @@
+import uuid
+from datetime import datetime
+from typing import Annotated
+
+from pydantic import BaseModel, Field
+
+from app.schemas.transactions_db import JobPriority, JobStatus
+
+# --- Service Layer Responses ---
+
+class ResponseProcessingJob(BaseModel):
+    """
+    This is the response body for:
+    ```
+    /image-api/augment/{unprocessed_image_id}/async
+    /image-api/job/{job_id}
+    /image-api/job/{job_id}/cancel
+    ```
+    and the data of every `status` event of `/image-api/job/{job_id}/events`.
+    """
+    job_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the processing job."
+        )
+    ]
+    unprocessed_image_id: Annotated[
+        uuid.UUID,
+        Field(
+            description="The ID of the unprocessed image the job augments."
+        )
+    ]
+    job_status: Annotated[
+        JobStatus,
+        Field(
+            description="`pending` while it waits for a worker, then `processing`."
+                        "\nIt ends as `succeeded`, `failed` or `cancelled`."
+        )
+    ]
+    priority: Annotated[
+        JobPriority,
+        Field(
+            description="The priority the job was requested with."
+        )
+    ]
+    requested_at: Annotated[
+        datetime,
+        Field(
+            description="When the job was requested."
+        )
+    ]
+    started_at: Annotated[
+        datetime | None,
+        Field(
+            description="When the job got a worker... null if it never did."
+        )
+    ]
+    completed_at: Annotated[
+        datetime | None,
+        Field(
+            description="When the job ended... null while it waits or runs."
+        )
+    ]
+    processed_image_id: Annotated[
+        uuid.UUID | None,
+        Field(
+            description="The ID of the processed image the job made... null unless it succeeded."
+        )
+    ]
@@ -0,0 +1,46 @@
+from datetime import UTC, datetime
+
+from sqlalchemy import Column, DateTime
+from sqlmodel import Field, Relationship, SQLModel
+
+
+class ImageBlob(SQLModel, table=True):
+    """
+        Class representing a stored unprocessed image file in the database.
+
+        A blob is named after the hash of the uploaded bytes... so the same upload is only stored once.
+        Every UnprocessedImage made from the same bytes references the same blob.
+    """
+    # Question: which file is this?
+    # the BLAKE2b hash of the uploaded bytes as hex
+    content_hash: str = Field(
+        # the hash is the identity of the file
+        primary_key=True,
+        # a 32 byte digest is 64 hex characters
+        max_length=64,
+        # is a constraint that ensures every blob MUST have a hash
+        nullable=False,
+    )
+    # Question: how many UnprocessedImages use this file?
+    # the file can only be deleted when nothing references it
+    reference_count: int = Field(
+        default=1,
+        nullable=False,
+    )
+    # Question: when was this file first stored?
+    created_at: datetime | None = Field(
+        # automatically sets the creation time to the current time in UTC when a new blob is added
+        default_factory=lambda: datetime.now(UTC),
+        # this tells SQLAlchemy to use a timezone-aware database column type
+        sa_column=Column(
+            # this ensures the database stores the date, time and timezone
+            DateTime(timezone=True),
+            # the blob record must include a created_at timestamp
+            nullable=False
+        )
+    )
+    # --- Table Relationships ---
+    # a blob is related to every unprocessed image uploaded with the same bytes
+    unprocessed_images: list["UnprocessedImage"] = Relationship(
+        back_populates="blob"
+    )
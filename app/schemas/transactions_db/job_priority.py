@@ -0,0 +1,13 @@
+import enum
+
+
+class JobPriority(str, enum.Enum):
+    """
+        Enum for the priority class of jobs.
+
+        A waiting HIGH job always starts before a waiting NORMAL job, and NORMAL before LOW.
+        Within a class users take turns in proportion to their weight.
+    """
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
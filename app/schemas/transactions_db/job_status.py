@@ -5,9 +5,17 @@ class JobStatus(str, enum.Enum):
     """
         Enum for state of jobs.
 
-        SUCCEEDED AND FAILED are both valid end states.
+        SUCCEEDED, FAILED and CANCELLED are all valid end states.
     """
     PENDING = "pending"
     PROCESSING = "processing"
     SUCCEEDED = "succeeded"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    @property
+    def is_finished(self) -> bool:
+        """
+        Is this an end state? A finished job never changes again.
+        """
+        return self in (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
@@ -2,7 +2,7 @@ import uuid
 from datetime import UTC, datetime
 from typing import Optional
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -10,6 +10,11 @@ class ProcessedImage(SQLModel, table=True):
     """
         Class representing a processed image in the database.
     """
+    # listing pages seek straight to (created_at, id) in this index...
+    # ... so every page costs the same however deep it is
+    __table_args__ = (
+        Index("ix_processedimage_unprocessed_image_id_created_at_id", "unprocessed_image_id", "created_at", "id"),
+    )
     # Question: which image is this?
     # this is the unique identifier of this processed image in the database
     id: uuid.UUID | None = Field(
@@ -7,6 +7,7 @@ from sqlalchemy import Column, DateTime, Enum
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Field, Relationship, SQLModel
 
+from .job_priority import JobPriority
 from .job_status import JobStatus
 
 
@@ -46,6 +47,16 @@ class ProcessingJob(SQLModel, table=True):
         ),
         default=JobStatus.PENDING
     )
+    # Question: how urgent is this job?
+    priority: JobPriority = Field(
+        sa_column=Column(
+            # use the JobPriority enum to define what the priority can be
+            Enum(JobPriority),
+            # is a constraint that ensures every ProcessingJob MUST have a priority
+            nullable=False
+        ),
+        default=JobPriority.NORMAL
+    )
     # Question: when was this request made?
     requested_at: datetime | None = Field(
         default_factory=lambda: datetime.now(UTC),
@@ -85,8 +96,8 @@ class ProcessingJob(SQLModel, table=True):
     )
     # a processing_job is related to a single unprocessed_image
     unprocessed_image: "UnprocessedImage" = Relationship(
-        # 'back_populates' links this relationship to the 'unprocessed_image' field on the UnprocessedImage model.
-        back_populates="job"
+        # 'back_populates' links this relationship to the 'jobs' field on the UnprocessedImage model.
+        back_populates="jobs"
     )
     # <--- ...Keep this code together
     # Keep this code together... --->
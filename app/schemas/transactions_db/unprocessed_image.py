@@ -2,7 +2,7 @@ import uuid
 from datetime import UTC, datetime
 from typing import Optional
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -10,6 +10,11 @@ class UnprocessedImage(SQLModel, table=True):
     """
         Class representing an unprocessed image in the database.
     """
+    # listing pages seek straight to (created_at, id) in this index...
+    # ... so every page costs the same however deep it is
+    __table_args__ = (
+        Index("ix_unprocessedimage_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     # Question: which image is this?
     # the unique identifier for this specific image record.
     id: uuid.UUID | None = Field(
@@ -42,6 +47,31 @@ class UnprocessedImage(SQLModel, table=True):
         # the image record must include a storage filename
         nullable=False
     )
+    # Question: which file holds this image?
+    # the hash of the uploaded bytes... images uploaded before deduplication have no hash
+    # ... and are stored under the user directory with their storage filename
+    content_hash: str | None = Field(
+        default=None,
+        # establishes the link to the content_hash column in imageblob
+        foreign_key="imageblob.content_hash",
+        # a 32 byte digest is 64 hex characters
+        max_length=64,
+        # legacy images are not stored as blobs
+        nullable=True,
+        # add a database index to speed up finding the images that use a blob
+        index=True,
+    )
+    # Question: how large is this image?
+    # the width and height in pixels... an augmentation is priced by them before the image is decoded
+    # ... images uploaded before they were recorded have none
+    width: int | None = Field(
+        default=None,
+        nullable=True,
+    )
+    height: int | None = Field(
+        default=None,
+        nullable=True,
+    )
     # Question: when was this image created?
     # the timestamp for when this image was uploaded
     created_at: datetime | None = Field(
@@ -76,9 +106,21 @@ class UnprocessedImage(SQLModel, table=True):
     # an unprocessed image is related to multiple processed_images
     processed_images: list["ProcessedImage"] = Relationship(
         # 'back_populates' links this relationship to the 'unprocessed_image' field on the ProcessedImage model.
-        back_populates="unprocessed_image"
+        back_populates="unprocessed_image",
+        # the processed images of a deleted unprocessed image are deleted as well
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan"
+        }
+    )
+    # an unprocessed image is related to a processing_job for every augmentation requested for it
+    jobs: list["ProcessingJob"] = Relationship(
+        back_populates="unprocessed_image",
+        # the jobs of a deleted unprocessed image are deleted as well
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan"
+        }
+    )
+    # an unprocessed image is stored in a single blob
+    blob: Optional["ImageBlob"] = Relationship(
+        back_populates="unprocessed_images"
     )
-    # an unprocessed image may relate to a processing_job if the image has been created
-    job: Optional["ProcessingJob"] = Relationship(
-        back_populates="unprocessed_image"
-    )
\ No newline at end of file
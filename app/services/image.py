@@ -1,58 +1,147 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
 import uuid
+from datetime import UTC, datetime
+from pathlib import Path
 
-from fastapi import Depends, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import BackgroundTasks, Depends, Response, UploadFile, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
+import app.exceptions as exc
+from app.config import VOLUME_PATHS, settings
 from app.db.database import get_async_session
+from app.internal.admission import get_admission_controller
+from app.internal.blocking_io import run_blocking_io
+from app.internal.cancellation import (
+    CancellationToken,
+    track_job,
+    use_cancellation_token,
+)
+from app.internal.content_addressing import hash_image_content
+from app.internal.cost_model import CostEstimate
+from app.internal.download_links import (
+    get_file_key,
+    get_file_path,
+    make_internal_redirect_uri,
+    make_signed_url,
+    verify_signed_url,
+)
+from app.internal.file_handling import read_image_size
+from app.internal.http_caching import (
+    REDIRECT_CACHE_CONTROL,
+    is_not_modified,
+    make_caching_headers,
+    make_etag,
+)
+from app.internal.metrics import (
+    AUGMENTATIONS_CANCELLED,
+    AUGMENTATIONS_DEADLINE_EXCEEDED,
+)
+from app.internal.pagination import decode_cursor, encode_cursor
+from app.internal.renditions import (
+    RENDITION_MEDIA_TYPE,
+    generate_renditions,
+    get_rendition_location,
+)
+from app.internal.scheduler import get_job_scheduler
+from app.internal.tar_stream import TarMember, iter_tar
 from app.repository import (
+    complete_ProcessingJob_entry,
+    count_ProcessedImage_entries,
     create_processed_image_directory,
-    create_ProcessedImage_entry,
+    create_ProcessingJob_entry,
     create_UnprocessedImage_entry,
-    does_processed_image_file_exist,
-    does_unprocessed_image_file_exist,
+    estimate_processing_cost,
     get_processed_image_location,
     get_unprocessed_image_location,
     process_image,
+    read_ProcessedImage_entries,
+    read_ProcessedImage_entries_with_requests,
     read_ProcessedImage_entry,
     read_unprocessed_image_from_disc,
+    read_UnprocessedImage_entries,
     read_UnprocessedImage_entry,
+    reference_ImageBlob_entry,
+    update_ProcessingJob_entry,
     write_processed_image_to_disc,
     write_unprocessed_image_to_disc,
 )
 from app.schemas.image import (
     AugmentationRequestBody,
+    ExportFormat,
+    ProcessedImageSummary,
+    RenditionSize,
     ResponseAugmentImage,
+    ResponseEstimateAugmentation,
+    ResponseListProcessedImages,
+    ResponseListUnprocessedImages,
     ResponseUploadImage,
+    UnprocessedImageSummary,
 )
+from app.schemas.job import ResponseProcessingJob
+from app.schemas.logging import LogEntry
+from app.schemas.transactions_db import (
+    JobPriority,
+    JobStatus,
+    ProcessedImage,
+    ProcessingJob,
+    UnprocessedImage,
+)
+from app.services.job import make_job_response
+from app.storage import get_storage_backend
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+# the jobs submitted to this worker that are still running... see submit_augmentation_service
+_submitted_jobs: set[asyncio.Task] = set()
 
 
 async def upload_image_service(
         image_file: UploadFile,
         user_id: uuid.UUID,
         db_session: AsyncSession = Depends(get_async_session),
+        background_tasks: BackgroundTasks | None = None,
 ) -> ResponseUploadImage:
     """
     Upload a new unprocessed image.
     Creates an entry in the database.
     Creates a file in the block storage to be retrieved later.
+    Schedules the previews of the image to be made after the response is sent.
     """
     # TODO: any other raised exceptions and such...
     # asynchronously read the contents of the uploaded file as bytes
     image_content = await image_file.read()
+    # the same bytes are only stored once... the hash is the name of the stored file
+    content_hash = hash_image_content(image_content)
+    # the size prices every augmentation of the image (see app/internal/admission.py)
+    width, height = read_image_size(image_content)
     # create a filename
     filename = f"{uuid.uuid4()}.png"
-    # persist image to storage volume
-    file_path = await write_unprocessed_image_to_disc(
+    # the reference is taken first... it locks the blob so it cannot be reclaimed while this upload uses it
+    await reference_ImageBlob_entry(
+        content_hash=content_hash,
+        db_session=db_session,
+    )
+    # persist image to storage volume... unless these bytes are already stored
+    file_path, is_new_file = await write_unprocessed_image_to_disc(
         image_content=image_content,
-        user_id=user_id,
-        storage_filename=filename
+        content_hash=content_hash,
     )
     # persist entry to transactions database
     data_entry = await create_UnprocessedImage_entry(
         original_filename=image_file.filename,
         storage_filename=filename,
         user_id=user_id,
+        content_hash=content_hash,
+        width=width,
+        height=height,
         db_session=db_session,
     )
     unprocessed_image_id = data_entry.id
@@ -61,6 +150,9 @@ async def upload_image_service(
         user_id=user_id,
         image_id=unprocessed_image_id
     )
+    # make the previews once the response has been sent... a stored file already has them
+    if background_tasks is not None and is_new_file:
+        background_tasks.add_task(generate_renditions, file_path)
     # return relevant information
     return ResponseUploadImage(
         unprocessed_image_id=unprocessed_image_id,
@@ -72,117 +164,684 @@ async def augment_image_service(
         processing_request: AugmentationRequestBody,
         user_id: uuid.UUID,
         db_session: AsyncSession = Depends(get_async_session),
+        background_tasks: BackgroundTasks | None = None,
+        priority: JobPriority = JobPriority.NORMAL,
+        timeout_seconds: float | None = None,
+        job_id: uuid.UUID | None = None,
 ) -> ResponseAugmentImage:
+    """
+    Make an augmentation of an unprocessed image and store it.
+
+    The job stops at its next safe point (see app/internal/cancellation.py) when it is cancelled
+    or when timeout_seconds (from the request, waiting included) run out... and is recorded as cancelled.
+    Raises JobCancelled or JobDeadlineExceeded when it stops.
+    Raises JobAlreadyExists if another job has the job_id the client chose.
+    """
+    requested_at = datetime.now(UTC)
+    token = _job_token(timeout_seconds)
     # read the UnprocessedImage from the database
     unprocessed_image_entry = await read_UnprocessedImage_entry(
         image_id=unprocessed_image_id,
         user_id=user_id,
         db_session=db_session,
     )
-    # get the unprocessed_image from block storage
-    unprocessed_image_data = await read_unprocessed_image_from_disc(
-        user_id=user_id,
-        storage_filename=unprocessed_image_entry.storage_filename,
-    )
-    # make an augmentation
-    processed_image_data = await process_image(
-        image_data=unprocessed_image_data,
-        processing_parameters=processing_request
-    )
-    # make a filename
-    storage_filename = f"{uuid.uuid4()}.png"
-    # persist the image to block storage
-    stored_at = await write_processed_image_to_disc(
-        image_data=processed_image_data,
-        user_id=user_id,
-        unprocessed_image_id=unprocessed_image_id,
-        storage_filename=storage_filename
-    )
-    # make an entry in the database
-    new_entry = await create_ProcessedImage_entry(
-        unprocessed_image_id=unprocessed_image_id,
-        storage_filename=storage_filename,
-        db_session=db_session,
+    # an augmentation is turned away before the image is decoded... while it is still cheap to say no
+    cost = estimate_processing_cost(
+        processing_parameters=processing_request,
+        width=unprocessed_image_entry.width,
+        height=unprocessed_image_entry.height,
     )
+    # the cost is held while the augmentation waits for a worker and while it runs
+    with get_admission_controller().admit(cost=cost, user_id=user_id):
+        # record the request before it waits... so the wait can be measured
+        job = await create_ProcessingJob_entry(
+            unprocessed_image_id=unprocessed_image_id,
+            processed_image_id=None,
+            upload_request_body=processing_request.model_dump(mode="json"),
+            job_status=JobStatus.PENDING,
+            requested_at=requested_at,
+            priority=priority,
+            job_id=job_id,
+            db_session=db_session,
+        )
+        stored_at, storage_filename = await _run_augmentation_job(
+            job=job,
+            token=token,
+            unprocessed_image_entry=unprocessed_image_entry,
+            processing_request=processing_request,
+            cost=cost,
+            db_session=db_session,
+        )
+    new_entry = await _complete_augmentation_job(job, storage_filename, db_session)
+    # make the previews once the response has been sent
+    if background_tasks is not None:
+        background_tasks.add_task(generate_renditions, stored_at)
     # return the important information
     return ResponseAugmentImage(
+        job_id=job.id,
         unprocessed_image_id=unprocessed_image_id,
         processed_image_id=new_entry.id,
         processed_image_filename=new_entry.storage_filename,
         request_body=processing_request
     )
 
-async def get_unprocessed_image_by_id_service(
+async def submit_augmentation_service(
+        unprocessed_image_id: uuid.UUID,
+        processing_request: AugmentationRequestBody,
+        user_id: uuid.UUID,
+        db_session: AsyncSession = Depends(get_async_session),
+        priority: JobPriority = JobPriority.NORMAL,
+        timeout_seconds: float | None = None,
+        job_id: uuid.UUID | None = None,
+) -> ResponseProcessingJob:
+    """
+    Record an augmentation and run it in the background... the client does not wait for it.
+
+    The job is admitted (or turned away) before this returns, exactly like augment_image_service.
+    The client learns it finished through `GET /image-api/job/{job_id}?wait=` or `/events`.
+    Raises JobAlreadyExists if another job has the job_id the client chose.
+    """
+    requested_at = datetime.now(UTC)
+    token = _job_token(timeout_seconds)
+    unprocessed_image_entry = await read_UnprocessedImage_entry(
+        image_id=unprocessed_image_id,
+        user_id=user_id,
+        db_session=db_session,
+    )
+    cost = estimate_processing_cost(
+        processing_parameters=processing_request,
+        width=unprocessed_image_entry.width,
+        height=unprocessed_image_entry.height,
+    )
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(get_admission_controller().admit(cost=cost, user_id=user_id))
+        job = await create_ProcessingJob_entry(
+            unprocessed_image_id=unprocessed_image_id,
+            processed_image_id=None,
+            upload_request_body=processing_request.model_dump(mode="json"),
+            job_status=JobStatus.PENDING,
+            requested_at=requested_at,
+            priority=priority,
+            job_id=job_id,
+            db_session=db_session,
+        )
+        # the background task gives the cost back when the job ends
+        admitted = stack.pop_all()
+    task = asyncio.create_task(_run_submitted_job(
+        job=job,
+        token=token,
+        admitted=admitted,
+        unprocessed_image_entry=unprocessed_image_entry,
+        processing_request=processing_request,
+        cost=cost,
+    ))
+    # the event loop only keeps a weak reference to a task
+    _submitted_jobs.add(task)
+    task.add_done_callback(_submitted_jobs.discard)
+    return make_job_response(job)
+
+async def cancel_submitted_jobs() -> None:
+    """
+    Stop the jobs submitted to this worker... on shutdown. They are recorded as cancelled.
+    """
+    tasks = list(_submitted_jobs)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def _job_token(timeout_seconds: float | None) -> CancellationToken:
+    if timeout_seconds is None:
+        timeout_seconds = settings.AUGMENTATION_DEFAULT_TIMEOUT_SECONDS
+    # the clock starts when the request arrives... a client that stops waiting stops the job too
+    return CancellationToken.with_timeout(min(timeout_seconds, settings.AUGMENTATION_MAX_TIMEOUT_SECONDS))
+
+async def _run_augmentation_job(
+        job: ProcessingJob,
+        token: CancellationToken,
+        unprocessed_image_entry: UnprocessedImage,
+        processing_request: AugmentationRequestBody,
+        cost: CostEstimate,
+        db_session: AsyncSession,
+) -> tuple[Path, str]:
+    # waits for a worker, makes the augmentation and writes it... returns where and under which filename
+    user_id = unprocessed_image_entry.user_id
+    try:
+        # the cancel endpoint finds the token of the job while it waits or runs
+        with track_job(job.id, token):
+            # wait for a worker... by priority class, then taking turns with the other users
+            async with get_job_scheduler().schedule(
+                user_id=user_id,
+                cost=cost.cpu_seconds,
+                priority=job.priority,
+                token=token,
+            ):
+                started_at = datetime.now(UTC)
+                # a job cancelled through another worker while it waited is not started
+                if not await update_ProcessingJob_entry(
+                    job_id=job.id,
+                    job_status=JobStatus.PROCESSING,
+                    started_at=started_at,
+                    from_statuses=(JobStatus.PENDING,),
+                    db_session=db_session,
+                ):
+                    raise exc.JobCancelled(f"Job {job.id} was cancelled.")
+                log_data = LogEntry(
+                    date_time=started_at,
+                    event="augment_image",
+                    details=f"Job {job.id} waited {(started_at - job.requested_at).total_seconds():.3f}s for a worker.",
+                )
+                logger.info(log_data.model_dump_json())
+                # get the unprocessed_image from block storage
+                unprocessed_image_data = await read_unprocessed_image_from_disc(
+                    user_id=user_id,
+                    storage_filename=unprocessed_image_entry.storage_filename,
+                    content_hash=unprocessed_image_entry.content_hash,
+                )
+                token.raise_if_cancelled()
+                # make an augmentation... the worker thread checks the token at every safe point
+                with use_cancellation_token(token):
+                    processed_image_data = await process_image(
+                        image_data=unprocessed_image_data,
+                        processing_parameters=processing_request
+                    )
+                # a job cancelled during its last block is not stored
+                token.raise_if_cancelled()
+                # make a filename
+                storage_filename = f"{uuid.uuid4()}.png"
+                # persist the image to block storage
+                stored_at = await write_processed_image_to_disc(
+                    image_data=processed_image_data,
+                    user_id=user_id,
+                    unprocessed_image_id=job.unprocessed_image_id,
+                    storage_filename=storage_filename
+                )
+                # the decoded copies are dropped before the worker and the cost are given back
+                del unprocessed_image_data, processed_image_data
+    except exc.JobCancelled as e:
+        await _record_cancelled_job(job.id, e, db_session)
+        raise
+    except Exception:
+        await update_ProcessingJob_entry(
+            job_id=job.id,
+            job_status=JobStatus.FAILED,
+            completed_at=datetime.now(UTC),
+            from_statuses=(JobStatus.PENDING, JobStatus.PROCESSING),
+            db_session=db_session,
+        )
+        raise
+    return stored_at, storage_filename
+
+async def _complete_augmentation_job(
+        job: ProcessingJob,
+        storage_filename: str,
+        db_session: AsyncSession,
+) -> ProcessedImage:
+    # make an entry in the database... and link the request to the image it made
+    new_entry = await complete_ProcessingJob_entry(
+        job_id=job.id,
+        unprocessed_image_id=job.unprocessed_image_id,
+        storage_filename=storage_filename,
+        completed_at=datetime.now(UTC),
+        db_session=db_session,
+    )
+    if new_entry is None:
+        # cancelled after the image was written... the file is left for `python -m app.commands.scan_volumes`
+        AUGMENTATIONS_CANCELLED.inc()
+        raise exc.JobCancelled(f"Job {job.id} was cancelled.")
+    return new_entry
+
+async def _run_submitted_job(
+        job: ProcessingJob,
+        token: CancellationToken,
+        admitted: contextlib.ExitStack,
+        unprocessed_image_entry: UnprocessedImage,
+        processing_request: AugmentationRequestBody,
+        cost: CostEstimate,
+) -> None:
+    # the request that submitted the job has ended... the job gets a session of its own
+    succeeded = False
+    async for db_session in get_async_session():
+        try:
+            with admitted:
+                stored_at, storage_filename = await _run_augmentation_job(
+                    job=job,
+                    token=token,
+                    unprocessed_image_entry=unprocessed_image_entry,
+                    processing_request=processing_request,
+                    cost=cost,
+                    db_session=db_session,
+                )
+            await _complete_augmentation_job(job, storage_filename, db_session)
+            succeeded = True
+        except asyncio.CancelledError:
+            # the service is shutting down... the job must not be left waiting or running forever
+            await _record_cancelled_job(job.id, exc.JobCancelled("The service shut down."), db_session)
+            raise
+        except exc.JobCancelled:
+            # already recorded... the client reads it from the job
+            pass
+        except Exception as e:
+            # recorded as failed... nobody waits for the exception
+            log_data = LogEntry(
+                date_time=datetime.now(UTC),
+                event="augment_image",
+                details=f"Job {job.id} failed: {e!r}",
+            )
+            logger.error(log_data.model_dump_json())
+    # make the previews after the job has been reported as done
+    if succeeded:
+        await run_in_threadpool(generate_renditions, stored_at)
+
+async def _record_cancelled_job(
+        job_id: uuid.UUID,
+        error: exc.JobCancelled,
+        db_session: AsyncSession,
+) -> None:
+    # a job cancelled through the endpoint is already recorded... this records a deadline
+    await update_ProcessingJob_entry(
+        job_id=job_id,
+        job_status=JobStatus.CANCELLED,
+        completed_at=datetime.now(UTC),
+        from_statuses=(JobStatus.PENDING, JobStatus.PROCESSING),
+        db_session=db_session,
+    )
+    if isinstance(error, exc.JobDeadlineExceeded):
+        AUGMENTATIONS_DEADLINE_EXCEEDED.inc()
+    else:
+        AUGMENTATIONS_CANCELLED.inc()
+    log_data = LogEntry(
+        date_time=datetime.now(UTC),
+        event="augment_image",
+        details=f"Job {job_id} stopped: {error}",
+    )
+    logger.info(log_data.model_dump_json())
+
+async def estimate_augmentation_service(
         unprocessed_image_id: uuid.UUID,
+        processing_request: AugmentationRequestBody,
         user_id: uuid.UUID,
         db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseEstimateAugmentation:
+    # the same estimate the admission controller uses... the image is never read
+    unprocessed_image_entry = await read_UnprocessedImage_entry(
+        image_id=unprocessed_image_id,
+        user_id=user_id,
+        db_session=db_session,
+    )
+    cost = estimate_processing_cost(
+        processing_parameters=processing_request,
+        width=unprocessed_image_entry.width,
+        height=unprocessed_image_entry.height,
+    )
+    return ResponseEstimateAugmentation(
+        unprocessed_image_id=unprocessed_image_id,
+        width=unprocessed_image_entry.width,
+        height=unprocessed_image_entry.height,
+        estimated_cpu_seconds=cost.cpu_seconds,
+        estimated_peak_memory_bytes=cost.peak_memory_bytes,
+        request_body=processing_request,
+    )
+
+def _redirect_response(url: str, headers: dict[str, str] | None) -> RedirectResponse:
+    # the link expires... so the redirect must never be cached like the image itself
+    headers = {**(headers or {}), "Cache-Control": REDIRECT_CACHE_CONTROL}
+    return RedirectResponse(url=url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers=headers)
+
+def _offloaded_response(header: str, value: str, media_type: str, filename: str, headers: dict[str, str] | None) -> Response:
+    # the web server in front of the service replaces the empty body with the file (and answers Range itself)
+    headers = {**(headers or {}), header: value, "Content-Disposition": f'attachment; filename="{filename}"'}
+    return Response(media_type=media_type, headers=headers)
+
+async def _get_stored_file_response(
+        path: Path,
+        media_type: str,
+        filename: str,
+        headers: dict[str, str] | None = None,
+        check_exists: bool = False,
+) -> Response:
+    """
+    Serve a stored file... or hand it to whatever sends the bytes (see DOWNLOAD_MODE).
+    Raises FileNotFoundError if the file is missing.
+    Files only appear once they are complete... so a file that exists is always whole.
+    """
+    storage = get_storage_backend()
+    download_url = storage.get_download_url(path, filename, media_type)
+    if download_url is not None:
+        # the bytes go straight from the object store to the client
+        if check_exists:
+            await run_blocking_io(storage.size, path)
+        return _redirect_response(download_url, headers)
+    # a single stat finds the file and gives the response its size
+    stat_result = await run_blocking_io(os.stat, path)
+    match settings.DOWNLOAD_MODE:
+        case "signed_url":
+            if settings.DOWNLOAD_URL_SECRET is None:
+                raise ValueError("DOWNLOAD_URL_SECRET must be set when DOWNLOAD_MODE is signed_url")
+            signed_url = make_signed_url(
+                file_key=get_file_key(path, VOLUME_PATHS),
+                filename=filename,
+                base_url=settings.DOWNLOAD_URL_BASE,
+                secret=settings.DOWNLOAD_URL_SECRET,
+                expires_seconds=settings.DOWNLOAD_URL_EXPIRES_SECONDS,
+            )
+            return _redirect_response(signed_url, headers)
+        case "x_accel_redirect":
+            uri = make_internal_redirect_uri(get_file_key(path, VOLUME_PATHS), settings.X_ACCEL_REDIRECT_PREFIX)
+            return _offloaded_response("X-Accel-Redirect", uri, media_type, filename, headers)
+        case "x_sendfile":
+            return _offloaded_response("X-Sendfile", str(path), media_type, filename, headers)
+    return FileResponse(
+        path=path,
+        media_type=media_type,
+        filename=filename,
+        headers=headers,
+        stat_result=stat_result,
+    )
+
+async def get_rendition_response(
+        image_path: Path,
+        size: RenditionSize,
+        headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Serve a preview of a stored image.
+    The preview is normally made in the background after the image is stored.
+    If it is not there yet it is made now.
+    """
+    rendition_path = get_rendition_location(image_path, size)
+    try:
+        return await _get_stored_file_response(
+            rendition_path, RENDITION_MEDIA_TYPE, rendition_path.name, headers, check_exists=True,
+        )
+    except FileNotFoundError:
+        # decoding and resizing blocks... so keep it off the event loop
+        try:
+            await run_in_threadpool(generate_renditions, image_path, (size,))
+        except FileNotFoundError as e:
+            raise exc.ImageNotFound(f"The file of {image_path.name} is missing.") from e
+    return await _get_stored_file_response(rendition_path, RENDITION_MEDIA_TYPE, rendition_path.name, headers)
+
+async def get_image_file_response(
+        image_path: Path,
+        filename: str,
+        headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Serve a stored image.
+    With an object store (or DOWNLOAD_MODE=signed_url) the client is redirected to a short lived link to the file.
+    """
+    try:
+        return await _get_stored_file_response(image_path, "image/png", filename, headers)
+    except FileNotFoundError as e:
+        raise exc.ImageNotFound(f"The file of {image_path.name} is missing.") from e
+
+async def get_signed_file_service(
+        file_key: str,
+        filename: str,
+        expires: int,
+        signature: str,
 ) -> FileResponse:
+    """
+    Serve a file from a signed download link (see app/internal/download_links.py).
+    The link is the only permission needed... it is checked instead of a user.
+    Raises InvalidDownloadLink if the link is not valid and ImageNotFound if the file is missing.
+    """
+    if settings.DOWNLOAD_URL_SECRET is None:
+        raise exc.InvalidDownloadLink("Signed download links are not enabled")
+    verify_signed_url(
+        file_key=file_key,
+        filename=filename,
+        expires=expires,
+        signature=signature,
+        secret=settings.DOWNLOAD_URL_SECRET,
+    )
+    try:
+        path = get_file_path(file_key, VOLUME_PATHS)
+    except ValueError as e:
+        raise exc.InvalidDownloadLink(str(e)) from e
+    try:
+        stat_result = await run_blocking_io(os.stat, path)
+    except FileNotFoundError as e:
+        raise exc.ImageNotFound(f"The file of {path.name} is missing.") from e
+    return FileResponse(
+        path=path,
+        media_type=RENDITION_MEDIA_TYPE if path.suffix == ".webp" else "image/png",
+        filename=filename,
+        # every link is a different URL... a shared cache can keep the file until the link expires
+        headers={"Cache-Control": f"public, max-age={max(0, expires - int(time.time()))}"},
+        stat_result=stat_result,
+    )
+
+async def get_unprocessed_image_by_id_service(
+        unprocessed_image_id: uuid.UUID,
+        user_id: uuid.UUID,
+        db_session: AsyncSession = Depends(get_async_session),
+        size: RenditionSize | None = None,
+        if_none_match: str | None = None,
+        if_modified_since: str | None = None,
+) -> FileResponse | Response:
     # get the UnprocessedImage entry from the database
     image_entry = await read_UnprocessedImage_entry(
         image_id=unprocessed_image_id,
         user_id=user_id,
         db_session=db_session,
     )
-    # check if the entry exists
-    if not image_entry:
-        # TODO: raise error
-        return None
-    # check if the file exists
-    # TODO: this can be improved
-    if await does_unprocessed_image_file_exist(
+    # stored images never change... so the entry is enough to answer a revalidation
+    etag = make_etag(image_entry.storage_filename, size)
+    caching_headers = make_caching_headers(etag, image_entry.created_at)
+    if is_not_modified(
+        etag=etag,
+        created_at=image_entry.created_at,
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+    ):
+        # the client already has this image... do not touch the disk
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=caching_headers)
+    image_path = await get_unprocessed_image_location(
         user_id=user_id,
         unprocessed_image_storage_filename=image_entry.storage_filename,
-    ):
-        image_path = await get_unprocessed_image_location(
-            user_id=user_id,
-            unprocessed_image_storage_filename=image_entry.storage_filename,
-        )
-        # it exists
-        return FileResponse(
-            path=image_path.with_suffix('.png'),
-            media_type="image/png",
-            filename=str(image_entry.storage_filename) + '.png',
-        )
-    else:
-        # it does not exist
-        # TODO: raise error
-        return None
+        content_hash=image_entry.content_hash,
+    )
+    if size is not None:
+        return await get_rendition_response(image_path=image_path, size=size, headers=caching_headers)
+    return await get_image_file_response(
+        image_path=image_path,
+        filename=str(image_entry.storage_filename) + '.png',
+        headers=caching_headers,
+    )
 
 async def get_processed_image_by_id_service(
         processed_image_id: uuid.UUID,
         user_id: uuid.UUID,
         db_session: AsyncSession = Depends(get_async_session),
-) -> FileResponse:
+        size: RenditionSize | None = None,
+        if_none_match: str | None = None,
+        if_modified_since: str | None = None,
+) -> FileResponse | Response:
     # get the ProcessedImage entry from the database
     image_entry = await read_ProcessedImage_entry(
         image_id=processed_image_id,
         user_id=user_id,
         db_session=db_session,
     )
-    # check if the entry exists
-    if not image_entry:
-        # TODO: raise error
-        return None
-    # check if the file exists
-    # TODO: this can be improved
-    if await does_processed_image_file_exist(
+    # stored images never change... so the entry is enough to answer a revalidation
+    etag = make_etag(image_entry.storage_filename, size)
+    caching_headers = make_caching_headers(etag, image_entry.created_at)
+    if is_not_modified(
+        etag=etag,
+        created_at=image_entry.created_at,
+        if_none_match=if_none_match,
+        if_modified_since=if_modified_since,
+    ):
+        # the client already has this image... do not touch the disk
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=caching_headers)
+    image_path = await get_processed_image_location(
         user_id=user_id,
         unprocessed_image_id=image_entry.unprocessed_image_id,
         processed_image_storage_filename=image_entry.storage_filename,
-    ):
+    )
+    if size is not None:
+        return await get_rendition_response(image_path=image_path, size=size, headers=caching_headers)
+    return await get_image_file_response(
+        image_path=image_path,
+        filename=str(image_entry.storage_filename) + '.png',
+        headers=caching_headers,
+    )
+
+
+
+async def export_processed_images_service(
+        user_id: uuid.UUID,
+        db_session: AsyncSession = Depends(get_async_session),
+        unprocessed_image_id: uuid.UUID | None = None,
+        archive_format: ExportFormat = ExportFormat.TAR,
+        shard: int = 0,
+        shard_size: int | None = None,
+) -> StreamingResponse:
+    """
+    Stream the processed images of a user as a tar archive.
+    Only export the images made from one unprocessed image if unprocessed_image_id is given.
+
+    The archive is written while it is sent... one chunk of one image at a time.
+    With a shard_size the images are split into shards (oldest first) and only one shard is sent.
+    """
+    if unprocessed_image_id is not None:
+        # raises ImageNotFound if the user does not own this image
+        await read_UnprocessedImage_entry(
+            image_id=unprocessed_image_id,
+            user_id=user_id,
+            db_session=db_session,
+        )
+    headers = {}
+    if shard_size is not None:
+        num_images = await count_ProcessedImage_entries(
+            user_id=user_id,
+            unprocessed_image_id=unprocessed_image_id,
+            db_session=db_session,
+        )
+        # tell the client how many shards to ask for
+        headers["X-Shard-Count"] = str(-(-num_images // shard_size))
+    entries = await read_ProcessedImage_entries_with_requests(
+        user_id=user_id,
+        unprocessed_image_id=unprocessed_image_id,
+        offset=shard * shard_size if shard_size is not None else 0,
+        limit=shard_size,
+        db_session=db_session,
+    )
+    members = []
+    for image_entry, request_body in entries:
         image_path = await get_processed_image_location(
             user_id=user_id,
             unprocessed_image_id=image_entry.unprocessed_image_id,
             processed_image_storage_filename=image_entry.storage_filename,
         )
-        # it exists
-        return FileResponse(
-            path=image_path.with_suffix('.png'),
-            media_type="image/png",
-            filename=str(image_entry.storage_filename) + '.png',
-        )
-    else:
-        # it does not exist
-        # TODO: raise error
-        return None
+        if archive_format == ExportFormat.WEBDATASET:
+            # WebDataset groups the files of a sample by the name before the first dot
+            key = str(image_entry.id)
+            members.append(TarMember(name=f"{key}.png", modified_at=image_entry.created_at, path=image_path))
+            sidecar = {
+                "processed_image_id": key,
+                "unprocessed_image_id": str(image_entry.unprocessed_image_id),
+                "created_at": image_entry.created_at.isoformat(),
+                "request_body": request_body,
+            }
+            members.append(TarMember(
+                name=f"{key}.json",
+                modified_at=image_entry.created_at,
+                content=json.dumps(sidecar).encode(),
+            ))
+        else:
+            members.append(TarMember(
+                name=f"{image_entry.unprocessed_image_id}/{image_entry.storage_filename}",
+                modified_at=image_entry.created_at,
+                path=image_path,
+            ))
+    archive_name = f"{unprocessed_image_id or 'processed-images'}"
+    if shard_size is not None:
+        archive_name = f"{archive_name}-{shard:06d}"
+    headers["Content-Disposition"] = f'attachment; filename="{archive_name}.tar"'
+    # a sync generator is run in the threadpool... so reading the files never blocks the event loop
+    return StreamingResponse(
+        content=iter_tar(members),
+        media_type="application/x-tar",
+        headers=headers,
+    )
+
+
+async def list_unprocessed_images_service(
+        user_id: uuid.UUID,
+        limit: int,
+        cursor: str | None = None,
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseListUnprocessedImages:
+    """
+    List a page of the unprocessed images of a user... oldest first.
+    Raises InvalidCursor if the cursor was not made by this service.
+    """
+    # one extra entry is read to find out if there is another page
+    entries = await read_UnprocessedImage_entries(
+        user_id=user_id,
+        limit=limit + 1,
+        after=decode_cursor(cursor) if cursor is not None else None,
+        db_session=db_session,
+    )
+    page = entries[:limit]
+    next_cursor = None
+    if len(entries) > limit:
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    return ResponseListUnprocessedImages(
+        images=[
+            UnprocessedImageSummary(
+                unprocessed_image_id=entry.id,
+                unprocessed_image_filename=entry.original_filename,
+                created_at=entry.created_at,
+            )
+            for entry in page
+        ],
+        next_cursor=next_cursor,
+    )
+
 
+async def list_processed_images_service(
+        unprocessed_image_id: uuid.UUID,
+        user_id: uuid.UUID,
+        limit: int,
+        cursor: str | None = None,
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseListProcessedImages:
+    """
+    List a page of the processed images made from an unprocessed image... oldest first.
+    Raises ImageNotFound if the user does not own the unprocessed image.
+    Raises InvalidCursor if the cursor was not made by this service.
+    """
+    after = decode_cursor(cursor) if cursor is not None else None
+    # raises ImageNotFound if the user does not own this image
+    await read_UnprocessedImage_entry(
+        image_id=unprocessed_image_id,
+        user_id=user_id,
+        db_session=db_session,
+    )
+    # one extra entry is read to find out if there is another page
+    entries = await read_ProcessedImage_entries(
+        unprocessed_image_id=unprocessed_image_id,
+        user_id=user_id,
+        limit=limit + 1,
+        after=after,
+        db_session=db_session,
+    )
+    page = entries[:limit]
+    next_cursor = None
+    if len(entries) > limit:
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    return ResponseListProcessedImages(
+        unprocessed_image_id=unprocessed_image_id,
+        images=[
+            ProcessedImageSummary(
+                processed_image_id=entry.id,
+                processed_image_filename=entry.storage_filename,
+                created_at=entry.created_at,
+            )
+            for entry in page
+        ],
+        next_cursor=next_cursor,
+    )
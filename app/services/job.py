@@ -0,0 +1,215 @@
+"""
+This module contains the services that follow and cancel processing jobs.
+
+A client waiting for a job sleeps until Postgres notifies its worker that the job moved
+(see app/internal/job_notifications.py)... it never polls the database while the listener is connected.
+
+A job is cancelled in the database first... so the cancel holds whichever worker runs the job.
+The token of a job running in this worker is cancelled straight away. A worker that runs a job cancelled
+through another worker is told by the CANCELLED notification.
+"""
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+
+from fastapi import Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.exceptions as exc
+from app.config import settings
+from app.db.database import get_async_session
+from app.internal.cancellation import cancel_job, tracked_job_ids
+from app.internal.job_notifications import get_job_status_listener
+from app.repository import (
+    read_cancelled_ProcessingJob_ids,
+    read_ProcessingJob_entry,
+    update_ProcessingJob_entry,
+)
+from app.schemas.job import ResponseProcessingJob
+from app.schemas.logging import LogEntry
+from app.schemas.transactions_db import JobStatus, ProcessingJob
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+
+def make_job_response(job: ProcessingJob) -> ResponseProcessingJob:
+    return ResponseProcessingJob(
+        job_id=job.id,
+        unprocessed_image_id=job.unprocessed_image_id,
+        job_status=job.job_status,
+        priority=job.priority,
+        requested_at=job.requested_at,
+        started_at=job.started_at,
+        completed_at=job.completed_at,
+        processed_image_id=job.processed_image_id,
+    )
+
+
+async def cancel_job_service(
+        job_id: uuid.UUID,
+        user_id: uuid.UUID,
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseProcessingJob:
+    """
+    Cancel a job that is waiting or running.
+    Cancelling a cancelled job does nothing.
+    Raises JobNotFound if the user does not own the job.
+    Raises JobAlreadyFinished if the job already succeeded or failed.
+    """
+    # raises JobNotFound if the user does not own this job
+    await read_ProcessingJob_entry(job_id=job_id, user_id=user_id, db_session=db_session)
+    # only a job that has not finished moves... the check and the move are a single statement
+    cancelled = await update_ProcessingJob_entry(
+        job_id=job_id,
+        job_status=JobStatus.CANCELLED,
+        completed_at=datetime.now(UTC),
+        from_statuses=(JobStatus.PENDING, JobStatus.PROCESSING),
+        db_session=db_session,
+    )
+    if cancelled:
+        # stop it now if it waits or runs in this worker
+        cancel_job(job_id)
+        log_data = LogEntry(
+            date_time=datetime.now(UTC),
+            event="cancel_job",
+            details=f"Job {job_id} was cancelled.",
+        )
+        logger.info(log_data.model_dump_json())
+    job = await read_ProcessingJob_entry(job_id=job_id, user_id=user_id, db_session=db_session)
+    if job.job_status != JobStatus.CANCELLED:
+        raise exc.JobAlreadyFinished(f"Job {job_id} already {job.job_status.value}.")
+    return make_job_response(job)
+
+
+async def cancel_jobs_cancelled_elsewhere(db_session: AsyncSession) -> int:
+    """
+    Stop the jobs of this worker that were cancelled through another worker.
+    Returns how many were stopped.
+    """
+    job_ids = tracked_job_ids()
+    if not job_ids:
+        return 0
+    cancelled_ids = await read_cancelled_ProcessingJob_ids(job_ids=job_ids, db_session=db_session)
+    return sum(cancel_job(job_id) for job_id in cancelled_ids)
+
+
+async def _read_job(job_id: uuid.UUID, user_id: uuid.UUID, db_session: AsyncSession) -> ProcessingJob:
+    job = await read_ProcessingJob_entry(job_id=job_id, user_id=user_id, db_session=db_session)
+    # the connection goes back to the pool while the client waits
+    await db_session.commit()
+    return job
+
+
+async def iter_job_updates(
+        job_id: uuid.UUID,
+        user_id: uuid.UUID,
+        db_session: AsyncSession,
+        timeout: float,
+        heartbeat: float | None = None,
+) -> AsyncIterator[ProcessingJob | None]:
+    """
+    Yield the job now... and again every time its status changes, until it finishes or `timeout` runs out.
+    Yield None when the job has not moved for `heartbeat` seconds.
+    Raises JobNotFound if the user does not own the job.
+    """
+    listener = get_job_status_listener()
+    deadline = time.monotonic() + timeout
+    # subscribe before the first read... a move in between still wakes the wait
+    with listener.subscribe(job_id) as subscription:
+        job = await _read_job(job_id, user_id, db_session)
+        yield job
+        last_sent = time.monotonic()
+        while not job.job_status.is_finished:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            wake_at = deadline
+            if heartbeat is not None:
+                wake_at = min(wake_at, last_sent + heartbeat)
+            if not listener.connected:
+                # notifications are lost while the listener is down... read the job now and then instead
+                wake_at = min(wake_at, now + settings.JOB_STATUS_FALLBACK_POLL_SECONDS)
+            moved = await subscription.wait(wake_at - now)
+            if moved or not listener.connected:
+                job_status = job.job_status
+                job = await _read_job(job_id, user_id, db_session)
+                if job.job_status != job_status:
+                    yield job
+                    last_sent = time.monotonic()
+                    continue
+            if heartbeat is not None and time.monotonic() >= last_sent + heartbeat:
+                yield None
+                last_sent = time.monotonic()
+
+
+async def wait_for_job_service(
+        job_id: uuid.UUID,
+        user_id: uuid.UUID,
+        wait: float = 0.0,
+        db_session: AsyncSession = Depends(get_async_session),
+) -> ResponseProcessingJob:
+    """
+    Answer as soon as the job has finished... or after `wait` seconds with the job as it is then.
+    Raises JobNotFound if the user does not own the job.
+    """
+    job = None
+    async for update in iter_job_updates(job_id=job_id, user_id=user_id, db_session=db_session, timeout=wait):
+        job = update
+    return make_job_response(job)
+
+
+def _status_event(job: ProcessingJob) -> str:
+    return f"event: status\ndata: {make_job_response(job).model_dump_json()}\n\n"
+
+
+async def job_events_service(
+        job_id: uuid.UUID,
+        user_id: uuid.UUID,
+        db_session: AsyncSession = Depends(get_async_session),
+) -> StreamingResponse:
+    """
+    Stream the job as server-sent events: a `status` event now and at every change, until it finishes.
+    A comment is sent every JOB_EVENTS_HEARTBEAT_SECONDS the job does not move... so proxies keep the stream open.
+    Raises JobNotFound if the user does not own the job.
+    """
+    updates = iter_job_updates(
+        job_id=job_id,
+        user_id=user_id,
+        db_session=db_session,
+        # a job never runs longer than its deadline... a stream left open by a lost job still ends
+        timeout=settings.AUGMENTATION_MAX_TIMEOUT_SECONDS,
+        heartbeat=settings.JOB_EVENTS_HEARTBEAT_SECONDS,
+    )
+    # read the job before the response starts... so a missing job is still a 404
+    first = await anext(updates)
+
+    async def iter_events() -> AsyncIterator[str]:
+        try:
+            yield _status_event(first)
+            async for job in updates:
+                yield ": heartbeat\n\n" if job is None else _status_event(job)
+        finally:
+            await updates.aclose()
+
+    return StreamingResponse(
+        iter_events(),
+        media_type="text/event-stream",
+        # every event must reach the client straight away... never cached or buffered
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def run_job_status_listener() -> None:
+    """
+    Listen for job status notifications until cancelled.
+    """
+    async def catch_up() -> None:
+        # a job cancelled while the connection was down is never notified again
+        async for db_session in get_async_session():
+            await cancel_jobs_cancelled_elsewhere(db_session=db_session)
+
+    await get_job_status_listener().run(on_connect=catch_up)
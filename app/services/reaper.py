@@ -0,0 +1,80 @@
+"""
+This module contains the background task that removes the files of deleted images.
+
+Deleting a user (or an image) only renames its directory to a tombstone... so the request returns straight away.
+The reaper runs every REAPER_INTERVAL_SECONDS in every worker and:
+1. deletes the blobs that no unprocessed image references any more
+2. removes the files in the tombstones, REAPER_BATCH_SIZE files at a time
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.database import get_async_session
+from app.internal.metrics import PENDING_TOMBSTONES, RECLAIMED_BYTES, RECLAIMED_FILES
+from app.repository import reap_tombstones, reclaim_orphaned_ImageBlob_entries
+from app.repository.directory_manager import ReapResult
+from app.schemas.logging import LogEntry
+
+# set up logging
+logger = logging.getLogger(__name__)
+
+
+async def reclaim_storage_service(
+        db_session: AsyncSession,
+        batch_size: int | None = None,
+) -> ReapResult:
+    """
+    Remove everything that has been deleted so far.
+
+    Each batch of files is removed in its own call... so other filesystem calls get a turn in between.
+    Returns the total removed.
+    """
+    if batch_size is None:
+        batch_size = settings.REAPER_BATCH_SIZE
+    # orphaned blobs are moved to tombstones first... so they are removed below
+    while len(await reclaim_orphaned_ImageBlob_entries(limit=batch_size, db_session=db_session)) == batch_size:
+        pass
+    total = ReapResult()
+    while True:
+        result = await reap_tombstones(batch_size=batch_size)
+        total.files += result.files
+        total.bytes += result.bytes
+        total.pending = result.pending
+        RECLAIMED_FILES.inc(result.files)
+        RECLAIMED_BYTES.inc(result.bytes)
+        PENDING_TOMBSTONES.set(result.pending)
+        if result.pending == 0 or result.files == 0:
+            break
+    if total.files:
+        log_data = LogEntry(
+            date_time=datetime.now(),
+            event="reclaim_storage",
+            details=f"Removed {total.files} files ({total.bytes} bytes) of deleted images.",
+        )
+        logger.info(log_data.model_dump_json())
+    return total
+
+
+async def run_reaper(interval: float | None = None) -> None:
+    """
+    Reclaim storage every `interval` seconds until cancelled.
+    """
+    if interval is None:
+        interval = settings.REAPER_INTERVAL_SECONDS
+    while True:
+        try:
+            async for db_session in get_async_session():
+                await reclaim_storage_service(db_session=db_session)
+        except Exception as e:
+            # the next run tries again... the reaper must never stop
+            log_data = LogEntry(
+                date_time=datetime.now(),
+                event="reclaim_storage",
+                details=f"Failed to reclaim storage: {e!r}",
+            )
+            logger.error(log_data.model_dump_json())
+        await asyncio.sleep(interval)
@@ -10,6 +10,8 @@ from app.dependency.async_dependency import get_current_external_user_id
 from app.repository.directory_manager import (
     create_processed_user_directory,
     create_unprocessed_user_directory,
+    delete_processed_user_directory,
+    delete_unprocessed_user_directory,
 )
 from app.schemas.transactions_db.user import User
 from app.schemas.user import ResponseSignInUser, ResponseSignUpUser
@@ -78,8 +80,21 @@ async def delete_user_service(
             "You do not have permission to delete this user."
         )
     # --- Delete The Entry ---
+    # the images of the user stop referencing their blobs in the same transaction
+    await repository_layer.release_ImageBlob_references(
+        user_id=user_record.id,
+        db_session=db_session,
+    )
     await db_session.delete(user_record)
     await db_session.commit()
+    # --- Delete The Image Data ---
+    # the directories are renamed to tombstones... the files are removed in the background
+    await delete_unprocessed_user_directory(
+        user_id=user_record.id,
+    )
+    await delete_processed_user_directory(
+        user_id=user_record.id,
+    )
     return None
 
 async def sign_in_user_service(
@@ -0,0 +1,15 @@
+from .backend import get_storage_backend
+from .base import StorageBackend
+from .local import (
+    TOMBSTONE_DIRECTORY,
+    LocalStorageBackend,
+    make_tombstone,
+)
+
+__all__ = [
+    "get_storage_backend",
+    "StorageBackend",
+    "TOMBSTONE_DIRECTORY",
+    "LocalStorageBackend",
+    "make_tombstone",
+]
@@ -0,0 +1,34 @@
+"""
+This module picks the storage backend set by STORAGE_BACKEND.
+"""
+import functools
+
+from app.config import VOLUME_PATHS, settings
+from app.storage.base import StorageBackend
+from app.storage.local import LocalStorageBackend
+
+
+@functools.cache
+def get_storage_backend() -> StorageBackend:
+    """
+    The storage backend shared by the whole process... so its connections are reused.
+    """
+    if settings.STORAGE_BACKEND == "s3":
+        # boto3 is only needed (and imported) when the s3 backend is used
+        from app.storage.s3 import S3StorageBackend
+        if not settings.S3_BUCKET:
+            raise ValueError("S3_BUCKET must be set when STORAGE_BACKEND is s3")
+        return S3StorageBackend(
+            volume_paths=VOLUME_PATHS,
+            bucket=settings.S3_BUCKET,
+            key_prefix=settings.S3_KEY_PREFIX,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            # every storage thread can run a transfer of its own
+            max_pool_connections=settings.STORAGE_IO_THREADS * settings.S3_TRANSFER_CONCURRENCY,
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunk_size=settings.S3_MULTIPART_CHUNK_SIZE,
+            transfer_concurrency=settings.S3_TRANSFER_CONCURRENCY,
+            presigned_url_expires_seconds=settings.S3_PRESIGNED_URL_EXPIRES_SECONDS,
+        )
+    return LocalStorageBackend(volume_paths=VOLUME_PATHS)
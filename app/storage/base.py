@@ -0,0 +1,81 @@
+"""
+This module contains the interface every storage backend implements.
+
+A stored file is named by its path in a volume, exactly as on a local disk:
+`{UNPROCESSED_IMAGE_PATH}/{user_id}/ab/cd/{storage_filename}`.
+The local backend opens the path. An object store backend turns it into an object key:
+`unprocessed_image_data/{user_id}/ab/cd/{storage_filename}`.
+So sharding, blobs and renditions work the same whichever backend is used.
+
+Every method blocks... call them from a storage I/O thread (see app/internal/blocking_io.py).
+"""
+import contextlib
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+
+class StorageBackend(ABC):
+    """
+    Where the image files are kept.
+    """
+
+    # can a file be stored in another shard layout than the configured one?
+    # ... only local volumes are resharded (see app/commands/reshard.py)... object store keys never move.
+    has_other_layouts: bool = True
+
+    @abstractmethod
+    def exists(self, path: Path) -> bool:
+        """
+        Is there a file (or directory) at the path?
+        """
+
+    @abstractmethod
+    def size(self, path: Path) -> int:
+        """
+        The size of a file in bytes. Raises FileNotFoundError if there is no file.
+        """
+
+    @abstractmethod
+    @contextlib.contextmanager
+    def open_read(self, path: Path) -> Iterator[BinaryIO]:
+        """
+        Open a file for reading. The file can seek. Raises FileNotFoundError if there is no file.
+        """
+
+    @abstractmethod
+    @contextlib.contextmanager
+    def open_write(self, path: Path) -> Iterator[BinaryIO]:
+        """
+        Open a new file for writing. Its directory must exist (see make_directory)...
+        a directory that was moved or deleted is never made again by a write. Raises FileNotFoundError if it is missing.
+        Nobody sees the file until the block ends without an error. Then it replaces any file at the path.
+        """
+
+    @abstractmethod
+    def make_directory(self, path: Path, exist_ok: bool = False, parents: bool = True) -> None:
+        """
+        Make a directory and its parents. Raises FileExistsError if it exists and exist_ok is False.
+        With parents False it raises FileNotFoundError if its parent does not exist.
+        """
+
+    @abstractmethod
+    def list_files(self, directory_path: Path) -> list[Path]:
+        """
+        The files directly in a directory. Empty if there is no directory.
+        """
+
+    @abstractmethod
+    def delete(self, path: Path) -> Path | None:
+        """
+        Delete a file or a directory with everything in it.
+        Returns the tombstone its files are waiting in if they are removed later... None if they are already gone.
+        """
+
+    def get_download_url(self, path: Path, filename: str, media_type: str) -> str | None:
+        """
+        A link a client can download the file from without going through this service.
+        None if the files can only be served by this service.
+        """
+        return None
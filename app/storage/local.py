@@ -0,0 +1,82 @@
+"""
+This module contains the storage backend for volumes mounted on the local filesystem.
+
+Deleted files are not removed straight away. They are renamed into the tombstones of their volume
+and removed in batches by the reaper (see app/services/reaper.py).
+"""
+import contextlib
+import os
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+from app.internal.atomic_write import atomic_write
+from app.storage.base import StorageBackend
+
+# deleted directories are renamed into this directory of their volume... then removed in the background
+TOMBSTONE_DIRECTORY = ".tombstones"
+
+
+def make_tombstone(path: Path, volume_path: Path) -> Path | None:
+    """
+    Move a file or directory of a volume to its tombstones... reap_tombstones removes it later.
+    Returns the tombstone, or None if there is nothing at the path.
+    """
+    # a rename within a volume is atomic and takes the same time however many files there are
+    tombstone_path = volume_path / TOMBSTONE_DIRECTORY / f"{path.name}.{uuid.uuid4()}"
+    tombstone_path.parent.mkdir(exist_ok=True)
+    try:
+        os.rename(path, tombstone_path)
+    except FileNotFoundError:
+        # already deleted
+        return None
+    return tombstone_path
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Keeps the image files in directories on the local filesystem.
+
+    Args:
+        volume_paths (dict[str, Path]): the directory of every volume.
+    """
+
+    def __init__(self, volume_paths: dict[str, Path]):
+        self.volume_paths = volume_paths
+
+    def _volume_path(self, path: Path) -> Path:
+        for volume_path in self.volume_paths.values():
+            if path.is_relative_to(volume_path):
+                return volume_path
+        raise ValueError(f"{path} is not in a volume")
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+    def size(self, path: Path) -> int:
+        return path.stat().st_size
+
+    @contextlib.contextmanager
+    def open_read(self, path: Path) -> Iterator[BinaryIO]:
+        with open(path, mode="rb") as file:
+            yield file
+
+    @contextlib.contextmanager
+    def open_write(self, path: Path) -> Iterator[BinaryIO]:
+        # a crash while writing leaves a temporary file... never a half written file under the real name
+        with atomic_write(path) as temporary_path, open(temporary_path, mode="wb") as file:
+            yield file
+
+    def make_directory(self, path: Path, exist_ok: bool = False, parents: bool = True) -> None:
+        path.mkdir(parents=parents, exist_ok=exist_ok)
+
+    def list_files(self, directory_path: Path) -> list[Path]:
+        try:
+            with os.scandir(directory_path) as entries:
+                return [Path(entry.path) for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def delete(self, path: Path) -> Path | None:
+        return make_tombstone(path, self._volume_path(path))
@@ -0,0 +1,191 @@
+"""
+This module contains the storage backend for S3 compatible object stores (AWS S3, MinIO, ...).
+
+Every API node reads and writes the same bucket... so nodes can be added without a shared volume.
+
+- one client is shared by every storage I/O thread. Its connection pool has room for all of them.
+- files larger than S3_MULTIPART_THRESHOLD are sent and fetched in parts, S3_TRANSFER_CONCURRENCY at a time.
+- downloads are redirected to a presigned URL... the bytes never pass through the API node.
+
+An object only becomes visible once it is completely uploaded... so writes are atomic like on a local volume.
+Directories do not exist in an object store. Making one does nothing and deleting one deletes every object under it.
+
+Needs the s3 extra: `pip install "image-augmentation-service[s3]"`
+"""
+import contextlib
+import itertools
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - only without the s3 extra
+    boto3 = None
+
+from app.storage.base import StorageBackend
+
+# delete_objects takes at most this many keys
+MAX_DELETE_KEYS = 1000
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Keeps the image files in a bucket of an S3 compatible object store.
+
+    Args:
+        volume_paths (dict[str, Path]): the directory of every volume. Paths in a volume are stored under its name.
+        bucket (str): the bucket.
+        key_prefix (str): put in front of every key.
+        endpoint_url (str | None): the endpoint of a store that is not AWS.
+        region (str | None): the region of the bucket.
+        max_pool_connections (int): the connections kept open to the store.
+        multipart_threshold (int): files larger than this (in bytes) are sent in parts.
+        multipart_chunk_size (int): the size of every part.
+        transfer_concurrency (int): the parts of one file sent at the same time.
+        presigned_url_expires_seconds (int): how long a download link works.
+        client: a boto3 S3 client to use instead of making one.
+    """
+
+    # every key was written with the configured layout... and is never resharded
+    has_other_layouts = False
+
+    def __init__(
+            self,
+            volume_paths: dict[str, Path],
+            bucket: str,
+            key_prefix: str = "",
+            endpoint_url: str | None = None,
+            region: str | None = None,
+            max_pool_connections: int = 10,
+            multipart_threshold: int = 8 * 1024 * 1024,
+            multipart_chunk_size: int = 8 * 1024 * 1024,
+            transfer_concurrency: int = 4,
+            presigned_url_expires_seconds: int = 300,
+            client=None,
+    ):
+        if boto3 is None:
+            raise RuntimeError(
+                'The s3 storage backend needs boto3. Install it with: pip install "image-augmentation-service[s3]"'
+            )
+        self.volume_paths = volume_paths
+        self.bucket = bucket
+        self.key_prefix = key_prefix
+        self.presigned_url_expires_seconds = presigned_url_expires_seconds
+        if client is None:
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=region,
+                # every storage thread can run a transfer of its own
+                config=Config(max_pool_connections=max_pool_connections),
+            )
+        # a boto3 client can be shared by threads... its connections are reused
+        self.client = client
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunk_size,
+            max_concurrency=transfer_concurrency,
+        )
+        # files this small are kept in memory while they are read or written
+        self._spool_size = multipart_threshold
+
+    def _key(self, path: Path) -> str:
+        for volume_name, volume_path in self.volume_paths.items():
+            if path.is_relative_to(volume_path):
+                relative_path = path.relative_to(volume_path).as_posix()
+                return f"{self.key_prefix}{volume_name}/{relative_path}".removesuffix("/.")
+        raise ValueError(f"{path} is not in a volume")
+
+    def _head(self, path: Path) -> dict | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(path))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _iter_keys(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"]
+
+    def exists(self, path: Path) -> bool:
+        if self._head(path) is not None:
+            return True
+        # a directory exists while there is an object under it
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=f"{self._key(path)}/", MaxKeys=1)
+        return response.get("KeyCount", 0) > 0
+
+    def size(self, path: Path) -> int:
+        head = self._head(path)
+        if head is None:
+            raise FileNotFoundError(path)
+        return head["ContentLength"]
+
+    @contextlib.contextmanager
+    def open_read(self, path: Path) -> Iterator[BinaryIO]:
+        # the body of an object cannot seek... Pillow and tar need to
+        with tempfile.SpooledTemporaryFile(max_size=self._spool_size) as file:
+            try:
+                self.client.download_fileobj(self.bucket, self._key(path), file, Config=self.transfer_config)
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                    raise FileNotFoundError(path) from e
+                raise
+            file.seek(0)
+            yield file
+
+    @contextlib.contextmanager
+    def open_write(self, path: Path) -> Iterator[BinaryIO]:
+        with tempfile.SpooledTemporaryFile(max_size=self._spool_size) as file:
+            yield file
+            file.seek(0)
+            # large files are sent as a multipart upload... the object appears when the last part is sent
+            self.client.upload_fileobj(file, self.bucket, self._key(path), Config=self.transfer_config)
+
+    def make_directory(self, path: Path, exist_ok: bool = False, parents: bool = True) -> None:
+        # an object store has no directories... a key can always be written
+        return None
+
+    def list_files(self, directory_path: Path) -> list[Path]:
+        prefix = f"{self._key(directory_path)}/"
+        paginator = self.client.get_paginator("list_objects_v2")
+        files = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter="/"):
+            for item in page.get("Contents", []):
+                files.append(directory_path / item["Key"].removeprefix(prefix))
+        return files
+
+    def delete(self, path: Path) -> Path | None:
+        key = self._key(path)
+        # the file itself or everything under the directory... up to 1000 keys per request
+        keys = itertools.chain([key], self._iter_keys(f"{key}/"))
+        for batch in itertools.batched(keys, MAX_DELETE_KEYS):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [{"Key": batch_key} for batch_key in batch],
+                    "Quiet": True,
+                },
+            )
+        # the objects are already gone... nothing is left for the reaper
+        return None
+
+    def get_download_url(self, path: Path, filename: str, media_type: str) -> str | None:
+        # signing is done locally... no request is sent to the store
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._key(path),
+                "ResponseContentType": media_type,
+                "ResponseContentDisposition": f'attachment; filename="{filename}"',
+            },
+            ExpiresIn=self.presigned_url_expires_seconds,
+        )
@@ -0,0 +1,163 @@
+import tracemalloc
+
+import numpy
+import pytest
+import scipy.ndimage
+
+from app.config import settings
+from app.internal.augmentations import (
+    edge_filter,
+    gaussian_blur,
+    max_filter,
+    min_filter,
+    pepper_noise,
+    percentile_filter,
+    rainbow_noise,
+    salt_and_pepper_noise,
+    salt_noise,
+    uniform_blur,
+)
+from app.internal.parallel import shutdown_executor
+
+# a 4 megapixel RGB image
+IMAGE_SHAPE = (2048, 2048, 3)
+
+
+@pytest.fixture(scope="module")
+def large_image() -> numpy.ndarray:
+    rng = numpy.random.default_rng(seed=0)
+    return rng.integers(low=0, high=256, size=IMAGE_SHAPE, dtype=numpy.uint8)
+
+
+def measure_peak_memory(function, *args, **kwargs) -> int:
+    """
+    Returns the peak number of bytes allocated while calling a function.
+    numpy reports its allocations to tracemalloc.
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+# --- edge_filter ---
+
+def legacy_edge_filter(image_data: numpy.ndarray, image_type: str) -> numpy.ndarray:
+    """
+    The float64/int32 implementation of edge_filter.
+    Kept as a baseline for comparison.
+    """
+    g_image_data = numpy.dot(image_data[...,:3], [0.2989, 0.5870, 0.1140])
+    g_image_data = g_image_data.astype('int32')
+    sobel_h = scipy.ndimage.sobel(g_image_data, axis=0)
+    sobel_v = scipy.ndimage.sobel(g_image_data, axis=1)
+    magnitude = numpy.sqrt(sobel_h**2 + sobel_v**2)
+    max_mag = numpy.max(magnitude)
+    if max_mag == 0:
+        magnitude_norm_2D = numpy.zeros(magnitude.shape, dtype=image_data.dtype)
+    else:
+        magnitude_norm_2D = (magnitude * (255.0 / numpy.max(magnitude))).astype(image_data.dtype)
+    if image_type == 'edge_map':
+        result = numpy.stack([magnitude_norm_2D] * 3, axis=-1)
+    else:
+        enhance_weight = 0.5
+        edge_map_3D = numpy.stack([magnitude_norm_2D] * 3, axis=-1).astype('float32')
+        original_3D = image_data[..., :3].astype('float32')
+        blended = original_3D + ( edge_map_3D * enhance_weight )
+        result = numpy.clip(blended, 0, 255).astype(image_data.dtype)
+    return result
+
+
+@pytest.mark.parametrize("image_type", ["edge_map", "edge_enhanced"])
+@pytest.mark.parametrize("implementation", [legacy_edge_filter, edge_filter], ids=["legacy", "current"])
+def test_edge_filter_time(benchmark, large_image, implementation, image_type):
+    benchmark.group = f"edge_filter-{image_type}"
+    benchmark.extra_info["peak_memory_bytes"] = measure_peak_memory(implementation, large_image, image_type)
+    benchmark.extra_info["peak_memory_image_multiple"] = benchmark.extra_info["peak_memory_bytes"] / large_image.nbytes
+    benchmark(implementation, large_image, image_type)
+
+
+@pytest.mark.parametrize("image_type", ["edge_map", "edge_enhanced"])
+def test_edge_filter_peak_memory_is_about_3x_the_image(large_image, image_type):
+    """
+    GIVEN a large image
+    WHEN edge_filter is called
+    THEN the peak memory (including the result) is about 3x the size of the image
+    AND it is a fraction of the legacy implementation
+    """
+    legacy_peak = measure_peak_memory(legacy_edge_filter, large_image, image_type)
+    current_peak = measure_peak_memory(edge_filter, large_image, image_type)
+    assert current_peak <= 3.5 * large_image.nbytes
+    assert current_peak * 3 < legacy_peak
+
+# --- per-channel filters on the shared thread pool ---
+
+@pytest.mark.parametrize("threads", [1, 3])
+@pytest.mark.parametrize("augmentation, kwargs", [
+    (gaussian_blur, {"amount": 200}),
+    (max_filter, {"size": 9}),
+    (min_filter, {"size": 9}),
+    (percentile_filter, {"percentile": 25, "size": 5}),
+    (uniform_blur, {"size": 9}),
+], ids=["gaussian_blur", "max_filter", "min_filter", "percentile_filter", "uniform_blur"])
+def test_channel_filter_threads(benchmark, mocker, large_image, augmentation, kwargs, threads):
+    """
+    Compare serial filtering against filtering R, G and B on separate threads.
+    On a machine with 3 or more cores the threaded run should take about a third of the time.
+    """
+    benchmark.group = f"{augmentation.__name__}-threads"
+    shutdown_executor()
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", threads)
+    try:
+        benchmark(augmentation, large_image, **kwargs)
+    finally:
+        shutdown_executor()
+
+# --- noise ---
+
+def legacy_salt_noise(image_data: numpy.ndarray, amount: int) -> numpy.ndarray:
+    """
+    The implementation of salt_noise that sampled coordinates with replacement
+    and drew a random colour array for a constant value.
+    Kept as a baseline for comparison.
+    """
+    value = amount / 100
+    output_image = image_data.copy()
+    height, width = output_image.shape[:2]
+    num_channels = output_image.shape[2]
+    bit_depth = output_image.dtype
+    max_val = numpy.iinfo(bit_depth).max
+    num_pixels = int(value * height * width)
+    rows = numpy.random.randint(low=0, high=height, size=num_pixels)
+    columns = numpy.random.randint(low=0, high=width, size=num_pixels)
+    random_white = numpy.random.randint(low=max_val, high=max_val + 1, size=(num_pixels, num_channels), dtype=bit_depth)
+    output_image[rows, columns] = random_white
+    return output_image
+
+
+@pytest.mark.parametrize("implementation", [
+    legacy_salt_noise,
+    salt_noise,
+    pepper_noise,
+    salt_and_pepper_noise,
+    rainbow_noise,
+], ids=["legacy_salt_noise", "salt_noise", "pepper_noise", "salt_and_pepper_noise", "rainbow_noise"])
+def test_noise_time(benchmark, large_image, implementation):
+    benchmark.group = "noise-100-percent"
+    benchmark.extra_info["peak_memory_image_multiple"] = (
+        measure_peak_memory(implementation, large_image, amount=100) / large_image.nbytes
+    )
+    benchmark(implementation, large_image, amount=100)
+
+
+def test_salt_noise_allocates_a_tenth_of_the_legacy_implementation(large_image):
+    """
+    GIVEN a large image
+    WHEN salt_noise is called with an amount of 100%
+    THEN the memory allocated on top of the output image is less than a tenth of the legacy implementation
+    """
+    legacy_peak = measure_peak_memory(legacy_salt_noise, large_image, amount=100)
+    current_peak = measure_peak_memory(salt_noise, large_image, amount=100)
+    assert (current_peak - large_image.nbytes) * 10 < legacy_peak - large_image.nbytes
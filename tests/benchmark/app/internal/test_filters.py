@@ -0,0 +1,58 @@
+import numpy
+import pytest
+import scipy.ndimage
+
+from app.internal import filters
+
+# a 4 megapixel channel
+CHANNEL_SHAPE = (2048, 2048)
+# the cost of each filter should stay flat across these window sizes
+SIZES = [3, 9, 17, 33, 65, 128]
+
+
+@pytest.fixture(scope="module")
+def large_channel() -> numpy.ndarray:
+    rng = numpy.random.default_rng(seed=0)
+    return rng.integers(low=0, high=256, size=CHANNEL_SHAPE, dtype=numpy.uint8)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("function", [
+    filters.maximum_filter,
+    filters.minimum_filter,
+    filters.uniform_filter,
+], ids=["maximum_filter", "minimum_filter", "uniform_filter"])
+def test_separable_filter_cost_by_size(benchmark, large_channel, function, size):
+    benchmark.group = function.__name__
+    benchmark(function, large_channel, size=size)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_scipy_maximum_filter_cost_by_size(benchmark, large_channel, size):
+    """
+    The scipy filter, for comparison with the separable maximum_filter.
+    """
+    benchmark.group = "maximum_filter"
+    benchmark(scipy.ndimage.maximum_filter, large_channel, size=size)
+
+# sigmas either side of GAUSSIAN_FFT_MIN_SIGMA
+SIGMAS = [0.5, 1, 2, 4, 8, 16, 32, 50]
+
+
+@pytest.mark.parametrize("sigma", SIGMAS)
+def test_scipy_gaussian_filter_cost_by_sigma(benchmark, large_channel, sigma):
+    """
+    The direct convolution. Its cost grows with the kernel radius.
+    """
+    benchmark.group = "gaussian_filter"
+    benchmark(scipy.ndimage.gaussian_filter, large_channel, sigma=sigma)
+
+
+@pytest.mark.parametrize("sigma", SIGMAS)
+def test_fft_gaussian_filter_cost_by_sigma(benchmark, large_channel, sigma):
+    """
+    The FFT. Its cost only grows with the padding around the channel.
+    """
+    benchmark.group = "gaussian_filter"
+    output = numpy.empty_like(large_channel)
+    benchmark(filters._fft_gaussian_filter, large_channel, sigma=sigma, output=output)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import numpy
+import pytest
+
+from app.internal.content_addressing import hash_image_content
+from app.repository import directory_manager
+
+# the number of uploads written at the same time
+CONCURRENT_UPLOADS = 16
+# a 1 megapixel upload... noise so the PNG encoder has real work to do
+IMAGE_SHAPE = (1024, 1024, 3)
+# how often the probe asks to be woken up
+PROBE_INTERVAL = 0.001
+
+
+@pytest.fixture(scope="module")
+def upload_image_data() -> numpy.ndarray:
+    rng = numpy.random.default_rng(seed=0)
+    return rng.integers(low=0, high=256, size=IMAGE_SHAPE, dtype=numpy.uint8)
+
+
+async def _blocking_write_unprocessed_blob(image_data, content_hash):
+    """
+    The earlier write_unprocessed_blob... it wrote the file on the event loop.
+    """
+    return directory_manager._write_unprocessed_blob(image_data, content_hash)
+
+
+async def measure_event_loop_lag(write_blob, image_data) -> float:
+    """
+    Writes CONCURRENT_UPLOADS blobs at once while a probe measures how late the event loop wakes it.
+    Returns the worst lag in seconds. Every request on the worker waits at least this long.
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+    async def upload(index):
+        await write_blob(image_data, hash_image_content(f"{time.time_ns()}-{index}".encode()))
+
+    probe_task = asyncio.create_task(probe())
+    # let the probe start before the uploads
+    await asyncio.sleep(PROBE_INTERVAL)
+    await asyncio.gather(*(upload(index) for index in range(CONCURRENT_UPLOADS)))
+    done.set()
+    await probe_task
+    return max(lags)
+
+
+@pytest.fixture
+def blob_volume(mocker, tmp_path):
+    mocker.patch.dict(directory_manager.VOLUME_PATHS, {"unprocessed_image_data": tmp_path})
+    return tmp_path
+
+
+@pytest.mark.parametrize("write_blob", [
+    _blocking_write_unprocessed_blob,
+    directory_manager.write_unprocessed_blob,
+], ids=["on_event_loop", "storage_io_threads"])
+def test_event_loop_lag_during_concurrent_uploads(benchmark, blob_volume, upload_image_data, write_blob):
+    """
+    The time is how long it takes to store every upload.
+    The worst event loop lag (how long any other request would have been stalled) is in extra_info.
+    """
+    benchmark.group = "event_loop_lag"
+    lags = []
+
+    def run():
+        lags.append(asyncio.run(measure_event_loop_lag(write_blob, upload_image_data)))
+
+    benchmark.pedantic(run, rounds=3, iterations=1)
+    benchmark.extra_info["max_event_loop_lag_ms"] = round(max(lags) * 1000, 1)
+
+
+def test_storage_io_threads_keep_the_event_loop_responsive(blob_volume, upload_image_data):
+    """
+    GIVEN many uploads written at the same time
+    WHEN they are written in storage I/O threads
+    THEN the event loop is stalled for a fraction of the time it was when they were written on the event loop
+    """
+    lag_on_event_loop = asyncio.run(measure_event_loop_lag(_blocking_write_unprocessed_blob, upload_image_data))
+    lag_in_threads = asyncio.run(measure_event_loop_lag(directory_manager.write_unprocessed_blob, upload_image_data))
+    assert lag_in_threads < lag_on_event_loop / 4
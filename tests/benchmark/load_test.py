@@ -0,0 +1,294 @@
+"""
+A load generator for a running instance of the image-augmentation-service.
+
+The harness:
+1. signs up a pool of users
+2. uploads an image for every user
+3. drives a weighted mix of augment and download calls at a target concurrency
+4. reports latency percentiles, throughput and error rates per endpoint
+
+Example:
+    python -m tests.benchmark.load_test --base-url http://localhost:8000 --concurrency 32 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+import numpy
+
+from app.schemas.image import (
+    AugmentationRequestBody,
+    EdgeFilterArguments,
+    FlipArguments,
+    GaussianBlurArguments,
+    RainbowNoiseArguments,
+    RotateArguments,
+    ShiftArguments,
+)
+from tests.helperfunc import TESTS_DIR
+
+DEFAULT_IMAGE_PATH = TESTS_DIR / "data" / "colour-scribbles-256x256.png"
+
+# the augmentations sent during the load phase
+# these are picked at random for every augment call
+AUGMENTATION_REQUESTS = [
+    AugmentationRequestBody(arguments=FlipArguments(processing="flip", axis="x")),
+    AugmentationRequestBody(arguments=RotateArguments(processing="rotate", angle=30)),
+    AugmentationRequestBody(arguments=ShiftArguments(processing="shift", direction="left", distance=10)),
+    AugmentationRequestBody(arguments=RainbowNoiseArguments(processing="rainbow_noise", amount=10)),
+    AugmentationRequestBody(arguments=GaussianBlurArguments(processing="gaussian_blur", amount=150)),
+    AugmentationRequestBody(arguments=EdgeFilterArguments(processing="edge_filter", image_type="edge_map")),
+]
+
+# the operations a worker can perform during the load phase
+OPERATIONS = ("augment", "download_unprocessed", "download_processed")
+
+
+@dataclass
+class EndpointStats:
+    """
+    The latencies and errors observed for a single endpoint.
+    """
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        return float(numpy.percentile(self.latencies, q))
+
+
+@dataclass
+class VirtualUser:
+    """
+    A user created during setup and the images they own.
+    """
+    headers: dict[str, str]
+    unprocessed_image_ids: list[str] = field(default_factory=list)
+    processed_image_ids: list[str] = field(default_factory=list)
+
+
+class LoadTest:
+    """
+    Drives a mix of requests against the service and records what happened.
+    """
+
+    def __init__(
+            self,
+            client: httpx.AsyncClient,
+            image_bytes: bytes,
+            mix: dict[str, int],
+            seed: int | None = None,
+    ):
+        self.client = client
+        self.image_bytes = image_bytes
+        self.mix = mix
+        self.random = random.Random(seed)
+        self.users: list[VirtualUser] = []
+        self.stats: dict[str, EndpointStats] = {}
+
+    async def _request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        """
+        Send a request and record its latency against an endpoint label.
+        """
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats.latencies.append(time.perf_counter() - start)
+            stats.errors += 1
+            return None
+        stats.latencies.append(time.perf_counter() - start)
+        if response.is_error:
+            stats.errors += 1
+            return None
+        return response
+
+    async def sign_up(self) -> VirtualUser | None:
+        headers = {"X-External-User-ID": f"load-test-{uuid.uuid4()}"}
+        response = await self._request("sign_up", "POST", "/users-api/sign-up", headers=headers)
+        if response is None:
+            return None
+        user = VirtualUser(headers=headers)
+        self.users.append(user)
+        return user
+
+    async def upload(self, user: VirtualUser) -> None:
+        response = await self._request(
+            "upload",
+            "POST",
+            "/image-api/upload",
+            headers=user.headers,
+            files={"image": ("load-test.png", self.image_bytes, "image/png")},
+        )
+        if response is not None:
+            user.unprocessed_image_ids.append(response.json()["unprocessed_image_id"])
+
+    async def augment(self, user: VirtualUser) -> None:
+        unprocessed_image_id = self.random.choice(user.unprocessed_image_ids)
+        request_body = self.random.choice(AUGMENTATION_REQUESTS)
+        response = await self._request(
+            "augment",
+            "POST",
+            f"/image-api/augment/{unprocessed_image_id}",
+            headers=user.headers,
+            json=request_body.model_dump(),
+        )
+        if response is not None:
+            user.processed_image_ids.append(response.json()["processed_image_id"])
+
+    async def download_unprocessed(self, user: VirtualUser) -> None:
+        unprocessed_image_id = self.random.choice(user.unprocessed_image_ids)
+        await self._request(
+            "download_unprocessed",
+            "GET",
+            f"/image-api/unprocessed-image/{unprocessed_image_id}/",
+            headers=user.headers,
+        )
+
+    async def download_processed(self, user: VirtualUser) -> None:
+        if not user.processed_image_ids:
+            # nothing to download yet... make something instead
+            return await self.augment(user)
+        processed_image_id = self.random.choice(user.processed_image_ids)
+        await self._request(
+            "download_processed",
+            "GET",
+            f"/image-api/processed-image/{processed_image_id}/",
+            headers=user.headers,
+        )
+
+    async def set_up(self, num_users: int) -> None:
+        """
+        Create the users and give each of them an image to work with.
+        """
+        users = await asyncio.gather(*(self.sign_up() for _ in range(num_users)))
+        await asyncio.gather(*(self.upload(user) for user in users if user is not None))
+        # drop users that could not upload anything
+        self.users = [user for user in self.users if user.unprocessed_image_ids]
+        if not self.users:
+            raise RuntimeError("no users could be set up. Is the service running?")
+
+    async def _worker(self, deadline: float) -> None:
+        operations = list(self.mix)
+        weights = [self.mix[operation] for operation in operations]
+        while time.perf_counter() < deadline:
+            user = self.random.choice(self.users)
+            operation = self.random.choices(operations, weights=weights)[0]
+            await getattr(self, operation)(user)
+
+    async def run(self, concurrency: int, duration: float) -> float:
+        """
+        Run the load phase and return the elapsed wall-clock time in seconds.
+        """
+        # the setup phase is not part of the measurement
+        self.stats = {}
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(self._worker(deadline) for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> dict[str, dict[str, float]]:
+        """
+        Summarise the load phase per endpoint.
+        Latencies are reported in milliseconds.
+        """
+        return {
+            endpoint: {
+                "requests": stats.requests,
+                "requests_per_second": stats.requests / elapsed if elapsed else 0.0,
+                "error_rate": stats.errors / stats.requests if stats.requests else 0.0,
+                "p50_ms": stats.percentile(50) * 1000,
+                "p95_ms": stats.percentile(95) * 1000,
+                "p99_ms": stats.percentile(99) * 1000,
+            }
+            for endpoint, stats in sorted(self.stats.items())
+        }
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    """
+    Parse a mix such as 'augment=2,download_processed=5' into operation weights.
+    """
+    mix = {}
+    for item in value.split(","):
+        operation, _, weight = item.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                f"Invalid operation: '{operation}'. Must be one of {', '.join(OPERATIONS)}."
+            )
+        mix[operation] = int(weight or 1)
+    return mix
+
+
+def format_report(report: dict[str, dict[str, float]]) -> str:
+    header = f"{'endpoint':<22}{'requests':>10}{'req/s':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    for endpoint, row in report.items():
+        lines.append(
+            f"{endpoint:<22}{row['requests']:>10}{row['requests_per_second']:>10.1f}"
+            f"{row['error_rate']:>9.1%}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+async def main(arguments: argparse.Namespace) -> dict[str, dict[str, float]]:
+    image_bytes = Path(arguments.image).read_bytes()
+    limits = httpx.Limits(max_connections=arguments.concurrency)
+    async with httpx.AsyncClient(
+            base_url=arguments.base_url,
+            limits=limits,
+            timeout=arguments.timeout,
+    ) as client:
+        load_test = LoadTest(
+            client=client,
+            image_bytes=image_bytes,
+            mix=arguments.mix,
+            seed=arguments.seed,
+        )
+        await load_test.set_up(num_users=arguments.users)
+        elapsed = await load_test.run(
+            concurrency=arguments.concurrency,
+            duration=arguments.duration,
+        )
+    report = load_test.report(elapsed)
+    print(format_report(report))
+    if arguments.json:
+        Path(arguments.json).write_text(json.dumps(report, indent=2))
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("API_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--users", type=int, default=8, help="number of users to sign up")
+    parser.add_argument("--concurrency", type=int, default=16, help="number of requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="length of the load phase in seconds")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("augment=2,download_unprocessed=1,download_processed=3"),
+        help="weighted mix of operations",
+    )
+    parser.add_argument("--image", default=str(DEFAULT_IMAGE_PATH), help="image to upload")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a repeatable request sequence")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
@@ -0,0 +1,71 @@
+import io
+import uuid
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from PIL import Image
+
+from app.schemas.image import AugmentationRequestBody, ShiftArguments
+
+pytestmark = pytest.mark.asyncio
+
+async def test_download_a_processed_image_preview_200(http_client):
+    """
+    This test downloads a preview of a processed image.
+    1. Create a user
+    2. Upload an image
+    3. Augment the image
+    4. Download a preview of every size
+    """
+    external_id = str(uuid.uuid4())
+    headers = {
+        "X-External-User-ID": external_id
+    }
+    # --- CREATE A USER ---
+    response = await http_client.post(
+        url="/users-api/sign-up",
+        headers=headers
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    # --- UPLOAD AN IMAGE ---
+    image_path = Path("/image-augmentation-service/tests/data/test_image.png")
+    assert image_path.exists()
+    with open(image_path, "rb") as image_file:
+        upload_response = await http_client.post(
+            headers=headers,
+            url="/image-api/upload",
+            files={"image": ("test.png", image_file, "image/png")},
+        )
+    assert upload_response.status_code == status.HTTP_201_CREATED
+    # --- AUGMENT AN IMAGE ---
+    augment_response = await http_client.post(
+        headers=headers,
+        url=f"/image-api/augment/{str(upload_response.json()['unprocessed_image_id'])}",
+        json=AugmentationRequestBody(
+            arguments=ShiftArguments(
+                processing='shift',
+                direction='left',
+                distance=100,
+            )
+        ).model_dump()
+    )
+    assert augment_response.status_code == status.HTTP_201_CREATED
+    # --- DOWNLOAD A PREVIEW ---
+    for size in (128, 512):
+        download_response = await http_client.get(
+            headers=headers,
+            url=f"/image-api/processed-image/{augment_response.json()['processed_image_id']}/",
+            params={"size": size},
+        )
+        assert download_response.status_code == status.HTTP_200_OK
+        assert download_response.headers["content-type"] == "image/webp"
+        with Image.open(io.BytesIO(download_response.content)) as preview:
+            assert max(preview.size) <= size
+    # --- AN UNKNOWN SIZE IS REJECTED ---
+    download_response = await http_client.get(
+        headers=headers,
+        url=f"/image-api/processed-image/{augment_response.json()['processed_image_id']}/",
+        params={"size": 300},
+    )
+    assert download_response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -11,7 +11,7 @@ from app.schemas.image import (
     DarkenArguments,
     EdgeFilterArguments, FlipArguments, InvertArguments, MaxFilterArguments, MinFilterArguments,
     ShiftArguments, GaussianBlurArguments, MuteChannelArguments, PepperNoiseArguments, RainbowNoiseArguments,
-    PercentileFilterArguments, RotateArguments, SaltNoiseArguments, UniformBlurArguments, ZoomArguments, TintArguments,
+    PercentileFilterArguments, RotateArguments, SaltAndPepperNoiseArguments, SaltNoiseArguments, UniformBlurArguments, ZoomArguments, TintArguments,
 )
 import pytest
 
@@ -228,6 +228,18 @@ async def test_every_augmentation(http_client):
         ).model_dump()
     )
     responses_map.update({'rotate': augment_response.json()})
+    # --- salt_and_pepper_noise
+    augment_response = await http_client.post(
+        headers=headers,
+        url=f"/image-api/augment/{str(upload_response.json()['unprocessed_image_id'])}",
+        json=AugmentationRequestBody(
+            arguments=SaltAndPepperNoiseArguments(
+                processing='salt_and_pepper_noise',
+                amount=33
+            )
+        ).model_dump()
+    )
+    responses_map.update({'salt_and_pepper_noise': augment_response.json()})
     # --- salt_noise
     augment_response = await http_client.post(
         headers=headers,
@@ -1,16 +1,43 @@
 import uuid
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
 
+import psycopg
 import pytest
 import sqlalchemy
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.exceptions.image import ImageNotFound
+from app.exceptions.job import JobAlreadyExists, JobNotFound
+from app.internal.job_notifications import (
+    JOB_STATUS_CHANNEL,
+    decode_job_status,
+    get_conninfo,
+)
 from app.repository.image import (
+    complete_ProcessingJob_entry,
+    count_ProcessedImage_entries,
+    create_ProcessedImage_entry,
+    create_ProcessingJob_entry,
     create_UnprocessedImage_entry,
+    delete_UnprocessedImage_entries,
+    read_cancelled_ProcessingJob_ids,
+    read_ProcessedImage_entries_with_requests,
+    read_ProcessingJob_entry,
+    read_UnprocessedImage_entries,
     read_UnprocessedImage_entry,
+    reference_ImageBlob_entry,
+    stream_UnprocessedImage_files,
+    update_ProcessingJob_entry,
+)
+from app.schemas.transactions_db import (
+    ImageBlob,
+    JobPriority,
+    JobStatus,
+    ProcessingJob,
+    UnprocessedImage,
+    User,
 )
-from app.schemas.transactions_db import UnprocessedImage, User
 
 pytestmark = pytest.mark.asyncio
 
@@ -133,3 +160,378 @@ async def test_read_UnprocessedImage_fails_when_user_does_not_match(
             user_id=uuid.uuid4(),
             db_session=async_db_session,
         )
+
+
+
+async def test_read_ProcessedImage_entries_with_requests_includes_the_job_request(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    fake_user = await test_user
+    unprocessed_image = await create_UnprocessedImage_entry(
+        original_filename='my_cool_image.png',
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=fake_user.id,
+        db_session=async_db_session,
+    )
+    # one image with a recorded job... and one made before jobs were recorded
+    with_job = await create_ProcessedImage_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        storage_filename=f"{uuid.uuid4()}.png",
+        db_session=async_db_session,
+    )
+    request_body = {"arguments": {"processing": "flip", "axis": "x"}}
+    job = await create_ProcessingJob_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        processed_image_id=with_job.id,
+        upload_request_body=request_body,
+        job_status=JobStatus.SUCCEEDED,
+        requested_at=with_job.created_at,
+        db_session=async_db_session,
+    )
+    assert isinstance(job, ProcessingJob)
+    without_job = await create_ProcessedImage_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        storage_filename=f"{uuid.uuid4()}.png",
+        db_session=async_db_session,
+    )
+    # call the function
+    entries = await read_ProcessedImage_entries_with_requests(
+        user_id=fake_user.id,
+        unprocessed_image_id=unprocessed_image.id,
+        db_session=async_db_session,
+    )
+    # check the results... oldest first
+    assert entries == [(with_job, request_body), (without_job, None)]
+    assert await count_ProcessedImage_entries(user_id=fake_user.id, db_session=async_db_session) == 2
+    # another user sees nothing
+    assert await read_ProcessedImage_entries_with_requests(user_id=uuid.uuid4(), db_session=async_db_session) == []
+
+
+async def test_update_ProcessingJob_entry_moves_a_job_through_its_states(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN a pending job
+    WHEN it starts and then succeeds
+    THEN it keeps its started_at... and started_at - requested_at is its wait for a worker
+    """
+    fake_user = await test_user
+    unprocessed_image = await create_UnprocessedImage_entry(
+        original_filename='my_cool_image.png',
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=fake_user.id,
+        db_session=async_db_session,
+    )
+    requested_at = datetime.now(UTC)
+    job = await create_ProcessingJob_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        processed_image_id=None,
+        upload_request_body={"arguments": {"processing": "flip", "axis": "x"}},
+        job_status=JobStatus.PENDING,
+        requested_at=requested_at,
+        priority=JobPriority.LOW,
+        db_session=async_db_session,
+    )
+    started_at = requested_at + timedelta(seconds=2)
+    await update_ProcessingJob_entry(
+        job_id=job.id,
+        job_status=JobStatus.PROCESSING,
+        started_at=started_at,
+        db_session=async_db_session,
+    )
+    processed_image = await create_ProcessedImage_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        storage_filename=f"{uuid.uuid4()}.png",
+        db_session=async_db_session,
+    )
+    await update_ProcessingJob_entry(
+        job_id=job.id,
+        job_status=JobStatus.SUCCEEDED,
+        processed_image_id=processed_image.id,
+        completed_at=started_at + timedelta(seconds=1),
+        db_session=async_db_session,
+    )
+    await async_db_session.refresh(job)
+    assert job.job_status == JobStatus.SUCCEEDED
+    assert job.priority == JobPriority.LOW
+    assert job.processed_image_id == processed_image.id
+    assert job.started_at - job.requested_at == timedelta(seconds=2)
+
+
+async def test_a_cancelled_ProcessingJob_entry_is_never_moved_back(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN a job with an id chosen by the client
+    WHEN it is cancelled while it is processing
+    THEN it cannot be moved to processing again or completed
+    AND no processed image is created for it
+    """
+    fake_user = await test_user
+    unprocessed_image = await create_UnprocessedImage_entry(
+        original_filename='my_cool_image.png',
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=fake_user.id,
+        db_session=async_db_session,
+    )
+    job_id = uuid.uuid4()
+    job = await create_ProcessingJob_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        processed_image_id=None,
+        upload_request_body={"arguments": {"processing": "invert"}},
+        job_status=JobStatus.PENDING,
+        requested_at=datetime.now(UTC),
+        job_id=job_id,
+        db_session=async_db_session,
+    )
+    assert job.id == job_id
+    assert await update_ProcessingJob_entry(
+        job_id=job_id,
+        job_status=JobStatus.PROCESSING,
+        started_at=datetime.now(UTC),
+        from_statuses=(JobStatus.PENDING,),
+        db_session=async_db_session,
+    )
+    assert await update_ProcessingJob_entry(
+        job_id=job_id,
+        job_status=JobStatus.CANCELLED,
+        completed_at=datetime.now(UTC),
+        from_statuses=(JobStatus.PENDING, JobStatus.PROCESSING),
+        db_session=async_db_session,
+    )
+    assert not await update_ProcessingJob_entry(
+        job_id=job_id,
+        job_status=JobStatus.PROCESSING,
+        from_statuses=(JobStatus.PENDING,),
+        db_session=async_db_session,
+    )
+    assert await complete_ProcessingJob_entry(
+        job_id=job_id,
+        unprocessed_image_id=unprocessed_image.id,
+        storage_filename=f"{uuid.uuid4()}.png",
+        completed_at=datetime.now(UTC),
+        db_session=async_db_session,
+    ) is None
+    assert await count_ProcessedImage_entries(user_id=fake_user.id, db_session=async_db_session) == 0
+    assert await read_cancelled_ProcessingJob_ids(job_ids=[job_id, uuid.uuid4()], db_session=async_db_session) == {job_id}
+    job = await read_ProcessingJob_entry(job_id=job_id, user_id=fake_user.id, db_session=async_db_session)
+    assert job.job_status == JobStatus.CANCELLED
+    # another user cannot see it... or take its id
+    with pytest.raises(JobNotFound):
+        await read_ProcessingJob_entry(job_id=job_id, user_id=uuid.uuid4(), db_session=async_db_session)
+    with pytest.raises(JobAlreadyExists):
+        await create_ProcessingJob_entry(
+            unprocessed_image_id=unprocessed_image.id,
+            processed_image_id=None,
+            upload_request_body={"arguments": {"processing": "invert"}},
+            job_status=JobStatus.PENDING,
+            requested_at=datetime.now(UTC),
+            job_id=job_id,
+            db_session=async_db_session,
+        )
+
+
+async def test_complete_ProcessingJob_entry_links_the_image_it_made(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    fake_user = await test_user
+    unprocessed_image = await create_UnprocessedImage_entry(
+        original_filename='my_cool_image.png',
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=fake_user.id,
+        db_session=async_db_session,
+    )
+    job = await create_ProcessingJob_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        processed_image_id=None,
+        upload_request_body={"arguments": {"processing": "invert"}},
+        job_status=JobStatus.PROCESSING,
+        requested_at=datetime.now(UTC),
+        db_session=async_db_session,
+    )
+    processed_image = await complete_ProcessingJob_entry(
+        job_id=job.id,
+        unprocessed_image_id=unprocessed_image.id,
+        storage_filename=f"{uuid.uuid4()}.png",
+        completed_at=datetime.now(UTC),
+        db_session=async_db_session,
+    )
+    await async_db_session.refresh(job)
+    assert job.job_status == JobStatus.SUCCEEDED
+    assert job.processed_image_id == processed_image.id
+
+
+async def test_every_committed_move_of_a_ProcessingJob_entry_is_notified(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN a connection listening for job status notifications
+    WHEN a job moves to processing, fails to move back to pending and then succeeds
+    THEN exactly the two moves are notified... in order
+    """
+    fake_user = await test_user
+    unprocessed_image = await create_UnprocessedImage_entry(
+        original_filename='my_cool_image.png',
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=fake_user.id,
+        db_session=async_db_session,
+    )
+    job = await create_ProcessingJob_entry(
+        unprocessed_image_id=unprocessed_image.id,
+        processed_image_id=None,
+        upload_request_body={"arguments": {"processing": "invert"}},
+        job_status=JobStatus.PENDING,
+        requested_at=datetime.now(UTC),
+        db_session=async_db_session,
+    )
+    async with await psycopg.AsyncConnection.connect(
+        get_conninfo(str(settings.DATABASE_URL)), autocommit=True,
+    ) as listener:
+        await listener.execute(f"LISTEN {JOB_STATUS_CHANNEL}")
+        assert await update_ProcessingJob_entry(
+            job_id=job.id,
+            job_status=JobStatus.PROCESSING,
+            from_statuses=(JobStatus.PENDING,),
+            db_session=async_db_session,
+        )
+        assert not await update_ProcessingJob_entry(
+            job_id=job.id,
+            job_status=JobStatus.PENDING,
+            from_statuses=(JobStatus.CANCELLED,),
+            db_session=async_db_session,
+        )
+        await complete_ProcessingJob_entry(
+            job_id=job.id,
+            unprocessed_image_id=unprocessed_image.id,
+            storage_filename=f"{uuid.uuid4()}.png",
+            completed_at=datetime.now(UTC),
+            db_session=async_db_session,
+        )
+        notified = [decode_job_status(notify.payload) async for notify in listener.notifies(timeout=1)]
+    assert notified == [(job.id, JobStatus.PROCESSING), (job.id, JobStatus.SUCCEEDED)]
+
+
+async def test_read_UnprocessedImage_entries_pages_by_key(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN 5 uploaded images
+    WHEN they are read 2 at a time, each page after the last entry of the one before
+    THEN every image is read exactly once, oldest first
+    """
+    fake_user = await test_user
+    created = []
+    for index in range(5):
+        created.append(await create_UnprocessedImage_entry(
+            original_filename=f'image_{index}.png',
+            storage_filename=f"{uuid.uuid4()}.png",
+            user_id=fake_user.id,
+            db_session=async_db_session,
+        ))
+    pages = []
+    after = None
+    while True:
+        page = await read_UnprocessedImage_entries(
+            user_id=fake_user.id,
+            limit=2,
+            after=after,
+            db_session=async_db_session,
+        )
+        if not page:
+            break
+        pages.append(page)
+        after = (page[-1].created_at, page[-1].id)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [entry.id for page in pages for entry in page] == [entry.id for entry in created]
+
+
+async def test_reference_ImageBlob_entry_counts_every_upload(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN the same bytes are uploaded twice
+    WHEN reference_ImageBlob_entry is called for each upload
+    THEN there is one ImageBlob entry with 2 references
+    """
+    fake_user = await test_user
+    content_hash = uuid.uuid4().hex * 2
+    for reference_count in (1, 2):
+        assert await reference_ImageBlob_entry(
+            content_hash=content_hash,
+            db_session=async_db_session,
+        ) == reference_count
+        await create_UnprocessedImage_entry(
+            original_filename='my_cool_image.png',
+            storage_filename=f"{uuid.uuid4()}.png",
+            user_id=fake_user.id,
+            content_hash=content_hash,
+            db_session=async_db_session,
+        )
+    result = await async_db_session.execute(
+        sqlalchemy.select(ImageBlob).where(ImageBlob.content_hash == content_hash)
+    )
+    assert result.scalar_one().reference_count == 2
+
+
+async def test_stream_UnprocessedImage_files_yields_every_entry_in_batches(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN 5 unprocessed images
+    WHEN they are streamed 2 at a time
+    THEN every image is yielded once in batches of 2, 2 and 1
+    """
+    fake_user = await test_user
+    created = [
+        await create_UnprocessedImage_entry(
+            original_filename='my_cool_image.png',
+            storage_filename=f"{uuid.uuid4()}.png",
+            user_id=fake_user.id,
+            db_session=async_db_session,
+        )
+        for _ in range(5)
+    ]
+    batches = [
+        batch async for batch in stream_UnprocessedImage_files(
+            user_id=fake_user.id,
+            batch_size=2,
+            db_session=async_db_session,
+        )
+    ]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert sorted(row.id for batch in batches for row in batch) == sorted(entry.id for entry in created)
+
+
+async def test_delete_UnprocessedImage_entries_releases_their_blob(
+        async_db_session: AsyncSession,
+        test_user: User,
+):
+    """
+    GIVEN an unprocessed image stored in a blob
+    WHEN its entry is deleted
+    THEN the blob is no longer referenced
+    """
+    fake_user = await test_user
+    content_hash = uuid.uuid4().hex * 2
+    await reference_ImageBlob_entry(content_hash=content_hash, db_session=async_db_session)
+    entry = await create_UnprocessedImage_entry(
+        original_filename='my_cool_image.png',
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=fake_user.id,
+        content_hash=content_hash,
+        db_session=async_db_session,
+    )
+    await delete_UnprocessedImage_entries(image_ids=[entry.id], db_session=async_db_session)
+    assert await async_db_session.get(UnprocessedImage, entry.id) is None
+    result = await async_db_session.execute(
+        sqlalchemy.select(ImageBlob.reference_count).where(ImageBlob.content_hash == content_hash)
+    )
+    assert result.scalar_one() == 0
@@ -0,0 +1,46 @@
+import argparse
+import json
+
+import numpy
+import pytest
+
+from app.commands import calibrate_cost_model
+from app.commands.calibrate_cost_model import CALIBRATION_CASES, fit_line, measure
+from app.internal.cost_model import PROCESSING_NAMES, load_calibration
+
+
+def test_every_processing_is_calibrated():
+    assert CALIBRATION_CASES.keys() == PROCESSING_NAMES
+
+
+def test_fit_line_recovers_a_line():
+    slope, intercept = fit_line([(1.0, 3.0), (2.0, 5.0), (4.0, 9.0)])
+    assert slope == pytest.approx(2.0)
+    assert intercept == pytest.approx(1.0)
+
+
+def test_fit_line_never_returns_a_negative_intercept():
+    slope, intercept = fit_line([(1.0, 1.0), (2.0, 3.0)])
+    assert intercept == 0.0
+    assert slope == pytest.approx(7 / 5)
+
+
+def test_fit_line_through_a_single_point():
+    assert fit_line([(2.0, 4.0)]) == (2.0, 0.0)
+
+
+def test_measure_does_not_change_the_image():
+    image_data = numpy.full((8, 8, 3), 10, dtype=numpy.uint8)
+    seconds, peak_bytes = measure("brighten", {"amount": 50}, image_data, repeats=2)
+    assert seconds >= 0
+    assert peak_bytes >= 0
+    assert (image_data == 10).all()
+
+
+def test_main_writes_a_calibration_the_model_can_load(mocker, tmp_path):
+    mocker.patch.dict(calibrate_cost_model.CALIBRATION_CASES, {"flip": [{"axis": "x"}]}, clear=True)
+    output = tmp_path / "calibration.json"
+    calibration = calibrate_cost_model.main(argparse.Namespace(sizes=[8, 16], repeats=1, output=output))
+    assert calibration.keys() == {"flip"}
+    assert json.loads(output.read_text())["sizes"] == [8, 16]
+    assert load_calibration(output) == calibration
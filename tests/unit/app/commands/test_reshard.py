@@ -0,0 +1,92 @@
+import uuid
+
+import pytest
+
+from app.commands.reshard import reshard_user_directory, reshard_volume
+from app.repository.directory_manager import get_sharded_path
+
+
+@pytest.fixture
+def flat_user_directory(tmp_path):
+    """
+    A user directory with 2 images and a preview stored before sharding.
+    """
+    user_dir_path = tmp_path / str(uuid.uuid4())
+    user_dir_path.mkdir()
+    names = [f"{uuid.uuid4()}.png", f"{uuid.uuid4()}.png"]
+    for name in names:
+        (user_dir_path / name).write_bytes(name.encode())
+    names.append(names[0].replace(".png", ".128.webp"))
+    (user_dir_path / names[2]).write_bytes(b"preview")
+    return user_dir_path, names
+
+
+def test_reshard_user_directory_moves_every_image(flat_user_directory):
+    """
+    GIVEN images stored before sharding
+    WHEN reshard_user_directory is called
+    THEN every image is moved to its sharded location with its content
+    AND an image and its preview end up in the same shard
+    """
+    user_dir_path, names = flat_user_directory
+    report = reshard_user_directory(user_dir_path, levels=2)
+    assert report.moved == 3
+    for name in names:
+        assert get_sharded_path(user_dir_path, name, 2).exists()
+        assert not (user_dir_path / name).exists()
+    assert get_sharded_path(user_dir_path, names[0], 2).parent == get_sharded_path(user_dir_path, names[2], 2).parent
+
+
+def test_reshard_user_directory_is_repeatable(flat_user_directory):
+    user_dir_path, names = flat_user_directory
+    reshard_user_directory(user_dir_path, levels=2)
+    report = reshard_user_directory(user_dir_path, levels=2)
+    assert report.moved == 0
+    assert report.already_in_place == 3
+
+
+def test_reshard_user_directory_back_to_flat_removes_the_shards(flat_user_directory):
+    user_dir_path, names = flat_user_directory
+    reshard_user_directory(user_dir_path, levels=2)
+    report = reshard_user_directory(user_dir_path, levels=0)
+    assert report.moved == 3
+    assert sorted(entry.name for entry in user_dir_path.iterdir()) == sorted(names)
+
+
+def test_reshard_user_directory_dry_run_moves_nothing(flat_user_directory):
+    user_dir_path, names = flat_user_directory
+    report = reshard_user_directory(user_dir_path, levels=2, dry_run=True)
+    assert report.moved == 3
+    assert sorted(entry.name for entry in user_dir_path.iterdir()) == sorted(names)
+
+
+def test_reshard_user_directory_leaves_conflicts(flat_user_directory):
+    user_dir_path, names = flat_user_directory
+    target = get_sharded_path(user_dir_path, names[1], 2)
+    target.parent.mkdir(parents=True)
+    target.write_bytes(b"other")
+    report = reshard_user_directory(user_dir_path, levels=2)
+    assert report.conflicts == 1
+    assert (user_dir_path / names[1]).exists()
+    assert target.read_bytes() == b"other"
+
+
+def test_reshard_volume_moves_image_directories_and_skips_blobs(tmp_path):
+    """
+    GIVEN a processed image volume with an image directory stored before sharding
+    AND a directory of content addressed blobs
+    WHEN reshard_volume is called
+    THEN the image directory is moved with everything in it
+    AND the blobs are left alone
+    """
+    image_dir_path = tmp_path / str(uuid.uuid4()) / str(uuid.uuid4())
+    image_dir_path.mkdir(parents=True)
+    (image_dir_path / "augmented.png").write_bytes(b"png")
+    blob_path = tmp_path / "blobs" / "ab" / "cd" / "abcd.png"
+    blob_path.parent.mkdir(parents=True)
+    blob_path.write_bytes(b"blob")
+    report = reshard_volume(tmp_path, levels=2)
+    assert report.moved == 1
+    moved_path = get_sharded_path(image_dir_path.parent, image_dir_path.name, 2)
+    assert (moved_path / "augmented.png").read_bytes() == b"png"
+    assert blob_path.exists()
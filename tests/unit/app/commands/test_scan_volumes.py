@@ -0,0 +1,177 @@
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.commands.scan_volumes import VolumeScanner
+from app.repository.directory_manager import (
+    TOMBSTONE_DIRECTORY,
+    get_sharded_path,
+    get_unprocessed_blob_location,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+def _stream(*batches):
+    """
+    A stand-in for a repository function that yields rows in batches.
+    """
+    async def _stream_rows(**kwargs):
+        for batch in batches:
+            yield batch
+    return _stream_rows
+
+
+@pytest.fixture
+def volumes(mocker, tmp_path):
+    volume_paths = {
+        "unprocessed_image_data": tmp_path / "unprocessed",
+        "processed_image_data": tmp_path / "processed",
+    }
+    for volume_path in volume_paths.values():
+        volume_path.mkdir()
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", volume_paths)
+    return volume_paths
+
+
+@pytest.fixture
+def user_images(mocker, volumes):
+    """
+    A user with 2 unprocessed images and 2 processed images in the database...
+    one of each has its file, one of each has lost it.
+    """
+    user_id = uuid.uuid4()
+    stored = SimpleNamespace(id=uuid.uuid4(), storage_filename=f"{uuid.uuid4()}.png", content_hash=None)
+    lost = SimpleNamespace(id=uuid.uuid4(), storage_filename=f"{uuid.uuid4()}.png", content_hash=None)
+    processed_stored = SimpleNamespace(id=uuid.uuid4(), unprocessed_image_id=stored.id, storage_filename="a.png")
+    processed_lost = SimpleNamespace(id=uuid.uuid4(), unprocessed_image_id=stored.id, storage_filename="b.png")
+    unprocessed_user_dir = volumes["unprocessed_image_data"] / str(user_id)
+    image_path = get_sharded_path(unprocessed_user_dir, stored.storage_filename, 2)
+    image_path.parent.mkdir(parents=True)
+    image_path.write_bytes(b"image")
+    # a preview belongs to its image
+    image_path.with_name(image_path.stem + ".128.webp").write_bytes(b"preview")
+    # an upload that never made it to the database
+    orphan_path = get_sharded_path(unprocessed_user_dir, f"{uuid.uuid4()}.png", 2)
+    orphan_path.parent.mkdir(parents=True, exist_ok=True)
+    orphan_path.write_bytes(b"orphan")
+    processed_dir_path = get_sharded_path(volumes["processed_image_data"] / str(user_id), str(stored.id), 2)
+    processed_dir_path.mkdir(parents=True)
+    (processed_dir_path / processed_stored.storage_filename).write_bytes(b"processed")
+    mocker.patch("app.commands.scan_volumes.stream_UnprocessedImage_files", _stream([stored, lost]))
+    mocker.patch("app.commands.scan_volumes.stream_ProcessedImage_files", _stream([processed_stored], [processed_lost]))
+    return SimpleNamespace(
+        user_id=user_id,
+        lost=lost,
+        processed_lost=processed_lost,
+        orphan_path=orphan_path,
+        image_path=image_path,
+    )
+
+
+async def test_scan_user_reports_orphaned_and_missing_files(user_images):
+    """
+    GIVEN a user with an orphaned file, a missing unprocessed image and a missing processed image
+    WHEN the user is scanned
+    THEN each is reported
+    AND nothing is changed
+    """
+    scanner = VolumeScanner(db_session=AsyncMock(), min_age=0)
+    await scanner.scan_user(user_images.user_id)
+    assert scanner.report.files == 4
+    assert scanner.report.orphaned == 1
+    assert scanner.report.missing == 2
+    assert scanner.report.repaired == 0
+    assert user_images.orphan_path.exists()
+
+
+async def test_scan_user_ignores_new_files(user_images):
+    """
+    GIVEN a file with no database entry that was just written
+    WHEN the user is scanned
+    THEN it is not an orphan... its upload may not be committed yet
+    """
+    scanner = VolumeScanner(db_session=AsyncMock(), min_age=3600)
+    await scanner.scan_user(user_images.user_id)
+    assert scanner.report.orphaned == 0
+
+
+async def test_scan_user_repairs(mocker, volumes, user_images):
+    """
+    GIVEN a user with an orphaned file, a missing unprocessed image and a missing processed image
+    WHEN the user is scanned with repair
+    THEN the orphan is moved to the tombstones
+    AND the entries with missing files are deleted
+    """
+    mock_delete_unprocessed = mocker.patch("app.commands.scan_volumes.delete_UnprocessedImage_entries")
+    mock_delete_processed = mocker.patch("app.commands.scan_volumes.delete_ProcessedImage_entries")
+    db_session = AsyncMock()
+    scanner = VolumeScanner(db_session=db_session, repair=True, min_age=0)
+    await scanner.scan_user(user_images.user_id)
+    assert not user_images.orphan_path.exists()
+    assert len(list((volumes["unprocessed_image_data"] / TOMBSTONE_DIRECTORY).iterdir())) == 1
+    assert user_images.image_path.exists()
+    mock_delete_unprocessed.assert_awaited_once_with(image_ids=[user_images.lost.id], db_session=db_session)
+    mock_delete_processed.assert_awaited_once_with(image_ids=[user_images.processed_lost.id], db_session=db_session)
+    assert scanner.report.repaired == 3
+
+
+async def test_scan_user_removes_empty_shard_directories_on_repair(mocker, volumes):
+    """
+    GIVEN an empty shard directory
+    WHEN the user is scanned with repair
+    THEN it is removed
+    """
+    mocker.patch("app.commands.scan_volumes.stream_UnprocessedImage_files", _stream())
+    mocker.patch("app.commands.scan_volumes.stream_ProcessedImage_files", _stream())
+    user_id = uuid.uuid4()
+    shard_path = volumes["unprocessed_image_data"] / str(user_id) / "ab" / "cd"
+    shard_path.mkdir(parents=True)
+    scanner = VolumeScanner(db_session=AsyncMock(), repair=True, min_age=0)
+    await scanner.scan_user(user_id)
+    assert scanner.report.empty_directories == 1
+    assert not shard_path.exists()
+
+
+async def test_scan_user_directories_finds_deleted_users(mocker, volumes):
+    """
+    GIVEN the directories of a user and of a deleted user
+    WHEN the user directories are scanned
+    THEN only the directories of the deleted user are orphans
+    AND the blob and tombstone directories are skipped
+    """
+    user_id = uuid.uuid4()
+    deleted_user_id = uuid.uuid4()
+    for volume_path in volumes.values():
+        (volume_path / str(user_id)).mkdir()
+        (volume_path / str(deleted_user_id)).mkdir()
+        (volume_path / TOMBSTONE_DIRECTORY).mkdir()
+    (volumes["unprocessed_image_data"] / "blobs").mkdir()
+    mocker.patch("app.commands.scan_volumes.read_existing_User_ids", AsyncMock(return_value={user_id}))
+    scanner = VolumeScanner(db_session=AsyncMock(), min_age=0)
+    await scanner.scan_user_directories()
+    assert scanner.report.orphaned == 2
+
+
+async def test_scan_blobs_finds_orphaned_and_missing_blobs(mocker, volumes):
+    """
+    GIVEN a blob file with no entry and a referenced blob entry with no file
+    WHEN the blobs are scanned
+    THEN both are reported
+    """
+    orphan_hash = "ab" * 32
+    missing_hash = "cd" * 32
+    stored_hash = "ef" * 32
+    for content_hash in (orphan_hash, stored_hash):
+        blob_path = get_unprocessed_blob_location(content_hash)
+        blob_path.parent.mkdir(parents=True)
+        blob_path.write_bytes(b"blob")
+    mocker.patch("app.commands.scan_volumes.read_existing_ImageBlob_hashes", AsyncMock(return_value={stored_hash}))
+    mocker.patch("app.commands.scan_volumes.stream_referenced_ImageBlob_hashes", _stream([missing_hash, stored_hash]))
+    scanner = VolumeScanner(db_session=AsyncMock(), min_age=0)
+    await scanner.scan_blobs()
+    assert scanner.report.files == 2
+    assert scanner.report.orphaned == 1
+    assert scanner.report.missing == 1
@@ -1,6 +1,6 @@
 import pytest
 
-from app.exceptions import PermissionDenied
+from app.exceptions import InvalidCursor, PermissionDenied
 
 # --- PermissionDenied ---
 
@@ -16,4 +16,19 @@ def test_PermissionDenied_is_raised():
     THEN it should raise PermissionDenied
     """
     with pytest.raises(PermissionDenied):
-        fake_PermissionDenied_function()
\ No newline at end of file
+        fake_PermissionDenied_function()
+# --- InvalidCursor ---
+
+def fake_InvalidCursor_function():
+    raise InvalidCursor(
+        "The cursor is not valid!"
+    )
+
+def test_InvalidCursor_is_raised():
+    """
+    GIVEN an InvalidCursor exception
+    WHEN fake_InvalidCursor_function is called
+    THEN it should raise InvalidCursor
+    """
+    with pytest.raises(InvalidCursor):
+        fake_InvalidCursor_function()
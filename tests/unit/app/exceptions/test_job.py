@@ -0,0 +1,20 @@
+import pytest
+
+from app.exceptions.job import JobCancelled, JobDeadlineExceeded, JobNotFound
+
+# --- JobNotFound ---
+
+def test_JobNotFound_is_raised():
+    with pytest.raises(JobNotFound):
+        raise JobNotFound("The job is not found!")
+
+# --- JobDeadlineExceeded ---
+
+def test_JobDeadlineExceeded_is_a_cancellation():
+    """
+    GIVEN a job that ran past its deadline
+    WHEN JobDeadlineExceeded is raised
+    THEN it is handled like any other cancelled job
+    """
+    with pytest.raises(JobCancelled):
+        raise JobDeadlineExceeded("The job ran out of time!")
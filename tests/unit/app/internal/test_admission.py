@@ -0,0 +1,101 @@
+import uuid
+
+import pytest
+
+from app.exceptions import ServiceOverloaded, TooManyAugmentations
+from app.internal.admission import AdmissionController
+from app.internal.cost_model import CostEstimate
+from app.internal.metrics import (
+    AUGMENTATIONS_REJECTED_OVERLOADED,
+    AUGMENTATIONS_REJECTED_USER_SHARE,
+)
+
+BUDGET = CostEstimate(cpu_seconds=10.0, peak_memory_bytes=1000)
+
+
+def test_admit_holds_the_cost_until_the_block_ends():
+    controller = AdmissionController(budget=BUDGET)
+    user_id = uuid.uuid4()
+    with controller.admit(cost=CostEstimate(cpu_seconds=6.0, peak_memory_bytes=600), user_id=user_id):
+        assert controller.in_use == CostEstimate(cpu_seconds=6.0, peak_memory_bytes=600)
+    assert controller.in_use == CostEstimate()
+
+
+@pytest.mark.parametrize("cost", [
+    CostEstimate(cpu_seconds=6.0, peak_memory_bytes=100),
+    CostEstimate(cpu_seconds=1.0, peak_memory_bytes=600),
+])
+def test_admit_rejects_past_the_budget(cost):
+    """
+    GIVEN augmentations using most of the CPU time or the memory of the budget
+    WHEN another one would go past it
+    THEN it is rejected with a Retry-After
+    AND it is admitted once the budget has room again
+    """
+    controller = AdmissionController(budget=BUDGET, retry_after=3)
+    rejected = AUGMENTATIONS_REJECTED_OVERLOADED.value
+    with controller.admit(cost=cost, user_id=uuid.uuid4()):
+        with pytest.raises(ServiceOverloaded) as e, controller.admit(cost=cost, user_id=uuid.uuid4()):
+            pass
+        assert e.value.retry_after == 3
+    assert AUGMENTATIONS_REJECTED_OVERLOADED.value == rejected + 1
+    with controller.admit(cost=cost, user_id=uuid.uuid4()):
+        assert controller.in_use == cost
+
+
+def test_admit_limits_the_share_of_a_single_user():
+    """
+    GIVEN a user holding half of the budget
+    WHEN they start another augmentation
+    THEN it is rejected... but another user is still admitted
+    """
+    controller = AdmissionController(budget=BUDGET, user_budget_share=0.5)
+    user_id = uuid.uuid4()
+    rejected = AUGMENTATIONS_REJECTED_USER_SHARE.value
+    with controller.admit(cost=CostEstimate(cpu_seconds=4.0, peak_memory_bytes=100), user_id=user_id):
+        with (
+            pytest.raises(TooManyAugmentations),
+            controller.admit(cost=CostEstimate(cpu_seconds=2.0, peak_memory_bytes=100), user_id=user_id),
+        ):
+            pass
+        with controller.admit(cost=CostEstimate(cpu_seconds=2.0, peak_memory_bytes=100), user_id=uuid.uuid4()):
+            assert controller.in_use == CostEstimate(cpu_seconds=6.0, peak_memory_bytes=200)
+    assert AUGMENTATIONS_REJECTED_USER_SHARE.value == rejected + 1
+
+
+def test_admit_runs_an_augmentation_larger_than_the_budget_alone():
+    controller = AdmissionController(budget=BUDGET, user_budget_share=0.5)
+    with (
+        controller.admit(cost=CostEstimate(cpu_seconds=500.0, peak_memory_bytes=5000), user_id=uuid.uuid4()),
+        pytest.raises(ServiceOverloaded),
+        controller.admit(cost=CostEstimate(cpu_seconds=0.1), user_id=uuid.uuid4()),
+    ):
+        pass
+
+
+def test_admit_counts_an_augmentation_that_costs_nothing():
+    """
+    GIVEN a user running an augmentation estimated to cost nothing (a flip)
+    WHEN they start one larger than their share
+    THEN it is rejected... the first one is still running
+    """
+    controller = AdmissionController(budget=BUDGET, user_budget_share=0.5)
+    user_id = uuid.uuid4()
+    with (
+        controller.admit(cost=CostEstimate(), user_id=user_id),
+        pytest.raises(TooManyAugmentations),
+        controller.admit(cost=CostEstimate(cpu_seconds=6.0), user_id=user_id),
+    ):
+        pass
+
+
+def test_admit_gives_the_cost_back_when_the_block_raises():
+    controller = AdmissionController(budget=BUDGET)
+    with (
+        pytest.raises(RuntimeError),
+        controller.admit(cost=CostEstimate(cpu_seconds=6.0, peak_memory_bytes=600), user_id=uuid.uuid4()),
+    ):
+        raise RuntimeError("decoding failed")
+    assert controller.in_use == CostEstimate()
+    assert controller._user_in_use == {}
+    assert controller._running == {}
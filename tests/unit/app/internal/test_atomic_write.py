@@ -0,0 +1,63 @@
+import pytest
+
+from app.config import settings
+from app.internal.atomic_write import atomic_write, fsync_batch
+
+
+def test_atomic_write_renames_the_file_into_place(tmp_path):
+    """
+    GIVEN a file being written
+    WHEN the write finishes
+    THEN the file is at its path
+    AND no temporary file is left
+    """
+    path = tmp_path / "image.png"
+    with atomic_write(path) as temporary_path:
+        temporary_path.write_bytes(b"image")
+        # readers never see the file before it is complete
+        assert not path.exists()
+    assert path.read_bytes() == b"image"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_atomic_write_keeps_the_old_file_if_the_write_fails(tmp_path):
+    """
+    GIVEN a stored file
+    WHEN a write to its path fails half way
+    THEN the stored file is unchanged
+    AND the temporary file is removed
+    """
+    path = tmp_path / "image.png"
+    path.write_bytes(b"old")
+    with pytest.raises(OSError), atomic_write(path) as temporary_path:
+        temporary_path.write_bytes(b"ne")
+        raise OSError("disk full")
+    assert path.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_fsync_batch_flushes_each_directory_once(mocker, tmp_path):
+    """
+    GIVEN STORAGE_FSYNC is on
+    WHEN 3 files in the same directory are written in a batch
+    THEN every file is flushed before its rename
+    AND the directory is flushed once at the end of the batch
+    """
+    mocker.patch.object(settings, "STORAGE_FSYNC", True)
+    mock_fsync = mocker.patch("app.internal.atomic_write.fsync_path")
+    with fsync_batch():
+        for index in range(3):
+            with atomic_write(tmp_path / f"{index}.webp") as temporary_path:
+                temporary_path.write_bytes(b"rendition")
+        assert tmp_path not in [call.args[0] for call in mock_fsync.call_args_list]
+    flushed = [call.args[0] for call in mock_fsync.call_args_list]
+    assert flushed.count(tmp_path) == 1
+    assert len(flushed) == 4
+
+
+def test_atomic_write_does_not_flush_by_default(mocker, tmp_path):
+    mocker.patch.object(settings, "STORAGE_FSYNC", False)
+    mock_fsync = mocker.patch("app.internal.atomic_write.fsync_path")
+    with atomic_write(tmp_path / "image.png") as temporary_path:
+        temporary_path.write_bytes(b"image")
+    mock_fsync.assert_not_called()
@@ -1,6 +1,7 @@
 import numpy
 import pytest
 
+from app.exceptions import JobCancelled, JobDeadlineExceeded
 from app.internal.augmentations import (
     brighten,
     channel_swap,
@@ -13,16 +14,19 @@ from app.internal.augmentations import (
     max_filter,
     min_filter,
     mute_channel,
+    noise_mask,
     pepper_noise,
     percentile_filter,
     rainbow_noise,
     rotate,
+    salt_and_pepper_noise,
     salt_noise,
     shift,
     tint,
     uniform_blur,
     zoom,
 )
+from app.internal.cancellation import CancellationToken, use_cancellation_token
 
 # --- brighten ---
 
@@ -49,6 +53,33 @@ def test_brighten_is_correct_for_8_bit_RGB_image():
     )
     assert numpy.array_equal(calculated_output, expected_output)
 
+
+@pytest.mark.parametrize("augmentation, kwargs", [
+    (brighten, {"amount": 50}),
+    (channel_swap, {"a": "r", "b": "g"}),
+    (darken, {"amount": 50}),
+    (invert, {}),
+    (mute_channel, {"channel": "g"}),
+    (tint, {"channel": "r", "amount": 50}),
+])
+def test_pixel_loops_stop_at_the_next_row_of_a_cancelled_job(augmentation, kwargs):
+    """
+    GIVEN a job that has been cancelled
+    WHEN a pure Python augmentation reaches its next row
+    THEN it raises JobCancelled... and leaves the image as it was
+    """
+    input_image = numpy.full((4, 4, 3), 100, dtype=numpy.uint8)
+    token = CancellationToken()
+    token.cancel()
+    with use_cancellation_token(token), pytest.raises(JobCancelled):
+        augmentation(input_image, **kwargs)
+    assert numpy.all(input_image == 100)
+
+
+def test_pixel_loops_stop_after_the_deadline():
+    with use_cancellation_token(CancellationToken(deadline=0.0)), pytest.raises(JobDeadlineExceeded):
+        brighten(numpy.zeros((4, 4, 3), dtype=numpy.uint8), amount=50)
+
 # --- channel_swap ---
 
 def test_channel_swap_r_g_is_correct_result():
@@ -451,13 +482,38 @@ def test_mute_channel_B_produces_correct_results():
     )
     assert numpy.array_equal(calculated_output, expected_output)
 
+# --- noise_mask ---
+
+@pytest.mark.parametrize("amount", [0, 1, 33, 50, 99, 100])
+@pytest.mark.parametrize("shape", [(10, 10, 3), (7, 13, 3)])
+def test_noise_mask_picks_exactly_amount_percent_of_pixels(shape, amount):
+    mask = noise_mask(shape, amount=amount, rng=numpy.random.default_rng(seed=0))
+    assert mask.shape == shape[:2]
+    assert numpy.count_nonzero(mask) == int(amount / 100 * shape[0] * shape[1])
+
+
+def test_noise_mask_shares_pixels_between_kinds():
+    mask = noise_mask((9, 11, 3), amount=100, rng=numpy.random.default_rng(seed=0), num_kinds=2)
+    assert numpy.count_nonzero(mask == 1) == 49
+    assert numpy.count_nonzero(mask == 2) == 50
+
+
+def test_noise_mask_is_repeatable_with_the_same_seed():
+    first_mask = noise_mask((32, 32, 3), amount=25, rng=numpy.random.default_rng(seed=42))
+    second_mask = noise_mask((32, 32, 3), amount=25, rng=numpy.random.default_rng(seed=42))
+    assert numpy.array_equal(first_mask, second_mask)
+
 # --- pepper_noise ---
 
 def test_pepper_noise_50_percent_is_correct():
-    # TODO: perhaps a better test can be made
-    trials = 100
-    observed_change_count_set = set()
-    for _ in range(trials):
+    """
+    GIVEN a 2x2 image
+    AND the amount is 50%
+    WHEN pepper_noise is called
+    THEN exactly 2 pixels are changed
+    AND every changed pixel is black
+    """
+    for _ in range(100):
         input_image = numpy.array(
             [
                 [[255,  0,      0], [0,     255,  0]],
@@ -465,13 +521,15 @@ def test_pepper_noise_50_percent_is_correct():
             ], dtype=numpy.uint8
         )
         calculated_output = pepper_noise(input_image, amount=50)
-        # count the number of changed pixels
-        number_of_changed_pixels = 0
-        for i, row in enumerate(calculated_output):
-            for j, pixel in enumerate(row):
-                if not numpy.array_equal(pixel, input_image[i, j]):
-                    number_of_changed_pixels = number_of_changed_pixels + 1
-    assert 2 in observed_change_count_set
+        changed = numpy.any(calculated_output != input_image, axis=-1)
+        assert numpy.count_nonzero(changed) == 2
+        assert numpy.all(calculated_output[changed] == 0)
+
+
+def test_pepper_noise_does_not_change_the_input():
+    input_image = numpy.full((4, 4, 3), 255, dtype=numpy.uint8)
+    pepper_noise(input_image, amount=100)
+    assert numpy.all(input_image == 255)
 
 # --- percentile_filter ---
 
@@ -590,6 +648,23 @@ def test_rainbow_noise_example_50_percent():
         observed_change_count_set.add(number_of_changed_pixels)
     assert 8 in observed_change_count_set
 
+
+def test_rainbow_noise_draws_a_colour_only_for_the_picked_pixels(mocker):
+    """
+    GIVEN a 100x100 RGB image
+    AND the amount is 1%
+    WHEN rainbow_noise is called
+    THEN a colour is drawn for each of the 100 picked pixels... not for every pixel
+    AND only those pixels change
+    """
+    input_image = numpy.zeros((100, 100, 3), dtype=numpy.uint8)
+    rng = mocker.MagicMock(wraps=numpy.random.default_rng(0))
+    calculated_output = rainbow_noise(input_image, amount=1, rng=rng)
+    assert rng.integers.call_args.kwargs["size"] == (100, 3)
+    changed = numpy.any(calculated_output != input_image, axis=-1)
+    assert numpy.count_nonzero(changed) <= 100
+    assert numpy.all(calculated_output[~changed] == 0)
+
 # --- rotate ---
 
 def test_rotate_example_45_degrees():
@@ -715,11 +790,14 @@ def test_rotate_angle_of_string_raises_exception():
 # --- salt_noise ---
 
 def test_salt_noise_50_percent_is_correct():
-
-    # TODO: perhaps a better test can be made
-    trials = 100
-    observed_change_count_set = set()
-    for _ in range(trials):
+    """
+    GIVEN a 2x2 image
+    AND the amount is 50%
+    WHEN salt_noise is called
+    THEN exactly 2 pixels are changed
+    AND every changed pixel is white
+    """
+    for _ in range(100):
         input_image = numpy.array(
             [
                 [[255,  0,      0], [0,     255,  0]],
@@ -727,14 +805,38 @@ def test_salt_noise_50_percent_is_correct():
             ], dtype=numpy.uint8
         )
         calculated_output = salt_noise(input_image, amount=50)
-        # count the number of changed pixels
-        number_of_changed_pixels = 0
-        for i, row in enumerate(calculated_output):
-            for j, pixel in enumerate(row):
-                if not numpy.array_equal(pixel, input_image[i, j]):
-                    number_of_changed_pixels = number_of_changed_pixels + 1
-        observed_change_count_set.add(number_of_changed_pixels)
-    assert 2 in observed_change_count_set
+        changed = numpy.any(calculated_output != input_image, axis=-1)
+        assert numpy.count_nonzero(changed) == 2
+        assert numpy.all(calculated_output[changed] == 255)
+
+
+def test_salt_noise_covers_a_non_square_image():
+    """
+    GIVEN an image that is wider than it is tall
+    AND the amount is 100%
+    WHEN salt_noise is called
+    THEN every pixel is white
+    """
+    input_image = numpy.zeros((3, 7, 3), dtype=numpy.uint8)
+    calculated_output = salt_noise(input_image, amount=100)
+    assert numpy.all(calculated_output == 255)
+
+# --- salt_and_pepper_noise ---
+
+def test_salt_and_pepper_noise_50_percent_is_correct():
+    """
+    GIVEN a 10x10 grey image
+    AND the amount is 50%
+    WHEN salt_and_pepper_noise is called
+    THEN exactly 25 pixels are white
+    AND exactly 25 pixels are black
+    AND the other pixels are unchanged
+    """
+    input_image = numpy.full((10, 10, 3), 128, dtype=numpy.uint8)
+    calculated_output = salt_and_pepper_noise(input_image, amount=50, rng=numpy.random.default_rng(seed=0))
+    assert numpy.count_nonzero(numpy.all(calculated_output == 255, axis=-1)) == 25
+    assert numpy.count_nonzero(numpy.all(calculated_output == 0, axis=-1)) == 25
+    assert numpy.count_nonzero(numpy.all(calculated_output == 128, axis=-1)) == 50
 
 # --- shift ---
 
@@ -0,0 +1,53 @@
+import threading
+import time
+
+import anyio
+import pytest
+
+from app.config import settings
+from app.internal.blocking_io import get_storage_io_limiter, run_blocking_io
+
+pytestmark = pytest.mark.asyncio
+
+# --- run_blocking_io ---
+
+async def test_run_blocking_io_runs_in_another_thread():
+    event_loop_thread = threading.get_ident()
+    assert await run_blocking_io(threading.get_ident) != event_loop_thread
+
+
+async def test_run_blocking_io_passes_arguments_and_raises():
+    assert await run_blocking_io(int, "ff", base=16) == 255
+    with pytest.raises(FileNotFoundError):
+        await run_blocking_io(open, "/does/not/exist")
+
+
+async def test_run_blocking_io_is_limited_to_the_storage_io_threads(mocker):
+    """
+    GIVEN STORAGE_IO_THREADS is 2
+    WHEN 6 blocking calls are made at the same time
+    THEN at most 2 run at once
+    """
+    mocker.patch.object(settings, "STORAGE_IO_THREADS", 2)
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+
+    def blocking_call():
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    async with anyio.create_task_group() as task_group:
+        for _ in range(6):
+            task_group.start_soon(run_blocking_io, blocking_call)
+    assert most_running == 2
+
+# --- get_storage_io_limiter ---
+
+async def test_get_storage_io_limiter_is_shared_within_an_event_loop():
+    assert get_storage_io_limiter() is get_storage_io_limiter()
@@ -0,0 +1,118 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.exceptions import JobCancelled, JobDeadlineExceeded
+from app.internal.cancellation import (
+    CancellationToken,
+    cancel_job,
+    check_cancelled,
+    get_cancellation_token,
+    track_job,
+    tracked_job_ids,
+    use_cancellation_token,
+)
+
+# --- CancellationToken ---
+
+def test_a_new_token_is_not_cancelled():
+    token = CancellationToken()
+    assert not token.cancelled
+    assert token.remaining() is None
+    token.raise_if_cancelled()
+
+
+def test_a_cancelled_token_raises_job_cancelled_with_the_reason():
+    token = CancellationToken()
+    token.cancel("stop it")
+    assert token.cancelled
+    with pytest.raises(JobCancelled, match="stop it"):
+        token.raise_if_cancelled()
+
+
+def test_a_token_past_its_deadline_raises_deadline_exceeded():
+    token = CancellationToken(deadline=time.monotonic() - 1)
+    assert token.cancelled
+    assert token.remaining() == 0.0
+    with pytest.raises(JobDeadlineExceeded):
+        token.raise_if_cancelled()
+
+
+def test_with_timeout_counts_from_now():
+    token = CancellationToken.with_timeout(10)
+    assert 9 < token.remaining() <= 10
+    assert CancellationToken.with_timeout(None).deadline is None
+
+
+def test_cancel_calls_the_callbacks_once():
+    """
+    GIVEN a token with a callback
+    WHEN it is cancelled twice
+    THEN the callback is called once
+    AND a callback removed before the cancel is never called
+    """
+    token = CancellationToken()
+    calls = []
+    token.on_cancel(lambda: calls.append("kept"))
+    remove = token.on_cancel(lambda: calls.append("removed"))
+    remove()
+    token.cancel()
+    token.cancel()
+    assert calls == ["kept"]
+
+
+def test_a_callback_added_after_the_cancel_is_called_straight_away():
+    token = CancellationToken()
+    token.cancel()
+    calls = []
+    token.on_cancel(lambda: calls.append(True))
+    assert calls == [True]
+
+
+def test_a_cancel_is_seen_by_another_thread():
+    token = CancellationToken()
+    seen = threading.Event()
+
+    def worker():
+        while not token.cancelled:
+            time.sleep(0.001)
+        seen.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    token.cancel()
+    thread.join(timeout=5)
+    assert seen.is_set()
+
+# --- the token of the current job ---
+
+def test_check_cancelled_does_nothing_outside_a_job():
+    assert get_cancellation_token() is None
+    check_cancelled()
+
+
+def test_use_cancellation_token_sets_the_token_of_the_job():
+    token = CancellationToken()
+    token.cancel()
+    with use_cancellation_token(token):
+        assert get_cancellation_token() is token
+        with pytest.raises(JobCancelled):
+            check_cancelled()
+    assert get_cancellation_token() is None
+
+# --- tracked jobs ---
+
+def test_cancel_job_cancels_a_tracked_job():
+    job_id = uuid.uuid4()
+    token = CancellationToken()
+    with track_job(job_id, token):
+        assert job_id in tracked_job_ids()
+        assert cancel_job(job_id)
+    assert token.cancelled
+    assert job_id not in tracked_job_ids()
+
+
+def test_cancel_job_of_another_process_does_nothing():
+    assert not cancel_job(uuid.uuid4())
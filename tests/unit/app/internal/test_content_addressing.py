@@ -0,0 +1,21 @@
+from pathlib import PurePath
+
+from app.internal.content_addressing import get_blob_relative_path, hash_image_content
+
+# --- hash_image_content ---
+
+def test_hash_image_content_is_stable():
+    assert hash_image_content(b"image") == hash_image_content(b"image")
+    assert len(hash_image_content(b"image")) == 64
+
+
+def test_hash_image_content_differs_for_different_bytes():
+    assert hash_image_content(b"image") != hash_image_content(b"imagf")
+
+# --- get_blob_relative_path ---
+
+def test_get_blob_relative_path_uses_2_levels_of_the_hash():
+    content_hash = hash_image_content(b"image")
+    assert get_blob_relative_path(content_hash) == PurePath(
+        "blobs", content_hash[0:2], content_hash[2:4], f"{content_hash}.png"
+    )
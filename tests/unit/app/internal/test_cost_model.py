@@ -0,0 +1,96 @@
+import pytest
+
+from app.internal import cost_model
+from app.internal.cost_model import (
+    BYTES_PER_PIXEL,
+    Calibration,
+    CostEstimate,
+    estimate_cost,
+    get_calibration,
+    get_work,
+)
+
+# every regime costs a second per unit of work and a byte per unit of memory
+UNIT_CALIBRATION = {
+    regime: Calibration(seconds_per_unit=1.0, overhead_seconds=0.5, bytes_per_unit=1.0)
+    for regime in [
+        "flip",
+        "gaussian_blur:direct",
+        "gaussian_blur:fft",
+        "max_filter:direct",
+        "max_filter:van_herk",
+        "percentile_filter",
+        "zoom",
+    ]
+}
+
+
+def test_the_shipped_calibration_covers_every_regime():
+    """
+    GIVEN the calibration in the repository
+    WHEN every regime is looked up
+    THEN it has coefficients... nothing falls back to UNCALIBRATED
+    """
+    calibration = get_calibration()
+    regimes = set()
+    for processing in cost_model.PROCESSING_NAMES:
+        work = cost_model._WORK[processing]
+        for arguments in [{"amount": 100, "size": 3}, {"amount": 2000, "size": 64}]:
+            regimes.add(work(100, {**arguments, "axis": "x"}).regime)
+    assert regimes <= calibration.keys()
+    for coefficients in calibration.values():
+        assert coefficients.seconds_per_unit >= 0
+        assert coefficients.overhead_seconds >= 0
+        assert coefficients.bytes_per_unit >= 0
+
+
+def test_estimate_cost_is_linear_in_the_work():
+    estimate = estimate_cost("flip", {"axis": "x"}, width=10, height=20, calibration=UNIT_CALIBRATION)
+    assert estimate == CostEstimate(
+        cpu_seconds=10 * 20 + 0.5,
+        # the decoded image plus what the augmentation allocates
+        peak_memory_bytes=10 * 20 * BYTES_PER_PIXEL * 2,
+    )
+
+
+def test_percentile_filter_grows_with_the_square_of_its_size():
+    small = get_work("percentile_filter", {"percentile": 50, "size": 4}, pixels=100)
+    large = get_work("percentile_filter", {"percentile": 50, "size": 128}, pixels=100)
+    assert large.work / small.work == (128 / 4) ** 2
+
+
+@pytest.mark.parametrize(("processing", "arguments", "regime"), [
+    ("gaussian_blur", {"amount": 100}, "gaussian_blur:direct"),
+    ("gaussian_blur", {"amount": 400}, "gaussian_blur:fft"),
+    ("max_filter", {"size": 15}, "max_filter:direct"),
+    ("max_filter", {"size": 16}, "max_filter:van_herk"),
+])
+def test_filters_switch_regime_with_their_arguments(processing, arguments, regime):
+    assert get_work(processing, arguments, pixels=100).regime == regime
+
+
+def test_the_fast_regimes_cost_the_same_for_every_argument():
+    assert get_work("max_filter", {"size": 16}, 100) == get_work("max_filter", {"size": 128}, 100)
+    assert get_work("gaussian_blur", {"amount": 400}, 100) == get_work("gaussian_blur", {"amount": 5000}, 100)
+
+
+def test_zoom_needs_memory_for_the_zoomed_image():
+    estimate = estimate_cost("zoom", {"amount": 100}, width=10, height=10, calibration=UNIT_CALIBRATION)
+    assert estimate.peak_memory_bytes == 10 * 10 * BYTES_PER_PIXEL + 10 * 10 * 4 * BYTES_PER_PIXEL
+
+
+def test_an_uncalibrated_regime_still_gets_an_estimate():
+    estimate = estimate_cost("invert", {}, width=10, height=10, calibration={})
+    assert estimate.cpu_seconds > 0
+    assert estimate.peak_memory_bytes >= 10 * 10 * BYTES_PER_PIXEL
+
+
+def test_the_shipped_calibration_orders_the_augmentations():
+    """
+    GIVEN the calibration in the repository
+    WHEN a flip and a large percentile filter of the same image are estimated
+    THEN the percentile filter costs orders of magnitude more
+    """
+    flip = estimate_cost("flip", {"axis": "x"}, width=1000, height=1000)
+    percentile = estimate_cost("percentile_filter", {"percentile": 50, "size": 128}, width=1000, height=1000)
+    assert percentile.cpu_seconds > 1000 * flip.cpu_seconds
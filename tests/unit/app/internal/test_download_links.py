@@ -0,0 +1,95 @@
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.exceptions import InvalidDownloadLink
+from app.internal.download_links import (
+    get_file_key,
+    get_file_path,
+    make_internal_redirect_uri,
+    make_signed_url,
+    verify_signed_url,
+)
+
+VOLUME_PATHS = {"unprocessed_image_data": Path("/data/unprocessed")}
+FILE_KEY = "unprocessed_image_data/user/ab/cd/image.png"
+
+
+def _query(url):
+    return {name: values[0] for name, values in parse_qs(urlsplit(url).query).items()}
+
+
+def test_get_file_key_and_get_file_path_round_trip():
+    path = VOLUME_PATHS["unprocessed_image_data"] / "user" / "ab" / "cd" / "image.png"
+    assert get_file_key(path, VOLUME_PATHS) == FILE_KEY
+    assert get_file_path(FILE_KEY, VOLUME_PATHS) == path
+
+
+@pytest.mark.parametrize("file_key", [
+    "unprocessed_image_data/../../etc/passwd",
+    "unprocessed_image_data//etc/passwd",
+    "processed_image_data/image.png",
+    "unprocessed_image_data/",
+])
+def test_get_file_path_rejects_keys_outside_a_volume(file_key):
+    with pytest.raises(ValueError):
+        get_file_path(file_key, VOLUME_PATHS)
+
+
+def test_a_signed_url_is_valid():
+    url = make_signed_url(FILE_KEY, "image.png", "https://cdn.example.com/files-api/", "secret", 300)
+    assert urlsplit(url).path == f"/files-api/files/{FILE_KEY}"
+    query = _query(url)
+    verify_signed_url(FILE_KEY, query["filename"], int(query["expires"]), query["signature"], "secret")
+
+
+@pytest.mark.parametrize("change", [
+    {"file_key": "unprocessed_image_data/user/ab/cd/other.png"},
+    {"filename": "other.png"},
+    {"secret": "other secret"},
+])
+def test_a_changed_signed_url_is_not_valid(change):
+    """
+    GIVEN a signed link
+    WHEN the file, the filename or the secret is changed
+    THEN the link is not valid
+    """
+    query = _query(make_signed_url(FILE_KEY, "image.png", "/files-api", "secret", 300))
+    arguments = {
+        "file_key": FILE_KEY,
+        "filename": query["filename"],
+        "expires": int(query["expires"]),
+        "signature": query["signature"],
+        "secret": "secret",
+    } | change
+    with pytest.raises(InvalidDownloadLink):
+        verify_signed_url(**arguments)
+
+
+@pytest.mark.parametrize("signature", [
+    "é" * 43,
+    "\udc80",
+    "not a signature",
+    "",
+])
+def test_a_malformed_signature_is_not_valid(signature):
+    """
+    GIVEN a signed link
+    WHEN its signature is replaced by one that is non-ASCII or malformed
+    THEN the link is not valid... and nothing else is raised
+    """
+    query = _query(make_signed_url(FILE_KEY, "image.png", "/files-api", "secret", 300))
+    with pytest.raises(InvalidDownloadLink):
+        verify_signed_url(FILE_KEY, query["filename"], int(query["expires"]), signature, "secret")
+
+
+def test_an_expired_signed_url_is_not_valid(mocker):
+    query = _query(make_signed_url(FILE_KEY, "image.png", "/files-api", "secret", 300))
+    mocker.patch("app.internal.download_links.time.time", return_value=int(query["expires"]) + 1)
+    with pytest.raises(InvalidDownloadLink):
+        verify_signed_url(FILE_KEY, query["filename"], int(query["expires"]), query["signature"], "secret")
+
+
+def test_make_internal_redirect_uri():
+    assert make_internal_redirect_uri(FILE_KEY, "/protected-files/") == f"/protected-files/{FILE_KEY}"
@@ -0,0 +1,118 @@
+import numpy
+import pytest
+import scipy.ndimage
+
+from app.internal import filters
+
+SIZES = [1, 2, 3, 8, 15, 16, 17, 33, 64, 128]
+
+
+def make_random_channel(height: int, width: int) -> numpy.ndarray:
+    rng = numpy.random.default_rng(seed=0)
+    return rng.integers(low=0, high=256, size=(height, width), dtype=numpy.uint8)
+
+# --- maximum_filter ---
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("shape", [(5, 4), (61, 47)])
+def test_maximum_filter_matches_scipy(shape, size):
+    """
+    GIVEN a channel
+    AND a window size (including windows larger than the channel)
+    WHEN maximum_filter is called
+    THEN the result is identical to scipy.ndimage.maximum_filter
+    """
+    channel = make_random_channel(*shape)
+    expected_output = scipy.ndimage.maximum_filter(channel, size=size)
+    assert numpy.array_equal(filters.maximum_filter(channel, size=size), expected_output)
+
+# --- minimum_filter ---
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("shape", [(5, 4), (61, 47)])
+def test_minimum_filter_matches_scipy(shape, size):
+    channel = make_random_channel(*shape)
+    expected_output = scipy.ndimage.minimum_filter(channel, size=size)
+    assert numpy.array_equal(filters.minimum_filter(channel, size=size), expected_output)
+
+# --- uniform_filter ---
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("shape", [(5, 4), (61, 47)])
+def test_uniform_filter_matches_scipy(shape, size):
+    channel = make_random_channel(*shape)
+    expected_output = scipy.ndimage.uniform_filter(channel, size=size)
+    assert numpy.array_equal(filters.uniform_filter(channel, size=size), expected_output)
+
+
+def test_uniform_filter_writes_to_output():
+    """
+    GIVEN a strided output array (example: one channel of an RGB image)
+    WHEN uniform_filter is called with that output
+    THEN the result is written to the output
+    """
+    channel = make_random_channel(20, 20)
+    output_image = numpy.zeros((20, 20, 3), dtype=numpy.uint8)
+    filters.uniform_filter(channel, size=5, output=output_image[..., 1])
+    assert numpy.array_equal(output_image[..., 1], scipy.ndimage.uniform_filter(channel, size=5))
+
+# --- van Herk/Gil-Werman ---
+
+@pytest.mark.parametrize("axis", [0, 1])
+@pytest.mark.parametrize("size", [16, 31, 128])
+def test_van_herk_gil_werman_1d_matches_scipy(axis, size):
+    channel = make_random_channel(150, 90)
+    assert numpy.array_equal(
+        filters._van_herk_gil_werman_1d(channel, size=size, axis=axis, function=numpy.maximum),
+        scipy.ndimage.maximum_filter1d(channel, size=size, axis=axis),
+    )
+    assert numpy.array_equal(
+        filters._van_herk_gil_werman_1d(channel, size=size, axis=axis, function=numpy.minimum),
+        scipy.ndimage.minimum_filter1d(channel, size=size, axis=axis),
+    )
+
+# --- gaussian_filter ---
+
+@pytest.mark.parametrize("sigma", [0.5, 1.0, 2.0, 3.9])
+def test_gaussian_filter_with_small_sigma_matches_scipy(sigma):
+    channel = make_random_channel(61, 47)
+    expected_output = scipy.ndimage.gaussian_filter(channel, sigma=sigma)
+    assert numpy.array_equal(filters.gaussian_filter(channel, sigma=sigma), expected_output)
+
+
+@pytest.mark.parametrize("sigma", [4.0, 7.5, 20.0, 50.0])
+@pytest.mark.parametrize("shape", [(61, 47), (300, 200)])
+def test_gaussian_filter_with_large_sigma_is_within_1_level_of_scipy(shape, sigma):
+    """
+    GIVEN a channel
+    AND a sigma large enough to use the FFT (including kernels wider than the channel)
+    WHEN gaussian_filter is called
+    THEN no pixel differs from scipy.ndimage.gaussian_filter by more than 1 level
+    """
+    channel = make_random_channel(*shape)
+    expected_output = scipy.ndimage.gaussian_filter(channel, sigma=sigma)
+    output = filters.gaussian_filter(channel, sigma=sigma)
+    assert output.dtype == numpy.uint8
+    difference = numpy.abs(output.astype(numpy.int16) - expected_output.astype(numpy.int16))
+    assert difference.max() <= 1
+
+
+@pytest.mark.parametrize("sigma", [1.0, 10.0])
+def test_gaussian_filter_writes_to_output(sigma):
+    channel = make_random_channel(40, 30)
+    output_image = numpy.zeros((40, 30, 3), dtype=numpy.uint8)
+    filters.gaussian_filter(channel, sigma=sigma, output=output_image[..., 2])
+    assert numpy.array_equal(output_image[..., 2], filters.gaussian_filter(channel, sigma=sigma))
+    assert not output_image[..., :2].any()
+
+
+def test_fft_gaussian_filter_keeps_a_constant_channel_constant():
+    """
+    GIVEN a channel where every pixel is 255
+    WHEN it is blurred with the FFT
+    THEN the edges do not wrap around or darken and nothing overflows
+    """
+    channel = numpy.full((50, 70), 255, dtype=numpy.uint8)
+    output = numpy.empty_like(channel)
+    filters._fft_gaussian_filter(channel, sigma=12.0, output=output)
+    assert numpy.all(output >= 254)
@@ -0,0 +1,80 @@
+from datetime import UTC, datetime, timedelta, timezone
+
+import pytest
+
+from app.internal.http_caching import (
+    IMMUTABLE_CACHE_CONTROL,
+    format_last_modified,
+    is_not_modified,
+    make_caching_headers,
+    make_etag,
+)
+
+CREATED_AT = datetime(2025, 8, 1, 12, 30, 15, 123456, tzinfo=UTC)
+ETAG = make_etag("1f0e4a9c.png")
+
+# --- make_etag ---
+
+def test_make_etag_is_a_strong_etag_from_the_storage_filename():
+    assert make_etag("1f0e4a9c.png") == '"1f0e4a9c"'
+
+
+def test_make_etag_is_different_for_each_rendition():
+    assert make_etag("1f0e4a9c.png", 128) == '"1f0e4a9c-128"'
+    assert make_etag("1f0e4a9c.png", 128) != make_etag("1f0e4a9c.png", 512)
+
+# --- make_caching_headers ---
+
+def test_make_caching_headers():
+    assert make_caching_headers(ETAG, CREATED_AT) == {
+        "ETag": '"1f0e4a9c"',
+        "Last-Modified": "Fri, 01 Aug 2025 12:30:15 GMT",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Vary": "X-External-User-ID",
+    }
+
+
+def test_format_last_modified_converts_to_gmt():
+    created_at = datetime(2025, 8, 1, 14, 30, 15, tzinfo=timezone(timedelta(hours=2)))
+    assert format_last_modified(created_at) == "Fri, 01 Aug 2025 12:30:15 GMT"
+
+# --- is_not_modified ---
+
+@pytest.mark.parametrize("if_none_match", [
+    '"1f0e4a9c"',
+    'W/"1f0e4a9c"',
+    '"something-else", "1f0e4a9c"',
+    "*",
+])
+def test_is_not_modified_when_the_etag_matches(if_none_match):
+    assert is_not_modified(ETAG, CREATED_AT, if_none_match=if_none_match)
+
+
+@pytest.mark.parametrize("if_none_match", ['"something-else"', '"1f0e4a9c-128"', ""])
+def test_is_modified_when_the_etag_does_not_match(if_none_match):
+    assert not is_not_modified(ETAG, CREATED_AT, if_none_match=if_none_match)
+
+
+def test_is_not_modified_since_the_last_modified_date():
+    assert is_not_modified(ETAG, CREATED_AT, if_modified_since="Fri, 01 Aug 2025 12:30:15 GMT")
+
+
+def test_is_modified_since_an_earlier_date():
+    assert not is_not_modified(ETAG, CREATED_AT, if_modified_since="Fri, 01 Aug 2025 12:30:14 GMT")
+
+
+def test_an_invalid_if_modified_since_is_ignored():
+    assert not is_not_modified(ETAG, CREATED_AT, if_modified_since="yesterday")
+
+
+def test_if_modified_since_is_ignored_when_if_none_match_is_sent():
+    assert not is_not_modified(
+        ETAG,
+        CREATED_AT,
+        if_none_match='"something-else"',
+        if_modified_since="Fri, 01 Aug 2025 12:30:15 GMT",
+    )
+
+
+def test_is_modified_without_conditional_headers():
+    assert not is_not_modified(ETAG, CREATED_AT)
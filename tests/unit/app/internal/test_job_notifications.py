@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.config import settings
+from app.internal.cancellation import CancellationToken, track_job
+from app.internal.job_notifications import (
+    JobStatusListener,
+    JobSubscription,
+    decode_job_status,
+    encode_job_status,
+    get_conninfo,
+    get_job_status_listener,
+)
+from app.internal.metrics import JOB_STATUS_SUBSCRIBERS
+from app.schemas.transactions_db import JobStatus
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_a_notification_payload_round_trips():
+    job_id = uuid.uuid4()
+    assert decode_job_status(encode_job_status(job_id, JobStatus.SUCCEEDED)) == (job_id, JobStatus.SUCCEEDED)
+
+
+@pytest.mark.parametrize("payload", ["", "not json", "[]", '{"job_id": "nope", "job_status": "succeeded"}'])
+async def test_decode_job_status_rejects_other_payloads(payload):
+    with pytest.raises(ValueError):
+        decode_job_status(payload)
+
+
+async def test_get_conninfo_drops_the_sqlalchemy_driver():
+    assert get_conninfo("postgresql+psycopg://u:p@localhost/db") == "postgresql://u:p@localhost/db"
+    assert get_conninfo("postgresql://u:p@localhost/db") == "postgresql://u:p@localhost/db"
+
+
+async def test_a_subscription_waits_at_most_its_timeout():
+    subscription = JobSubscription(uuid.uuid4())
+    assert not await subscription.wait(0.01)
+
+
+async def test_a_subscription_remembers_a_wake_until_the_next_wait():
+    subscription = JobSubscription(uuid.uuid4())
+    subscription.wake()
+    assert await subscription.wait(0)
+    # the wake was used up
+    assert not await subscription.wait(0)
+
+
+async def test_dispatch_wakes_only_the_subscribers_of_the_job():
+    """
+    GIVEN two clients waiting for one job and a client waiting for another
+    WHEN the first job moves
+    THEN both of its clients wake straight away... and the other client sleeps on
+    """
+    listener = JobStatusListener(conninfo="")
+    job_id, other_job_id = uuid.uuid4(), uuid.uuid4()
+    with (
+        listener.subscribe(job_id) as first,
+        listener.subscribe(job_id) as second,
+        listener.subscribe(other_job_id) as other,
+    ):
+        assert JOB_STATUS_SUBSCRIBERS.value == 3
+        waiting = asyncio.create_task(first.wait(10))
+        await asyncio.sleep(0)
+        listener.dispatch(encode_job_status(job_id, JobStatus.PROCESSING))
+        assert await asyncio.wait_for(waiting, 1)
+        assert await second.wait(0)
+        assert not await other.wait(0)
+    assert listener.subscribers == 0
+    assert JOB_STATUS_SUBSCRIBERS.value == 0
+
+
+async def test_dispatch_of_a_cancel_stops_the_job_in_this_worker():
+    listener = JobStatusListener(conninfo="")
+    job_id = uuid.uuid4()
+    token = CancellationToken()
+    with track_job(job_id, token):
+        listener.dispatch(encode_job_status(job_id, JobStatus.CANCELLED))
+    assert token.cancelled
+
+
+async def test_dispatch_ignores_a_payload_it_does_not_understand():
+    listener = JobStatusListener(conninfo="")
+    with listener.subscribe(uuid.uuid4()) as subscription:
+        listener.dispatch("not json")
+        assert not await subscription.wait(0)
+
+
+async def test_wake_all_wakes_every_subscriber():
+    listener = JobStatusListener(conninfo="")
+    with listener.subscribe(uuid.uuid4()) as first, listener.subscribe(uuid.uuid4()) as second:
+        listener.wake_all()
+        assert await first.wait(0)
+        assert await second.wait(0)
+
+
+async def test_run_keeps_trying_to_connect(mocker):
+    """
+    GIVEN a database that cannot be reached
+    WHEN the listener runs
+    THEN it stays disconnected and tries again... it never stops
+    """
+    mock_connect = mocker.patch(
+        "app.internal.job_notifications.psycopg.AsyncConnection.connect",
+        side_effect=OSError("connection refused"),
+    )
+    listener = JobStatusListener(conninfo="", reconnect_seconds=0.001)
+    task = asyncio.create_task(listener.run())
+    await asyncio.sleep(0.05)
+    assert not task.done()
+    assert not listener.connected
+    assert mock_connect.call_count > 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def test_get_job_status_listener_is_configured_from_settings(mocker):
+    mocker.patch.object(settings, "JOB_LISTENER_RECONNECT_SECONDS", 7.0)
+    listener = get_job_status_listener()
+    assert listener.reconnect_seconds == 7.0
+    assert listener.conninfo.startswith("postgresql://")
+    assert get_job_status_listener() is listener
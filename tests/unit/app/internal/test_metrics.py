@@ -0,0 +1,37 @@
+import pytest
+
+from app.internal.metrics import RECLAIMED_BYTES, Counter, Gauge, render_metrics
+
+
+def test_counter_renders_in_the_prometheus_text_format():
+    """
+    GIVEN a counter
+    WHEN it is incremented
+    THEN it renders its help, type and total
+    """
+    counter = Counter("test_things_total", "Things.")
+    counter.inc()
+    counter.inc(2)
+    assert counter.render() == (
+        "# HELP test_things_total Things.\n"
+        "# TYPE test_things_total counter\n"
+        "test_things_total 3\n"
+    )
+
+
+def test_counter_cannot_go_down():
+    counter = Counter("test_things_total", "Things.")
+    with pytest.raises(ValueError):
+        counter.inc(-1)
+
+
+def test_gauge_is_set_to_the_last_value():
+    gauge = Gauge("test_queue_length", "Queue length.")
+    gauge.set(5)
+    gauge.set(2.5)
+    assert gauge.render().endswith("test_queue_length 2.5\n")
+
+
+def test_render_metrics_includes_registered_metrics():
+    assert "# TYPE storage_reclaimed_bytes_total counter" in render_metrics()
+    assert RECLAIMED_BYTES.name in render_metrics()
@@ -0,0 +1,34 @@
+import uuid
+from datetime import UTC, datetime
+
+import pytest
+
+from app.exceptions import InvalidCursor
+from app.internal.pagination import decode_cursor, encode_cursor
+
+# --- encode_cursor / decode_cursor ---
+
+def test_a_cursor_round_trips():
+    created_at = datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=UTC)
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, row_id)) == (created_at, row_id)
+
+
+def test_a_cursor_is_url_safe():
+    cursor = encode_cursor(datetime.now(UTC), uuid.uuid4())
+    assert cursor.isascii()
+    assert not set(cursor) & set("+/=&?")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["", "not a cursor", "bm90IGEgY3Vyc29y", "MjAyNS0wMS0wMXxub3QtYS11dWlk"],
+)
+def test_decode_cursor_rejects_invalid_cursors(cursor):
+    """
+    GIVEN a cursor that was not made by encode_cursor
+    WHEN decode_cursor is called
+    THEN it raises InvalidCursor
+    """
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
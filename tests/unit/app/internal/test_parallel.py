@@ -0,0 +1,167 @@
+import threading
+
+import numpy
+import pytest
+import scipy.ndimage
+
+from app.config import settings
+from app.exceptions import JobCancelled
+from app.internal.cancellation import (
+    CancellationToken,
+    get_cancellation_token,
+    use_cancellation_token,
+)
+from app.internal.parallel import (
+    get_executor,
+    is_worker_thread,
+    map_channels,
+    parallel_map,
+    shutdown_executor,
+)
+
+
+@pytest.fixture
+def four_threads(mocker):
+    """
+    Configures a shared pool of 4 threads for the duration of a test.
+    """
+    shutdown_executor()
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", 4)
+    yield
+    shutdown_executor()
+
+# --- parallel_map ---
+
+def test_parallel_map_runs_on_calling_thread_with_one_thread(mocker):
+    """
+    GIVEN a single filter thread is configured
+    WHEN parallel_map is called
+    THEN every call runs on the calling thread
+    """
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", 1)
+    observed_threads = set()
+    parallel_map(lambda _: observed_threads.add(threading.get_ident()), range(3))
+    assert observed_threads == {threading.get_ident()}
+
+
+def test_parallel_map_runs_on_pool_with_many_threads(four_threads):
+    """
+    GIVEN more than one filter thread is configured
+    WHEN parallel_map is called
+    THEN every call runs on a pool thread
+    """
+    observed = []
+    parallel_map(lambda _: observed.append(is_worker_thread()), range(3))
+    assert observed == [True, True, True]
+
+
+def test_parallel_map_does_not_nest_on_pool(four_threads):
+    """
+    GIVEN parallel_map is called from a pool thread
+    WHEN the nested calls run
+    THEN they run on that same pool thread
+    """
+    observed = []
+
+    def outer(_):
+        outer_thread = threading.get_ident()
+        parallel_map(lambda _: observed.append(threading.get_ident() == outer_thread), range(3))
+
+    parallel_map(outer, range(2))
+    assert observed == [True] * 6
+
+
+def test_parallel_map_raises_exception_from_task(four_threads):
+    def fail(_):
+        raise ValueError("bad")
+    with pytest.raises(ValueError):
+        parallel_map(fail, range(3))
+
+
+def test_parallel_map_drops_the_items_that_have_not_started_after_a_failure(mocker):
+    """
+    GIVEN 2 pool threads and 6 items
+    WHEN the first item fails while the second is still running
+    THEN parallel_map raises... and the items still waiting for a thread never run
+    """
+    shutdown_executor()
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", 2)
+    second_item_started = threading.Event()
+    release = threading.Event()
+    started = set()
+
+    def run(item):
+        started.add(item)
+        if item == 0:
+            second_item_started.wait(5)
+            raise ValueError("bad")
+        second_item_started.set()
+        # both threads are busy until the failure has been raised
+        release.wait(5)
+
+    with pytest.raises(ValueError):
+        parallel_map(run, range(6))
+    release.set()
+    shutdown_executor()
+    assert {0, 1} <= started
+    assert not started & {3, 4, 5}
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_parallel_map_stops_at_the_next_item_after_a_cancel(mocker, threads):
+    """
+    GIVEN a job that is cancelled while its first channel is filtered
+    WHEN parallel_map reaches the next channel
+    THEN it raises JobCancelled... and the channels after it are never filtered
+    """
+    shutdown_executor()
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", threads)
+    token = CancellationToken()
+    filtered = []
+
+    def filter_channel(channel):
+        filtered.append(channel)
+        token.cancel()
+
+    with use_cancellation_token(token), pytest.raises(JobCancelled):
+        parallel_map(filter_channel, range(3))
+    shutdown_executor()
+    assert filtered == [0]
+
+
+def test_parallel_map_hands_the_token_to_pool_threads(four_threads):
+    """
+    GIVEN a job with a token
+    WHEN its tasks run on pool threads
+    THEN their own safe points see the token of the job
+    """
+    token = CancellationToken()
+    observed = []
+    with use_cancellation_token(token):
+        parallel_map(lambda _: observed.append(get_cancellation_token()), range(3))
+    assert observed == [token, token, token]
+
+
+def test_get_executor_is_shared(four_threads):
+    assert get_executor() is get_executor()
+
+# --- map_channels ---
+
+def test_map_channels_is_deterministic(four_threads):
+    """
+    GIVEN an image
+    WHEN map_channels is called on the shared pool
+    THEN the result is identical to filtering each channel serially
+    """
+    rng = numpy.random.default_rng(seed=0)
+    image_data = rng.integers(low=0, high=256, size=(64, 48, 3), dtype=numpy.uint8)
+    expected_output = numpy.stack(
+        [scipy.ndimage.gaussian_filter(image_data[..., channel], sigma=1.5) for channel in range(3)],
+        axis=-1,
+    )
+    for _ in range(10):
+        calculated_output = map_channels(
+            lambda channel, output: scipy.ndimage.gaussian_filter(channel, sigma=1.5, output=output),
+            image_data,
+        )
+        assert numpy.array_equal(calculated_output, expected_output)
@@ -0,0 +1,69 @@
+import numpy
+import pytest
+from PIL import Image
+
+from app.internal.renditions import (
+    RENDITION_SIZES,
+    generate_renditions,
+    get_rendition_location,
+    make_rendition,
+)
+
+
+@pytest.fixture
+def stored_image(tmp_path):
+    """
+    A 1000x600 PNG stored the way the service stores images.
+    """
+    rng = numpy.random.default_rng(seed=0)
+    image_data = rng.integers(low=0, high=256, size=(600, 1000, 3), dtype=numpy.uint8)
+    image_path = tmp_path / "1f0e4a9c.png"
+    Image.fromarray(image_data).save(image_path, format="PNG")
+    return image_path
+
+# --- get_rendition_location ---
+
+def test_get_rendition_location_is_next_to_the_original(tmp_path):
+    image_path = tmp_path / "1f0e4a9c.png"
+    assert get_rendition_location(image_path, 128) == tmp_path / "1f0e4a9c.128.webp"
+
+# --- make_rendition ---
+
+@pytest.mark.parametrize("size", RENDITION_SIZES)
+def test_make_rendition_keeps_the_aspect_ratio(size):
+    image = Image.new("RGB", (1000, 600))
+    rendition = make_rendition(image, size)
+    assert rendition.size == (size, round(size * 0.6))
+
+
+def test_make_rendition_never_makes_an_image_larger():
+    image = Image.new("RGB", (100, 50))
+    assert make_rendition(image, 512).size == (100, 50)
+
+# --- generate_renditions ---
+
+def test_generate_renditions_writes_every_size(stored_image):
+    """
+    GIVEN a stored image
+    WHEN generate_renditions is called
+    THEN a WebP rendition of every size is stored next to it
+    AND no temporary files are left behind
+    """
+    rendition_paths = generate_renditions(stored_image)
+    assert sorted(rendition_paths) == sorted(get_rendition_location(stored_image, size) for size in RENDITION_SIZES)
+    for size in RENDITION_SIZES:
+        with Image.open(get_rendition_location(stored_image, size)) as rendition:
+            assert rendition.format == "WEBP"
+            assert max(rendition.size) == size
+    assert not list(stored_image.parent.glob("*.tmp"))
+
+
+def test_generate_renditions_writes_only_the_sizes_asked_for(stored_image):
+    generate_renditions(stored_image, sizes=(128,))
+    assert get_rendition_location(stored_image, 128).exists()
+    assert not get_rendition_location(stored_image, 512).exists()
+
+
+def test_generate_renditions_for_a_missing_image_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        generate_renditions(tmp_path / "missing.png")
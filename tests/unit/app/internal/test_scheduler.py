@@ -0,0 +1,272 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+
+from app.config import settings
+from app.exceptions import JobCancelled, JobDeadlineExceeded, TooManyAugmentations
+from app.internal.cancellation import CancellationToken
+from app.internal.metrics import AUGMENTATIONS_REJECTED_QUEUE_FULL
+from app.internal.scheduler import JobScheduler, get_job_scheduler
+from app.schemas.transactions_db import JobPriority
+
+pytestmark = pytest.mark.asyncio
+
+
+async def run_in_order(scheduler: JobScheduler, jobs: list[tuple]) -> list:
+    """
+    Queues every job behind a job that holds the only worker... then lets them all run.
+    Returns the names of the jobs in the order they started.
+    """
+    started = []
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.schedule(user_id=uuid.uuid4(), cost=1.0):
+            await release.wait()
+
+    async def job(name, user_id, cost, priority):
+        async with scheduler.schedule(user_id=user_id, cost=cost, priority=priority):
+            started.append(name)
+
+    blocker_task = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+    tasks = []
+    for name, user_id, cost, priority in jobs:
+        tasks.append(asyncio.create_task(job(name, user_id, cost, priority)))
+        # queue them in the order given
+        await asyncio.sleep(0)
+    assert scheduler.queued == len(jobs)
+    release.set()
+    await asyncio.gather(blocker_task, *tasks)
+    return started
+
+
+async def test_schedule_runs_at_most_workers_jobs_at_once():
+    scheduler = JobScheduler(workers=2, max_running_per_user=10)
+    user_id = uuid.uuid4()
+    running = 0
+    most_running = 0
+
+    async def job():
+        nonlocal running, most_running
+        async with scheduler.schedule(user_id=user_id, cost=1.0):
+            running += 1
+            most_running = max(most_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(job() for _ in range(6)))
+    assert most_running == 2
+    assert scheduler.running == 0
+    assert scheduler.queued == 0
+
+
+async def test_schedule_serves_the_priority_classes_in_order():
+    scheduler = JobScheduler(workers=1, max_running_per_user=10)
+    user_id = uuid.uuid4()
+    started = await run_in_order(scheduler, [
+        ("low", user_id, 1.0, JobPriority.LOW),
+        ("normal", user_id, 1.0, JobPriority.NORMAL),
+        ("high", user_id, 1.0, JobPriority.HIGH),
+    ])
+    assert started == ["high", "normal", "low"]
+
+
+async def test_schedule_lets_users_take_turns():
+    """
+    GIVEN a user who queued 3 jobs before another user queued 2
+    WHEN the worker becomes free
+    THEN the users take turns instead of the first user going first with all of theirs
+    """
+    scheduler = JobScheduler(workers=1, max_running_per_user=10)
+    busy_user, other_user = uuid.uuid4(), uuid.uuid4()
+    started = await run_in_order(scheduler, [
+        ("busy 1", busy_user, 1.0, JobPriority.NORMAL),
+        ("busy 2", busy_user, 1.0, JobPriority.NORMAL),
+        ("busy 3", busy_user, 1.0, JobPriority.NORMAL),
+        ("other 1", other_user, 1.0, JobPriority.NORMAL),
+        ("other 2", other_user, 1.0, JobPriority.NORMAL),
+    ])
+    assert started == ["busy 1", "other 1", "busy 2", "other 2", "busy 3"]
+
+
+async def test_schedule_shares_by_estimated_cost():
+    """
+    GIVEN a user with an expensive job queued before a user with cheap ones
+    WHEN the worker becomes free
+    THEN the cheap jobs worth the same CPU time go first
+    """
+    scheduler = JobScheduler(workers=1, max_running_per_user=10)
+    expensive_user, cheap_user = uuid.uuid4(), uuid.uuid4()
+    started = await run_in_order(scheduler, [
+        ("expensive", expensive_user, 10.0, JobPriority.NORMAL),
+        ("cheap 1", cheap_user, 1.0, JobPriority.NORMAL),
+        ("cheap 2", cheap_user, 1.0, JobPriority.NORMAL),
+        ("cheap 3", cheap_user, 1.0, JobPriority.NORMAL),
+    ])
+    assert started == ["cheap 1", "cheap 2", "cheap 3", "expensive"]
+
+
+async def test_schedule_gives_heavier_users_more_turns():
+    heavy_user, light_user = uuid.uuid4(), uuid.uuid4()
+    scheduler = JobScheduler(workers=1, max_running_per_user=10, user_weights={heavy_user: 2.0})
+    started = await run_in_order(scheduler, [
+        ("light 1", light_user, 1.0, JobPriority.NORMAL),
+        ("light 2", light_user, 1.0, JobPriority.NORMAL),
+        ("heavy 1", heavy_user, 1.0, JobPriority.NORMAL),
+        ("heavy 2", heavy_user, 1.0, JobPriority.NORMAL),
+        ("heavy 3", heavy_user, 1.0, JobPriority.NORMAL),
+    ])
+    assert started == ["heavy 1", "light 1", "heavy 2", "heavy 3", "light 2"]
+
+
+async def test_schedule_caps_the_running_jobs_of_a_user():
+    """
+    GIVEN a user at their cap of running jobs
+    WHEN a worker is free
+    THEN their next job waits... and another user's job runs instead
+    """
+    scheduler = JobScheduler(workers=2, max_running_per_user=1)
+    capped_user, other_user = uuid.uuid4(), uuid.uuid4()
+    release = asyncio.Event()
+    started = []
+
+    async def job(name, user_id):
+        async with scheduler.schedule(user_id=user_id, cost=1.0):
+            started.append(name)
+            await release.wait()
+
+    tasks = [
+        asyncio.create_task(job("capped 1", capped_user)),
+        asyncio.create_task(job("capped 2", capped_user)),
+        asyncio.create_task(job("other", other_user)),
+    ]
+    await asyncio.sleep(0.01)
+    assert started == ["capped 1", "other"]
+    assert scheduler.queued == 1
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["capped 1", "other", "capped 2"]
+
+
+async def test_schedule_rejects_a_user_with_too_many_waiting():
+    scheduler = JobScheduler(workers=1, max_queued_per_user=1, retry_after=3)
+    user_id = uuid.uuid4()
+    release = asyncio.Event()
+    rejected = AUGMENTATIONS_REJECTED_QUEUE_FULL.value
+
+    async def job():
+        async with scheduler.schedule(user_id=user_id, cost=1.0):
+            await release.wait()
+
+    running = asyncio.create_task(job())
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(job())
+    await asyncio.sleep(0)
+    with pytest.raises(TooManyAugmentations) as e:
+        async with scheduler.schedule(user_id=user_id, cost=1.0):
+            pass
+    assert e.value.retry_after == 3
+    assert AUGMENTATIONS_REJECTED_QUEUE_FULL.value == rejected + 1
+    release.set()
+    await asyncio.gather(running, waiting)
+
+
+async def test_a_cancelled_job_gives_up_its_place():
+    scheduler = JobScheduler(workers=1)
+    release = asyncio.Event()
+
+    async def job(user_id):
+        async with scheduler.schedule(user_id=user_id, cost=1.0):
+            await release.wait()
+
+    running = asyncio.create_task(job(uuid.uuid4()))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(job(uuid.uuid4()))
+    await asyncio.sleep(0)
+    assert scheduler.queued == 1
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert scheduler.queued == 0
+    release.set()
+    await running
+    assert scheduler.running == 0
+    # idle users are forgotten
+    assert scheduler._last_finish == {}
+
+
+async def test_a_cancelled_token_stops_the_wait_for_a_worker():
+    """
+    GIVEN a job waiting for the only worker
+    WHEN its token is cancelled
+    THEN it raises JobCancelled straight away... and gives up its place
+    """
+    scheduler = JobScheduler(workers=1)
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.schedule(user_id=uuid.uuid4(), cost=1.0):
+            await release.wait()
+
+    running = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+    token = CancellationToken()
+
+    async def waiting_job():
+        async with scheduler.schedule(user_id=uuid.uuid4(), cost=1.0, token=token):
+            pass
+
+    waiting = asyncio.create_task(waiting_job())
+    await asyncio.sleep(0)
+    assert scheduler.queued == 1
+    token.cancel()
+    with pytest.raises(JobCancelled):
+        await waiting
+    assert scheduler.queued == 0
+    release.set()
+    await running
+    assert scheduler.running == 0
+
+
+async def test_a_job_waits_for_a_worker_at_most_until_its_deadline():
+    scheduler = JobScheduler(workers=1)
+    release = asyncio.Event()
+
+    async def blocker():
+        async with scheduler.schedule(user_id=uuid.uuid4(), cost=1.0):
+            await release.wait()
+
+    running = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+    with pytest.raises(JobDeadlineExceeded):
+        async with scheduler.schedule(user_id=uuid.uuid4(), cost=1.0, token=CancellationToken.with_timeout(0.01)):
+            pass
+    assert scheduler.queued == 0
+    release.set()
+    await running
+
+
+async def test_a_job_with_a_token_runs_when_a_worker_is_free():
+    scheduler = JobScheduler(workers=1)
+    async with scheduler.schedule(user_id=uuid.uuid4(), cost=1.0, token=CancellationToken.with_timeout(10)):
+        assert scheduler.running == 1
+    assert scheduler.running == 0
+
+
+async def test_run_sync_runs_in_a_worker_thread():
+    scheduler = JobScheduler(workers=1)
+    assert await scheduler.run_sync(threading.get_ident) != threading.get_ident()
+    assert await scheduler.run_sync(int, "ff", base=16) == 255
+
+
+async def test_get_job_scheduler_is_configured_from_settings(mocker):
+    mocker.patch.object(settings, "AUGMENTATION_WORKERS", 3)
+    mocker.patch.object(settings, "AUGMENTATION_MAX_RUNNING_PER_USER", 2)
+    scheduler = get_job_scheduler()
+    assert scheduler.workers == 3
+    assert scheduler.max_running_per_user == 2
+    assert scheduler.limiter.total_tokens == 3
+    assert get_job_scheduler() is scheduler
@@ -0,0 +1,52 @@
+from pathlib import PurePath
+
+import pytest
+
+from app.internal.sharding import (
+    get_shard_directories,
+    get_shard_key,
+    is_shard_directory,
+)
+
+# --- get_shard_key ---
+
+def test_an_image_and_its_previews_have_the_same_shard_key():
+    assert get_shard_key("1f0e4a9c.png") == get_shard_key("1f0e4a9c.128.webp") == "1f0e4a9c"
+
+# --- get_shard_directories ---
+
+@pytest.mark.parametrize("levels", [0, 1, 2])
+def test_get_shard_directories_has_one_directory_per_level(levels):
+    shard = get_shard_directories("1f0e4a9c.png", levels)
+    assert len(shard.parts) == levels
+    assert all(is_shard_directory(part) for part in shard.parts)
+
+
+def test_get_shard_directories_levels_share_a_prefix():
+    assert get_shard_directories("1f0e4a9c.png", 2).parts[0] == get_shard_directories("1f0e4a9c.png", 1).parts[0]
+
+
+def test_get_shard_directories_with_no_levels_is_flat():
+    assert get_shard_directories("1f0e4a9c.png", 0) == PurePath()
+
+
+def test_get_shard_directories_spreads_names_evenly():
+    """
+    GIVEN many names with the same prefix
+    WHEN their first shard directory is found
+    THEN they are spread over (nearly) every one of the 256 directories
+    """
+    first_levels = {get_shard_directories(f"image-{index}", 1) for index in range(10_000)}
+    assert len(first_levels) > 250
+
+
+@pytest.mark.parametrize("levels", [-1, 3])
+def test_get_shard_directories_rejects_other_levels(levels):
+    with pytest.raises(ValueError):
+        get_shard_directories("1f0e4a9c.png", levels)
+
+# --- is_shard_directory ---
+
+@pytest.mark.parametrize("name, expected", [("ab", True), ("0f", True), ("AB", False), ("abc", False), ("zz", False)])
+def test_is_shard_directory(name, expected):
+    assert is_shard_directory(name) is expected
@@ -0,0 +1,75 @@
+import io
+import tarfile
+from datetime import UTC, datetime
+
+import pytest
+
+from app.internal import tar_stream
+from app.internal.tar_stream import TarMember, iter_tar
+
+MODIFIED_AT = datetime(2025, 8, 1, 12, 30, 15, tzinfo=UTC)
+
+
+def read_archive(chunks) -> dict[str, bytes]:
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks)), mode="r:") as archive:
+        return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+
+# --- iter_tar ---
+
+def test_iter_tar_makes_a_valid_archive(tmp_path):
+    """
+    GIVEN files on disk and content in memory
+    WHEN iter_tar is called
+    THEN the joined chunks are a tar archive containing every member
+    """
+    first_path = tmp_path / "first.png"
+    first_path.write_bytes(b"a" * 1000)
+    second_path = tmp_path / "second.png"
+    second_path.write_bytes(b"b" * 512)
+    members = [
+        TarMember(name="images/first.png", modified_at=MODIFIED_AT, path=first_path),
+        TarMember(name="images/second.png", modified_at=MODIFIED_AT, path=second_path),
+        TarMember(name="first.json", modified_at=MODIFIED_AT, content=b'{"a": 1}'),
+    ]
+    assert read_archive(iter_tar(members)) == {
+        "images/first.png": b"a" * 1000,
+        "images/second.png": b"b" * 512,
+        "first.json": b'{"a": 1}',
+    }
+
+
+def test_iter_tar_keeps_the_modified_time(tmp_path):
+    chunks = iter_tar([TarMember(name="a.json", modified_at=MODIFIED_AT, content=b"{}")])
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks)), mode="r:") as archive:
+        assert archive.getmember("a.json").mtime == int(MODIFIED_AT.timestamp())
+
+
+def test_iter_tar_skips_missing_files(tmp_path):
+    members = [
+        TarMember(name="missing.png", modified_at=MODIFIED_AT, path=tmp_path / "missing.png"),
+        TarMember(name="a.json", modified_at=MODIFIED_AT, content=b"{}"),
+    ]
+    assert read_archive(iter_tar(members)) == {"a.json": b"{}"}
+
+
+def test_iter_tar_reads_files_in_chunks(mocker, tmp_path):
+    """
+    GIVEN a file larger than the chunk size
+    WHEN iter_tar is called
+    THEN no chunk is larger than the chunk size
+    """
+    mocker.patch.object(tar_stream, "CHUNK_SIZE", 1024)
+    image_path = tmp_path / "large.png"
+    image_path.write_bytes(bytes(range(256)) * 40)
+    chunks = list(iter_tar([TarMember(name="large.png", modified_at=MODIFIED_AT, path=image_path)]))
+    assert max(len(chunk) for chunk in chunks) <= 1024
+    assert read_archive(chunks) == {"large.png": image_path.read_bytes()}
+
+
+def test_iter_tar_of_nothing_is_an_empty_archive():
+    assert read_archive(iter_tar([])) == {}
+
+
+@pytest.mark.parametrize("name", ["a" * 150 + ".png", "deeply/" * 30 + "nested.png"])
+def test_iter_tar_supports_long_names(name):
+    assert read_archive(iter_tar([TarMember(name=name, modified_at=MODIFIED_AT, content=b"x")])) == {name: b"x"}
@@ -0,0 +1,177 @@
+import numpy
+import pytest
+import scipy.ndimage
+
+from app.config import settings
+from app.exceptions import JobCancelled
+from app.internal import tiling
+from app.internal.augmentations import (
+    edge_filter,
+    gaussian_blur,
+    max_filter,
+    percentile_filter,
+    uniform_blur,
+)
+from app.internal.cancellation import CancellationToken, use_cancellation_token
+from app.internal.tiling import (
+    apply_neighbourhood_operation,
+    halo_for_sigma,
+    halo_for_size,
+    iter_tiles,
+    process_in_tiles,
+)
+
+
+def make_random_image(height: int, width: int) -> numpy.ndarray:
+    rng = numpy.random.default_rng(seed=0)
+    return rng.integers(low=0, high=256, size=(height, width, 3), dtype=numpy.uint8)
+
+# --- halo ---
+
+@pytest.mark.parametrize("size, expected_halo", [(1, 0), (2, 1), (3, 1), (4, 2), (128, 64)])
+def test_halo_for_size_is_correct(size, expected_halo):
+    assert halo_for_size(size) == expected_halo
+
+
+@pytest.mark.parametrize("sigma, expected_halo", [(0.0, 0), (0.5, 2), (1.0, 4), (2.0, 8)])
+def test_halo_for_sigma_matches_the_scipy_kernel_radius(sigma, expected_halo):
+    assert halo_for_sigma(sigma) == expected_halo
+
+# --- iter_tiles ---
+
+def test_iter_tiles_covers_every_pixel_exactly_once():
+    """
+    GIVEN an image which does not divide evenly into tiles
+    WHEN iter_tiles is called
+    THEN every pixel is in exactly one tile
+    """
+    coverage = numpy.zeros((10, 7), dtype=int)
+    for rows, columns in iter_tiles((10, 7, 3), tile_size=4):
+        coverage[rows, columns] += 1
+    assert numpy.all(coverage == 1)
+
+
+def test_iter_tiles_makes_blocks_of_rows():
+    tiles = list(iter_tiles((10, 7, 3), tile_size=4, tile_width=7))
+    assert [rows for rows, _ in tiles] == [slice(0, 4), slice(4, 8), slice(8, 10)]
+    assert all(columns == slice(0, 7) for _, columns in tiles)
+
+# --- process_in_tiles ---
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_process_in_tiles_matches_whole_image_result(mocker, parallel):
+    """
+    GIVEN an image
+    AND a neighbourhood operation
+    WHEN process_in_tiles is called with the correct halo
+    THEN the result is identical to processing the whole image at once
+    """
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", 4)
+    image_data = make_random_image(37, 29)
+
+    def operation(tile):
+        return scipy.ndimage.uniform_filter(tile, size=(5, 5, 1))
+    expected_output = operation(image_data)
+    calculated_output = process_in_tiles(
+        image_data=image_data,
+        function=operation,
+        halo=halo_for_size(5),
+        tile_size=8,
+        parallel=parallel,
+    )
+    assert numpy.array_equal(calculated_output, expected_output)
+
+
+def test_process_in_tiles_allocates_output_from_the_result():
+    """
+    GIVEN an operation which returns a single channel float array
+    WHEN process_in_tiles is called
+    THEN the output has the dtype and channels of the result
+    """
+    image_data = make_random_image(12, 12)
+    calculated_output = process_in_tiles(
+        image_data=image_data,
+        function=lambda tile: tile[..., 0].astype(numpy.float32),
+        halo=0,
+        tile_size=5,
+    )
+    assert calculated_output.shape == (12, 12)
+    assert calculated_output.dtype == numpy.float32
+    assert numpy.array_equal(calculated_output, image_data[..., 0])
+
+
+def test_process_in_tiles_negative_halo_raises_exception():
+    with pytest.raises(ValueError):
+        process_in_tiles(make_random_image(4, 4), function=lambda tile: tile, halo=-1)
+
+# --- augmentations use tiles ---
+
+@pytest.mark.parametrize("augmentation, kwargs", [
+    (edge_filter, {"image_type": "edge_map"}),
+    (gaussian_blur, {"amount": 150}),
+    (max_filter, {"size": 6}),
+    (percentile_filter, {"percentile": 30, "size": 5}),
+    (uniform_blur, {"size": 7}),
+])
+def test_tiled_augmentation_matches_untiled_augmentation(mocker, augmentation, kwargs):
+    """
+    GIVEN an image larger than the tiling threshold
+    WHEN a neighbourhood augmentation is applied
+    THEN the result is identical to the untiled result
+    """
+    image_data = make_random_image(50, 45)
+    expected_output = augmentation(image_data.copy(), **kwargs)
+    mocker.patch.object(tiling, "TILING_THRESHOLD_PIXELS", 100)
+    mocker.patch.object(tiling, "TILE_SIZE", 16)
+    spy = mocker.spy(tiling, "process_in_tiles")
+    calculated_output = augmentation(image_data.copy(), **kwargs)
+    assert spy.call_count == 1
+    assert spy.call_args.kwargs["tile_size"] == 16
+    assert numpy.array_equal(calculated_output, expected_output)
+
+# --- cancellable operations ---
+
+def test_cancellable_operation_matches_the_whole_image_result_in_a_job(mocker):
+    """
+    GIVEN a smaller image processed inside a job
+    WHEN a cancellable operation is applied
+    THEN it is processed in blocks of rows
+    AND the result is identical to processing the whole image at once
+    """
+    image_data = make_random_image(50, 45)
+    expected_output = percentile_filter(image_data.copy(), percentile=30, size=5)
+    mocker.patch.object(tiling, "CANCELLATION_BLOCK_ROWS", 16)
+    spy = mocker.spy(tiling, "process_in_tiles")
+    with use_cancellation_token(CancellationToken()):
+        calculated_output = percentile_filter(image_data.copy(), percentile=30, size=5)
+    assert spy.call_args.kwargs["tile_size"] == 16
+    assert spy.call_args.kwargs["tile_width"] == 45
+    assert numpy.array_equal(calculated_output, expected_output)
+
+
+def test_cancellable_operation_runs_whole_outside_a_job(mocker):
+    mocker.patch.object(tiling, "CANCELLATION_BLOCK_ROWS", 16)
+    spy = mocker.spy(tiling, "process_in_tiles")
+    apply_neighbourhood_operation(make_random_image(50, 45), lambda tile: tile, halo=1, cancellable=True)
+    assert spy.call_count == 0
+
+
+def test_cancellable_operation_stops_at_the_next_block(mocker):
+    """
+    GIVEN a job that is cancelled while its first block of rows is processed
+    WHEN the operation reaches the next block
+    THEN it raises JobCancelled... and no other block is processed
+    """
+    mocker.patch.object(settings, "AUGMENTATION_THREADS", 1)
+    mocker.patch.object(tiling, "CANCELLATION_BLOCK_ROWS", 16)
+    token = CancellationToken()
+    blocks = []
+
+    def operation(tile):
+        blocks.append(tile.shape[0])
+        token.cancel()
+        return tile
+
+    with use_cancellation_token(token), pytest.raises(JobCancelled):
+        apply_neighbourhood_operation(make_random_image(50, 45), operation, halo=1, cancellable=True)
+    assert len(blocks) == 1
@@ -3,11 +3,23 @@ from unittest.mock import MagicMock
 
 import pytest
 from pathlib import Path
+from app.config import settings
 from app.repository.directory_manager import (
 VOLUME_PATHS,
+create_processed_image_directory,
 create_unprocessed_user_directory,
+delete_unprocessed_blob,
+delete_unprocessed_user_directory,
+get_processed_image_location,
+get_sharded_path,
+get_unprocessed_image_location,
+reap_tombstones,
+TOMBSTONE_DIRECTORY,
+write_processed_image,
+write_unprocessed_blob,
 write_unprocessed_image
 )
+from app.commands.reshard import reshard_user_directory
 import numpy
 pytestmark = pytest.mark.asyncio
 
@@ -37,20 +49,24 @@ async def test_create_unprocessed_user_directory_creates_new_directory(mocker):
     # do checks
     assert new_path == expected_path
 
-async def test_write_unprocessed_image_success(mocker):
+async def test_write_unprocessed_image_success(mocker, tmp_path):
     """
     GIVEN an image
     AND a user_id
     AND a storage_filename
     WHEN write_unprocessed_image is called
-    THEN it should create the new directory
+    THEN it should create the shard directories
+    AND the image is saved to a temporary file in it and renamed into place
     """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
     # make fake image data
     fake_image_data = numpy.random.random((4, 4, 3))
     fake_user_id = uuid.uuid4()
     fake_storage_filename = f"{uuid.uuid4()}.png"
+    (tmp_path / str(fake_user_id)).mkdir()
     #
     mock_image_instance = MagicMock()
+    mock_image_instance.save.side_effect = lambda fp, format: fp.write(b"png")
     mock_fromarray = mocker.patch(
         "app.repository.directory_manager.Image.fromarray",
         return_value=mock_image_instance
@@ -61,11 +77,253 @@ async def test_write_unprocessed_image_success(mocker):
         user_id=fake_user_id,
         storage_filename=fake_storage_filename,
     )
-    expected_path = VOLUME_PATHS["unprocessed_image_data"] / str(fake_user_id) / fake_storage_filename
+    expected_path = get_sharded_path(tmp_path / str(fake_user_id), fake_storage_filename)
     mock_fromarray.assert_called_once_with(obj= fake_image_data)
-    mock_image_instance.save.assert_called_once_with(
-        fp=str(expected_path),
-        format='PNG'
-    )
+    mock_image_instance.save.assert_called_once()
+    temporary_path = Path(mock_image_instance.save.call_args.kwargs["fp"].name)
+    assert temporary_path.parent == expected_path.parent
+    assert temporary_path.name.startswith(".")
     assert result_path == expected_path
+    assert list(expected_path.parent.iterdir()) == [expected_path]
+
+
+
+async def test_write_unprocessed_blob_writes_under_the_hash(mocker, tmp_path):
+    """
+    GIVEN an image
+    AND the hash of its upload
+    WHEN write_unprocessed_blob is called
+    THEN the image is stored in the blob directories named after the hash
+    AND no temporary file is left behind
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    content_hash = "abcdef" + "0" * 58
+    result_path = await write_unprocessed_blob(
+        image_data=numpy.zeros((4, 4, 3), dtype=numpy.uint8),
+        content_hash=content_hash,
+    )
+    assert result_path == tmp_path / "blobs" / "ab" / "cd" / f"{content_hash}.png"
+    assert result_path.exists()
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+
+async def test_get_unprocessed_image_location_of_a_legacy_image():
+    """
+    GIVEN an image uploaded before deduplication
+    WHEN get_unprocessed_image_location is called without a hash
+    THEN the image is in the user directory
+    """
+    fake_user_id = uuid.uuid4()
+    location = await get_unprocessed_image_location(
+        user_id=fake_user_id,
+        unprocessed_image_storage_filename="image.png",
+    )
+    assert location == get_sharded_path(VOLUME_PATHS["unprocessed_image_data"] / str(fake_user_id), "image.png")
+
+
+async def test_get_processed_image_location_finds_an_image_in_the_flat_layout(mocker, tmp_path):
+    """
+    GIVEN a processed image stored before sharding
+    WHEN get_processed_image_location is called
+    THEN the image is found where it was stored
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"processed_image_data": tmp_path})
+    fake_user_id = uuid.uuid4()
+    fake_image_id = uuid.uuid4()
+    flat_path = tmp_path / str(fake_user_id) / str(fake_image_id) / "augmented.png"
+    flat_path.parent.mkdir(parents=True)
+    flat_path.write_bytes(b"png")
+    location = await get_processed_image_location(
+        user_id=fake_user_id,
+        unprocessed_image_id=fake_image_id,
+        processed_image_storage_filename="augmented.png",
+    )
+    assert location == flat_path
+
+
+async def test_new_processed_images_are_stored_in_the_sharded_layout(mocker, tmp_path):
+    """
+    GIVEN a new unprocessed image
+    WHEN its processed image directory is created
+    THEN it is under 2 shard directories
+    AND processed images are found in it
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"processed_image_data": tmp_path})
+    mocker.patch.object(settings, "STORAGE_SHARD_LEVELS", 2)
+    fake_user_id = uuid.uuid4()
+    fake_image_id = uuid.uuid4()
+    (tmp_path / str(fake_user_id)).mkdir()
+    image_dir_path = await create_processed_image_directory(user_id=fake_user_id, image_id=fake_image_id)
+    assert image_dir_path == get_sharded_path(tmp_path / str(fake_user_id), str(fake_image_id), 2)
+    location = await get_processed_image_location(
+        user_id=fake_user_id,
+        unprocessed_image_id=fake_image_id,
+        processed_image_storage_filename="augmented.png",
+    )
+    assert location == image_dir_path / "augmented.png"
+
+
+async def test_write_unprocessed_image_does_not_make_a_deleted_user_directory(mocker, tmp_path):
+    """
+    GIVEN a user whose directory was deleted while an image was uploaded
+    WHEN write_unprocessed_image is called
+    THEN the write fails
+    AND the user directory is not made again
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    fake_user_id = uuid.uuid4()
+    with pytest.raises(FileNotFoundError):
+        await write_unprocessed_image(
+            image_data=numpy.zeros((4, 4, 3), dtype=numpy.uint8),
+            user_id=fake_user_id,
+            storage_filename="image.png",
+        )
+    assert not (tmp_path / str(fake_user_id)).exists()
+
+
+async def test_write_processed_image_follows_a_reshard(mocker, tmp_path):
+    """
+    GIVEN a processed image directory stored before sharding
+    WHEN a reshard moves it while an image is written into it
+    THEN the image is written again at the new location
+    AND the old location is not made again
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"processed_image_data": tmp_path})
+    mocker.patch.object(settings, "STORAGE_SHARD_LEVELS", 2)
+    fake_user_id = uuid.uuid4()
+    fake_image_id = uuid.uuid4()
+    user_dir_path = tmp_path / str(fake_user_id)
+    flat_dir_path = user_dir_path / str(fake_image_id)
+    flat_dir_path.mkdir(parents=True)
+
+    def save(fp, format):
+        reshard_user_directory(user_dir_path, levels=2)
+        fp.write(b"png")
+
+    mocker.patch("app.repository.directory_manager.Image.fromarray", return_value=MagicMock(save=save))
+    result_path = await write_processed_image(
+        image_data=numpy.zeros((4, 4, 3), dtype=numpy.uint8),
+        user_id=fake_user_id,
+        unprocessed_image_id=fake_image_id,
+        storage_filename="augmented.png",
+    )
+    assert result_path == get_sharded_path(user_dir_path, str(fake_image_id), 2) / "augmented.png"
+    assert result_path.read_bytes() == b"png"
+    assert not flat_dir_path.exists()
+
+
+async def test_get_processed_image_location_does_not_look_in_an_object_store(mocker):
+    """
+    GIVEN an object store... whose keys are never in another layout
+    WHEN get_processed_image_location is called
+    THEN the image is at the configured key
+    AND the store is never asked... a lookup costs no round trips
+    """
+    storage = mocker.MagicMock(has_other_layouts=False)
+    mocker.patch("app.repository.directory_manager.get_storage_backend", return_value=storage)
+    fake_user_id = uuid.uuid4()
+    fake_image_id = uuid.uuid4()
+    location = await get_processed_image_location(
+        user_id=fake_user_id,
+        unprocessed_image_id=fake_image_id,
+        processed_image_storage_filename="augmented.png",
+    )
+    user_dir_path = VOLUME_PATHS["processed_image_data"] / str(fake_user_id)
+    assert location == get_sharded_path(user_dir_path, str(fake_image_id)) / "augmented.png"
+    storage.exists.assert_not_called()
+
+
+async def test_delete_unprocessed_user_directory_moves_it_to_a_tombstone(mocker, tmp_path):
+    """
+    GIVEN a user directory with images
+    WHEN it is deleted
+    THEN it is gone from its location straight away
+    AND its files are in a tombstone until they are reaped
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    fake_user_id = uuid.uuid4()
+    image_path = tmp_path / str(fake_user_id) / "ab" / "cd" / "image.png"
+    image_path.parent.mkdir(parents=True)
+    image_path.write_bytes(b"x" * 10)
+    tombstone_path = await delete_unprocessed_user_directory(user_id=fake_user_id)
+    assert not (tmp_path / str(fake_user_id)).exists()
+    assert tombstone_path.parent == tmp_path / TOMBSTONE_DIRECTORY
+    assert (tombstone_path / "ab" / "cd" / "image.png").read_bytes() == b"x" * 10
+    # deleting it again does nothing
+    assert await delete_unprocessed_user_directory(user_id=fake_user_id) is None
+
+
+async def test_delete_unprocessed_blob_moves_the_blob_and_its_previews(mocker, tmp_path):
+    """
+    GIVEN a blob with a preview
+    WHEN the blob is deleted
+    THEN both files are moved to tombstones
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    content_hash = "ab" * 32
+    blob_path = await write_unprocessed_blob(image_data=numpy.zeros((2, 2, 3), dtype=numpy.uint8), content_hash=content_hash)
+    (blob_path.parent / f"{content_hash}.128.webp").write_bytes(b"preview")
+    tombstone_paths = await delete_unprocessed_blob(content_hash=content_hash)
+    assert len(tombstone_paths) == 2
+    assert list(blob_path.parent.iterdir()) == []
+    assert all(path.parent == tmp_path / TOMBSTONE_DIRECTORY for path in tombstone_paths)
+
+
+async def test_reap_tombstones_removes_files_in_bounded_batches(mocker, tmp_path):
+    """
+    GIVEN a deleted user directory with 5 files of 10 bytes
+    WHEN the tombstones are reaped 2 files at a time
+    THEN each call removes at most 2 files and reports the bytes it removed
+    AND the tombstone is gone once every file is removed
+    """
+    mocker.patch.dict(
+        "app.repository.directory_manager.VOLUME_PATHS",
+        {"unprocessed_image_data": tmp_path / "unprocessed", "processed_image_data": tmp_path / "processed"},
+    )
+    fake_user_id = uuid.uuid4()
+    user_dir_path = tmp_path / "unprocessed" / str(fake_user_id)
+    for index in range(5):
+        image_path = user_dir_path / f"{index:02x}" / f"{index}.png"
+        image_path.parent.mkdir(parents=True)
+        image_path.write_bytes(b"x" * 10)
+    await delete_unprocessed_user_directory(user_id=fake_user_id)
+    results = []
+    while True:
+        result = await reap_tombstones(batch_size=2)
+        results.append(result)
+        if result.pending == 0:
+            break
+    assert [result.files for result in results] == [2, 2, 1]
+    assert sum(result.bytes for result in results) == 50
+    assert list((tmp_path / "unprocessed" / TOMBSTONE_DIRECTORY).iterdir()) == []
+
+
+async def test_reap_tombstones_skips_the_files_another_worker_removed(mocker, tmp_path):
+    """
+    GIVEN a deleted user directory with 5 files of 10 bytes
+    WHEN another worker removes one of them while this one reaps the tombstones
+    THEN the other files are still removed
+    AND only the files this worker removed are counted
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    fake_user_id = uuid.uuid4()
+    for index in range(5):
+        image_path = tmp_path / str(fake_user_id) / f"{index:02x}" / f"{index}.png"
+        image_path.parent.mkdir(parents=True)
+        image_path.write_bytes(b"x" * 10)
+    await delete_unprocessed_user_directory(user_id=fake_user_id)
+    removed_by_another_worker = []
+    unlink = Path.unlink
+
+    def unlink_after_another_worker(path, missing_ok=False):
+        # the first file is removed between this worker's lstat and its unlink
+        if not removed_by_another_worker:
+            unlink(path)
+            removed_by_another_worker.append(path)
+        unlink(path, missing_ok=missing_ok)
 
+    mocker.patch.object(Path, "unlink", unlink_after_another_worker)
+    result = await reap_tombstones(batch_size=10)
+    assert len(removed_by_another_worker) == 1
+    assert (result.files, result.bytes, result.pending) == (4, 40, 0)
+    assert list((tmp_path / TOMBSTONE_DIRECTORY).iterdir()) == []
@@ -0,0 +1,25 @@
+import math
+
+from app.config import settings
+from app.internal.cost_model import PROCESSING_NAMES, estimate_cost
+from app.repository.image_processing import PROCESSING_MAP, estimate_processing_cost
+from app.schemas.image import AugmentationRequestBody
+
+
+def test_every_processing_has_a_cost():
+    assert PROCESSING_MAP.keys() == PROCESSING_NAMES
+
+
+def test_estimate_processing_cost_uses_the_arguments():
+    request = AugmentationRequestBody(arguments={"processing": "rotate", "angle": 30})
+    assert estimate_processing_cost(request, width=100, height=50) == estimate_cost(
+        "rotate", {"angle": 30}, width=100, height=50,
+    )
+
+
+def test_estimate_processing_cost_of_an_image_of_unknown_size():
+    request = AugmentationRequestBody(arguments={"processing": "invert"})
+    side = math.isqrt(settings.AUGMENTATION_UNKNOWN_IMAGE_PIXELS)
+    assert estimate_processing_cost(request, width=None, height=None) == estimate_cost(
+        "invert", {}, width=side, height=side,
+    )
@@ -0,0 +1,64 @@
+from urllib.parse import quote, urlsplit
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, status
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.internal.download_links import make_signed_url
+from app.routers import files
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def image_path(mocker, tmp_path):
+    mocker.patch.dict("app.services.image.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    mocker.patch.object(settings, "DOWNLOAD_URL_SECRET", "secret")
+    image_path = tmp_path / "user" / "image.png"
+    image_path.parent.mkdir()
+    image_path.write_bytes(b"png")
+    return image_path
+
+
+@pytest_asyncio.fixture
+async def client():
+    app = FastAPI()
+    app.include_router(files.router, prefix="/files-api")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_a_signed_link_serves_the_file(image_path, client):
+    """
+    GIVEN a signed link to a stored image
+    WHEN it is requested without a user
+    THEN the image is returned
+    """
+    url = make_signed_url("unprocessed_image_data/user/image.png", "original.png", "/files-api", "secret", 300)
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b"png"
+    assert response.headers["content-type"] == "image/png"
+    assert 'filename="original.png"' in response.headers["content-disposition"]
+
+
+async def test_a_changed_link_is_forbidden(image_path, client):
+    url = make_signed_url("unprocessed_image_data/user/image.png", "original.png", "/files-api", "secret", 300)
+    split_url = urlsplit(url)
+    response = await client.get(f"{split_url.path.replace('image.png', 'other.png')}?{split_url.query}")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+async def test_signed_links_are_forbidden_without_a_secret(mocker, image_path, client):
+    url = make_signed_url("unprocessed_image_data/user/image.png", "original.png", "/files-api", "secret", 300)
+    mocker.patch.object(settings, "DOWNLOAD_URL_SECRET", None)
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+async def test_a_link_with_a_non_ascii_signature_is_forbidden(image_path, client):
+    url = make_signed_url("unprocessed_image_data/user/image.png", "original.png", "/files-api", "secret", 300)
+    response = await client.get(f"{url.split('&signature=')[0]}&signature={quote('é' * 43)}")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
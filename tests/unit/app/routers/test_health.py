@@ -0,0 +1,22 @@
+import pytest
+from fastapi import FastAPI, status
+from httpx import ASGITransport, AsyncClient
+
+from app.routers import health
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_get_metrics_returns_the_prometheus_text_format():
+    """
+    GIVEN the health router
+    WHEN the metrics are requested
+    THEN they are returned as Prometheus text
+    """
+    app = FastAPI()
+    app.include_router(health.router, prefix="/healthcheck-api")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/healthcheck-api/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "storage_reclaimed_bytes_total" in response.text
@@ -0,0 +1,531 @@
+import io
+import json
+import tarfile
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, status
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.db.database import get_async_session
+from app.dependency.async_dependency import get_current_active_user
+from app.exceptions import (
+    ImageNotFound,
+    JobAlreadyFinished,
+    JobCancelled,
+    JobDeadlineExceeded,
+    JobNotFound,
+    ServiceOverloaded,
+    TooManyAugmentations,
+)
+from app.routers import image
+from app.schemas.job import ResponseProcessingJob
+from app.schemas.transactions_db import (
+    JobPriority,
+    JobStatus,
+    ProcessedImage,
+    UnprocessedImage,
+    User,
+)
+
+pytestmark = pytest.mark.asyncio
+
+# a stand-in for a large processed image
+IMAGE_CONTENT = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def processed_image_entry(mocker, tmp_path):
+    """
+    A processed image entry whose file exists on disk.
+    """
+    entry = ProcessedImage(
+        id=uuid.uuid4(),
+        storage_filename=f"{uuid.uuid4()}.png",
+        unprocessed_image_id=uuid.uuid4(),
+    )
+    image_path = tmp_path / entry.storage_filename
+    image_path.write_bytes(IMAGE_CONTENT)
+    mocker.patch("app.services.image.read_ProcessedImage_entry", AsyncMock(return_value=entry))
+    mocker.patch("app.services.image.get_processed_image_location", AsyncMock(return_value=image_path))
+    return entry
+
+
+@pytest_asyncio.fixture
+async def client():
+    """
+    A client for the image router with the database and user lookups replaced.
+    """
+    app = FastAPI()
+    app.include_router(image.router, prefix="/image-api")
+    app.dependency_overrides[get_async_session] = lambda: AsyncMock()
+    app.dependency_overrides[get_current_active_user] = lambda: User(id=uuid.uuid4(), external_id="test-user")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+# --- GET /processed-image/{processed_image_id}/ ---
+
+async def test_download_a_byte_range(client, processed_image_entry):
+    """
+    GIVEN a stored processed image
+    WHEN a single byte range is requested
+    THEN only those bytes are returned with 206 Partial Content
+    """
+    response = await client.get(
+        f"/image-api/processed-image/{processed_image_entry.id}/",
+        headers={"Range": "bytes=100-199"},
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.headers["content-range"] == f"bytes 100-199/{len(IMAGE_CONTENT)}"
+    assert response.content == IMAGE_CONTENT[100:200]
+
+
+async def test_resume_a_download_from_an_offset(client, processed_image_entry):
+    response = await client.get(
+        f"/image-api/processed-image/{processed_image_entry.id}/",
+        headers={"Range": "bytes=16000-"},
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == IMAGE_CONTENT[16000:]
+
+
+async def test_download_multiple_byte_ranges(client, processed_image_entry):
+    response = await client.get(
+        f"/image-api/processed-image/{processed_image_entry.id}/",
+        headers={"Range": "bytes=0-9, 5000-5009"},
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert IMAGE_CONTENT[0:10] in response.content
+    assert IMAGE_CONTENT[5000:5010] in response.content
+
+
+async def test_if_range_with_the_etag_returns_the_range(client, processed_image_entry):
+    """
+    GIVEN the ETag from an earlier download
+    WHEN a range is requested with If-Range
+    THEN the range is returned because the image has not changed
+    """
+    first_response = await client.head(f"/image-api/processed-image/{processed_image_entry.id}/")
+    assert first_response.headers["accept-ranges"] == "bytes"
+    assert int(first_response.headers["content-length"]) == len(IMAGE_CONTENT)
+    response = await client.get(
+        f"/image-api/processed-image/{processed_image_entry.id}/",
+        headers={"Range": "bytes=0-9", "If-Range": first_response.headers["etag"]},
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == IMAGE_CONTENT[0:10]
+
+
+async def test_if_range_with_another_etag_returns_the_whole_image(client, processed_image_entry):
+    response = await client.get(
+        f"/image-api/processed-image/{processed_image_entry.id}/",
+        headers={"Range": "bytes=0-9", "If-Range": '"something-else"'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == IMAGE_CONTENT
+
+
+async def test_an_unsatisfiable_range_returns_416(client, processed_image_entry):
+    response = await client.get(
+        f"/image-api/processed-image/{processed_image_entry.id}/",
+        headers={"Range": f"bytes={len(IMAGE_CONTENT) + 10}-"},
+    )
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+
+async def test_head_returns_no_body(client, processed_image_entry):
+    response = await client.head(f"/image-api/processed-image/{processed_image_entry.id}/")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b""
+
+
+async def test_download_of_a_missing_file_is_404(mocker, client, processed_image_entry, tmp_path):
+    """
+    GIVEN a processed image entry whose file is missing
+    WHEN it is downloaded
+    THEN the response is 404 Not Found
+    """
+    mocker.patch(
+        "app.services.image.get_processed_image_location",
+        AsyncMock(return_value=tmp_path / "missing.png"),
+    )
+    response = await client.get(f"/image-api/processed-image/{processed_image_entry.id}/")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+# --- GET /export/ ---
+
+@pytest.fixture
+def exported_images(mocker, tmp_path):
+    """
+    2 processed images on disk. Only the first has a recorded request body.
+    """
+    unprocessed_image_id = uuid.uuid4()
+    entries = []
+    for content in (b"first", b"second"):
+        entry = ProcessedImage(
+            id=uuid.uuid4(),
+            storage_filename=f"{uuid.uuid4()}.png",
+            unprocessed_image_id=unprocessed_image_id,
+        )
+        (tmp_path / entry.storage_filename).write_bytes(content)
+        entries.append(entry)
+    request_body = {"arguments": {"processing": "flip", "axis": "x"}}
+    mocker.patch(
+        "app.services.image.read_ProcessedImage_entries_with_requests",
+        AsyncMock(return_value=[(entries[0], request_body), (entries[1], None)]),
+    )
+    mocker.patch("app.services.image.count_ProcessedImage_entries", AsyncMock(return_value=5))
+
+    async def get_location(user_id, unprocessed_image_id, processed_image_storage_filename):
+        return tmp_path / processed_image_storage_filename
+
+    mocker.patch("app.services.image.get_processed_image_location", get_location)
+    return entries, request_body
+
+
+async def test_export_streams_a_tar_of_processed_images(client, exported_images):
+    entries, _ = exported_images
+    response = await client.get("/image-api/export/")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-tar"
+    with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:") as archive:
+        names = archive.getnames()
+        assert names == [f"{entry.unprocessed_image_id}/{entry.storage_filename}" for entry in entries]
+        assert archive.extractfile(names[0]).read() == b"first"
+
+
+async def test_export_a_webdataset_shard(client, exported_images):
+    """
+    GIVEN 5 processed images
+    WHEN a WebDataset shard of 2 images is exported
+    THEN every image is followed by a JSON sidecar with the same key
+    AND the number of shards is in the response headers
+    """
+    entries, request_body = exported_images
+    response = await client.get("/image-api/export/", params={"format": "webdataset", "shard_size": 2, "shard": 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["x-shard-count"] == "3"
+    assert "000001" in response.headers["content-disposition"]
+    with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:") as archive:
+        assert archive.getnames() == [
+            f"{entries[0].id}.png", f"{entries[0].id}.json",
+            f"{entries[1].id}.png", f"{entries[1].id}.json",
+        ]
+        first_sidecar = json.loads(archive.extractfile(f"{entries[0].id}.json").read())
+        second_sidecar = json.loads(archive.extractfile(f"{entries[1].id}.json").read())
+    assert first_sidecar["request_body"] == request_body
+    assert first_sidecar["unprocessed_image_id"] == str(entries[0].unprocessed_image_id)
+    assert second_sidecar["request_body"] is None
+
+
+async def test_export_of_an_unknown_unprocessed_image_is_404(mocker, client):
+    mocker.patch(
+        "app.services.image.read_UnprocessedImage_entry",
+        AsyncMock(side_effect=ImageNotFound("not found")),
+    )
+    response = await client.get(f"/image-api/export/{uuid.uuid4()}/")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+# --- GET /unprocessed-image/ ---
+
+async def test_list_unprocessed_images_pages_with_the_cursor(mocker, client):
+    """
+    GIVEN 3 uploaded images
+    WHEN they are listed 2 at a time
+    THEN the first page has a cursor
+    AND the cursor returns the rest of the images
+    """
+    entries = [
+        UnprocessedImage(
+            id=uuid.uuid4(),
+            original_filename=f"image_{index}.png",
+            storage_filename=f"{uuid.uuid4()}.png",
+            user_id=uuid.uuid4(),
+        )
+        for index in range(3)
+    ]
+    mocker.patch(
+        "app.services.image.read_UnprocessedImage_entries",
+        AsyncMock(side_effect=[entries, entries[2:]]),
+    )
+    first_page = await client.get("/image-api/unprocessed-image/", params={"limit": 2})
+    assert first_page.status_code == status.HTTP_200_OK
+    assert [image["unprocessed_image_filename"] for image in first_page.json()["images"]] == ["image_0.png", "image_1.png"]
+    second_page = await client.get(
+        "/image-api/unprocessed-image/",
+        params={"limit": 2, "cursor": first_page.json()["next_cursor"]},
+    )
+    assert [image["unprocessed_image_filename"] for image in second_page.json()["images"]] == ["image_2.png"]
+    assert second_page.json()["next_cursor"] is None
+
+
+async def test_list_unprocessed_images_with_an_invalid_cursor_is_400(client):
+    response = await client.get("/image-api/unprocessed-image/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize("limit", [0, 101])
+async def test_list_unprocessed_images_limit_is_bounded(client, limit):
+    response = await client.get("/image-api/unprocessed-image/", params={"limit": limit})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+# --- GET /unprocessed-image/{unprocessed_image_id}/processed-image/ ---
+
+async def test_list_processed_images(mocker, client):
+    unprocessed_image_id = uuid.uuid4()
+    entry = ProcessedImage(
+        id=uuid.uuid4(),
+        storage_filename=f"{uuid.uuid4()}.png",
+        unprocessed_image_id=unprocessed_image_id,
+    )
+    mocker.patch("app.services.image.read_UnprocessedImage_entry", AsyncMock())
+    mocker.patch("app.services.image.read_ProcessedImage_entries", AsyncMock(return_value=[entry]))
+    response = await client.get(f"/image-api/unprocessed-image/{unprocessed_image_id}/processed-image/")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["unprocessed_image_id"] == str(unprocessed_image_id)
+    assert response.json()["images"][0]["processed_image_id"] == str(entry.id)
+    assert response.json()["next_cursor"] is None
+
+
+async def test_list_processed_images_of_an_unknown_image_is_404(mocker, client):
+    mocker.patch(
+        "app.services.image.read_UnprocessedImage_entry",
+        AsyncMock(side_effect=ImageNotFound("not found")),
+    )
+    response = await client.get(f"/image-api/unprocessed-image/{uuid.uuid4()}/processed-image/")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+# --- POST /augment/{unprocessed_image_id} ---
+
+@pytest.mark.parametrize(("rejection", "status_code"), [
+    (ServiceOverloaded("busy", retry_after=3), status.HTTP_503_SERVICE_UNAVAILABLE),
+    (TooManyAugmentations("too many", retry_after=3), status.HTTP_429_TOO_MANY_REQUESTS),
+])
+async def test_augment_is_rejected_with_retry_after(mocker, client, rejection, status_code):
+    """
+    GIVEN an augmentation the admission controller turns away
+    WHEN it is requested
+    THEN the client is told when to try again
+    """
+    mocker.patch("app.routers.image.augment_image_service", AsyncMock(side_effect=rejection))
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}",
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status_code
+    assert response.headers["retry-after"] == "3"
+
+async def test_augment_passes_the_priority(mocker, client):
+    mock_service = mocker.patch(
+        "app.routers.image.augment_image_service",
+        AsyncMock(side_effect=ServiceOverloaded("busy", retry_after=1)),
+    )
+    await client.post(
+        f"/image-api/augment/{uuid.uuid4()}",
+        params={"priority": "low"},
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert mock_service.await_args.kwargs["priority"] == JobPriority.LOW
+
+
+async def test_augment_rejects_an_unknown_priority(client):
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}",
+        params={"priority": "urgent"},
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize(("error", "status_code"), [
+    (JobDeadlineExceeded("too slow"), status.HTTP_504_GATEWAY_TIMEOUT),
+    (JobCancelled("cancelled"), status.HTTP_409_CONFLICT),
+])
+async def test_augment_that_stops_is_an_error(mocker, client, error, status_code):
+    mocker.patch("app.routers.image.augment_image_service", AsyncMock(side_effect=error))
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}",
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status_code
+
+
+async def test_augment_passes_the_timeout_and_job_id(mocker, client):
+    mock_service = mocker.patch(
+        "app.routers.image.augment_image_service",
+        AsyncMock(side_effect=ServiceOverloaded("busy", retry_after=1)),
+    )
+    job_id = uuid.uuid4()
+    await client.post(
+        f"/image-api/augment/{uuid.uuid4()}",
+        params={"timeout": 2.5, "job_id": str(job_id)},
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert mock_service.await_args.kwargs["timeout_seconds"] == 2.5
+    assert mock_service.await_args.kwargs["job_id"] == job_id
+
+
+async def test_augment_rejects_a_timeout_that_is_not_positive(client):
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}",
+        params={"timeout": 0},
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+# --- POST /job/{job_id}/cancel ---
+
+async def test_cancel_a_job(mocker, client):
+    job_id = uuid.uuid4()
+    mocker.patch(
+        "app.routers.image.cancel_job_service",
+        AsyncMock(return_value=ResponseProcessingJob(
+            job_id=job_id,
+            unprocessed_image_id=uuid.uuid4(),
+            job_status=JobStatus.CANCELLED,
+            priority=JobPriority.NORMAL,
+            requested_at="2025-01-01T00:00:00Z",
+            started_at=None,
+            completed_at="2025-01-01T00:00:01Z",
+            processed_image_id=None,
+        )),
+    )
+    response = await client.post(f"/image-api/job/{job_id}/cancel")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["job_status"] == "cancelled"
+
+
+@pytest.mark.parametrize(("error", "status_code"), [
+    (JobNotFound("missing"), status.HTTP_404_NOT_FOUND),
+    (JobAlreadyFinished("too late"), status.HTTP_409_CONFLICT),
+])
+async def test_cancel_a_job_that_cannot_be_cancelled(mocker, client, error, status_code):
+    mocker.patch("app.routers.image.cancel_job_service", AsyncMock(side_effect=error))
+    response = await client.post(f"/image-api/job/{uuid.uuid4()}/cancel")
+    assert response.status_code == status_code
+
+# --- POST /augment/{unprocessed_image_id}/async ---
+
+def make_job_response(job_status: JobStatus) -> ResponseProcessingJob:
+    return ResponseProcessingJob(
+        job_id=uuid.uuid4(),
+        unprocessed_image_id=uuid.uuid4(),
+        job_status=job_status,
+        priority=JobPriority.NORMAL,
+        requested_at="2025-01-01T00:00:00Z",
+        started_at=None,
+        completed_at=None,
+        processed_image_id=None,
+    )
+
+
+async def test_submit_an_augmentation(mocker, client):
+    job = make_job_response(JobStatus.PENDING)
+    mock_service = mocker.patch("app.routers.image.submit_augmentation_service", AsyncMock(return_value=job))
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}/async",
+        params={"priority": "high", "timeout": 30},
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.headers["location"] == f"/image-api/job/{job.job_id}"
+    assert response.json()["job_status"] == "pending"
+    assert mock_service.await_args.kwargs["priority"] == JobPriority.HIGH
+    assert mock_service.await_args.kwargs["timeout_seconds"] == 30
+
+
+async def test_submit_an_augmentation_that_is_rejected(mocker, client):
+    mocker.patch(
+        "app.routers.image.submit_augmentation_service",
+        AsyncMock(side_effect=ServiceOverloaded("busy", retry_after=3)),
+    )
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}/async",
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "3"
+
+# --- GET /job/{job_id} ---
+
+async def test_wait_for_a_job(mocker, client):
+    mock_service = mocker.patch(
+        "app.routers.image.wait_for_job_service",
+        AsyncMock(return_value=make_job_response(JobStatus.SUCCEEDED)),
+    )
+    response = await client.get(f"/image-api/job/{uuid.uuid4()}", params={"wait": 30})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["job_status"] == "succeeded"
+    assert mock_service.await_args.kwargs["wait"] == 30
+
+
+async def test_wait_for_a_job_at_most_the_long_poll_max(client):
+    response = await client.get(f"/image-api/job/{uuid.uuid4()}", params={"wait": 3600})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_wait_for_a_job_that_is_not_found(mocker, client):
+    mocker.patch("app.routers.image.wait_for_job_service", AsyncMock(side_effect=JobNotFound("missing")))
+    response = await client.get(f"/image-api/job/{uuid.uuid4()}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+# --- GET /job/{job_id}/events ---
+
+async def test_follow_a_job_as_server_sent_events(mocker, client):
+    async def events():
+        yield "event: status\ndata: {}\n\n"
+
+    mocker.patch(
+        "app.routers.image.job_events_service",
+        AsyncMock(return_value=StreamingResponse(events(), media_type="text/event-stream")),
+    )
+    response = await client.get(f"/image-api/job/{uuid.uuid4()}/events")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == "event: status\ndata: {}\n\n"
+
+
+async def test_follow_a_job_that_is_not_found(mocker, client):
+    mocker.patch("app.routers.image.job_events_service", AsyncMock(side_effect=JobNotFound("missing")))
+    response = await client.get(f"/image-api/job/{uuid.uuid4()}/events")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+# --- POST /augment/{unprocessed_image_id}/estimate ---
+
+async def test_estimate_augmentation(mocker, client):
+    entry = UnprocessedImage(
+        id=uuid.uuid4(),
+        original_filename="image.png",
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=uuid.uuid4(),
+        width=640,
+        height=480,
+    )
+    mocker.patch("app.services.image.read_UnprocessedImage_entry", AsyncMock(return_value=entry))
+    response = await client.post(
+        f"/image-api/augment/{entry.id}/estimate",
+        json={"arguments": {"processing": "flip", "axis": "x"}},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert body["unprocessed_image_id"] == str(entry.id)
+    assert (body["width"], body["height"]) == (640, 480)
+    assert body["estimated_cpu_seconds"] >= 0
+    assert body["estimated_peak_memory_bytes"] >= 640 * 480 * 3
+    assert body["request_body"] == {"arguments": {"processing": "flip", "axis": "x"}}
+
+
+async def test_estimate_augmentation_of_an_unknown_image_is_404(mocker, client):
+    mocker.patch(
+        "app.services.image.read_UnprocessedImage_entry",
+        AsyncMock(side_effect=ImageNotFound("not found")),
+    )
+    response = await client.post(
+        f"/image-api/augment/{uuid.uuid4()}/estimate",
+        json={"arguments": {"processing": "invert"}},
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
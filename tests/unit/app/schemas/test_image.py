@@ -18,6 +18,7 @@ from app.schemas.image import (
     PepperNoiseArguments,
     RainbowNoiseArguments,
     RotateArguments,
+    SaltAndPepperNoiseArguments,
     SaltNoiseArguments,
     ShiftArguments,
     TintArguments,
@@ -242,6 +243,22 @@ def test_GaussianBlurArguments_amount_value_of_100_is_valid():
     gaussian_blur_args.processing = "gaussian_blur"
     gaussian_blur_args.amount = 100
 
+def test_GaussianBlurArguments_with_amount_value_of_5000_is_valid():
+    data = {
+        "processing": "gaussian_blur",
+        "amount": 5000
+    }
+    gaussian_blur_args = GaussianBlurArguments(**data)
+    assert gaussian_blur_args.amount == 5000
+
+def test_GaussianBlurArguments_with_amount_value_of_5001_is_not_valid():
+    data = {
+        "processing": "gaussian_blur",
+        "amount": 5001
+    }
+    with pytest.raises(ValidationError):
+        GaussianBlurArguments(**data)
+
 # --- InvertArguments ---
 
 def test_InvertArguments_is_valid():
@@ -424,6 +441,29 @@ def test_RotateArguments_360_is_invalid_angle():
         RotateArguments(**data)
 
 
+# --- SaltAndPepperNoiseArguments ---
+
+def test_SaltAndPepperNoiseArguments_with_in_range_amount_value_is_valid():
+    for i in range(0, 101):
+        data = {
+            "processing": "salt_and_pepper_noise",
+            "amount": i
+        }
+        salt_and_pepper_noise_args = SaltAndPepperNoiseArguments(**data)
+        assert salt_and_pepper_noise_args.amount == i
+
+def test_SaltAndPepperNoiseArguments_with_amount_value_of_101_is_not_valid():
+    data = {
+        "processing": "salt_and_pepper_noise",
+        "amount": 101
+    }
+    with pytest.raises(ValidationError):
+        SaltAndPepperNoiseArguments(**data)
+
+def test_AugmentationRequestBody_accepts_salt_and_pepper_noise():
+    request_body = AugmentationRequestBody(arguments={"processing": "salt_and_pepper_noise", "amount": 10})
+    assert isinstance(request_body.arguments, SaltAndPepperNoiseArguments)
+
 # --- SaltNoiseArguments ---
 
 def test_SaltNoiseArguments_with_in_range_amount_value_is_valid():
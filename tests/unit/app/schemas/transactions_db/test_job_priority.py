@@ -0,0 +1,35 @@
+import pytest
+
+from app.schemas.transactions_db.job_priority import JobPriority
+
+
+def test_JobPriority_member_values():
+    """
+    GIVEN a JobPriority
+    WHEN accessing the value of each member
+    THEN the correct string value should be returned
+    """
+    assert JobPriority.HIGH.value == "high"
+    assert JobPriority.NORMAL.value == "normal"
+    assert JobPriority.LOW.value == "low"
+
+
+def test_JobPriority_instantiation_from_string():
+    """
+    GIVEN a JobPriority enum
+    WHEN a valid string is used to instantiate a member
+    THEN the correct enum member should be returned
+    """
+    assert JobPriority("high") is JobPriority.HIGH
+    assert JobPriority("normal") is JobPriority.NORMAL
+    assert JobPriority("low") is JobPriority.LOW
+
+
+def test_JobPriority_invalid_priority_raises_error():
+    """
+    GIVEN a JobPriority enum
+    WHEN an invalid string is used to instantiate a member
+    THEN a ValueError should be raised
+    """
+    with pytest.raises(ValueError, match="'urgent' is not a valid JobPriority"):
+        JobPriority("urgent")
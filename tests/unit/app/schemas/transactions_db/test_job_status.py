@@ -13,6 +13,7 @@ def test_JobStatus_member_values():
     assert JobStatus.PROCESSING.value == "processing"
     assert JobStatus.SUCCEEDED.value == "succeeded"
     assert JobStatus.FAILED.value == "failed"
+    assert JobStatus.CANCELLED.value == "cancelled"
 
 
 def test_JobStatus_string_equality():
@@ -25,6 +26,7 @@ def test_JobStatus_string_equality():
     assert JobStatus.PROCESSING == "processing"
     assert JobStatus.SUCCEEDED == "succeeded"
     assert JobStatus.FAILED == "failed"
+    assert JobStatus.CANCELLED == "cancelled"
 
 
 def test_JobStatus_instantiation_from_string():
@@ -37,6 +39,7 @@ def test_JobStatus_instantiation_from_string():
     assert JobStatus("processing") is JobStatus.PROCESSING
     assert JobStatus("succeeded") is JobStatus.SUCCEEDED
     assert JobStatus("failed") is JobStatus.FAILED
+    assert JobStatus("cancelled") is JobStatus.CANCELLED
 
 
 def test_JobStatus_invalid_status_raises_error():
@@ -57,3 +60,11 @@ def test_JobStatus_inheritance():
     """
     assert isinstance(JobStatus.FAILED, JobStatus)
     assert isinstance(JobStatus.FAILED, str)
+
+
+def test_JobStatus_is_finished_for_the_end_states():
+    assert not JobStatus.PENDING.is_finished
+    assert not JobStatus.PROCESSING.is_finished
+    assert JobStatus.SUCCEEDED.is_finished
+    assert JobStatus.FAILED.is_finished
+    assert JobStatus.CANCELLED.is_finished
@@ -1,14 +1,594 @@
+import asyncio
+import io
 import uuid
 from unittest.mock import AsyncMock, MagicMock
 
+import anyio.to_thread
+import numpy
 import pytest
-from fastapi import HTTPException, UploadFile, status
+from fastapi import BackgroundTasks, HTTPException, UploadFile, status
+from PIL import Image
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import app.exceptions as exc
+import app.services.image as image_service
+from app.config import settings
+from app.internal.admission import AdmissionController
+from app.internal.cancellation import cancel_job, check_cancelled, tracked_job_ids
+from app.internal.cost_model import CostEstimate
 from app.internal.file_handling import InvalidImageFileError
-from app.schemas.image import RotateArguments, ShiftArguments, UploadRequestBody, ResponseUploadImage
-from app.schemas.transactions_db import UnprocessedImage, User
+from app.internal.pagination import decode_cursor, encode_cursor
+from app.internal.renditions import generate_renditions
+from app.schemas.image import AugmentationRequestBody, RotateArguments, ShiftArguments, UploadRequestBody, ResponseUploadImage
+from app.schemas.transactions_db import JobPriority, JobStatus, ProcessedImage, ProcessingJob, UnprocessedImage, User
+from app.services.image import (
+    augment_image_service,
+    cancel_submitted_jobs,
+    estimate_augmentation_service,
+    get_processed_image_by_id_service,
+    list_unprocessed_images_service,
+    submit_augmentation_service,
+    upload_image_service,
+)
 
 pytestmark = pytest.mark.asyncio
 
-# TODO: write tests
\ No newline at end of file
+# TODO: write tests
+
+# --- get_processed_image_by_id_service ---
+
+@pytest.fixture
+def processed_image_entry(mocker):
+    entry = ProcessedImage(
+        id=uuid.uuid4(),
+        storage_filename=f"{uuid.uuid4()}.png",
+        unprocessed_image_id=uuid.uuid4(),
+    )
+    mocker.patch("app.services.image.read_ProcessedImage_entry", AsyncMock(return_value=entry))
+    return entry
+
+
+async def test_get_processed_image_by_id_service_returns_304_without_touching_the_disk(mocker, processed_image_entry):
+    """
+    GIVEN a stored processed image
+    AND an If-None-Match header with its ETag
+    WHEN get_processed_image_by_id_service is called
+    THEN it returns 304 Not Modified with the cache headers
+    AND it never checks the file on disk
+    """
+    mock_get_location = mocker.patch("app.services.image.get_processed_image_location", AsyncMock())
+    etag = f'"{processed_image_entry.storage_filename.removesuffix(".png")}"'
+    response = await get_processed_image_by_id_service(
+        processed_image_id=processed_image_entry.id,
+        user_id=uuid.uuid4(),
+        db_session=MagicMock(spec=AsyncSession),
+        if_none_match=etag,
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "max-age=31536000, immutable"
+    assert not response.body
+    mock_get_location.assert_not_called()
+
+
+async def test_get_processed_image_by_id_service_sets_cache_headers_on_the_file(mocker, processed_image_entry, tmp_path):
+    image_path = tmp_path / processed_image_entry.storage_filename
+    image_path.write_bytes(b"png")
+    mocker.patch("app.services.image.get_processed_image_location", AsyncMock(return_value=image_path))
+    response = await get_processed_image_by_id_service(
+        processed_image_id=processed_image_entry.id,
+        user_id=uuid.uuid4(),
+        db_session=MagicMock(spec=AsyncSession),
+        if_none_match='"something-else"',
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == f'"{image_path.stem}"'
+    assert response.headers["vary"] == "X-External-User-ID"
+    assert response.headers["content-length"] == "3"
+
+
+async def test_get_processed_image_by_id_service_raises_image_not_found_for_a_missing_file(
+        mocker, processed_image_entry, tmp_path):
+    """
+    GIVEN a processed image entry whose file is missing
+    WHEN get_processed_image_by_id_service is called
+    THEN ImageNotFound is raised
+    """
+    image_path = tmp_path / processed_image_entry.storage_filename
+    mocker.patch("app.services.image.get_processed_image_location", AsyncMock(return_value=image_path))
+    with pytest.raises(exc.ImageNotFound):
+        await get_processed_image_by_id_service(
+            processed_image_id=processed_image_entry.id,
+            user_id=uuid.uuid4(),
+            db_session=MagicMock(spec=AsyncSession),
+        )
+
+async def test_get_processed_image_by_id_service_redirects_to_the_object_store(mocker, processed_image_entry, tmp_path):
+    """
+    GIVEN a storage backend that serves its own files
+    WHEN get_processed_image_by_id_service is called
+    THEN the client is redirected to the file
+    AND the cache headers are kept
+    """
+    image_path = tmp_path / processed_image_entry.storage_filename
+    mocker.patch("app.services.image.get_processed_image_location", AsyncMock(return_value=image_path))
+    mock_storage = MagicMock()
+    mock_storage.get_download_url.return_value = "https://bucket.example.com/image.png?signature=abc"
+    mocker.patch("app.services.image.get_storage_backend", return_value=mock_storage)
+    response = await get_processed_image_by_id_service(
+        processed_image_id=processed_image_entry.id,
+        user_id=uuid.uuid4(),
+        db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert response.headers["location"] == "https://bucket.example.com/image.png?signature=abc"
+    assert response.headers["etag"] == f'"{image_path.stem}"'
+    mock_storage.get_download_url.assert_called_once_with(
+        image_path, f"{processed_image_entry.storage_filename}.png", "image/png"
+    )
+
+@pytest.mark.parametrize(("download_mode", "header", "value"), [
+    ("x_accel_redirect", "x-accel-redirect", "/protected-files/processed_image_data/{name}"),
+    ("x_sendfile", "x-sendfile", "{path}"),
+])
+async def test_get_processed_image_by_id_service_hands_the_file_to_the_web_server(
+        mocker, processed_image_entry, tmp_path, download_mode, header, value):
+    """
+    GIVEN a web server in front of the service that sends files
+    WHEN get_processed_image_by_id_service is called
+    THEN the response names the file instead of holding it
+    """
+    mocker.patch.dict("app.services.image.VOLUME_PATHS", {"processed_image_data": tmp_path})
+    mocker.patch.object(settings, "DOWNLOAD_MODE", download_mode)
+    image_path = tmp_path / processed_image_entry.storage_filename
+    image_path.write_bytes(b"png")
+    mocker.patch("app.services.image.get_processed_image_location", AsyncMock(return_value=image_path))
+    response = await get_processed_image_by_id_service(
+        processed_image_id=processed_image_entry.id,
+        user_id=uuid.uuid4(),
+        db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.body == b""
+    assert response.headers[header] == value.format(name=image_path.name, path=image_path)
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{image_path.stem}"'
+
+
+async def test_get_processed_image_by_id_service_redirects_to_a_signed_link(mocker, processed_image_entry, tmp_path):
+    """
+    GIVEN DOWNLOAD_MODE=signed_url
+    WHEN get_processed_image_by_id_service is called
+    THEN the client is redirected to a signed link
+    AND the redirect is not cached
+    """
+    mocker.patch.dict("app.services.image.VOLUME_PATHS", {"processed_image_data": tmp_path})
+    mocker.patch.object(settings, "DOWNLOAD_MODE", "signed_url")
+    mocker.patch.object(settings, "DOWNLOAD_URL_SECRET", "secret")
+    image_path = tmp_path / processed_image_entry.storage_filename
+    image_path.write_bytes(b"png")
+    mocker.patch("app.services.image.get_processed_image_location", AsyncMock(return_value=image_path))
+    response = await get_processed_image_by_id_service(
+        processed_image_id=processed_image_entry.id,
+        user_id=uuid.uuid4(),
+        db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert response.headers["location"].startswith(f"/files-api/files/processed_image_data/{image_path.name}?")
+    assert response.headers["cache-control"] == "no-store"
+
+# --- list_unprocessed_images_service ---
+
+def make_unprocessed_image_entries(number):
+    return [
+        UnprocessedImage(
+            id=uuid.uuid4(),
+            original_filename=f"image_{index}.png",
+            storage_filename=f"{uuid.uuid4()}.png",
+            user_id=uuid.uuid4(),
+        )
+        for index in range(number)
+    ]
+
+
+async def test_list_unprocessed_images_service_returns_a_cursor_when_there_is_another_page(mocker):
+    """
+    GIVEN more entries than fit in a page
+    WHEN list_unprocessed_images_service is called
+    THEN it returns one page of images
+    AND a cursor pointing after the last image of the page
+    """
+    entries = make_unprocessed_image_entries(3)
+    mock_read = mocker.patch("app.services.image.read_UnprocessedImage_entries", AsyncMock(return_value=entries))
+    response = await list_unprocessed_images_service(
+        user_id=uuid.uuid4(),
+        limit=2,
+        db_session=MagicMock(spec=AsyncSession),
+    )
+    assert [image.unprocessed_image_id for image in response.images] == [entry.id for entry in entries[:2]]
+    assert response.next_cursor == encode_cursor(entries[1].created_at, entries[1].id)
+    # one extra entry is asked for
+    assert mock_read.call_args.kwargs["limit"] == 3
+    assert mock_read.call_args.kwargs["after"] is None
+
+
+async def test_list_unprocessed_images_service_last_page_has_no_cursor(mocker):
+    entries = make_unprocessed_image_entries(2)
+    mock_read = mocker.patch("app.services.image.read_UnprocessedImage_entries", AsyncMock(return_value=entries))
+    cursor = encode_cursor(entries[0].created_at, uuid.uuid4())
+    response = await list_unprocessed_images_service(
+        user_id=uuid.uuid4(),
+        limit=2,
+        cursor=cursor,
+        db_session=MagicMock(spec=AsyncSession),
+    )
+    assert len(response.images) == 2
+    assert response.next_cursor is None
+    assert mock_read.call_args.kwargs["after"] == decode_cursor(cursor)
+
+# --- upload_image_service ---
+
+@pytest.fixture
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.fromarray(numpy.zeros((8, 8, 3), dtype=numpy.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def test_upload_image_service_stores_the_same_bytes_once(mocker, tmp_path, png_bytes):
+    """
+    GIVEN the same image is uploaded twice
+    WHEN upload_image_service is called for each upload
+    THEN each upload gets its own UnprocessedImage entry
+    AND only the first upload is decoded and written to disk
+    AND only the first upload makes previews
+    """
+    mocker.patch.dict("app.repository.directory_manager.VOLUME_PATHS", {"unprocessed_image_data": tmp_path})
+    mock_decode = mocker.patch(
+        "app.repository.image.translate_file_to_numpy_array",
+        return_value=numpy.zeros((8, 8, 3), dtype=numpy.uint8),
+    )
+    mock_reference = mocker.patch("app.services.image.reference_ImageBlob_entry", AsyncMock(side_effect=[1, 2]))
+    mock_create = mocker.patch(
+        "app.services.image.create_UnprocessedImage_entry",
+        AsyncMock(side_effect=lambda **kwargs: UnprocessedImage(id=uuid.uuid4(), **kwargs)),
+    )
+    mocker.patch("app.services.image.create_processed_image_directory", AsyncMock())
+    background_tasks = BackgroundTasks()
+    responses = [
+        await upload_image_service(
+            image_file=UploadFile(file=io.BytesIO(png_bytes), filename="my_image.png"),
+            user_id=uuid.uuid4(),
+            db_session=MagicMock(spec=AsyncSession),
+            background_tasks=background_tasks,
+        )
+        for _ in range(2)
+    ]
+    assert responses[0].unprocessed_image_id != responses[1].unprocessed_image_id
+    mock_decode.assert_called_once()
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+    assert mock_reference.await_count == 2
+    content_hashes = {call.kwargs["content_hash"] for call in mock_create.await_args_list}
+    assert len(content_hashes) == 1
+    # the size is recorded so augmentations can be priced without decoding
+    assert {(call.kwargs["width"], call.kwargs["height"]) for call in mock_create.await_args_list} == {(8, 8)}
+    assert len(background_tasks.tasks) == 1
+
+# --- augment_image_service ---
+
+async def test_augment_image_service_rejects_before_reading_the_image(mocker):
+    """
+    GIVEN an admission controller with no room left
+    WHEN augment_image_service is called
+    THEN the augmentation is rejected
+    AND the image is never read
+    """
+    entry = UnprocessedImage(
+        id=uuid.uuid4(),
+        original_filename="image.png",
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=uuid.uuid4(),
+        width=4000,
+        height=3000,
+    )
+    mocker.patch("app.services.image.read_UnprocessedImage_entry", AsyncMock(return_value=entry))
+    mock_read = mocker.patch("app.services.image.read_unprocessed_image_from_disc", AsyncMock())
+    controller = AdmissionController(budget=CostEstimate(cpu_seconds=1.0, peak_memory_bytes=1_000_000_000))
+    mocker.patch("app.services.image.get_admission_controller", return_value=controller)
+    # another user is already running something
+    with controller.admit(cost=CostEstimate(cpu_seconds=0.5), user_id=uuid.uuid4()), pytest.raises(exc.ServiceOverloaded):
+        await augment_image_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(arguments={"processing": "invert"}),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+        )
+    mock_read.assert_not_awaited()
+
+@pytest.fixture
+def augmentation_mocks(mocker):
+    entry = UnprocessedImage(
+        id=uuid.uuid4(),
+        original_filename="image.png",
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=uuid.uuid4(),
+        width=4,
+        height=4,
+    )
+    job = ProcessingJob(
+        unprocessed_image_id=entry.id,
+        upload_request_body={},
+    )
+    processed_entry = ProcessedImage(
+        id=uuid.uuid4(),
+        storage_filename=f"{uuid.uuid4()}.png",
+        unprocessed_image_id=entry.id,
+    )
+    mocker.patch("app.services.image.read_UnprocessedImage_entry", AsyncMock(return_value=entry))
+    mocker.patch(
+        "app.services.image.read_unprocessed_image_from_disc",
+        AsyncMock(return_value=numpy.zeros((4, 4, 3), dtype=numpy.uint8)),
+    )
+    return {
+        "entry": entry,
+        "write_image": mocker.patch("app.services.image.write_processed_image_to_disc", AsyncMock()),
+        "processed_entry": processed_entry,
+        "create_job": mocker.patch("app.services.image.create_ProcessingJob_entry", AsyncMock(return_value=job)),
+        "update_job": mocker.patch("app.services.image.update_ProcessingJob_entry", AsyncMock(return_value=True)),
+        "complete_job": mocker.patch(
+            "app.services.image.complete_ProcessingJob_entry",
+            AsyncMock(return_value=processed_entry),
+        ),
+        "job": job,
+    }
+
+
+async def test_augment_image_service_records_the_wait_for_a_worker(augmentation_mocks):
+    """
+    GIVEN an augmentation that is admitted
+    WHEN augment_image_service is called
+    THEN its job is recorded as pending before it waits for a worker
+    AND it is processing from when it got a worker... so started_at - requested_at is the wait
+    AND it links the processed image when it succeeds
+    """
+    entry = augmentation_mocks["entry"]
+    response = await augment_image_service(
+        unprocessed_image_id=entry.id,
+        processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+        user_id=entry.user_id,
+        db_session=MagicMock(spec=AsyncSession),
+        priority=JobPriority.LOW,
+    )
+    assert response.processed_image_id == augmentation_mocks["processed_entry"].id
+    assert response.job_id == augmentation_mocks["job"].id
+    create_kwargs = augmentation_mocks["create_job"].await_args.kwargs
+    assert create_kwargs["job_status"] == JobStatus.PENDING
+    assert create_kwargs["priority"] == JobPriority.LOW
+    processing = augmentation_mocks["update_job"].await_args.kwargs
+    assert processing["job_id"] == augmentation_mocks["job"].id
+    assert processing["job_status"] == JobStatus.PROCESSING
+    assert processing["from_statuses"] == (JobStatus.PENDING,)
+    assert processing["started_at"] >= create_kwargs["requested_at"]
+    succeeded = augmentation_mocks["complete_job"].await_args.kwargs
+    assert succeeded["job_id"] == augmentation_mocks["job"].id
+    assert succeeded["completed_at"] >= processing["started_at"]
+
+
+async def test_augment_image_service_schedules_the_renditions(mocker, augmentation_mocks):
+    """
+    GIVEN an augmentation that succeeds
+    WHEN augment_image_service is called with background tasks
+    THEN the renditions of the stored image are made once the response has been sent
+    """
+    entry = augmentation_mocks["entry"]
+    stored_at = mocker.sentinel.stored_at
+    augmentation_mocks["write_image"].return_value = stored_at
+    background_tasks = BackgroundTasks()
+    await augment_image_service(
+        unprocessed_image_id=entry.id,
+        processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+        user_id=entry.user_id,
+        db_session=MagicMock(spec=AsyncSession),
+        background_tasks=background_tasks,
+    )
+    assert len(background_tasks.tasks) == 1
+    assert background_tasks.tasks[0].func is generate_renditions
+    assert background_tasks.tasks[0].args == (stored_at,)
+
+
+async def test_augment_image_service_records_a_failed_job(mocker, augmentation_mocks):
+    entry = augmentation_mocks["entry"]
+    mocker.patch(
+        "app.services.image.write_processed_image_to_disc",
+        AsyncMock(side_effect=OSError("disk full")),
+    )
+    with pytest.raises(OSError):
+        await augment_image_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+        )
+    assert augmentation_mocks["update_job"].await_args.kwargs["job_status"] == JobStatus.FAILED
+
+
+async def test_augment_image_service_stops_a_job_at_its_deadline(mocker, augmentation_mocks):
+    """
+    GIVEN an augmentation that is still running at its deadline
+    WHEN it reaches its next safe point
+    THEN it stops with JobDeadlineExceeded... and is recorded as cancelled
+    AND nothing is stored
+    """
+    entry = augmentation_mocks["entry"]
+
+    async def slow_process_image(image_data, processing_parameters):
+        await asyncio.sleep(0.05)
+        return image_data
+
+    mocker.patch("app.services.image.process_image", slow_process_image)
+    with pytest.raises(exc.JobDeadlineExceeded):
+        await augment_image_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+            timeout_seconds=0.01,
+        )
+    cancelled = augmentation_mocks["update_job"].await_args.kwargs
+    assert cancelled["job_status"] == JobStatus.CANCELLED
+    assert cancelled["from_statuses"] == (JobStatus.PENDING, JobStatus.PROCESSING)
+    augmentation_mocks["complete_job"].assert_not_awaited()
+
+
+async def test_augment_image_service_stops_a_job_cancelled_while_it_runs(mocker, augmentation_mocks):
+    """
+    GIVEN a running augmentation
+    WHEN its job is cancelled
+    THEN the worker thread stops at its next safe point with JobCancelled
+    AND the job is no longer tracked
+    """
+    entry = augmentation_mocks["entry"]
+    job_id = uuid.uuid4()
+    augmentation_mocks["job"].id = job_id
+
+    def process_in_thread(image_data, processing_parameters):
+        # runs in the worker thread... the token of the job came with it
+        cancel_job(job_id)
+        check_cancelled()
+
+    async def process_image(image_data, processing_parameters):
+        return await anyio.to_thread.run_sync(process_in_thread, image_data, processing_parameters)
+
+    mocker.patch("app.services.image.process_image", process_image)
+    with pytest.raises(exc.JobCancelled):
+        await augment_image_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+            job_id=job_id,
+        )
+    assert augmentation_mocks["create_job"].await_args.kwargs["job_id"] == job_id
+    assert augmentation_mocks["update_job"].await_args.kwargs["job_status"] == JobStatus.CANCELLED
+    assert job_id not in tracked_job_ids()
+
+
+async def test_augment_image_service_does_not_start_a_job_cancelled_while_it_waited(augmentation_mocks):
+    """
+    GIVEN a job cancelled through another worker while it waited
+    WHEN it gets a worker
+    THEN it is never processed
+    """
+    entry = augmentation_mocks["entry"]
+    # the job is no longer pending... so it does not move to processing
+    augmentation_mocks["update_job"].return_value = False
+    with pytest.raises(exc.JobCancelled):
+        await augment_image_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+        )
+    augmentation_mocks["complete_job"].assert_not_awaited()
+
+
+async def test_augment_image_service_does_not_succeed_a_job_cancelled_after_it_was_written(augmentation_mocks):
+    entry = augmentation_mocks["entry"]
+    # the job is no longer processing when it completes
+    augmentation_mocks["complete_job"].return_value = None
+    with pytest.raises(exc.JobCancelled):
+        await augment_image_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+        )
+
+# --- submit_augmentation_service ---
+
+async def fake_async_session():
+    yield MagicMock(spec=AsyncSession)
+
+
+async def run_submitted(mocker, augmentation_mocks) -> MagicMock:
+    # the background job gets a session of its own... and the previews are made after it
+    mocker.patch("app.services.image.get_async_session", fake_async_session)
+    mock_renditions = mocker.patch("app.services.image.generate_renditions")
+    entry = augmentation_mocks["entry"]
+    response = await submit_augmentation_service(
+        unprocessed_image_id=entry.id,
+        processing_request=AugmentationRequestBody(arguments={"processing": "flip", "axis": "x"}),
+        user_id=entry.user_id,
+        db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.job_id == augmentation_mocks["job"].id
+    assert response.job_status == JobStatus.PENDING
+    return mock_renditions
+
+
+async def test_submit_augmentation_service_runs_the_job_after_answering(mocker, augmentation_mocks):
+    """
+    GIVEN an augmentation that is admitted
+    WHEN it is submitted
+    THEN the client gets the pending job straight away
+    AND the job runs and succeeds in the background... and gives its cost back
+    """
+    controller = AdmissionController(budget=CostEstimate(cpu_seconds=100.0, peak_memory_bytes=1_000_000_000))
+    mocker.patch("app.services.image.get_admission_controller", return_value=controller)
+    mock_renditions = await run_submitted(mocker, augmentation_mocks)
+    augmentation_mocks["complete_job"].assert_not_awaited()
+    assert controller.in_use.cpu_seconds > 0
+    await asyncio.gather(*image_service._submitted_jobs)
+    augmentation_mocks["complete_job"].assert_awaited_once()
+    mock_renditions.assert_called_once()
+    assert controller.in_use.cpu_seconds == 0
+
+
+async def test_submit_augmentation_service_records_a_job_stopped_by_shutdown(mocker, augmentation_mocks):
+    async def slow_process_image(image_data, processing_parameters):
+        await asyncio.sleep(10)
+
+    mocker.patch("app.services.image.process_image", slow_process_image)
+    await run_submitted(mocker, augmentation_mocks)
+    await asyncio.sleep(0.01)
+    await cancel_submitted_jobs()
+    assert augmentation_mocks["update_job"].await_args.kwargs["job_status"] == JobStatus.CANCELLED
+    augmentation_mocks["complete_job"].assert_not_awaited()
+    assert augmentation_mocks["job"].id not in tracked_job_ids()
+    assert not image_service._submitted_jobs
+
+
+# --- estimate_augmentation_service ---
+
+async def test_estimate_augmentation_service_prices_by_the_recorded_size(mocker):
+    """
+    GIVEN an unprocessed image with a recorded size
+    WHEN estimate_augmentation_service is called
+    THEN the estimate grows with the work of the augmentation
+    AND the image is never read
+    """
+    entry = UnprocessedImage(
+        id=uuid.uuid4(),
+        original_filename="image.png",
+        storage_filename=f"{uuid.uuid4()}.png",
+        user_id=uuid.uuid4(),
+        width=400,
+        height=300,
+    )
+    mocker.patch("app.services.image.read_UnprocessedImage_entry", AsyncMock(return_value=entry))
+    mock_read = mocker.patch("app.services.image.read_unprocessed_image_from_disc", AsyncMock())
+    estimates = {}
+    for size in (3, 33):
+        estimates[size] = await estimate_augmentation_service(
+            unprocessed_image_id=entry.id,
+            processing_request=AugmentationRequestBody(
+                arguments={"processing": "percentile_filter", "percentile": 50, "size": size},
+            ),
+            user_id=entry.user_id,
+            db_session=MagicMock(spec=AsyncSession),
+        )
+    assert (estimates[3].width, estimates[3].height) == (400, 300)
+    assert estimates[33].estimated_cpu_seconds > 10 * estimates[3].estimated_cpu_seconds
+    # at least the decoded image
+    assert estimates[3].estimated_peak_memory_bytes >= 400 * 300 * 3
+    mock_read.assert_not_awaited()
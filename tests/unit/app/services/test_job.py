@@ -0,0 +1,217 @@
+import asyncio
+import time
+import uuid
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.exceptions as exc
+from app.config import settings
+from app.internal.cancellation import CancellationToken, track_job
+from app.internal.job_notifications import encode_job_status, get_job_status_listener
+from app.schemas.transactions_db import JobStatus, ProcessingJob
+from app.services.job import (
+    cancel_job_service,
+    cancel_jobs_cancelled_elsewhere,
+    iter_job_updates,
+    job_events_service,
+    wait_for_job_service,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_job(job_status: JobStatus) -> ProcessingJob:
+    return ProcessingJob(
+        id=uuid.uuid4(),
+        unprocessed_image_id=uuid.uuid4(),
+        upload_request_body={},
+        job_status=job_status,
+        requested_at=datetime.now(UTC),
+    )
+
+# --- cancel_job_service ---
+
+async def test_cancel_job_service_stops_a_job_running_in_this_worker(mocker):
+    """
+    GIVEN a job running in this worker
+    WHEN it is cancelled
+    THEN it is recorded as cancelled... only if it had not finished
+    AND its token is cancelled straight away
+    """
+    job = make_job(JobStatus.CANCELLED)
+    mocker.patch("app.services.job.read_ProcessingJob_entry", AsyncMock(return_value=job))
+    mock_update = mocker.patch("app.services.job.update_ProcessingJob_entry", AsyncMock(return_value=True))
+    token = CancellationToken()
+    with track_job(job.id, token):
+        response = await cancel_job_service(job_id=job.id, user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession))
+    assert token.cancelled
+    assert response.job_status == JobStatus.CANCELLED
+    update_kwargs = mock_update.await_args.kwargs
+    assert update_kwargs["job_status"] == JobStatus.CANCELLED
+    assert update_kwargs["from_statuses"] == (JobStatus.PENDING, JobStatus.PROCESSING)
+
+
+async def test_cancel_job_service_is_too_late_for_a_finished_job(mocker):
+    job = make_job(JobStatus.SUCCEEDED)
+    mocker.patch("app.services.job.read_ProcessingJob_entry", AsyncMock(return_value=job))
+    mocker.patch("app.services.job.update_ProcessingJob_entry", AsyncMock(return_value=False))
+    with pytest.raises(exc.JobAlreadyFinished):
+        await cancel_job_service(job_id=job.id, user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession))
+
+
+async def test_cancel_job_service_of_another_user_is_not_found(mocker):
+    mocker.patch("app.services.job.read_ProcessingJob_entry", AsyncMock(side_effect=exc.JobNotFound("missing")))
+    mock_update = mocker.patch("app.services.job.update_ProcessingJob_entry", AsyncMock())
+    with pytest.raises(exc.JobNotFound):
+        await cancel_job_service(job_id=uuid.uuid4(), user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession))
+    mock_update.assert_not_awaited()
+
+# --- cancel_jobs_cancelled_elsewhere ---
+
+async def test_cancel_jobs_cancelled_elsewhere_stops_only_the_cancelled_jobs(mocker):
+    cancelled_id, running_id = uuid.uuid4(), uuid.uuid4()
+    cancelled_token, running_token = CancellationToken(), CancellationToken()
+    mock_read = mocker.patch(
+        "app.services.job.read_cancelled_ProcessingJob_ids",
+        AsyncMock(return_value={cancelled_id}),
+    )
+    with track_job(cancelled_id, cancelled_token), track_job(running_id, running_token):
+        assert await cancel_jobs_cancelled_elsewhere(db_session=MagicMock(spec=AsyncSession)) == 1
+    assert set(mock_read.await_args.kwargs["job_ids"]) == {cancelled_id, running_id}
+    assert cancelled_token.cancelled
+    assert not running_token.cancelled
+
+
+async def test_cancel_jobs_cancelled_elsewhere_does_not_ask_without_jobs(mocker):
+    mock_read = mocker.patch("app.services.job.read_cancelled_ProcessingJob_ids", AsyncMock())
+    assert await cancel_jobs_cancelled_elsewhere(db_session=MagicMock(spec=AsyncSession)) == 0
+    mock_read.assert_not_awaited()
+
+# --- wait_for_job_service ---
+
+def read_job_in_turn(mocker, job: ProcessingJob, statuses: list[JobStatus]) -> AsyncMock:
+    # every read finds the job in the next status... the last one stays
+    remaining = list(statuses)
+
+    async def read(job_id, user_id, db_session):
+        job.job_status = remaining.pop(0) if len(remaining) > 1 else remaining[0]
+        return job
+
+    return mocker.patch("app.services.job.read_ProcessingJob_entry", AsyncMock(side_effect=read))
+
+
+async def test_wait_for_job_service_answers_a_finished_job_straight_away(mocker):
+    job = make_job(JobStatus.SUCCEEDED)
+    mock_read = read_job_in_turn(mocker, job, [JobStatus.SUCCEEDED])
+    get_job_status_listener().connected = True
+    response = await wait_for_job_service(
+        job_id=job.id, user_id=uuid.uuid4(), wait=10, db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.job_status == JobStatus.SUCCEEDED
+    assert mock_read.await_count == 1
+
+
+async def test_wait_for_job_service_wakes_when_the_job_is_notified(mocker):
+    """
+    GIVEN a client waiting for a running job
+    WHEN the job succeeds and Postgres notifies the worker
+    THEN the client is answered straight away... not at the end of its wait
+    AND the job was read only before the wait and after the notification
+    """
+    job = make_job(JobStatus.PROCESSING)
+    mock_read = read_job_in_turn(mocker, job, [JobStatus.PROCESSING, JobStatus.SUCCEEDED])
+    listener = get_job_status_listener()
+    listener.connected = True
+
+    async def notify():
+        await asyncio.sleep(0.01)
+        listener.dispatch(encode_job_status(job.id, JobStatus.SUCCEEDED))
+
+    notifier = asyncio.create_task(notify())
+    started = time.monotonic()
+    response = await wait_for_job_service(
+        job_id=job.id, user_id=uuid.uuid4(), wait=10, db_session=MagicMock(spec=AsyncSession),
+    )
+    await notifier
+    assert response.job_status == JobStatus.SUCCEEDED
+    assert time.monotonic() - started < 1
+    assert mock_read.await_count == 2
+    assert listener.subscribers == 0
+
+
+async def test_wait_for_job_service_does_not_poll_while_the_listener_is_connected(mocker):
+    job = make_job(JobStatus.PENDING)
+    mock_read = read_job_in_turn(mocker, job, [JobStatus.PENDING])
+    get_job_status_listener().connected = True
+    response = await wait_for_job_service(
+        job_id=job.id, user_id=uuid.uuid4(), wait=0.05, db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.job_status == JobStatus.PENDING
+    assert mock_read.await_count == 1
+
+
+async def test_wait_for_job_service_polls_while_the_listener_is_down(mocker):
+    """
+    GIVEN the LISTEN connection is down
+    WHEN a client waits for a job
+    THEN the job is read every JOB_STATUS_FALLBACK_POLL_SECONDS until it finishes
+    """
+    mocker.patch.object(settings, "JOB_STATUS_FALLBACK_POLL_SECONDS", 0.01)
+    job = make_job(JobStatus.PENDING)
+    mock_read = read_job_in_turn(mocker, job, [JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.FAILED])
+    get_job_status_listener().connected = False
+    response = await wait_for_job_service(
+        job_id=job.id, user_id=uuid.uuid4(), wait=10, db_session=MagicMock(spec=AsyncSession),
+    )
+    assert response.job_status == JobStatus.FAILED
+    assert mock_read.await_count == 3
+
+
+async def test_wait_for_job_service_of_another_user_is_not_found(mocker):
+    mocker.patch("app.services.job.read_ProcessingJob_entry", AsyncMock(side_effect=exc.JobNotFound("missing")))
+    with pytest.raises(exc.JobNotFound):
+        await wait_for_job_service(job_id=uuid.uuid4(), user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession))
+    assert get_job_status_listener().subscribers == 0
+
+# --- iter_job_updates ---
+
+async def test_iter_job_updates_sends_a_heartbeat_while_the_job_does_not_move(mocker):
+    job = make_job(JobStatus.PROCESSING)
+    read_job_in_turn(mocker, job, [JobStatus.PROCESSING])
+    get_job_status_listener().connected = True
+    updates = iter_job_updates(
+        job_id=job.id, user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession), timeout=10, heartbeat=0.01,
+    )
+    assert await anext(updates) is job
+    assert await anext(updates) is None
+    await updates.aclose()
+    assert get_job_status_listener().subscribers == 0
+
+# --- job_events_service ---
+
+async def test_job_events_service_streams_every_status_until_the_job_finishes(mocker):
+    job = make_job(JobStatus.PENDING)
+    read_job_in_turn(mocker, job, [JobStatus.PENDING, JobStatus.PROCESSING, JobStatus.SUCCEEDED])
+    listener = get_job_status_listener()
+    listener.connected = True
+    response = await job_events_service(job_id=job.id, user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession))
+    assert response.media_type == "text/event-stream"
+    assert response.headers["cache-control"] == "no-cache"
+    events = []
+    async for event in response.body_iterator:
+        events.append(event)
+        # the job moves once the client has the last event
+        listener.dispatch(encode_job_status(job.id, JobStatus.PROCESSING))
+    assert len(events) == 3
+    assert all(event.startswith("event: status\ndata: ") and event.endswith("\n\n") for event in events)
+    assert '"job_status":"pending"' in events[0]
+    assert '"job_status":"succeeded"' in events[2]
+
+
+async def test_job_events_service_of_another_user_is_not_found_before_it_streams(mocker):
+    mocker.patch("app.services.job.read_ProcessingJob_entry", AsyncMock(side_effect=exc.JobNotFound("missing")))
+    with pytest.raises(exc.JobNotFound):
+        await job_events_service(job_id=uuid.uuid4(), user_id=uuid.uuid4(), db_session=MagicMock(spec=AsyncSession))
@@ -0,0 +1,70 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.internal.metrics import PENDING_TOMBSTONES, RECLAIMED_BYTES, RECLAIMED_FILES
+from app.repository.directory_manager import ReapResult
+from app.services.reaper import reclaim_storage_service, run_reaper
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_reclaim_storage_service_reaps_until_nothing_is_pending(mocker):
+    """
+    GIVEN tombstones that take 2 batches to remove
+    WHEN storage is reclaimed
+    THEN both batches are removed
+    AND the metrics count the files and bytes removed
+    """
+    mocker.patch("app.services.reaper.reclaim_orphaned_ImageBlob_entries", AsyncMock(return_value=[]))
+    mock_reap = mocker.patch(
+        "app.services.reaper.reap_tombstones",
+        AsyncMock(side_effect=[ReapResult(files=2, bytes=20, pending=1), ReapResult(files=1, bytes=5, pending=0)]),
+    )
+    reclaimed_bytes = RECLAIMED_BYTES.value
+    reclaimed_files = RECLAIMED_FILES.value
+    total = await reclaim_storage_service(db_session=AsyncMock(), batch_size=2)
+    assert total == ReapResult(files=3, bytes=25, pending=0)
+    assert mock_reap.await_count == 2
+    assert RECLAIMED_BYTES.value - reclaimed_bytes == 25
+    assert RECLAIMED_FILES.value - reclaimed_files == 3
+    assert PENDING_TOMBSTONES.value == 0
+
+
+async def test_reclaim_storage_service_reclaims_orphaned_blobs_in_batches(mocker):
+    """
+    GIVEN more orphaned blobs than fit in a batch
+    WHEN storage is reclaimed
+    THEN blobs are reclaimed until a batch is not full
+    """
+    mock_reclaim = mocker.patch(
+        "app.services.reaper.reclaim_orphaned_ImageBlob_entries",
+        AsyncMock(side_effect=[["a", "b"], ["c"]]),
+    )
+    mocker.patch("app.services.reaper.reap_tombstones", AsyncMock(return_value=ReapResult()))
+    await reclaim_storage_service(db_session=AsyncMock(), batch_size=2)
+    assert mock_reclaim.await_count == 2
+
+
+async def test_run_reaper_survives_a_failed_run(mocker):
+    """
+    GIVEN a run that fails
+    WHEN the reaper is running
+    THEN it runs again on the next interval
+    """
+    mocker.patch("app.services.reaper.get_async_session", lambda: _sessions())
+    mock_reclaim = mocker.patch(
+        "app.services.reaper.reclaim_storage_service",
+        AsyncMock(side_effect=[OSError("volume unavailable"), ReapResult(), ReapResult()]),
+    )
+    task = asyncio.create_task(run_reaper(interval=0))
+    while mock_reclaim.await_count < 2:
+        await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+async def _sessions():
+    yield AsyncMock()
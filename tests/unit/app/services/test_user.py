@@ -95,6 +95,18 @@ async def test_delete_user_service_success(mocker):
     sample_user = User(id=user_id_to_delete, external_id=correct_external_id)
     # configure the mock query chain
     mock_session.get.return_value = sample_user
+    mock_release_blobs = mocker.patch(
+        "app.services.user.repository_layer.release_ImageBlob_references",
+        return_value=None
+    )
+    mock_delete_unprocessed_directory = mocker.patch(
+        "app.services.user.delete_unprocessed_user_directory",
+        return_value=None
+    )
+    mock_delete_processed_directory = mocker.patch(
+        "app.services.user.delete_processed_user_directory",
+        return_value=None
+    )
     # call the function
     await delete_user_service(
         db_session=mock_session,
@@ -103,8 +115,12 @@ async def test_delete_user_service_success(mocker):
     )
     # verify the correct methods were called in order
     mock_session.get.assert_awaited_once_with(User, user_id_to_delete)
+    mock_release_blobs.assert_awaited_once_with(user_id=user_id_to_delete, db_session=mock_session)
     mock_session.delete.assert_called_once_with(sample_user)
     mock_session.commit.assert_awaited_once()
+    # the directories are only moved to tombstones... the reaper removes the files
+    mock_delete_unprocessed_directory.assert_awaited_once_with(user_id=user_id_to_delete)
+    mock_delete_processed_directory.assert_awaited_once_with(user_id=user_id_to_delete)
 
 
 async def test_delete_user_service_raises_user_not_found(mocker):
@@ -0,0 +1,27 @@
+import pytest
+
+from app.config import VOLUME_PATHS, settings
+from app.storage import LocalStorageBackend, get_storage_backend
+
+
+@pytest.fixture(autouse=True)
+def clear_storage_backend():
+    get_storage_backend.cache_clear()
+    yield
+    get_storage_backend.cache_clear()
+
+
+def test_get_storage_backend_is_local_by_default():
+    storage = get_storage_backend()
+    assert isinstance(storage, LocalStorageBackend)
+    # the volumes are shared... patching them in a test reaches the backend
+    assert storage.volume_paths is VOLUME_PATHS
+    assert get_storage_backend() is storage
+
+
+def test_get_storage_backend_needs_a_bucket_for_s3(mocker):
+    pytest.importorskip("boto3")
+    mocker.patch.object(settings, "STORAGE_BACKEND", "s3")
+    mocker.patch.object(settings, "S3_BUCKET", None)
+    with pytest.raises(ValueError):
+        get_storage_backend()
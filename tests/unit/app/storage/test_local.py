@@ -0,0 +1,97 @@
+import pytest
+
+from app.storage import TOMBSTONE_DIRECTORY, LocalStorageBackend
+
+
+@pytest.fixture
+def volume_path(tmp_path):
+    volume_path = tmp_path / "unprocessed"
+    volume_path.mkdir()
+    return volume_path
+
+
+@pytest.fixture
+def storage(volume_path):
+    return LocalStorageBackend(volume_paths={"unprocessed_image_data": volume_path})
+
+
+def test_open_write_renames_the_file_into_place(storage, volume_path):
+    """
+    GIVEN a path in a directory
+    WHEN a file is written to it
+    THEN the file only appears once it is complete
+    """
+    path = volume_path / "user" / "ab" / "image.png"
+    storage.make_directory(path.parent)
+    with storage.open_write(path) as file:
+        file.write(b"image")
+        assert not path.exists()
+    assert path.read_bytes() == b"image"
+    assert storage.exists(path)
+    assert storage.size(path) == 5
+
+
+def test_open_write_does_not_make_a_missing_directory(storage, volume_path):
+    """
+    GIVEN a user directory that was just deleted
+    WHEN a file is written to it
+    THEN the write fails
+    AND the directory is not made again
+    """
+    with pytest.raises(FileNotFoundError), storage.open_write(volume_path / "user" / "image.png") as file:
+        file.write(b"image")
+    assert not (volume_path / "user").exists()
+
+
+def test_make_directory_without_parents_raises_for_a_missing_parent(storage, volume_path):
+    with pytest.raises(FileNotFoundError):
+        storage.make_directory(volume_path / "user" / "ab", parents=False)
+    assert not (volume_path / "user").exists()
+
+
+def test_open_read_raises_file_not_found_for_a_missing_file(storage, volume_path):
+    with pytest.raises(FileNotFoundError), storage.open_read(volume_path / "missing.png"):
+        pass
+
+
+def test_make_directory_raises_if_it_exists(storage, volume_path):
+    storage.make_directory(volume_path / "user")
+    storage.make_directory(volume_path / "user", exist_ok=True)
+    with pytest.raises(FileExistsError):
+        storage.make_directory(volume_path / "user")
+
+
+def test_list_files_only_lists_files(storage, volume_path):
+    """
+    GIVEN a directory with a file and a directory in it
+    WHEN its files are listed
+    THEN only the file is listed
+    """
+    (volume_path / "image.png").write_bytes(b"image")
+    (volume_path / "user").mkdir()
+    assert storage.list_files(volume_path) == [volume_path / "image.png"]
+    assert storage.list_files(volume_path / "missing") == []
+
+
+def test_delete_moves_the_directory_to_the_tombstones(storage, volume_path):
+    """
+    GIVEN a directory with a file in it
+    WHEN it is deleted
+    THEN it is moved to the tombstones of its volume
+    """
+    (volume_path / "user").mkdir()
+    (volume_path / "user" / "image.png").write_bytes(b"image")
+    tombstone_path = storage.delete(volume_path / "user")
+    assert tombstone_path.parent == volume_path / TOMBSTONE_DIRECTORY
+    assert (tombstone_path / "image.png").exists()
+    assert not (volume_path / "user").exists()
+    assert storage.delete(volume_path / "user") is None
+
+
+def test_delete_outside_a_volume_raises(storage, tmp_path):
+    with pytest.raises(ValueError):
+        storage.delete(tmp_path / "elsewhere")
+
+
+def test_local_storage_has_no_download_url(storage, volume_path):
+    assert storage.get_download_url(volume_path / "image.png", "image.png", "image/png") is None
@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from app.storage.s3 import S3StorageBackend  # noqa: E402
+
+BUCKET = "images"
+VOLUME_PATHS = {
+    "unprocessed_image_data": Path("/data/unprocessed"),
+    "processed_image_data": Path("/data/processed"),
+}
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        # a small threshold... so the multipart upload is used
+        yield S3StorageBackend(
+            volume_paths=VOLUME_PATHS,
+            bucket=BUCKET,
+            key_prefix="test/",
+            multipart_threshold=5 * 1024 * 1024,
+            multipart_chunk_size=5 * 1024 * 1024,
+            client=client,
+        )
+
+
+def test_paths_in_a_volume_are_stored_under_its_name(storage):
+    path = VOLUME_PATHS["unprocessed_image_data"] / "user" / "ab" / "image.png"
+    with storage.open_write(path) as file:
+        file.write(b"image")
+    response = storage.client.get_object(Bucket=BUCKET, Key="test/unprocessed_image_data/user/ab/image.png")
+    assert response["Body"].read() == b"image"
+    assert storage.exists(path)
+    assert storage.size(path) == 5
+    with storage.open_read(path) as file:
+        assert file.read() == b"image"
+
+
+def test_large_files_are_uploaded_in_parts(storage):
+    """
+    GIVEN a file larger than the multipart threshold
+    WHEN it is written
+    THEN it is read back whole
+    """
+    path = VOLUME_PATHS["processed_image_data"] / "user" / "image.png"
+    content = b"0123456789" * (1024 * 1024)
+    with storage.open_write(path) as file:
+        file.write(content)
+    with storage.open_read(path) as file:
+        assert file.read() == content
+
+
+def test_missing_files(storage):
+    path = VOLUME_PATHS["unprocessed_image_data"] / "missing.png"
+    assert not storage.exists(path)
+    with pytest.raises(FileNotFoundError):
+        storage.size(path)
+    with pytest.raises(FileNotFoundError), storage.open_read(path):
+        pass
+
+
+def test_a_directory_exists_while_it_has_files(storage):
+    user_dir_path = VOLUME_PATHS["unprocessed_image_data"] / "user"
+    storage.make_directory(user_dir_path)
+    assert not storage.exists(user_dir_path)
+    with storage.open_write(user_dir_path / "image.png") as file:
+        file.write(b"image")
+    assert storage.exists(user_dir_path)
+
+
+def test_list_files_and_delete_a_directory(storage):
+    """
+    GIVEN a directory with a file and a subdirectory
+    WHEN its files are listed
+    THEN only the file is listed
+    WHEN it is deleted
+    THEN every object under it is deleted
+    """
+    user_dir_path = VOLUME_PATHS["processed_image_data"] / "user"
+    for path in (user_dir_path / "a.png", user_dir_path / "image" / "b.png"):
+        with storage.open_write(path) as file:
+            file.write(b"image")
+    assert storage.list_files(user_dir_path) == [user_dir_path / "a.png"]
+    assert storage.delete(user_dir_path) is None
+    assert not storage.exists(user_dir_path)
+
+
+def test_get_download_url_signs_a_link_to_the_object(storage):
+    path = VOLUME_PATHS["unprocessed_image_data"] / "image.png"
+    url = storage.get_download_url(path, "original.png", "image/png")
+    assert "test/unprocessed_image_data/image.png" in url
+    assert "Signature" in url or "X-Amz-Signature" in url
+    assert "response-content-disposition" in url
+
+
+def test_object_store_keys_are_never_in_another_layout(storage):
+    assert not storage.has_other_layouts